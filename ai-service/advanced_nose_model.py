@@ -2,95 +2,72 @@ import numpy as np
 import cv2
 import os
 import json
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Sequence
 import logging
 import tensorflow as tf
-from tensorflow.keras.applications import MobileNetV2, EfficientNetB0
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input as mobilenet_preprocess
 from tensorflow.keras.applications.efficientnet import preprocess_input as efficientnet_preprocess
 from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import Model
-from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout, Concatenate
-from sklearn.metrics.pairwise import cosine_similarity
-import pickle
-from datetime import datetime
+from embedding_store import EmbeddingStore
+from backbone_registry import get_backbone_registry, build_head
+from inference_runner import make_runner
+from image_pipeline import DecodedImage, ImageInput, as_decoded
+from feature_artifacts import get_feature_artifacts
+from config import Config
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AdvancedNoseModel:
+    # Prefijo de las cabezas en el artefacto y de la versión de cada embedding
+    ARTIFACT_PREFIX = "advanced"
+
     def __init__(self, embeddings_path: str = "advanced_embeddings.json"):
         self.embeddings_path = embeddings_path
         self.embeddings = {}
+        self.embedding_version = f"{self.ARTIFACT_PREFIX}-{get_feature_artifacts().tag}"
+        self.store = EmbeddingStore(embeddings_path, self.embedding_version, Config.EMBEDDING_STORE_COMPACT_EVERY)
         self.feature_models = {}
+        self.head_runners = {}
         self.threshold = 0.75  # Umbral más flexible para mejor detección
         self.confidence_boost = 1.2  # Factor de boost para confianza
         self._initialize_models()
         
     def _initialize_models(self):
-        """Inicializar múltiples modelos para extracción de características"""
+        """Inicializar cabezas para múltiples modelos sobre los backbones compartidos"""
         try:
+            self.backbones = get_backbone_registry()
             # Modelo 1: MobileNetV2 (rápido y eficiente)
-            mobilenet_base = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
-            mobilenet_x = mobilenet_base.output
-            mobilenet_x = GlobalAveragePooling2D()(mobilenet_x)
-            mobilenet_x = Dense(512, activation='relu')(mobilenet_x)
-            mobilenet_x = Dropout(0.3)(mobilenet_x)
-            mobilenet_x = Dense(256, activation='relu')(mobilenet_x)
-            
-            self.feature_models['mobilenet'] = Model(inputs=mobilenet_base.input, outputs=mobilenet_x)
-            
             # Modelo 2: EfficientNetB0 (más preciso)
-            efficientnet_base = EfficientNetB0(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
-            efficientnet_x = efficientnet_base.output
-            efficientnet_x = GlobalAveragePooling2D()(efficientnet_x)
-            efficientnet_x = Dense(512, activation='relu')(efficientnet_x)
-            efficientnet_x = Dropout(0.3)(efficientnet_x)
-            efficientnet_x = Dense(256, activation='relu')(efficientnet_x)
-            
-            self.feature_models['efficientnet'] = Model(inputs=efficientnet_base.input, outputs=efficientnet_x)
-            
-            # Congelar capas base
-            for model in self.feature_models.values():
-                for layer in model.layers[:-6]:  # No congelar las últimas capas
-                    layer.trainable = False
+            for model_name in ('mobilenet', 'efficientnet'):
+                self.backbones.get(model_name)
+                self.feature_models[model_name] = build_head(
+                    self.backbones.output_dim(model_name), [512, 256], [0.3], f"{self.ARTIFACT_PREFIX}/{model_name}"
+                )
+                self.head_runners[model_name] = make_runner(self.feature_models[model_name])
                     
             logger.info(f"Modelos inicializados: {list(self.feature_models.keys())}")
             
         except Exception as e:
             logger.error(f"Error inicializando modelos: {e}")
             self.feature_models = {}
+            self.head_runners = {}
     
-    def preprocess_image_advanced(self, img_bytes: bytes) -> Dict[str, np.ndarray]:
-        """Preprocesamiento avanzado para múltiples modelos"""
-        # Convertir bytes a imagen
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen")
+    def preprocess_image_advanced(self, img_bytes: ImageInput) -> Dict[str, np.ndarray]:
+        """Preprocesamiento avanzado para múltiples modelos (acepta bytes o DecodedImage)"""
+        decoded = as_decoded(img_bytes)
         
-        # Convertir BGR a RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Aplicar mejoras de imagen
-        img_enhanced = self._enhance_image(img)
+        # Aplicar mejoras de imagen y redimensionar una sola vez para ambos backbones
+        enhanced_224 = decoded.memo('advanced_enhanced@224x224', lambda: cv2.resize(self._enhance_image(decoded.rgb_color), (224, 224)))
+        base_array = np.expand_dims(image.img_to_array(enhanced_224), axis=0)
         
         processed_images = {}
         
-        # Procesar para MobileNetV2
-        mobilenet_img = cv2.resize(img_enhanced, (224, 224))
-        mobilenet_array = image.img_to_array(mobilenet_img)
-        mobilenet_array = np.expand_dims(mobilenet_array, axis=0)
-        mobilenet_array = mobilenet_preprocess(mobilenet_array)
-        processed_images['mobilenet'] = mobilenet_array
+        # Procesar para MobileNetV2 (preprocess_input modifica el arreglo en sitio)
+        processed_images['mobilenet'] = mobilenet_preprocess(base_array.copy())
         
         # Procesar para EfficientNetB0
-        efficientnet_img = cv2.resize(img_enhanced, (224, 224))
-        efficientnet_array = image.img_to_array(efficientnet_img)
-        efficientnet_array = np.expand_dims(efficientnet_array, axis=0)
-        efficientnet_array = efficientnet_preprocess(efficientnet_array)
-        processed_images['efficientnet'] = efficientnet_array
+        processed_images['efficientnet'] = efficientnet_preprocess(base_array)
         
         return processed_images
     
@@ -117,21 +94,24 @@ class AdvancedNoseModel:
         
         return (enhanced * 255).astype(np.uint8)
     
-    def extract_features_advanced(self, img_bytes: bytes) -> Dict[str, List[float]]:
-        """Extraer características usando múltiples modelos"""
+    def extract_features_advanced(self, img_bytes: ImageInput, pooled: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, List[float]]:
+        """Extraer características usando múltiples modelos (pooled: salidas ya calculadas de los backbones)"""
         try:
             if not self.feature_models:
                 logger.warning("Modelos no disponibles, usando características tradicionales")
                 return {'traditional': self._extract_traditional_features_advanced(img_bytes)}
             
-            processed_images = self.preprocess_image_advanced(img_bytes)
+            if pooled is None:
+                pooled = {
+                    model_name: self.backbones.pooled(model_name, img_array)
+                    for model_name, img_array in self.preprocess_image_advanced(img_bytes).items()
+                }
             features = {}
             
             # Extraer características de cada modelo
-            for model_name, model in self.feature_models.items():
-                if model_name in processed_images:
-                    img_array = processed_images[model_name]
-                    model_features = model.predict(img_array, verbose=0)
+            for model_name, head in self.feature_models.items():
+                if model_name in pooled:
+                    model_features = self.head_runners[model_name](pooled[model_name])
                     
                     # Normalizar características
                     features_norm = model_features[0] / np.linalg.norm(model_features[0])
@@ -147,17 +127,34 @@ class AdvancedNoseModel:
             logger.error(f"Error en extracción avanzada: {e}")
             return {'traditional': self._extract_traditional_features_advanced(img_bytes)}
     
-    def _extract_traditional_features_advanced(self, img_bytes: bytes) -> List[float]:
+    def extract_features_advanced_batch(self, images: Sequence[DecodedImage], pooled: Optional[Dict[str, np.ndarray]] = None) -> List[Dict[str, List[float]]]:
+        """Características de un lote de imágenes (pooled: {backbone: (N, D)} ya calculado)"""
+        if not self.feature_models:
+            return [self.extract_features_advanced(img) for img in images]
+        try:
+            if pooled is None:
+                inputs = [self.preprocess_image_advanced(img) for img in images]
+                pooled = {
+                    model_name: self.backbones.pooled(model_name, np.concatenate([x[model_name] for x in inputs], axis=0))
+                    for model_name in self.feature_models
+                }
+            families = {}
+            for model_name in self.feature_models:
+                if model_name in pooled:
+                    model_features = self.head_runners[model_name](pooled[model_name])
+                    families[model_name] = model_features / np.linalg.norm(model_features, axis=1, keepdims=True)
+            batch_features = [{name: rows[i].tolist() for name, rows in families.items()} for i in range(len(images))]
+            for features, img in zip(batch_features, images):
+                features['traditional'] = self._extract_traditional_features_advanced(img)
+            logger.info(f"Características avanzadas extraídas para un lote de {len(images)} imágenes")
+            return batch_features
+        except Exception as e:
+            logger.error(f"Error en extracción avanzada por lote, extrayendo imagen por imagen: {e}")
+            return [self.extract_features_advanced(img) for img in images]
+    
+    def _extract_traditional_features_advanced(self, img_bytes: ImageInput) -> List[float]:
         """Extraer características tradicionales mejoradas"""
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen")
-        
-        # Convertir a RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = cv2.resize(img, (224, 224))
+        img = as_decoded(img_bytes).resized('rgb_color', (224, 224))
         
         features = []
         
@@ -224,33 +221,51 @@ class AdvancedNoseModel:
         return features_norm.tolist()
     
     def load_embeddings(self):
-        """Cargar embeddings guardados"""
-        if os.path.exists(self.embeddings_path):
-            with open(self.embeddings_path, 'r') as f:
-                self.embeddings = json.load(f)
-                logger.info(f"Cargados {len(self.embeddings)} embeddings avanzados")
+        """Cargar embeddings guardados (snapshot binario + log append-only)"""
+        self.embeddings = self.store.load()
+        stale = self.stale_embedding_count()
+        if stale:
+            logger.warning(f"{stale} embeddings fueron generados con otra versión del extractor (actual: {self.embedding_version})")
+        if self.embeddings:
+            logger.info(f"Cargados {len(self.embeddings)} embeddings avanzados")
         else:
-            self.embeddings = {}
             logger.info("No se encontraron embeddings avanzados previos")
     
+    def sync_embeddings(self) -> bool:
+        """Incorporar lo que registraron otros workers; sin cambios sólo lee el contador compartido"""
+        if not self.store.changed():
+            return False
+        changes = self.store.pending_changes()
+        if changes is None:
+            self.load_embeddings()
+            return True
+        for pet_id, features in changes.items():
+            if features is None:
+                self.embeddings.pop(pet_id, None)
+            else:
+                self.embeddings[pet_id] = features
+        return True
+    
+    def stale_embedding_count(self) -> int:
+        """Embeddings producidos con un artefacto distinto del cargado (no comparables)"""
+        return sum(1 for pet_id in self.embeddings if self.store.versions.get(pet_id) != self.embedding_version)
+    
     def save_embeddings(self):
-        """Guardar embeddings"""
-        with open(self.embeddings_path, 'w') as f:
-            json.dump(self.embeddings, f)
+        """Compactar todos los embeddings en un snapshot atómico"""
+        self.store.compact(self.embeddings)
         logger.info(f"Guardados {len(self.embeddings)} embeddings avanzados")
     
-    def register_pet_advanced(self, pet_id: str, img_bytes: bytes) -> Dict:
+    def register_pet_advanced(self, pet_id: str, img_bytes: ImageInput, pooled: Optional[Dict[str, np.ndarray]] = None) -> Dict:
         """Registrar una nueva mascota con características avanzadas"""
         try:
-            features = self.extract_features_advanced(img_bytes)
+            features = self.extract_features_advanced(img_bytes, pooled=pooled)
             
             # Convertir numpy arrays a listas para serialización JSON
             features_serializable = {}
             for model_name, model_features in features.items():
                 features_serializable[model_name] = [float(f) for f in model_features]
             
-            self.embeddings[pet_id] = features_serializable
-            self.save_embeddings()
+            self.add_pets_advanced([(pet_id, features_serializable)])
             
             total_features = sum(len(f) for f in features_serializable.values())
             logger.info(f"Mascota {pet_id} registrada con {len(features_serializable)} modelos")
@@ -267,11 +282,22 @@ class AdvancedNoseModel:
             logger.error(f"Error registrando mascota {pet_id}: {str(e)}")
             return {"status": "error", "message": str(e)}
     
-    def compare_nose_advanced(self, img_bytes: bytes) -> Dict:
+    def add_pets_advanced(self, entries: List[Tuple[str, Dict[str, List[float]]]]):
+        """Agregar características ya extraídas con una sola escritura al store"""
+        for pet_id, features in entries:
+            self.embeddings[pet_id] = features
+        self.store.put_many(entries)
+        if self.store.should_compact():
+            self.save_embeddings()
+    
+    def compare_nose_advanced(self, img_bytes: ImageInput) -> Dict:
         """Comparar nariz con embeddings registrados usando múltiples modelos"""
         try:
             query_features = self.extract_features_advanced(img_bytes)
             
+            # Registros hechos en otros workers desde la última consulta
+            self.sync_embeddings()
+            
             if not self.embeddings:
                 return {
                     "match": False, 
@@ -370,9 +396,13 @@ class AdvancedNoseModel:
     
     def get_model_stats(self) -> Dict:
         """Obtener estadísticas del modelo avanzado"""
+        self.sync_embeddings()
         return {
             "total_pets": len(self.embeddings),
             "embeddings_path": self.embeddings_path,
+            "store": self.store.stats(),
+            "embedding_version": self.embedding_version,
+            "stale_embeddings": self.stale_embedding_count(),
             "threshold": self.threshold,
             "confidence_boost": self.confidence_boost,
             "model_type": "AdvancedMultiModelNoseRecognition",
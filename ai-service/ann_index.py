@@ -0,0 +1,182 @@
+import numpy as np
+from typing import Callable, Dict, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Filas por tramo al asignar listas: acota el vector fusionado (8192 × 747 floats) y la matriz de
+# scores contra los centroides (8192 × nlist floats, ≈130 MB con nlist=4000 a 1M de mascotas)
+ASSIGN_CHUNK = 8192
+
+class IVFIndex:
+    """Cuantizador grueso IVF sobre el embedding fusionado (concatenación de familias escaladas por sqrt(peso)).
+
+    El producto interno del vector fusionado es exactamente el score ponderado de NosePrintModel,
+    por lo que los centroides se entrenan en el mismo espacio en que se rankea. La búsqueda sólo
+    elige las listas a visitar; el score final de los candidatos se recalcula de forma exacta en
+    EmbeddingIndex con las matrices por familia.
+    """
+
+    def __init__(self, weights: Dict[str, float], nlist: int = 0, nprobe: int = 16,
+                 min_pets: int = 50000, train_sample: int = 100000, train_iters: int = 10,
+                 retrain_factor: float = 2.0, seed: int = 0, assign_chunk: int = ASSIGN_CHUNK):
+        self.weights = dict(weights)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_pets = min_pets
+        self.train_sample = train_sample
+        self.train_iters = train_iters
+        self.retrain_factor = retrain_factor
+        self.seed = seed
+        self.assign_chunk = max(1, assign_chunk)
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def fuse(self, family_vectors: Dict[str, np.ndarray]) -> np.ndarray:
+        """Concatenar vectores normalizados (1D o 2D) escalados por sqrt(peso)"""
+        parts = []
+        for family, weight in self.weights.items():
+            if family in family_vectors:
+                parts.append(np.sqrt(np.float32(weight)) * family_vectors[family])
+        return np.concatenate(parts, axis=-1).astype(np.float32, copy=False)
+
+    def fuse_rows(self, family_rows: Callable[[str], np.ndarray], dims: Dict[str, int]) -> np.ndarray:
+        """Como fuse, pero pidiendo las filas familia por familia y escalándolas dentro de un único
+        arreglo: para la muestra de entrenamiento sólo vive una familia descomprimida a la vez"""
+        families = [family for family in self.weights if family in dims]
+        width = sum(dims[family] for family in families)
+        fused = None
+        offset = 0
+        for family in families:
+            values = family_rows(family)
+            if fused is None:
+                fused = np.empty(values.shape[:-1] + (width,), dtype=np.float32)
+            np.multiply(values, np.sqrt(np.float32(self.weights[family])), out=fused[..., offset:offset + dims[family]])
+            offset += dims[family]
+            del values
+        return fused
+
+    def _resolve_nlist(self, n: int) -> int:
+        nlist = self.nlist if self.nlist > 0 else int(4 * np.sqrt(n))
+        return max(1, min(nlist, n))
+
+    def _nearest(self, fused: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Lista más cercana de cada fila, por tramos de assign_chunk filas"""
+        centroids = self.centroids if centroids is None else centroids
+        labels = np.empty(fused.shape[0], dtype=np.int32)
+        for start in range(0, fused.shape[0], self.assign_chunk):
+            labels[start:start + self.assign_chunk] = np.argmax(fused[start:start + self.assign_chunk] @ centroids.T, axis=1)
+        return labels
+
+    def _ensure_capacity(self, n: int):
+        if self._assign.shape[0] < n:
+            grown = np.zeros(max(n, 2 * self._assign.shape[0], 256), dtype=np.int32)
+            grown[:self._assign.shape[0]] = self._assign
+            self._assign = grown
+
+    def train(self, fused_rows: Callable[[object], np.ndarray], n: int):
+        """K-means esférico sobre una muestra y asignación de todas las filas (sincrónico).
+
+        fused_rows(filas) devuelve los vectores fusionados de un slice o arreglo de filas: sólo
+        se materializan la muestra (train_sample filas) y un tramo de assign_chunk filas a la
+        vez, nunca la matriz fusionada completa (≈3 GB en float32 con 1M de mascotas).
+        """
+        if n == 0:
+            self.reset()
+            return
+        centroids = self.fit(fused_rows, n)
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, self.assign_chunk):
+            end = min(n, start + self.assign_chunk)
+            assign[start:end] = self._nearest(fused_rows(slice(start, end)), centroids)
+        self.install(centroids, assign, n)
+
+    def fit(self, fused_rows: Callable[[object], np.ndarray], n: int,
+            stop: Optional[Callable[[], bool]] = None) -> Optional[np.ndarray]:
+        """Centroides entrenados sobre una muestra, sin tocar el cuantizador en uso.
+
+        `stop()` se consulta entre iteraciones: si devuelve True se abandona (devuelve None).
+        """
+        rng = np.random.default_rng(self.seed)
+        if n <= self.train_sample:
+            sample = fused_rows(slice(0, n))
+        else:
+            sample = fused_rows(np.sort(rng.choice(n, self.train_sample, replace=False)))
+        nlist = min(self._resolve_nlist(n), sample.shape[0])
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.train_iters):
+            if stop is not None and stop():
+                return None
+            labels = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Reubicar centroides vacíos en puntos aleatorios de la muestra
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        return centroids.astype(np.float32)
+
+    def assign_rows(self, fused: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Lista de cada fila con unos centroides dados (p. ej. los de un entrenamiento en curso)"""
+        return self._nearest(fused, centroids)
+
+    def install(self, centroids: np.ndarray, assign: np.ndarray, trained_size: int):
+        """Pasar a usar centroides y asignaciones ya calculados (entrenamiento o índice compartido)"""
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._ensure_capacity(assign.shape[0])
+        self._assign[:assign.shape[0]] = assign
+        self.trained_size = trained_size
+        logger.info(f"Índice IVF listo: {trained_size} mascotas en {self.centroids.shape[0]} listas")
+
+    def assignments(self, n: int) -> np.ndarray:
+        """Lista asignada a cada una de las primeras n filas"""
+        self._ensure_capacity(n)
+        return self._assign[:n]
+
+    def reset(self):
+        self.centroids = None
+        self.trained_size = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+
+    def needs_training(self, n: int) -> bool:
+        if n < self.min_pets:
+            return False
+        return not self.ready or n >= self.trained_size * self.retrain_factor
+
+    def add(self, row: int, fused_row: np.ndarray):
+        if not self.ready:
+            return
+        self._ensure_capacity(row + 1)
+        self._assign[row] = self._nearest(fused_row[np.newaxis, :])[0]
+
+    def move(self, src: int, dst: int):
+        """Reflejar el swap-remove de EmbeddingIndex"""
+        if self.ready:
+            self._assign[dst] = self._assign[src]
+
+    def candidate_rows(self, fused_query: np.ndarray, n: int, nprobe: Optional[int] = None) -> np.ndarray:
+        """Filas pertenecientes a las nprobe listas más cercanas a la consulta"""
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        centroid_scores = self.centroids @ fused_query
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self._assign[:n], probed))
+
+    def stats(self) -> Dict:
+        return {
+            "type": "ivf",
+            "trained": self.ready,
+            "trained_size": self.trained_size,
+            "nlist": 0 if self.centroids is None else int(self.centroids.shape[0]),
+            "nprobe": self.nprobe,
+            "min_pets": self.min_pets
+        }
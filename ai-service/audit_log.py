@@ -0,0 +1,210 @@
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict
+import logging
+
+try:
+    import fcntl
+except ImportError:  # sin flock (Windows) la rotación sólo es segura con un único proceso
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+def summarize_similarities(all_similarities: Dict, top_k: int) -> Dict:
+    """Top-k de all_similarities (ya viene ordenado por score) más estadísticas del resto"""
+    scores = [float(v.get("final_score", 0)) for v in all_similarities.values()]
+    top = {}
+    for pet_id, data in all_similarities.items():
+        if len(top) >= top_k:
+            break
+        top[pet_id] = data
+    return {
+        "top": top,
+        "count": len(scores),
+        "max": max(scores) if scores else 0.0,
+        "min": min(scores) if scores else 0.0,
+        "mean": sum(scores) / len(scores) if scores else 0.0
+    }
+
+def _cap_payload(value, top_k: int):
+    """Reemplazar cada all_similarities (O(N) mascotas) por su resumen acotado"""
+    if isinstance(value, dict):
+        return {
+            k: summarize_similarities(v, top_k) if k == "all_similarities" and isinstance(v, dict) else _cap_payload(v, top_k)
+            for k, v in value.items()
+        }
+    return value
+
+class AuditLogWriter:
+    """Log de auditoría JSONL escrito por un hilo en segundo plano.
+
+    log() sólo encola (nunca bloquea la petición); si la cola está llena el evento se descarta
+    y se cuenta en `dropped`. El hilo escribe en un archivo con buffer, hace flush cada
+    `flush_bytes` bytes o `flush_interval` segundos y rota por tamaño (archivo.1 ... archivo.N).
+
+    Varios workers pueden compartir el archivo: se escribe en modo append, la rotación toma un
+    flock y quien encuentra el archivo ya rotado por otro proceso sólo lo reabre.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000, flush_bytes: int = 64 * 1024,
+                 flush_interval: float = 1.0, max_bytes: int = 50 * 1024 * 1024,
+                 backup_count: int = 5, top_k: int = 5):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = max(0, backup_count)
+        self.top_k = max(0, top_k)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self._file = None
+        # Métricas
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.max_queue_depth = 0
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, event: str, data: Dict) -> bool:
+        """Encolar un evento; devuelve False si se descartó por cola llena"""
+        entry = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "event": event,
+            **data
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Cola de auditoría llena: {self.dropped} eventos descartados")
+            return False
+        self.enqueued += 1
+        return True
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1024 * 1024)
+
+    def _rotated_elsewhere(self) -> bool:
+        """¿Otro proceso rotó el archivo (la ruta ya no apunta al que tenemos abierto)?"""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _rotate(self):
+        lock_file = open(self.path + ".lock", "a") if fcntl is not None else None
+        try:
+            if lock_file is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            # Otro worker pudo rotar mientras se esperaba el candado
+            if not self._rotated_elsewhere() and os.path.getsize(self.path) >= self.max_bytes:
+                if self.backup_count > 0:
+                    for i in range(self.backup_count - 1, 0, -1):
+                        source = f"{self.path}.{i}"
+                        if os.path.exists(source):
+                            os.replace(source, f"{self.path}.{i + 1}")
+                    os.replace(self.path, f"{self.path}.1")
+                else:
+                    os.remove(self.path)
+                self.rotations += 1
+        finally:
+            if lock_file is not None:
+                lock_file.close()  # libera el flock
+        self._file.close()
+        self._open()
+
+    def _write(self, entry: Dict) -> int:
+        try:
+            line = json.dumps(_cap_payload(entry, self.top_k), ensure_ascii=False, default=str) + "\n"
+        except (TypeError, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Evento de auditoría no serializable ({entry.get('event')}): {e}")
+            return 0
+        self._file.write(line)
+        self.written += 1
+        return len(line)
+
+    def _flush(self):
+        self._file.flush()
+        self.flushes += 1
+        if self._rotated_elsewhere():
+            self._file.close()
+            self._open()
+        elif self.max_bytes and os.fstat(self._file.fileno()).st_size >= self.max_bytes:
+            self._rotate()
+
+    def _run(self):
+        self._open()
+        pending = 0
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush)) if pending else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize() + (item is not None))
+            # Vaciar lo que haya en cola de una vez
+            while item is not None:
+                if item is _STOP:
+                    stopping = True
+                    break
+                try:
+                    pending += self._write(item)
+                except OSError as e:
+                    self.errors += 1
+                    logger.error(f"Error escribiendo auditoría: {e}")
+                if pending >= self.flush_bytes:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            if pending and (stopping or pending >= self.flush_bytes or time.monotonic() - last_flush >= self.flush_interval):
+                try:
+                    self._flush()
+                except OSError as e:
+                    self.errors += 1
+                    logger.error(f"Error escribiendo auditoría: {e}")
+                pending = 0
+                last_flush = time.monotonic()
+        self._file.close()
+
+    def close(self, timeout: float = 5.0):
+        """Escribir lo pendiente y detener el hilo"""
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("No se pudo detener el writer de auditoría: cola llena")
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "queue_capacity": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+            "similarities_top_k": self.top_k
+        }
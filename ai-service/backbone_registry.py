@@ -0,0 +1,168 @@
+import numpy as np
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional
+import logging
+import tensorflow as tf
+from tensorflow.keras.applications import MobileNetV2, EfficientNetB0
+from tensorflow.keras.models import Model
+from tensorflow.keras.layers import Input, GlobalAveragePooling2D, Dense, Dropout
+from tensorflow.keras.initializers import GlorotUniform
+from feature_artifacts import get_feature_artifacts, layer_seed
+from inference_scheduler import MicroBatchScheduler
+from inference_runner import make_runner
+from metrics import stage
+from model_roster import process_rss_bytes
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Arquitecturas disponibles: constructor y dimensión del vector tras GlobalAveragePooling2D
+ARCHITECTURES = {
+    'mobilenet': (MobileNetV2, 1280),
+    'efficientnet': (EfficientNetB0, 1280)
+}
+
+# Cuántas veces construían cada backbone los tres modelos antes de compartirlos
+UNSHARED_USAGE = {'mobilenet': 3, 'efficientnet': 2}
+
+def build_head(input_dim: int, units: List[int], dropouts: List[float], key: str) -> Model:
+    """Cabeza densa propia de cada modelo sobre el vector agrupado del backbone compartido.
+
+    `key` (p. ej. "nose_print/mobilenet") identifica los pesos en el artefacto versionado;
+    sin artefacto la inicialización usa semillas fijas derivadas de la clave.
+    """
+    inputs = Input(shape=(input_dim,))
+    x = inputs
+    for i, n_units in enumerate(units):
+        x = Dense(n_units, activation='relu', kernel_initializer=GlorotUniform(seed=layer_seed(key, i)))(x)
+        if i < len(dropouts):
+            x = Dropout(dropouts[i])(x)
+    head = Model(inputs=inputs, outputs=x)
+    weights_path = get_feature_artifacts().head_path(key)
+    if weights_path:
+        head.load_weights(weights_path)
+    return head
+
+class BackboneRegistry:
+    """Una única instancia de cada backbone ImageNet por proceso, compartida por todos los modelos"""
+
+    def __init__(self):
+        self._backbones: Dict[str, Model] = {}
+        self._schedulers: Dict[str, MicroBatchScheduler] = {}
+        self._runners: Dict = {}
+        self._lock = threading.Lock()
+        self.forward_passes = 0
+        self.images = 0
+        self.deduplicated = 0
+        self.forward_seconds = 0.0
+
+    def get(self, name: str) -> Model:
+        """Backbone + GlobalAveragePooling2D, construido una sola vez"""
+        with self._lock:
+            if name not in self._backbones:
+                constructor, _ = ARCHITECTURES[name]
+                # Con artefacto local no se descarga nada: se construye sin pesos y se cargan de disco
+                weights_path = get_feature_artifacts().backbone_path(name)
+                base = constructor(weights=None if weights_path else 'imagenet', include_top=False, input_shape=(224, 224, 3))
+                base.trainable = False
+                pooled = GlobalAveragePooling2D()(base.output)
+                model = Model(inputs=base.input, outputs=pooled)
+                if weights_path:
+                    model.load_weights(weights_path)
+                self._backbones[name] = model
+                self._runners[name] = make_runner(model)
+                if Config.INFERENCE_BATCHING_ENABLED:
+                    self._schedulers[name] = MicroBatchScheduler(
+                        name,
+                        lambda batch, name=name: self._forward(name, batch),
+                        max_batch=Config.INFERENCE_MAX_BATCH,
+                        max_wait_ms=Config.INFERENCE_MAX_WAIT_MS
+                    )
+                logger.info(f"Backbone compartido cargado: {name} ({'artefacto' if weights_path else 'imagenet'})")
+            return self._backbones[name]
+
+    @staticmethod
+    def output_dim(name: str) -> int:
+        return ARCHITECTURES[name][1]
+
+    def pooled(self, name: str, batch: np.ndarray) -> np.ndarray:
+        """Vectores agrupados para un lote (N, 224, 224, 3) ya preprocesado"""
+        self.get(name)
+        scheduler = self._schedulers.get(name)
+        if scheduler is not None:
+            # Se agrupa con las peticiones concurrentes en un solo forward pass
+            return scheduler.submit(batch)
+        return self._forward(name, batch)
+
+    def _forward(self, name: str, batch: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        result = self._runners[name](batch)
+        self.forward_seconds += time.perf_counter() - start
+        self.forward_passes += 1
+        self.images += batch.shape[0]
+        return result
+
+    def fan_out(self, jobs: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict[str, np.ndarray]]:
+        """Ejecutar un solo forward pass por backbone para las entradas de varios modelos.
+
+        `jobs` es {modelo: {backbone: tensor (N, 224, 224, 3)}}; las entradas idénticas se
+        calculan una sola vez. Devuelve {modelo: {backbone: vectores agrupados (N, D)}}.
+        """
+        results: Dict[str, Dict[str, np.ndarray]] = {model_name: {} for model_name in jobs}
+        by_backbone: Dict[str, List] = {}
+        for model_name, inputs in jobs.items():
+            for backbone_name, tensor in inputs.items():
+                by_backbone.setdefault(backbone_name, []).append((model_name, tensor))
+
+        for backbone_name, entries in by_backbone.items():
+            unique: Dict[str, int] = {}
+            batch = []
+            rows = 0
+            slots = []
+            for _, tensor in entries:
+                key = hashlib.sha1(np.ascontiguousarray(tensor).tobytes()).hexdigest()
+                if key not in unique:
+                    unique[key] = rows
+                    batch.append(tensor)
+                    rows += tensor.shape[0]
+                else:
+                    self.deduplicated += tensor.shape[0]
+                slots.append(unique[key])
+            with stage(f"backbone_{backbone_name}"):
+                pooled = self.pooled(backbone_name, np.concatenate(batch, axis=0))
+            for (model_name, tensor), start in zip(entries, slots):
+                results[model_name][backbone_name] = pooled[start:start + tensor.shape[0]]
+        return results
+
+    def param_bytes(self) -> Dict[str, int]:
+        return {name: int(sum(np.prod(w.shape) for w in model.weights) * 4) for name, model in self._backbones.items()}
+
+    def stats(self) -> Dict:
+        shared = self.param_bytes()
+        return {
+            "artifact": get_feature_artifacts().stats(),
+            "inference_mode": Config.INFERENCE_MODE,
+            "xla": Config.INFERENCE_XLA,
+            "backbones_loaded": list(self._backbones.keys()),
+            "shared_weight_bytes": sum(shared.values()),
+            "unshared_weight_bytes_estimate": sum(shared[name] * UNSHARED_USAGE.get(name, 1) for name in shared),
+            "forward_passes": self.forward_passes,
+            "images": self.images,
+            "deduplicated_inputs": self.deduplicated,
+            "avg_forward_ms": (self.forward_seconds / self.forward_passes * 1000) if self.forward_passes else 0.0,
+            "micro_batching": {name: scheduler.stats() for name, scheduler in self._schedulers.items()}
+        }
+
+_registry: Optional[BackboneRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_backbone_registry() -> BackboneRegistry:
+    """Registro de backbones compartido por todo el proceso"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = BackboneRegistry()
+        return _registry
@@ -0,0 +1,222 @@
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, List, Tuple
+import logging
+import numpy as np
+
+from image_pipeline import DecodedImage
+from model_roster import loaded_backbone_registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Extensiones que se toman como imágenes dentro de un archivo .zip / .tar(.gz)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+
+# (petId, función que devuelve los bytes de la imagen); la lectura se difiere hasta procesar su tramo
+BatchSource = Tuple[str, Callable[[], bytes]]
+
+class BatchItemError(Exception):
+    """Error de un elemento del lote (no interrumpe al resto)"""
+
+class BatchItemRejected(BatchItemError):
+    """Foto rechazada por el filtro de calidad (mismo criterio que /register-embedding)"""
+
+    def __init__(self, quality: Dict):
+        super().__init__(quality["message"])
+        self.quality = quality
+
+def pet_id_from_name(name: str) -> str:
+    """petId a partir del nombre de archivo: 'fotos/pet-123.jpg' -> 'pet-123'"""
+    return os.path.splitext(os.path.basename(name))[0]
+
+def read_limited(fileobj: BinaryIO, max_bytes: int) -> bytes:
+    """Leer a lo sumo max_bytes; si el archivo es más grande el elemento se rechaza"""
+    data = fileobj.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise BatchItemError(f"Imagen mayor que el límite de {max_bytes} bytes")
+    return data
+
+def archive_sources(fileobj: BinaryIO, max_image_bytes: int) -> List[BatchSource]:
+    """Entradas de imagen de un .zip o .tar(.gz); cada una se lee sólo cuando se procesa"""
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        archive = zipfile.ZipFile(fileobj)
+        sources = []
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            def read(info=info):
+                if info.file_size > max_image_bytes:
+                    raise BatchItemError(f"Imagen mayor que el límite de {max_image_bytes} bytes")
+                with archive.open(info) as f:
+                    return read_limited(f, max_image_bytes)
+            sources.append((pet_id_from_name(info.filename), read))
+        return sources
+
+    fileobj.seek(0)
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r:*")
+    except tarfile.TarError:
+        raise ValueError("El archivo debe ser .zip o .tar(.gz)")
+    # Un tar es un único flujo (gzip no admite lecturas intercaladas): los hilos de decodificación
+    # leen sus miembros de a uno; zipfile ya serializa el acceso a su archivo compartido
+    lock = threading.Lock()
+    sources = []
+    for member in archive.getmembers():
+        if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        def read(member=member):
+            if member.size > max_image_bytes:
+                raise BatchItemError(f"Imagen mayor que el límite de {max_image_bytes} bytes")
+            with lock:
+                return read_limited(archive.extractfile(member), max_image_bytes)
+        sources.append((pet_id_from_name(member.name), read))
+    return sources
+
+class BatchRegistrar:
+    """Registro de muchas mascotas en los modelos activos del roster con inferencia por lotes.
+
+    extract() procesa un tramo: lee, decodifica y preprocesa en paralelo, hace un forward pass
+    por backbone para todo el tramo y corre cada cabeza una vez. commit() agrega todo lo extraído
+    con una sola escritura por store. Los errores de un elemento se reportan en su resultado y
+    no afectan al resto del lote; las fotos que el filtro de calidad rechaza no se preprocesan.
+    """
+
+    def __init__(self, roster, decode_workers: int = 4):
+        self.roster = roster
+        self._decode_pool = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="batch-decode")
+        # Métricas
+        self.batches = 0
+        self.images = 0
+        self.failed = 0
+        self.quality_rejected = 0
+        self.extract_seconds = 0.0
+
+    def _prepare(self, source: BatchSource, models: Dict) -> Tuple[DecodedImage, Dict[str, Dict[str, np.ndarray]]]:
+        """Leer, decodificar y preprocesar una imagen para los modelos disponibles"""
+        _, read = source
+        decoded = DecodedImage(read())
+        nose_print_model = models["nose_print"]
+        quality = nose_print_model.assess_quality(decoded)
+        if quality is not None and not quality["accepted"]:
+            raise BatchItemRejected(quality)
+        inputs = {}
+        if nose_print_model.uses_shared_backbones:
+            inputs["nose_print"] = nose_print_model.preprocess_nose_image(decoded)
+        elif nose_print_model.feature_models:
+            # Backend onnx/tflite: sólo se adelanta la mejora de imagen (queda memorizada en el DecodedImage)
+            nose_print_model.preprocess_nose_image(decoded)
+        if "advanced" in models and models["advanced"].feature_models:
+            inputs["advanced"] = models["advanced"].preprocess_image_advanced(decoded)
+        if "simple" in models and models["simple"].feature_extractor is not None:
+            inputs["simple"] = {"mobilenet": models["simple"].preprocess_image(decoded)}
+        return decoded, inputs
+
+    def _models(self) -> Dict:
+        """Modelos activos del roster (el primer lote carga los que son lazy)"""
+        return {name: self.roster.get(name) for name in self.roster.active}
+
+    def extract(self, sources: List[BatchSource]) -> List[Dict]:
+        """Extraer las características de un tramo; devuelve un resultado por elemento, en orden"""
+        start = time.perf_counter()
+        models = self._models()
+        results: List[Dict] = [{"petId": pet_id} for pet_id, _ in sources]
+        ok: List[int] = []
+        decoded: List[DecodedImage] = []
+        inputs: List[Dict[str, Dict[str, np.ndarray]]] = []
+        for i, future in enumerate([self._decode_pool.submit(self._prepare, source, models) for source in sources]):
+            try:
+                image, model_inputs = future.result()
+            except BatchItemRejected as e:
+                self.quality_rejected += 1
+                results[i].update({"status": "error", "message": str(e), "quality_rejected": True, "quality": e.quality})
+                continue
+            except (BatchItemError, ValueError) as e:
+                results[i].update({"status": "error", "message": str(e)})
+                continue
+            except Exception as e:
+                logger.error(f"Error preparando la imagen de {sources[i][0]}: {e}")
+                results[i].update({"status": "error", "message": str(e)})
+                continue
+            ok.append(i)
+            decoded.append(image)
+            inputs.append(model_inputs)
+
+        if ok:
+            # Un forward pass por backbone para todo el tramo (entradas idénticas entre modelos se comparten)
+            pooled: Dict[str, Dict[str, np.ndarray]] = {}
+            try:
+                jobs = {}
+                for model_name in inputs[0]:
+                    jobs[model_name] = {
+                        backbone: np.concatenate([x[model_name][backbone] for x in inputs], axis=0)
+                        for backbone in inputs[0][model_name]
+                    }
+                if jobs:
+                    pooled = loaded_backbone_registry().fan_out(jobs)
+            except Exception as e:
+                logger.warning(f"Fan-out del lote falló, cada modelo extraerá por separado: {e}")
+            del inputs
+
+            extracted = {"nose_print": models["nose_print"].extract_nose_features_batch(decoded, pooled=pooled.get("nose_print"))}
+            if "advanced" in models:
+                extracted["advanced"] = models["advanced"].extract_features_advanced_batch(decoded, pooled=pooled.get("advanced"))
+            if "simple" in models:
+                extracted["simple"] = models["simple"].extract_features_batch(decoded, pooled=pooled.get("simple"))
+            for position, i in enumerate(ok):
+                features = {}
+                for model_name, batch_features in extracted.items():
+                    item = batch_features[position]
+                    if isinstance(item, dict):
+                        features[model_name] = {name: [float(f) for f in values] for name, values in item.items()}
+                    else:
+                        features[model_name] = [float(f) for f in item]
+                results[i].update({"status": "extracted", "features": features})
+                quality = models["nose_print"].assess_quality(decoded[position])  # memorizado en la imagen
+                if quality is not None and quality["reasons"]:
+                    results[i]["quality"] = quality
+
+        self.batches += 1
+        self.images += len(ok)
+        self.failed += len(sources) - len(ok)
+        self.extract_seconds += time.perf_counter() - start
+        return results
+
+    def commit(self, results: List[Dict]) -> int:
+        """Agregar todos los elementos extraídos con una sola escritura por store; devuelve cuántos"""
+        extracted = [r for r in results if r.get("status") == "extracted"]
+        if not extracted:
+            return 0
+        models = self._models()
+        models["nose_print"].add_nose_prints([(r["petId"], r["features"]["nose_print"]) for r in extracted])
+        if "advanced" in models:
+            models["advanced"].add_pets_advanced([(r["petId"], r["features"]["advanced"]) for r in extracted])
+        if "simple" in models:
+            models["simple"].add_pets([(r["petId"], r["features"]["simple"]) for r in extracted])
+        for r in extracted:
+            features = r.pop("features")["nose_print"]
+            r.update({
+                "status": "registered",
+                "models_used": list(features.keys()),
+                "total_features": sum(len(f) for f in features.values())
+            })
+        logger.info(f"Lote registrado: {len(extracted)} mascotas")
+        return len(extracted)
+
+    def shutdown(self):
+        self._decode_pool.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": self.batches,
+            "images": self.images,
+            "failed": self.failed,
+            "quality_rejected": self.quality_rejected,
+            "images_per_sec": (self.images / self.extract_seconds) if self.extract_seconds else 0.0
+        }
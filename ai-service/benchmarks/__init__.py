@@ -0,0 +1,12 @@
+# Benchmarks reproducibles del ai-service (ejecutar desde ai-service/ con python -m benchmarks.<modulo>)
+import os
+import tempfile
+
+# Los reportes van por defecto fuera del árbol; los que se versionan se escriben con
+# --output benchmarks/results/<nombre>.json
+REPORTS_DIR = os.path.join(tempfile.gettempdir(), "nose-benchmarks")
+
+def report_path(filename: str) -> str:
+    """Ruta por defecto de un reporte JSON (en REPORTS_DIR)"""
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    return os.path.join(REPORTS_DIR, filename)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Reporte recall@k vs QPS del índice IVF frente al escaneo exacto.
+
+También reporta el pico de memoria del entrenamiento (muestra de --train-sample filas más un
+tramo), que no crece con el número de mascotas. El último reporte (1 CPU, 10k–300k mascotas;
+1M no entra en 5 GB junto con el registro sintético) está en benchmarks/results/ann_recall.json.
+
+Uso (desde ai-service/):
+    python -m benchmarks.ann_recall --sizes 10000 100000 1000000 --nprobe 1 4 8 16 32
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks import report_path
+from embedding_index import EmbeddingIndex
+from ann_index import IVFIndex
+
+FAMILY_DIMS = {'mobilenet': 256, 'efficientnet': 256, 'nose_specific': 235}
+# Mismos pesos que NosePrintModel.MODEL_WEIGHTS (sin importar TensorFlow)
+MODEL_WEIGHTS = {'mobilenet': 0.35, 'efficientnet': 0.35, 'nose_specific': 0.30}
+
+def synthetic_registry(n: int, clusters: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Embeddings agrupados (razas/tipos de nariz) con ruido individual por mascota"""
+    labels = rng.integers(0, clusters, size=n)
+    registry = {}
+    for family, dim in FAMILY_DIMS.items():
+        centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+        registry[family] = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return registry
+
+def build_index(registry: Dict[str, np.ndarray], n: int) -> EmbeddingIndex:
+    index = EmbeddingIndex(list(FAMILY_DIMS.keys()), initial_capacity=n)
+    for i in range(n):
+        index.upsert(f"pet-{i}", {family: registry[family][i] for family in FAMILY_DIMS})
+    return index
+
+def make_queries(registry: Dict[str, np.ndarray], n: int, count: int, rng: np.random.Generator) -> List[Dict[str, np.ndarray]]:
+    """Re-escaneos ruidosos de mascotas registradas"""
+    targets = rng.choice(n, size=count, replace=False)
+    return [
+        {family: registry[family][t] + 0.3 * rng.standard_normal(dim).astype(np.float32)
+         for family, dim in FAMILY_DIMS.items()}
+        for t in targets
+    ]
+
+def run_queries(index: EmbeddingIndex, queries, k: int):
+    start = time.perf_counter()
+    results = [index.search(q, MODEL_WEIGHTS, top_k=k) for q in queries]
+    elapsed = time.perf_counter() - start
+    return results, len(queries) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs QPS del índice IVF")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--train-sample", type=int, default=100000, help="Como ANN_TRAIN_SAMPLE")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=report_path("ann_report.json"))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    report = {"k": args.k, "queries": args.queries, "results": []}
+
+    for n in args.sizes:
+        registry = synthetic_registry(n, args.clusters, rng)
+        index = build_index(registry, n)
+        queries = make_queries(registry, n, min(args.queries, n), rng)
+
+        exact, exact_qps = run_queries(index, queries, args.k)
+        print(f"\nN={n}  exacto: {exact_qps:.1f} QPS")
+        print(f"{'nprobe':>8} {'recall@k':>10} {'top1':>8} {'QPS':>10} {'speedup':>8}")
+
+        ivf = IVFIndex(MODEL_WEIGHTS, nlist=args.nlist, min_pets=0, train_sample=args.train_sample, seed=args.seed)
+        # Pico de memoria del entrenamiento: muestra + un tramo, no la matriz fusionada completa
+        tracemalloc.start()
+        train_start = time.perf_counter()
+        index.attach_ann(ivf)
+        index.wait_ann_training()
+        train_seconds = time.perf_counter() - train_start
+        train_peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        print(f"IVF: {ivf.stats()['nlist']} listas entrenadas en {train_seconds:.1f} s, pico {train_peak_mb:.0f} MB")
+
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            approx, qps = run_queries(index, queries, args.k)
+            recall = np.mean([
+                len({p for p, _, _ in a} & {p for p, _, _ in e}) / max(1, len(e))
+                for a, e in zip(approx, exact)
+            ])
+            top1 = np.mean([bool(a) and a[0][0] == e[0][0] for a, e in zip(approx, exact)])
+            print(f"{nprobe:>8} {recall:>10.4f} {top1:>8.4f} {qps:>10.1f} {qps / exact_qps:>7.1f}x")
+            report["results"].append({
+                "pets": n,
+                "nlist": ivf.stats()["nlist"],
+                "nprobe": nprobe,
+                "recall_at_k": float(recall),
+                "top1_agreement": float(top1),
+                "qps": float(qps),
+                "exact_qps": float(exact_qps),
+                "train_seconds": train_seconds,
+                "train_peak_mb": train_peak_mb
+            })
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Costo por evento en la ruta de la petición: escritura síncrona original (abrir, escribir el
+all_similarities completo, cerrar) frente a AuditLogWriter (encolar), más tamaño en disco y
+eventos descartados cuando el writer no da abasto.
+
+Uso (desde ai-service/):
+    python -m benchmarks.audit_log_throughput --pets 1000 --events 2000
+"""
+
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from audit_log import AuditLogWriter
+
+def scan_result(pets: int) -> dict:
+    similarities = {
+        f"pet-{i}": {"final_score": 1.0 - i / pets, "model_scores": {"mobilenet": 0.5, "efficientnet": 0.5, "nose_specific": 0.5}}
+        for i in range(pets)
+    }
+    return {"result": {"match": True, "confidence": 0.9, "all_similarities": similarities}, "img_size": 123456}
+
+def sync_log(path: str, event: str, data: dict):
+    """Implementación original de log_audit"""
+    entry = {"timestamp": datetime.datetime.now().isoformat(), "event": event, **data}
+    with open(path, "a") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo del log de auditoría por evento")
+    parser.add_argument("--pets", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--queue", type=int, default=10000)
+    args = parser.parse_args()
+
+    data = scan_result(args.pets)
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_path = os.path.join(tmp, "sync.log")
+        start = time.perf_counter()
+        for _ in range(args.events):
+            sync_log(sync_path, "scan-result", data)
+        sync_us = (time.perf_counter() - start) / args.events * 1e6
+
+        writer = AuditLogWriter(os.path.join(tmp, "async.log"), max_queue=args.queue, top_k=args.top_k)
+        start = time.perf_counter()
+        for _ in range(args.events):
+            writer.log("scan-result", data)
+        async_us = (time.perf_counter() - start) / args.events * 1e6
+        writer.close(timeout=60)
+        stats = writer.stats()
+
+        print(f"{args.events} eventos scan-result con {args.pets} mascotas registradas")
+        print(f"  síncrono (original): {sync_us:>9.1f} µs/evento en la petición, {os.path.getsize(sync_path) / args.events:>10.0f} B/evento")
+        print(f"  cola + hilo writer:  {async_us:>9.1f} µs/evento en la petición, {os.path.getsize(writer.path) / max(1, stats['written']):>10.0f} B/evento")
+        print(f"  escritos={stats['written']} descartados={stats['dropped']} cola máx={stats['max_queue_depth']} flushes={stats['flushes']}")
+
+if __name__ == "__main__":
+    main()
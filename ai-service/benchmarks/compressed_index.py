@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Índice comprimido (float16 / int8 por vector) frente a float32: memoria por mascota, QPS y
+concordancia de la decisión de match (mismo match/no-match y mismo petId) con y sin
+re-puntuación exacta de los mejores candidatos.
+
+Uso (desde ai-service/):
+    python -m benchmarks.compressed_index --pets 20000 --queries 400
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks import report_path
+from benchmarks.ann_recall import FAMILY_DIMS, MODEL_WEIGHTS, make_queries, synthetic_registry
+from embedding_index import EmbeddingIndex
+
+# Decisión de NosePrintModel: min(1, score * confidence_boost) >= threshold
+THRESHOLD = 0.85
+CONFIDENCE_BOOST = 1.2
+
+def decision(ranked) -> tuple:
+    pet_id, score, _ = ranked[0]
+    is_match = min(1.0, score * CONFIDENCE_BOOST) >= THRESHOLD
+    return (is_match, pet_id if is_match else None)
+
+def build(registry: Dict[str, np.ndarray], n: int, precision: str, rescore: int, exact: Dict) -> EmbeddingIndex:
+    index = EmbeddingIndex(list(FAMILY_DIMS.keys()), initial_capacity=n, precision=precision,
+                           exact_vectors=exact.get, rescore_candidates=rescore)
+    for i in range(n):
+        index.upsert(f"pet-{i}", {family: registry[family][i] for family in FAMILY_DIMS})
+    return index
+
+def impostor_queries(count: int, clusters: int, rng: np.random.Generator) -> List[Dict[str, np.ndarray]]:
+    """Narices de mascotas no registradas (deberían dar no-match)"""
+    fresh = synthetic_registry(count, clusters, rng)
+    return [{family: fresh[family][i] for family in FAMILY_DIMS} for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice comprimido vs float32")
+    parser.add_argument("--pets", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=100)
+    parser.add_argument("--min-agreement", type=float, default=0.999, help="Concordancia mínima con re-puntuación")
+    parser.add_argument("--output", default=report_path("compressed_index_report.json"))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    registry = synthetic_registry(args.pets, args.clusters, rng)
+    exact = {f"pet-{i}": {family: registry[family][i] for family in FAMILY_DIMS} for i in range(args.pets)}
+    queries = make_queries(registry, args.pets, args.queries // 2, rng) + impostor_queries(args.queries - args.queries // 2, args.clusters, rng)
+
+    baseline_index = build(registry, args.pets, "float32", 0, exact)
+    baseline = [baseline_index.search(q, MODEL_WEIGHTS, top_k=args.k) for q in queries]
+    baseline_decisions = [decision(r) for r in baseline]
+    matches = sum(1 for is_match, _ in baseline_decisions if is_match)
+    print(f"{args.pets} mascotas, {len(queries)} consultas ({matches} match en float32)\n")
+    print(f"{'precisión':>10} {'re-puntúa':>10} {'B/mascota':>10} {'QPS':>8} {'decisión':>9} {'top-k':>7} {'max |Δ| top-1':>14}")
+
+    ok = True
+    report = {"pets": args.pets, "queries": len(queries), "results": []}
+    for precision in ("float32", "float16", "int8"):
+        for rescore in ([0] if precision == "float32" else [0, args.rescore]):
+            index = build(registry, args.pets, precision, rescore, exact)
+            start = time.perf_counter()
+            ranked = [index.search(q, MODEL_WEIGHTS, top_k=args.k) for q in queries]
+            qps = len(queries) / (time.perf_counter() - start)
+            agreement = float(np.mean([decision(r) == d for r, d in zip(ranked, baseline_decisions)]))
+            topk = float(np.mean([
+                len({p for p, _, _ in r} & {p for p, _, _ in b}) / args.k for r, b in zip(ranked, baseline)
+            ]))
+            max_diff = max(abs(r[0][1] - b[0][1]) for r, b in zip(ranked, baseline))
+            print(f"{precision:>10} {rescore:>10} {index.bytes_per_pet():>10.0f} {qps:>8.1f} "
+                  f"{agreement * 100:>8.2f}% {topk * 100:>6.1f}% {max_diff:>14.2e}")
+            report["results"].append({
+                "precision": precision, "rescore_candidates": rescore, "bytes_per_pet": index.bytes_per_pet(),
+                "qps": qps, "decision_agreement": agreement, "topk_overlap": topk, "max_top1_diff": max_diff
+            })
+            if rescore:
+                ok = ok and agreement >= args.min_agreement
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print(f"❌ Con re-puntuación la concordancia quedó por debajo de {args.min_agreement * 100:.1f}%")
+        sys.exit(1)
+    print("✅ Índice comprimido con re-puntuación concordante con float32")
+
+if __name__ == "__main__":
+    main()
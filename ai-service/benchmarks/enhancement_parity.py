@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Paridad (imagen dorada) y tiempos por etapa del realce de nariz optimizado frente a la
+implementación original.
+
+Para cada imagen se compara enhance_nose_image con enhance_nose_image_reference a resolución
+completa (la salida es binaria: se reporta la fracción de píxeles distintos) y, si se indica
+--max-side, también la imagen de 224x224 que consumen los backbones.
+
+Uso (desde ai-service/):
+    python -m benchmarks.enhancement_parity --images fotos_nariz/ --iterations 20
+    python -m benchmarks.enhancement_parity --sizes 480x640 1080x1440 --max-side 640
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from benchmarks import report_path
+from nose_enhancement import enhance_nose_image, enhance_nose_image_reference
+
+def synthetic_nose(height: int, width: int, rng: np.random.Generator) -> np.ndarray:
+    """Textura de surcos y lóbulos parecida a una trufa, con ruido de sensor"""
+    coarse = rng.normal(110, 45, size=(height // 12 + 2, width // 12 + 2, 1)).clip(0, 255).astype(np.uint8)
+    img = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    tint = np.array([1.0, 0.85, 0.8], np.float32)
+    img = (img.astype(np.float32) * tint).clip(0, 255).astype(np.uint8)
+    noise = rng.integers(0, 25, size=img.shape, dtype=np.uint8)
+    return cv2.add(img, noise)
+
+def load_images(args, rng: np.random.Generator) -> List[Tuple[str, np.ndarray]]:
+    images = []
+    if args.images:
+        for name in sorted(os.listdir(args.images)):
+            img = cv2.imread(os.path.join(args.images, name), cv2.IMREAD_COLOR)
+            if img is not None:
+                images.append((name, cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
+    for size in args.sizes:
+        height, width = (int(v) for v in size.split('x'))
+        images.append((f"sintetica_{size}", synthetic_nose(height, width, rng)))
+    return images
+
+def stage_timings(func, img: np.ndarray, iterations: int, **kwargs) -> Dict[str, float]:
+    func(img, **kwargs)  # calentamiento
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(img, timings=timings, **kwargs)
+    total = (time.perf_counter() - start) / iterations * 1000
+    result = {stage: ms / iterations for stage, ms in timings.items()}
+    result['total'] = total
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y tiempos por etapa del realce de nariz")
+    parser.add_argument("--images", help="Directorio con fotos reales de nariz (opcional)")
+    parser.add_argument("--sizes", nargs="*", default=["224x224", "480x640", "1080x1440", "3024x4032"],
+                        help="Imágenes sintéticas ALTOxANCHO")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--max-side", type=int, default=0, help="Resolución de trabajo a evaluar además de la completa")
+    parser.add_argument("--max-diff", type=float, default=0.001,
+                        help="Fracción máxima de píxeles distintos a resolución completa")
+    parser.add_argument("--output", default=report_path("enhancement_parity_report.json"))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = load_images(args, rng)
+    if not images:
+        print("No hay imágenes que evaluar")
+        sys.exit(1)
+
+    report = {"iterations": args.iterations, "max_side": args.max_side, "images": {}}
+    ok = True
+    for name, img in images:
+        with warnings.catch_warnings():
+            # La referencia divide por cero en imágenes planas (sin bordes)
+            warnings.simplefilter("ignore", RuntimeWarning)
+            reference = enhance_nose_image_reference(img)
+            ref_timings = stage_timings(enhance_nose_image_reference, img, args.iterations)
+        optimized = enhance_nose_image(img)
+        diff_fraction = float(np.mean(np.any(reference != optimized, axis=-1)))
+        ok = ok and diff_fraction <= args.max_diff
+        entry = {
+            "shape": list(img.shape),
+            "diff_fraction": diff_fraction,
+            "reference_ms": ref_timings,
+            "optimized_ms": stage_timings(enhance_nose_image, img, args.iterations)
+        }
+        if args.max_side:
+            reduced = enhance_nose_image(img, max_side=args.max_side)
+            ref_224 = cv2.resize(reference, (224, 224))
+            entry["working_resolution"] = {
+                "mean_abs_diff_224": float(np.mean(np.abs(ref_224 - cv2.resize(reduced, (224, 224))))),
+                "optimized_ms": stage_timings(enhance_nose_image, img, args.iterations, max_side=args.max_side)
+            }
+        report["images"][name] = entry
+
+        print(f"\n{name} {img.shape[1]}x{img.shape[0]}  píxeles distintos: {diff_fraction:.4%}")
+        stages = list(dict.fromkeys(list(ref_timings) + list(entry["optimized_ms"])))
+        stages.remove('total')
+        print(f"{'etapa':>20} {'original ms':>12} {'optimizado ms':>14}")
+        for stage in stages + ['total']:
+            print(f"{stage:>20} {ref_timings.get(stage, 0.0):>12.2f} {entry['optimized_ms'].get(stage, 0.0):>14.2f}")
+        if args.max_side:
+            wr = entry["working_resolution"]
+            print(f"  max_side={args.max_side}: {wr['optimized_ms']['total']:.2f} ms, |Δ| medio a 224x224 = {wr['mean_abs_diff_224']:.4f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print(f"❌ La salida optimizada difiere de la original en más del {args.max_diff:.2%} de los píxeles")
+        sys.exit(1)
+    print("✅ Salida optimizada equivalente a la original")
+
+if __name__ == "__main__":
+    main()
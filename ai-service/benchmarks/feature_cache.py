@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Verificación de la caché de características (FeatureCache) con un extractor simulado:
+
+  1. reintentos con la misma foto: un solo cálculo, el resto son aciertos
+  2. peticiones concurrentes idénticas: se agrupan en un único cálculo
+  3. límite de memoria: el LRU expulsa las entradas más antiguas y respeta max_bytes
+  4. nivel en disco: una instancia nueva (reinicio) encuentra lo calculado antes
+  5. los vectores devueltos son idénticos a los calculados (float32 exacto o float64)
+
+Uso (desde ai-service/):
+    python -m benchmarks.feature_cache --compute-ms 150 --clients 32
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from feature_cache import FeatureCache
+from image_pipeline import content_digest
+
+def fake_features(seed: int):
+    """Dict con la forma de NosePrintModel: cabezas float32 + nose_specific float32"""
+    rng = np.random.default_rng(seed)
+    return {
+        "mobilenet": rng.standard_normal(256).astype(np.float32).tolist(),
+        "efficientnet": rng.standard_normal(256).astype(np.float32).tolist(),
+        "nose_specific": rng.random(235).astype(np.float32).tolist()
+    }
+
+class SlowExtractor:
+    def __init__(self, compute_ms: float):
+        self.compute_ms = compute_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, seed: int):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.compute_ms / 1000)
+        return fake_features(seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificación de la caché de características")
+    parser.add_argument("--compute-ms", type=float, default=150)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--retries", type=int, default=20)
+    args = parser.parse_args()
+    ok = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        extractor = SlowExtractor(args.compute_ms)
+        cache = FeatureCache("nose_print-v1-enh0", max_bytes=64 * 1024 * 1024, disk_dir=tmp)
+        photo = os.urandom(200_000)
+        digest = content_digest(photo)
+
+        # 1. Reintentos
+        start = time.perf_counter()
+        first = cache.get_or_compute(digest, lambda: extractor(1))
+        miss_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for _ in range(args.retries):
+            again = cache.get_or_compute(digest, lambda: extractor(1))
+        hit_ms = (time.perf_counter() - start) * 1000 / args.retries
+        print(f"1. reintentos: fallo {miss_ms:.1f} ms, acierto {hit_ms:.3f} ms, cálculos={extractor.calls}")
+        ok = ok and extractor.calls == 1 and again == first
+
+        # 5. Exactitud
+        exact = first == fake_features(1)
+        print(f"5. vectores idénticos a los calculados: {exact}")
+        ok = ok and exact
+
+        # 2. Concurrencia
+        extractor.calls = 0
+        other = content_digest(os.urandom(200_000))
+        results = []
+        barrier = threading.Barrier(args.clients)
+
+        def client():
+            barrier.wait()
+            results.append(cache.get_or_compute(other, lambda: extractor(2)))
+
+        threads = [threading.Thread(target=client) for _ in range(args.clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = (time.perf_counter() - start) * 1000
+        same = all(r == results[0] for r in results)
+        print(f"2. {args.clients} peticiones idénticas concurrentes: cálculos={extractor.calls}, "
+              f"agrupadas={cache.coalesced}, {elapsed:.0f} ms")
+        ok = ok and extractor.calls == 1 and same and len(results) == args.clients
+
+        # 3. LRU acotado
+        entry_bytes = cache.bytes // max(1, len(cache._entries))
+        small = FeatureCache("lru", max_bytes=entry_bytes * 10)
+        for i in range(50):
+            small.get_or_compute(f"img-{i}", lambda i=i: fake_features(i))
+        stats = small.stats()
+        print(f"3. LRU con capacidad para 10: entradas={stats['entries']}, expulsadas={stats['evictions']}, "
+              f"bytes={stats['bytes']}/{stats['max_bytes']}")
+        ok = ok and stats["entries"] == 10 and stats["evictions"] == 40 and stats["bytes"] <= stats["max_bytes"]
+        small.get_or_compute("img-49", lambda: fake_features(-1))
+        ok = ok and small.hits == 1
+
+        # 4. Nivel en disco tras un "reinicio"
+        extractor.calls = 0
+        restarted = FeatureCache("nose_print-v1-enh0", disk_dir=tmp)
+        from_disk = restarted.get_or_compute(digest, lambda: extractor(1))
+        print(f"4. tras reiniciar: aciertos en disco={restarted.disk_hits}, cálculos={extractor.calls}")
+        ok = ok and restarted.disk_hits == 1 and extractor.calls == 0 and from_disk == first
+        # Otra versión del extractor no reutiliza las entradas
+        other_version = FeatureCache("nose_print-v2-enh0", disk_dir=tmp)
+        other_version.get_or_compute(digest, lambda: extractor(1))
+        ok = ok and other_version.misses == 1
+
+    if not ok:
+        print("❌ La caché de características no se comportó como se esperaba")
+        sys.exit(1)
+    print("✅ Caché de características verificada")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Comprueba que /health sigue respondiendo mientras el servicio procesa una ráfaga de /scan.
+
+Uso (con el servicio corriendo):
+    python -m benchmarks.health_under_load --url http://localhost:8000 --image nariz.jpg --scans 32
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import requests
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de /health durante una ráfaga de escaneos")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--image", required=True)
+    parser.add_argument("--scans", type=int, default=32, help="Escaneos concurrentes")
+    parser.add_argument("--max-health-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+
+    statuses = []
+
+    def scan():
+        files = {'image': ('nose.jpg', image_bytes, 'image/jpeg')}
+        response = requests.post(f"{args.url}/scan", files=files, timeout=300)
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=scan) for _ in range(args.scans)]
+    for t in threads:
+        t.start()
+
+    health_latencies = []
+    while any(t.is_alive() for t in threads):
+        start = time.perf_counter()
+        requests.get(f"{args.url}/health", timeout=30)
+        health_latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+
+    worst = max(health_latencies) if health_latencies else 0.0
+    print(f"Escaneos: {len(statuses)} (códigos: {sorted(set(statuses))})")
+    print(f"/health: {len(health_latencies)} sondeos, peor latencia {worst:.1f} ms")
+    if worst > args.max_health_ms:
+        print(f"❌ /health superó {args.max_health_ms} ms durante la ráfaga")
+        sys.exit(1)
+    print("✅ /health se mantuvo responsivo")
+
+if __name__ == "__main__":
+    main()
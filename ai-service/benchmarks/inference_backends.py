@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Backends de inferencia de huella nasal (keras / onnx / tflite y sus variantes cuantizadas):
+tiempo de arranque, latencia por imagen con lote 1 y concordancia de los embeddings con la
+referencia Keras.
+
+Cada backend corre en un proceso nuevo para que el arranque incluya la importación del runtime
+y la carga de los modelos. La concordancia se mide por familia con el coseno entre el embedding
+del backend y el de Keras para la misma imagen, y con el vecino más cercano: la fracción de
+imágenes cuyo embedding encuentra su propia imagen entre las de referencia.
+
+Los modelos onnx/tflite se generan antes con:
+    python export_feature_models.py --runtime-only --onnx --tflite --variants fp32 dynamic int8
+
+Uso (desde ai-service/):
+    python -m benchmarks.inference_backends --images 50 --backends onnx tflite --variants fp32 dynamic int8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks import report_path
+
+FAMILIES = ('mobilenet', 'efficientnet')
+
+def child(backend_name: str, variant: str, inputs_path: str, output_path: str):
+    """Proceso hijo: arrancar el backend, medir latencia y guardar los embeddings"""
+    start = time.perf_counter()
+    from config import Config
+    from feature_artifacts import get_feature_artifacts
+    from inference_backends import create_backend
+    from nose_print_model import NosePrintModel
+
+    backend = create_backend(backend_name, variant, NosePrintModel.ARTIFACT_PREFIX, FAMILIES,
+                             NosePrintModel.HEAD_UNITS, NosePrintModel.HEAD_DROPOUTS,
+                             get_feature_artifacts(), Config.INFERENCE_BACKEND_THREADS)
+    startup = time.perf_counter() - start
+    if backend.name != backend_name:
+        print(json.dumps({"error": f"{backend_name}/{variant} no disponible"}))
+        return
+
+    with np.load(inputs_path) as data:
+        inputs = {family: data[family] for family in FAMILIES}
+    start = time.perf_counter()
+    for family in FAMILIES:
+        backend.run(family, inputs[family][:1])
+    first_call = time.perf_counter() - start
+
+    latencies = []
+    outputs = {family: [] for family in FAMILIES}
+    for i in range(len(inputs[FAMILIES[0]])):
+        start = time.perf_counter()
+        for family in FAMILIES:
+            outputs[family].append(backend.run(family, inputs[family][i:i + 1])[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    np.savez(output_path, **{family: np.stack(rows) for family, rows in outputs.items()})
+    print(json.dumps({
+        "startup_s": startup,
+        "first_call_ms": first_call * 1000,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95))
+    }))
+
+def run_child(backend: str, variant: str, inputs_path: str, output_path: str) -> dict:
+    command = [sys.executable, "-m", "benchmarks.inference_backends", "--child", backend, variant, inputs_path, output_path]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+    if completed.returncode != 0 or not lines:
+        return {"error": (completed.stderr.strip().splitlines() or ["sin salida"])[-1]}
+    return json.loads(lines[-1])
+
+def agreement(outputs: dict, reference: dict) -> dict:
+    """Coseno por imagen y concordancia del vecino más cercano contra Keras, por familia"""
+    result = {}
+    for family in FAMILIES:
+        a = outputs[family] / np.linalg.norm(outputs[family], axis=1, keepdims=True)
+        b = reference[family] / np.linalg.norm(reference[family], axis=1, keepdims=True)
+        cosine = np.sum(a * b, axis=1)
+        nearest = np.argmax(a @ b.T, axis=1)
+        result[family] = {
+            "mean_cosine": float(np.mean(cosine)),
+            "min_cosine": float(np.min(cosine)),
+            "nn_agreement": float(np.mean(nearest == np.arange(len(a))))
+        }
+    return result
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(*sys.argv[2:6])
+        return
+
+    parser = argparse.ArgumentParser(description="Backends de inferencia: arranque, latencia y concordancia")
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--backends", nargs="+", choices=["onnx", "tflite"], default=["onnx", "tflite"])
+    parser.add_argument("--variants", nargs="+", choices=["fp32", "dynamic", "int8"], default=["fp32", "dynamic", "int8"])
+    parser.add_argument("--min-cosine-fp32", type=float, default=0.999, help="Coseno mínimo de las variantes fp32")
+    parser.add_argument("--min-cosine-quantized", type=float, default=0.95, help="Coseno medio mínimo de dynamic/int8")
+    parser.add_argument("--output", default=report_path("inference_backends_report.json"))
+    args = parser.parse_args()
+
+    from benchmarks.enhancement_parity import synthetic_nose
+    from nose_print_model import preprocess_nose_input
+
+    rng = np.random.default_rng(0)
+    batches = []
+    for _ in range(args.images):
+        _, encoded = cv2.imencode('.jpg', synthetic_nose(480, 640, rng))
+        batches.append(preprocess_nose_input(encoded.tobytes()))
+
+    ok = True
+    report = {"images": args.images, "results": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs_path = os.path.join(tmp, "inputs.npz")
+        np.savez(inputs_path, **{family: np.concatenate([b[family] for b in batches]) for family in FAMILIES})
+
+        runs = [("keras", "fp32")] + [(backend, variant) for backend in args.backends for variant in args.variants]
+        reference = None
+        print(f"{args.images} imágenes, lote 1 (latencia = ambas familias por imagen)\n")
+        print(f"{'backend':>16} {'arranque s':>11} {'1ª ms':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'cos mobilenet':>14} {'cos efficientnet':>17} {'vecino':>7}")
+        for backend, variant in runs:
+            label = f"{backend}/{variant}"
+            output_path = os.path.join(tmp, f"{backend}-{variant}.npz")
+            result = run_child(backend, variant, inputs_path, output_path)
+            if "error" in result:
+                print(f"{label:>16} omitido: {result['error']}")
+                report["results"][label] = result
+                if backend == "keras":
+                    print("❌ Sin la referencia Keras no se puede medir la concordancia")
+                    sys.exit(1)
+                continue
+            with np.load(output_path) as data:
+                outputs = {family: data[family] for family in FAMILIES}
+            if reference is None:
+                reference = outputs
+            result["agreement"] = agreement(outputs, reference)
+            report["results"][label] = result
+            cosines = [result["agreement"][family] for family in FAMILIES]
+            nn = min(c["nn_agreement"] for c in cosines)
+            print(f"{label:>16} {result['startup_s']:>11.2f} {result['first_call_ms']:>8.1f} {result['p50_ms']:>8.1f} "
+                  f"{result['p95_ms']:>8.1f} {cosines[0]['mean_cosine']:>14.5f} {cosines[1]['mean_cosine']:>17.5f} {nn * 100:>6.1f}%")
+            if variant == "fp32":
+                ok = ok and all(c["min_cosine"] >= args.min_cosine_fp32 for c in cosines)
+            else:
+                ok = ok and all(c["mean_cosine"] >= args.min_cosine_quantized for c in cosines)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print("❌ Algún backend no concuerda con la referencia Keras")
+        sys.exit(1)
+    print("✅ Backends concordantes con la referencia Keras")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Latencia por llamada de model.predict vs llamada directa vs tf.function compilada,
+y verificación de que las tres rutas producen embeddings numéricamente equivalentes.
+
+Uso (desde ai-service/):
+    python -m benchmarks.inference_paths --iterations 50 --xla
+    python -m benchmarks.inference_paths --random-weights   # sin acceso a los pesos ImageNet
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from backbone_registry import BackboneRegistry, build_head
+from inference_runner import make_runner, INFERENCE_MODES
+from benchmarks import report_path
+from benchmarks.offline_weights import use_random_backbones
+
+def time_runner(runner, x: np.ndarray, iterations: int) -> float:
+    runner(x)  # calentamiento / trazado
+    start = time.perf_counter()
+    for _ in range(iterations):
+        runner(x)
+    return (time.perf_counter() - start) / iterations * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de rutas de inferencia")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--xla", action="store_true", help="Compilar también con XLA")
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--random-weights", action="store_true",
+                        help="Backbones con pesos aleatorios (benchmarks/offline_weights.py)")
+    parser.add_argument("--output", default=report_path("inference_paths_report.json"))
+    args = parser.parse_args()
+
+    if args.random_weights:
+        use_random_backbones()
+
+    registry = BackboneRegistry()
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-1, 1, size=(args.batch, 224, 224, 3)).astype(np.float32)
+    report = {"batch": args.batch, "iterations": args.iterations, "random_weights": args.random_weights,
+              "cpus": os.cpu_count(), "models": {}}
+    ok = True
+
+    for name in ('mobilenet', 'efficientnet'):
+        backbone = registry.get(name)
+        head = build_head(registry.output_dim(name), [1024, 512, 256], [0.4, 0.3], f"nose_print/{name}")
+        variants = {mode: (make_runner(backbone, mode, xla=False), make_runner(head, mode, xla=False)) for mode in INFERENCE_MODES}
+        if args.xla:
+            variants["compiled+xla"] = (make_runner(backbone, "compiled", xla=True), make_runner(head, "compiled", xla=True))
+
+        reference = variants["predict"][1](variants["predict"][0](x))
+        reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+        print(f"\n{name}")
+        print(f"{'ruta':>14} {'backbone ms':>12} {'cabeza ms':>10} {'max |Δ|':>10}")
+        results = {}
+        for label, (backbone_runner, head_runner) in variants.items():
+            embedding = head_runner(backbone_runner(x))
+            embedding /= np.linalg.norm(embedding, axis=1, keepdims=True)
+            max_diff = float(np.max(np.abs(embedding - reference)))
+            ok = ok and max_diff <= args.atol
+            pooled = backbone_runner(x)
+            results[label] = {
+                "backbone_ms": time_runner(backbone_runner, x, args.iterations),
+                "head_ms": time_runner(head_runner, pooled, args.iterations),
+                "max_abs_diff_vs_predict": max_diff
+            }
+            r = results[label]
+            print(f"{label:>14} {r['backbone_ms']:>12.2f} {r['head_ms']:>10.3f} {max_diff:>10.2e}")
+        report["models"][name] = results
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print(f"❌ Alguna ruta difiere de model.predict en más de {args.atol}")
+        sys.exit(1)
+    print("✅ Todas las rutas producen embeddings equivalentes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Costo de las métricas de /metrics en la ruta de la petición y corrección de la exposición.
+
+  - costo por etapa medida (with stage(...)) con el arreglo en memoria y con el archivo mapeado
+    de METRICS_DIR, comparado con un bloque vacío
+  - costo por petición del pipeline completo (todas las etapas + contadores) frente a la latencia
+    de un /scan; falla si supera --max-overhead
+  - el texto generado es Prometheus válido: buckets acumulados y _count igual a lo observado
+  - con METRICS_DIR, render() suma los contadores de varios procesos
+
+Uso (desde ai-service/):
+    python -m benchmarks.metrics_overhead --observations 200000
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import report_path
+
+CHILD = """
+import sys
+from metrics import REGISTRY, record_request, stage
+REGISTRY.share(sys.argv[1])
+for _ in range(int(sys.argv[2])):
+    with stage("decode"):
+        pass
+    record_request("scan", 0.01, failed=False)
+"""
+
+def timed_loop(observations: int, measure: bool) -> float:
+    """Nanosegundos por iteración de un bloque with (medido o vacío)"""
+    from metrics import stage
+    start = time.perf_counter()
+    if measure:
+        for _ in range(observations):
+            with stage("similarity_search"):
+                pass
+    else:
+        for _ in range(observations):
+            pass
+    return (time.perf_counter() - start) / observations * 1e9
+
+def parse(text: str) -> dict:
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not line:
+            continue
+        name, value = line.rsplit(" ", 1)
+        samples[name] = float(value)
+    return samples
+
+def check_exposition(text: str, stage_name: str, expected: int) -> bool:
+    samples = parse(text)
+    buckets = [(key, value) for key, value in samples.items()
+               if key.startswith(f'nose_stage_seconds_bucket{{stage="{stage_name}"')]
+    counts = [value for _, value in buckets]
+    cumulative = all(a <= b for a, b in zip(counts, counts[1:]))
+    count = samples.get(f'nose_stage_seconds_count{{stage="{stage_name}"}}')
+    well_formed = all(re.match(r'^[a-z_]+(\{[^}]*\})?$', key) for key in samples)
+    return cumulative and count == expected and counts[-1] == expected and well_formed
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo de las métricas y corrección de /metrics")
+    parser.add_argument("--observations", type=int, default=200000)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--scan-ms", type=float, default=50, help="Latencia de referencia de un /scan")
+    parser.add_argument("--max-overhead", type=float, default=0.001, help="Fracción máxima del /scan dedicada a métricas")
+    parser.add_argument("--output", default=report_path("metrics_overhead_report.json"))
+    args = parser.parse_args()
+
+    from metrics import REGISTRY, STAGES, record_request, stage
+    report = {"observations": args.observations}
+
+    baseline = timed_loop(args.observations, measure=False)
+    in_memory = timed_loop(args.observations, measure=True) - baseline
+    with tempfile.TemporaryDirectory() as tmp:
+        REGISTRY.share(os.path.join(tmp, "self"))
+        mapped = timed_loop(args.observations, measure=True) - baseline
+
+        # Una petición de /scan: todas las etapas una vez y el registro de la petición
+        start = time.perf_counter()
+        requests = max(1, args.observations // len(STAGES))
+        for _ in range(requests):
+            for name in STAGES:
+                with stage(name):
+                    pass
+            record_request("scan", 0.05, failed=False)
+        per_request_us = (time.perf_counter() - start) / requests * 1e6
+
+        exposition_ok = check_exposition(REGISTRY.render(), "similarity_search", 2 * args.observations + requests)
+
+    report.update({"stage_ns_in_memory": in_memory, "stage_ns_mapped": mapped, "request_us": per_request_us})
+    print(f"Costo por etapa medida: {in_memory:.0f} ns en memoria, {mapped:.0f} ns con METRICS_DIR")
+    print(f"Costo por petición ({len(STAGES)} etapas + contadores): {per_request_us:.1f} µs "
+          f"({per_request_us / 1000 / args.scan_ms * 100:.3f}% de un /scan de {args.scan_ms:.0f} ms)")
+    print(f"{'✅' if exposition_ok else '❌'} Exposición Prometheus válida (buckets acumulados, _count exacto)")
+
+    # Varios procesos con el mismo METRICS_DIR: render() debe sumarlos
+    per_process = 1000
+    with tempfile.TemporaryDirectory() as shared_dir:
+        env = dict(os.environ, PYTHONPATH=os.getcwd() + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        for _ in range(args.processes):
+            subprocess.run([sys.executable, "-c", CHILD, shared_dir, str(per_process)], check=True, env=env)
+        # Leer sólo los archivos de los hijos (el de este proceso quedó en el directorio anterior)
+        REGISTRY.shared_dir = shared_dir
+        samples = parse(REGISTRY.render())
+    total = args.processes * per_process
+    aggregated_ok = (samples.get('nose_requests_total{endpoint="scan"}') == total
+                     and samples.get('nose_stage_seconds_count{stage="decode"}') == total
+                     and samples.get("nose_metrics_workers") == args.processes)
+    print(f"{'✅' if aggregated_ok else '❌'} {args.processes} procesos sumados en /metrics")
+    report.update({"exposition_ok": exposition_ok, "aggregated_ok": aggregated_ok})
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    overhead_ok = per_request_us / 1000 <= args.max_overhead * args.scan_ms
+    if not (overhead_ok and exposition_ok and aggregated_ok):
+        print("❌ Las métricas son demasiado costosas o la exposición es incorrecta")
+        sys.exit(1)
+    print("✅ Métricas baratas para dejarlas activas en producción")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Throughput de los backbones con y sin micro-batching para 1, 8, 32 y 64 clientes concurrentes.
+
+Cada cliente envía su propia imagen: se verifica que la fila que recibe del lote sea la suya,
+comparándola con un forward pass individual (max |Δ| ≤ --atol), y si no la suite falla.
+
+Uso (desde ai-service/):
+    python -m benchmarks.micro_batching --clients 1 8 32 64 --requests 16
+    python -m benchmarks.micro_batching --random-weights   # sin acceso a los pesos ImageNet
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from backbone_registry import BackboneRegistry
+from inference_scheduler import MicroBatchScheduler
+from benchmarks import report_path
+from benchmarks.offline_weights import use_random_backbones
+
+def client_tensors(clients: int) -> list:
+    rng = np.random.default_rng(0)
+    return [rng.uniform(-1, 1, size=(1, 224, 224, 3)).astype(np.float32) for _ in range(clients)]
+
+def run_clients(pooled, tensors: list, requests_per_client: int, backbone: str):
+    """Cada cliente envía peticiones de su imagen en serie; devuelve (img/s, latencia media ms, última salida por cliente)"""
+    clients = len(tensors)
+    latencies = []
+    outputs = [None] * clients
+    lock = threading.Lock()
+
+    def client(i):
+        local = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            outputs[i] = pooled(backbone, tensors[i])
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return clients * requests_per_client / elapsed, float(np.mean(latencies) * 1000), outputs
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de micro-batching de inferencia")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=16, help="Peticiones por cliente")
+    parser.add_argument("--backbone", default="mobilenet")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--random-weights", action="store_true",
+                        help="Backbones con pesos aleatorios (benchmarks/offline_weights.py)")
+    parser.add_argument("--output", default=report_path("micro_batching_report.json"))
+    args = parser.parse_args()
+
+    if args.random_weights:
+        use_random_backbones()
+
+    registry = BackboneRegistry()
+    registry.get(args.backbone)
+    # Sin scheduler: cada petición hace su propio forward pass (serializado como en el servicio)
+    forward_lock = threading.Lock()
+
+    def unbatched(name, batch):
+        with forward_lock:
+            return registry._forward(name, batch)
+
+    scheduler = MicroBatchScheduler(args.backbone, lambda batch: registry._forward(args.backbone, batch),
+                                    max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+    def batched(name, batch):
+        return scheduler.submit(batch)
+
+    # Calentamiento
+    unbatched(args.backbone, np.zeros((1, 224, 224, 3), dtype=np.float32))
+
+    results = []
+    ok = True
+    print(f"{'clientes':>9} {'sin lote img/s':>15} {'con lote img/s':>15} {'lat. sin (ms)':>14} {'lat. con (ms)':>14} {'max |Δ|':>10}")
+    for clients in args.clients:
+        tensors = client_tensors(clients)
+        plain_tput, plain_lat, plain_out = run_clients(unbatched, tensors, args.requests, args.backbone)
+        batched_tput, batched_lat, batched_out = run_clients(batched, tensors, args.requests, args.backbone)
+        # Cada cliente debe recibir la fila de su propia imagen, igual a su forward pass individual
+        max_diff = float(max(np.max(np.abs(b - p)) for b, p in zip(batched_out, plain_out)))
+        ok = ok and max_diff <= args.atol
+        print(f"{clients:>9} {plain_tput:>15.1f} {batched_tput:>15.1f} {plain_lat:>14.1f} {batched_lat:>14.1f} "
+              f"{max_diff:>10.2e}")
+        results.append({
+            "clients": clients,
+            "unbatched_images_per_sec": plain_tput,
+            "batched_images_per_sec": batched_tput,
+            "unbatched_mean_latency_ms": plain_lat,
+            "batched_mean_latency_ms": batched_lat,
+            "max_abs_diff_vs_unbatched": max_diff
+        })
+
+    report = {"backbone": args.backbone, "random_weights": args.random_weights, "cpus": os.cpu_count(),
+              "max_batch": args.max_batch, "max_wait_ms": args.max_wait_ms,
+              "results": results, "scheduler": scheduler.stats()}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print(f"❌ Alguna petición recibió una salida distinta de su forward pass individual (> {args.atol})")
+        sys.exit(1)
+    print("✅ El micro-batching devuelve a cada petición la misma salida que sin lote")
+
+if __name__ == "__main__":
+    main()
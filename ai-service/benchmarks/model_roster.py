@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Arranque en frío y memoria residente del servicio para cada configuración del roster de modelos
+(MODEL_ROSTER / MODEL_LAZY).
+
+Cada configuración importa main.py en un proceso nuevo (directorio de trabajo temporal, sin
+embeddings previos) y reporta:
+  - segundos hasta que main termina de importar y RSS en ese momento
+  - si TensorFlow quedó importado
+  - qué modelos se construyeron al arrancar (los inactivos y los lazy no deben estarlo)
+  - el costo del primer uso de los modelos lazy (segundos y RSS tras cargarlos)
+
+Uso (desde ai-service/):
+    python -m benchmarks.model_roster
+    python -m benchmarks.model_roster --backend onnx --configs "nose_print:" "nose_print,advanced,simple:advanced,simple"
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import report_path
+
+# "roster:lazy"
+DEFAULT_CONFIGS = [
+    "nose_print:",
+    "nose_print,advanced,simple:advanced,simple",
+    "nose_print,advanced,simple:"
+]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import main
+cold_start = time.perf_counter() - start
+from model_roster import process_rss_bytes
+rss_startup = process_rss_bytes()
+tensorflow_at_startup = "tensorflow" in sys.modules
+loaded_at_startup = sorted(main.model_roster.loaded_models())
+start = time.perf_counter()
+for name in main.model_roster.active:
+    main.model_roster.get(name)
+first_use = time.perf_counter() - start
+print(json.dumps({
+    "cold_start_s": cold_start,
+    "rss_startup_bytes": rss_startup,
+    "tensorflow_at_startup": tensorflow_at_startup,
+    "loaded_at_startup": loaded_at_startup,
+    "first_use_s": first_use,
+    "rss_after_first_use_bytes": process_rss_bytes()
+}))
+"""
+
+def run_config(roster: str, lazy: str, backend: str, service_dir: str) -> dict:
+    env = dict(os.environ, MODEL_ROSTER=roster, MODEL_LAZY=lazy, INFERENCE_BACKEND=backend,
+               PYTHONPATH=service_dir + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.setdefault("MODEL_ARTIFACTS_DIR", os.path.join(service_dir, "model_artifacts"))
+    with tempfile.TemporaryDirectory() as tmp:
+        completed = subprocess.run([sys.executable, "-c", CHILD], cwd=tmp, env=env, capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+    if completed.returncode != 0 or not lines:
+        return {"error": (completed.stderr.strip().splitlines() or ["sin salida"])[-1]}
+    return json.loads(lines[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío y RSS por configuración del roster")
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS, help='"roster:lazy", p. ej. "nose_print,advanced:advanced"')
+    parser.add_argument("--backend", default="keras", help="INFERENCE_BACKEND de nose_print")
+    parser.add_argument("--output", default=report_path("model_roster_report.json"))
+    args = parser.parse_args()
+
+    service_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ok = True
+    report = {"backend": args.backend, "results": []}
+    print(f"{'roster':>28} {'lazy':>16} {'arranque s':>11} {'RSS MB':>8} {'TF':>4} {'1er uso s':>10} {'RSS final MB':>13}")
+    for config in args.configs:
+        roster, _, lazy = config.partition(":")
+        result = run_config(roster, lazy, args.backend, service_dir)
+        result.update({"roster": roster, "lazy": lazy})
+        report["results"].append(result)
+        if "error" in result:
+            print(f"{roster:>28} {lazy or '-':>16} falló: {result['error']}")
+            ok = False
+            continue
+        # Al arrancar sólo deben estar construidos los activos que no son lazy (nose_print siempre)
+        expected = sorted(name for name in roster.split(",") if name and (name == "nose_print" or name not in lazy.split(",")))
+        ok = ok and result["loaded_at_startup"] == expected
+        print(f"{roster:>28} {lazy or '-':>16} {result['cold_start_s']:>11.2f} {result['rss_startup_bytes'] / 1e6:>8.1f} "
+              f"{'sí' if result['tensorflow_at_startup'] else 'no':>4} {result['first_use_s']:>10.2f} "
+              f"{result['rss_after_first_use_bytes'] / 1e6:>13.1f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print("❌ Alguna configuración falló o construyó modelos que debían cargarse en su primer uso")
+        sys.exit(1)
+    print("✅ Roster verificado: los modelos inactivos y lazy no se construyen al arrancar")
+
+if __name__ == "__main__":
+    main()
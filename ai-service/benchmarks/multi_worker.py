@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Varios workers sobre el mismo registro de huellas nasales: visibilidad de los registros entre
+procesos y memoria del índice compartido (EMBEDDING_INDEX_SHARED) frente a índices privados.
+
+Cada worker es un proceso nuevo con su propio NosePrintModel sobre los mismos archivos, igual
+que los workers de `uvicorn --workers N` (las búsquedas van directo al índice con vectores
+sintéticos, sin extraer características de imágenes). Se verifica:
+  - un registro hecho en un worker aparece en la siguiente búsqueda de todos los demás
+  - registros simultáneos en todos los workers quedan visibles en cada uno
+  - tras la compactación de un worker los demás remapean el índice nuevo y siguen al día
+y se reporta, para cada número de workers, la PSS total y la memoria privada por worker
+(/proc/<pid>/smaps_rollup) con el índice compartido y con índices privados.
+
+Uso (desde ai-service/):
+    python -m benchmarks.multi_worker --pets 50000 --workers 1 2 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks import report_path
+from benchmarks.ann_recall import FAMILY_DIMS, MODEL_WEIGHTS
+
+EMBEDDINGS_FILE = "nose_print_embeddings.json"
+
+def pet_vectors(pet_id: str) -> Dict[str, np.ndarray]:
+    """Vectores deterministas por pet_id: cualquier proceso puede generar la consulta de una mascota"""
+    rng = np.random.default_rng(zlib.crc32(pet_id.encode('utf-8')))
+    return {family: rng.standard_normal(dim).astype(np.float32) for family, dim in FAMILY_DIMS.items()}
+
+def child(directory: str):
+    """Proceso worker: atiende comandos JSON por stdin y responde una línea JSON por stdout"""
+    # El protocolo usa una copia de stdout; lo que Keras/TensorFlow impriman va al log (stderr)
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    from nose_print_model import NosePrintModel
+    model = NosePrintModel(os.path.join(directory, EMBEDDINGS_FILE))
+
+    def respond(payload: Dict):
+        protocol.write(json.dumps(payload) + "\n")
+        protocol.flush()
+
+    respond({"pid": os.getpid(), "size": len(model.index), "shared": model.index.shared_path is not None})
+    for line in sys.stdin:
+        command = json.loads(line)
+        op = command["op"]
+        if op == "register":
+            model.add_nose_prints([(pet_id, {f: v.tolist() for f, v in pet_vectors(pet_id).items()})
+                                   for pet_id in command["pet_ids"]])
+            respond({"size": len(model.index)})
+        elif op == "find":
+            # Igual que compare_nose_print: sincronizar y buscar
+            model.sync_embeddings()
+            rng = np.random.default_rng(0)
+            found = []
+            for pet_id in command["pet_ids"]:
+                query = {f: v + 0.05 * rng.standard_normal(v.shape[0]).astype(np.float32) for f, v in pet_vectors(pet_id).items()}
+                ranked = model.index.search(query, MODEL_WEIGHTS, top_k=1)
+                found.append(bool(ranked) and ranked[0][0] == pet_id)
+            respond({"found": found, "size": len(model.index), "shared": model.index.shared_path is not None})
+        elif op == "compact":
+            model.save_embeddings()
+            respond({"size": len(model.index), "shared": model.index.shared_path is not None})
+        elif op == "quit":
+            return
+
+class Worker:
+    def __init__(self, directory: str, env: Dict[str, str], log_path: str):
+        self._log = open(log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.multi_worker", "--child", directory],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._log, text=True, env=env
+        )
+        self.log_path = log_path
+        self.ready = self.read()
+
+    def send(self, op: str, **kwargs):
+        self.process.stdin.write(json.dumps({"op": op, **kwargs}) + "\n")
+        self.process.stdin.flush()
+
+    def read(self) -> Dict:
+        line = self.process.stdout.readline()
+        if not line:
+            with open(self.log_path) as f:
+                tail = f.read().strip().splitlines()
+            raise RuntimeError(f"El worker terminó: {tail[-1] if tail else 'sin salida'}")
+        return json.loads(line)
+
+    def call(self, op: str, **kwargs) -> Dict:
+        self.send(op, **kwargs)
+        return self.read()
+
+    def memory(self) -> Dict[str, int]:
+        """PSS y memoria privada del proceso en bytes (smaps_rollup)"""
+        values = {}
+        with open(f"/proc/{self.process.pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    values[parts[0][:-1]] = int(parts[1]) * 1024
+        return {
+            "rss": values.get("Rss", 0),
+            "pss": values.get("Pss", 0),
+            "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+        }
+
+    def stop(self):
+        try:
+            self.send("quit")
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self._log.close()
+
+def seed_registry(directory: str, pets: int):
+    """Registro inicial compactado (snapshot + índice compartido) escrito por un único proceso"""
+    from nose_print_model import NosePrintModel
+    model = NosePrintModel(os.path.join(directory, EMBEDDINGS_FILE))
+    model.store.compact_every = 0
+    chunk = 5000
+    for start in range(0, pets, chunk):
+        model.add_nose_prints([(f"pet-{i}", {f: v.tolist() for f, v in pet_vectors(f"pet-{i}").items()})
+                               for i in range(start, min(pets, start + chunk))])
+    model.save_embeddings()
+    return model.index.memory_bytes()
+
+def start_workers(count: int, directory: str, shared: bool, logs: str) -> List[Worker]:
+    env = dict(os.environ, EMBEDDING_INDEX_SHARED="true" if shared else "false",
+               PYTHONPATH=os.getcwd() + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    return [Worker(directory, env, os.path.join(logs, f"worker-{'shared' if shared else 'private'}-{i}.log"))
+            for i in range(count)]
+
+def check(label: str, passed: bool, results: Dict) -> bool:
+    results[label] = passed
+    print(f"  {'✅' if passed else '❌'} {label}")
+    return passed
+
+def visibility(directory: str, workers_count: int, logs: str, per_worker: int) -> Dict:
+    """Registros en un worker (y en todos a la vez) visibles desde los demás, antes y después de compactar"""
+    results: Dict = {}
+    workers = start_workers(workers_count, directory, True, logs)
+    try:
+        check("todos los workers mapean el índice compartido", all(w.ready["shared"] for w in workers), results)
+
+        workers[0].call("register", pet_ids=["solo-0"])
+        replies = [w.call("find", pet_ids=["solo-0"]) for w in workers[1:]]
+        check("registro de un worker visible en los demás", all(all(r["found"]) for r in replies), results)
+
+        # Todos registran a la vez: se envían los comandos antes de leer las respuestas
+        batches = [[f"concurrent-{i}-{j}" for j in range(per_worker)] for i in range(len(workers))]
+        for worker, pet_ids in zip(workers, batches):
+            worker.send("register", pet_ids=pet_ids)
+        for worker in workers:
+            worker.read()
+        everyone = [pet_id for batch in batches for pet_id in batch]
+        replies = [w.call("find", pet_ids=everyone) for w in workers]
+        sizes = {r["size"] for r in replies}
+        check("registros simultáneos visibles en todos los workers",
+              all(all(r["found"]) for r in replies) and len(sizes) == 1, results)
+
+        compacted = workers[0].call("compact")
+        workers[-1].call("register", pet_ids=["after-compact"])
+        replies = [w.call("find", pet_ids=["solo-0", everyone[-1], "after-compact"]) for w in workers]
+        check("tras compactar todos remapean el índice nuevo y siguen al día",
+              compacted["shared"] and all(all(r["found"]) and r["shared"] for r in replies)
+              and len({r["size"] for r in replies}) == 1, results)
+    finally:
+        for worker in workers:
+            worker.stop()
+    return results
+
+def memory_profile(directory: str, counts: List[int], logs: str) -> List[Dict]:
+    rows = []
+    for shared in (True, False):
+        for count in counts:
+            workers = start_workers(count, directory, shared, logs)
+            try:
+                # Una búsqueda recorre las matrices completas: todas sus páginas quedan residentes
+                for worker in workers:
+                    worker.call("find", pet_ids=["pet-0"])
+                memory = [w.memory() for w in workers]
+            finally:
+                for worker in workers:
+                    worker.stop()
+            rows.append({
+                "mode": "compartido" if shared else "privado",
+                "workers": count,
+                "pss_total_bytes": sum(m["pss"] for m in memory),
+                "private_per_worker_bytes": sum(m["private"] for m in memory) / count,
+                "rss_per_worker_bytes": sum(m["rss"] for m in memory) / count
+            })
+    return rows
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+        return
+
+    parser = argparse.ArgumentParser(description="Índice compartido entre workers: visibilidad y memoria")
+    parser.add_argument("--pets", type=int, default=50000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Números de workers a medir")
+    parser.add_argument("--per-worker", type=int, default=20, help="Registros simultáneos por worker")
+    parser.add_argument("--output", default=report_path("multi_worker_report.json"))
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("❌ Se necesita Linux (/proc/<pid>/smaps_rollup) para medir la memoria por worker")
+        sys.exit(1)
+
+    ok = True
+    report: Dict = {"pets": args.pets}
+    with tempfile.TemporaryDirectory() as tmp:
+        index_bytes = seed_registry(tmp, args.pets)
+        report["index_bytes"] = index_bytes
+        print(f"{args.pets} mascotas, índice de {index_bytes / 1e6:.1f} MB\n")
+
+        print(f"Visibilidad entre {max(args.workers)} workers:")
+        report["visibility"] = visibility(tmp, max(2, max(args.workers)), tmp, args.per_worker)
+        ok = ok and all(report["visibility"].values())
+
+        # Un registro recién creado para medir memoria sin el log de la prueba anterior
+        memory_dir = os.path.join(tmp, "memory")
+        os.makedirs(memory_dir)
+        seed_registry(memory_dir, args.pets)
+        rows = memory_profile(memory_dir, sorted(set(args.workers)), tmp)
+        report["memory"] = rows
+        print(f"\n{'modo':>11} {'workers':>8} {'PSS total MB':>13} {'privada/worker MB':>18} {'RSS/worker MB':>14}")
+        for row in rows:
+            print(f"{row['mode']:>11} {row['workers']:>8} {row['pss_total_bytes'] / 1e6:>13.1f} "
+                  f"{row['private_per_worker_bytes'] / 1e6:>18.1f} {row['rss_per_worker_bytes'] / 1e6:>14.1f}")
+
+    # Con el índice compartido cada worker debe ahorrarse al menos la mitad de su copia privada
+    private = {row["workers"]: row["private_per_worker_bytes"] for row in rows if row["mode"] == "privado"}
+    shared = {row["workers"]: row["private_per_worker_bytes"] for row in rows if row["mode"] == "compartido"}
+    saved = {count: private[count] - shared[count] for count in private}
+    report["private_bytes_saved_per_worker"] = saved
+    memory_ok = all(value >= 0.5 * index_bytes for value in saved.values())
+    ok = ok and memory_ok
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print("❌ Algún registro no fue visible entre workers o el índice no se compartió")
+        sys.exit(1)
+    print("✅ Registros visibles entre workers y un solo índice en memoria para todos")
+
+if __name__ == "__main__":
+    main()
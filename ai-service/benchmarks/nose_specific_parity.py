@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Paridad y throughput (imágenes/s) del extractor nose_specific vectorizado frente al original.
+
+Compara nose_specific_features (lotes) con nose_specific_features_reference (una imagen a la
+vez) sobre imágenes sintéticas y, opcionalmente, fotos reales; luego mide imágenes/s para cada
+tamaño de lote.
+
+Uso (desde ai-service/):
+    python -m benchmarks.nose_specific_parity --batch-sizes 1 8 32 128 256
+    python -m benchmarks.nose_specific_parity --images fotos_nariz/ --atol 1e-6
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+import cv2
+import numpy as np
+
+from benchmarks import report_path
+from benchmarks.enhancement_parity import synthetic_nose
+from nose_specific_features import nose_specific_features, nose_specific_features_reference
+
+def parity_images(args, rng: np.random.Generator) -> List[np.ndarray]:
+    """Fotos reales (si se indican) más casos sintéticos: textura, ruido, casi negras y vacías"""
+    images = []
+    if args.images:
+        for name in sorted(os.listdir(args.images)):
+            img = cv2.imread(os.path.join(args.images, name), cv2.IMREAD_COLOR)
+            if img is not None:
+                images.append(cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), (224, 224)))
+    for i in range(args.synthetic):
+        kind = i % 4
+        if kind == 0:
+            images.append(synthetic_nose(224, 224, rng))
+        elif kind == 1:
+            images.append(rng.integers(0, 256, size=(224, 224, 3), dtype=np.uint8))
+        elif kind == 2:
+            images.append(((rng.random((224, 224, 3)) < 0.02) * 2).astype(np.uint8))
+        else:
+            images.append(np.zeros((224, 224, 3), dtype=np.uint8))
+    return images
+
+def images_per_second(func, batch: np.ndarray, min_seconds: float) -> float:
+    func(batch)  # calentamiento
+    processed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        func(batch)
+        processed += len(batch)
+    return processed / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y throughput del extractor nose_specific")
+    parser.add_argument("--images", help="Directorio con fotos reales de nariz (opcional)")
+    parser.add_argument("--synthetic", type=int, default=64, help="Imágenes sintéticas para la paridad")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32, 64, 128, 256])
+    parser.add_argument("--seconds", type=float, default=1.0, help="Duración mínima de cada medición")
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--output", default=report_path("nose_specific_report.json"))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = parity_images(args, rng)
+    reference = np.array([nose_specific_features_reference(img) for img in images])
+    vectorized = nose_specific_features(np.stack(images))
+    max_diff = float(np.max(np.abs(reference - vectorized)))
+    ok = bool(np.isfinite(vectorized).all()) and max_diff <= args.atol
+    print(f"Paridad sobre {len(images)} imágenes: max |Δ| = {max_diff:.2e} (atol {args.atol:.0e})")
+
+    pool = np.stack([synthetic_nose(224, 224, rng) for _ in range(max(args.batch_sizes))])
+    reference_loop = lambda batch: [nose_specific_features_reference(img) for img in batch]
+    report = {"parity_images": len(images), "max_abs_diff": max_diff, "throughput": {}}
+    print(f"\n{'lote':>6} {'original img/s':>15} {'vectorizado img/s':>18} {'speedup':>8}")
+    for size in args.batch_sizes:
+        batch = pool[:size]
+        before = images_per_second(reference_loop, batch, args.seconds)
+        after = images_per_second(nose_specific_features, batch, args.seconds)
+        report["throughput"][str(size)] = {"reference_images_per_sec": before, "vectorized_images_per_sec": after}
+        print(f"{size:>6} {before:>15.1f} {after:>18.1f} {after / before:>7.2f}x")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print(f"❌ El extractor vectorizado difiere del original en más de {args.atol}")
+        sys.exit(1)
+    print("✅ Extractor vectorizado equivalente al original")
+
+if __name__ == "__main__":
+    main()
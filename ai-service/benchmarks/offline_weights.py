@@ -0,0 +1,36 @@
+"""
+Artefacto con backbones de pesos aleatorios (semilla fija) para medir sin descargar ImageNet.
+
+Misma arquitectura y mismo costo que los backbones reales: sirve para latencia, throughput y
+equivalencia numérica entre rutas de inferencia, no para calidad de reconocimiento. Las cabezas
+no se exportan y usan la inicialización con semilla de build_head.
+"""
+
+import os
+import tempfile
+
+from config import Config
+
+RANDOM_ARTIFACT_VERSION = "random-init"
+
+def use_random_backbones(root: str = "") -> str:
+    """Exportar (una vez) el artefacto aleatorio y apuntar Config a él; llamar antes de construir backbones"""
+    import tensorflow as tf
+    from tensorflow.keras.layers import GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+    from backbone_registry import ARCHITECTURES
+    from feature_artifacts import MANIFEST_NAME, FeatureArtifacts
+
+    root = root or os.path.join(tempfile.gettempdir(), "nose-benchmark-artifacts")
+    artifacts = FeatureArtifacts(root, RANDOM_ARTIFACT_VERSION, load=False)
+    if not os.path.exists(os.path.join(artifacts.path, MANIFEST_NAME)):
+        tf.keras.utils.set_random_seed(Config.MODEL_SEED)
+        backbones = {}
+        for name, (constructor, _) in ARCHITECTURES.items():
+            base = constructor(weights=None, include_top=False, input_shape=(224, 224, 3))
+            backbones[name] = Model(inputs=base.input, outputs=GlobalAveragePooling2D()(base.output))
+        artifacts.export(backbones, {})
+    Config.MODEL_ARTIFACTS_DIR = root
+    Config.MODEL_ARTIFACT_VERSION = RANDOM_ARTIFACT_VERSION
+    print(f"⚠️  Backbones con pesos aleatorios ({artifacts.path}): tiempos válidos, embeddings sin significado")
+    return artifacts.path
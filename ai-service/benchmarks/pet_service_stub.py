@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Stub local del pet-service y verificación del cliente async (pool, caché, circuit breaker).
+
+Escenarios contra el stub:
+  1. fan-out de N mascotas con latencia simulada: tiempo total vs N llamadas en serie
+  2. segunda consulta de las mismas mascotas: todo desde caché, sin peticiones nuevas
+  3. mascota inexistente (404): None y caché negativa
+  4. pet-service lento (latencia > timeout): el circuito se abre y el resto responde al instante
+
+Uso (desde ai-service/):
+    python -m benchmarks.pet_service_stub --pets 1000 --latency-ms 20
+    python -m benchmarks.pet_service_stub --serve --port 8083   # sólo el stub, para levantar main.py contra él
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pet_service_client import PetServiceClient
+
+class StubState:
+    latency = 0.0
+    requests = 0
+    lock = threading.Lock()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        with StubState.lock:
+            StubState.requests += 1
+        time.sleep(StubState.latency)
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "pets" or parts[1].startswith("missing"):
+            self._send(404, {"error": "not found"})
+            return
+        pet_id = parts[1]
+        self._send(200, {"id": pet_id, "name": f"Mascota {pet_id}", "breed": "Mestizo",
+                         "noseImageUrl": f"https://example.invalid/{pet_id}.jpg"})
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente ya abandonó la petición por timeout (escenario 4)
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def run_checks(args, base_url: str) -> bool:
+    ok = True
+    pet_ids = [f"pet-{i}" for i in range(args.pets)]
+    client = PetServiceClient(base_url, timeout=args.timeout, max_concurrency=args.concurrency,
+                              failure_threshold=args.failure_threshold, reset_timeout=60)
+
+    # 1. Fan-out acotado
+    StubState.latency = args.latency_ms / 1000
+    StubState.requests = 0
+    start = time.perf_counter()
+    results = await client.get_pets(pet_ids)
+    elapsed = time.perf_counter() - start
+    serial = args.pets * StubState.latency
+    complete = all(results[p] and results[p]["name"] == f"Mascota {p}" for p in pet_ids)
+    print(f"1. fan-out de {args.pets} mascotas: {elapsed:.2f}s (en serie ≈ {serial:.2f}s), completo={complete}")
+    ok = ok and complete
+
+    # 2. Caché
+    before = StubState.requests
+    start = time.perf_counter()
+    await client.get_pets(pet_ids)
+    cached_elapsed = time.perf_counter() - start
+    new_requests = StubState.requests - before
+    print(f"2. repetición desde caché: {cached_elapsed * 1000:.1f} ms, peticiones nuevas={new_requests}")
+    ok = ok and new_requests == 0
+
+    # 3. 404 con caché negativa
+    missing = await client.get_pet("missing-1")
+    before = StubState.requests
+    missing_again = await client.get_pet("missing-1")
+    print(f"3. mascota inexistente: {missing}, segunda consulta sin petición={StubState.requests == before}")
+    ok = ok and missing is None and missing_again is None and StubState.requests == before
+
+    # 4. Servicio lento: el circuito se abre y el resto degrada a valores por defecto
+    StubState.latency = args.timeout * 2
+    slow_ids = [f"slow-{i}" for i in range(args.pets)]
+    start = time.perf_counter()
+    slow_results = await client.get_pets(slow_ids)
+    slow_elapsed = time.perf_counter() - start
+    degraded = sum(1 for v in slow_results.values() if v is None)
+    bound = args.timeout * (args.failure_threshold / args.concurrency + 2)
+    print(f"4. pet-service lento: {slow_elapsed:.2f}s para {args.pets} mascotas, degradadas={degraded}, "
+          f"circuito={client.breaker.state} (cota {bound:.2f}s)")
+    ok = ok and client.breaker.state == "open" and degraded == args.pets and slow_elapsed <= bound
+    # Una mascota ya conocida sigue respondiendo con su última entrada aunque el circuito esté abierto
+    stale = await client.get_pet(pet_ids[0])
+    ok = ok and stale is not None
+
+    print(f"\nEstadísticas del cliente: {json.dumps(client.stats())}")
+    StubState.latency = 0
+    await client.aclose()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub del pet-service y verificación del cliente async")
+    parser.add_argument("--port", type=int, default=0, help="0 = puerto libre")
+    parser.add_argument("--serve", action="store_true", help="Sólo levantar el stub y esperar")
+    parser.add_argument("--pets", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--failure-threshold", type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_stub(args.port)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.serve:
+        print(f"Stub del pet-service en {base_url} (Ctrl+C para salir)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+
+    ok = asyncio.run(run_checks(args, base_url))
+    server.shutdown()
+    if not ok:
+        print("❌ El cliente del pet-service no se comportó como se esperaba")
+        sys.exit(1)
+    print("✅ Cliente del pet-service verificado contra el stub")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Filtro de calidad previo a la inferencia (image_quality.ImageQualityGate) con los umbrales de config.py.
+
+Para narices sintéticas a varias resoluciones y sus versiones degradadas (borrosa, quemada,
+oscura, diminuta, sin textura) se verifica:
+  - las fotos buenas pasan y cada degradación se rechaza con el motivo esperado
+  - el filtro cuesta pocos ms por foto (p95 por debajo de --max-ms) incluso a 12 MP
+  - un /scan rechazado por calidad cuesta una fracción del que recorre todo el pipeline
+
+Uso (desde ai-service/):
+    python -m benchmarks.quality_gate --sizes 480x640 960x1280 3024x4032
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from benchmarks import report_path
+from benchmarks.enhancement_parity import synthetic_nose
+
+def encode(rgb: np.ndarray) -> bytes:
+    return cv2.imencode(".jpg", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+def variants(height: int, width: int, rng: np.random.Generator) -> List[Tuple[str, str, bytes]]:
+    """(nombre, motivo esperado o '' si debe pasar, JPEG)"""
+    img = synthetic_nose(height, width, rng)
+    # Desenfoque fuerte (sigma ~1% del ancho): los surcos desaparecen a cualquier resolución
+    blur = max(3, (width // 15) | 1)
+    small = cv2.resize(img, (96, 72), interpolation=cv2.INTER_AREA)
+    flat = np.full_like(img, 120) + rng.integers(0, 3, img.shape, dtype=np.uint8)
+    return [
+        ("nítida", "", encode(img)),
+        ("desenfocada", "blurry", encode(cv2.GaussianBlur(img, (blur, blur), 0))),
+        ("sobreexpuesta", "overexposed", encode(cv2.add(img, np.full_like(img, 170)))),
+        ("oscura", "underexposed", encode((img * 0.1).astype(np.uint8))),
+        ("diminuta", "too_small", encode(small)),
+        ("sin textura", "low_texture", encode(flat))
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Filtro de calidad: detección, costo y ahorro de inferencia")
+    parser.add_argument("--sizes", nargs="+", default=["480x640", "960x1280", "3024x4032"], help="Resoluciones ALTOxANCHO")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--max-ms", type=float, default=10.0, help="p95 máximo del filtro por foto")
+    parser.add_argument("--output", default=report_path("quality_gate_report.json"))
+    args = parser.parse_args()
+
+    os.environ["FEATURE_CACHE_ENABLED"] = "false"  # cada /scan extrae de verdad
+    from config import Config
+    from image_pipeline import DecodedImage
+    from image_quality import ImageQualityGate
+    from nose_print_model import NosePrintModel
+
+    gate = ImageQualityGate.from_config(Config, mode="reject")
+    rng = np.random.default_rng(0)
+    ok = True
+    report: Dict = {"thresholds": gate.stats()["thresholds"], "cases": []}
+    print(f"{'resolución':>10} {'foto':>14} {'esperado':>13} {'motivos':>28} {'p50 ms':>8} {'p95 ms':>8}")
+    samples: Dict[str, bytes] = {}
+    for size in args.sizes:
+        height, width = (int(v) for v in size.split("x"))
+        for name, expected, data in variants(height, width, rng):
+            timings = []
+            for _ in range(args.iterations):
+                decoded = DecodedImage(data)  # el filtro memoriza su reporte en la imagen
+                start = time.perf_counter()
+                quality = gate.assess(decoded)
+                timings.append((time.perf_counter() - start) * 1000)
+            codes = [reason["code"] for reason in quality["reasons"]]
+            correct = (not codes) if not expected else expected in codes
+            p50, p95 = float(np.percentile(timings, 50)), float(np.percentile(timings, 95))
+            ok = ok and correct and p95 <= args.max_ms
+            report["cases"].append({"size": size, "variant": name, "expected": expected or None, "reasons": codes,
+                                    "correct": correct, "p50_ms": p50, "p95_ms": p95, "metrics": quality["metrics"]})
+            print(f"{size:>10} {name:>14} {expected or 'pasa':>13} {','.join(codes) or '-':>28} {p50:>8.2f} {p95:>8.2f} "
+                  f"{'✅' if correct else '❌'}")
+            samples.setdefault(name, data)
+
+    # /scan de punta a punta: foto buena (pipeline completo) frente a foto rechazada
+    with tempfile.TemporaryDirectory() as tmp:
+        model = NosePrintModel(os.path.join(tmp, "nose_print_embeddings.json"))
+        model.add_nose_prints([(f"pet-{i}", {"traditional": rng.standard_normal(64).tolist()}) for i in range(100)])
+        if model.quality_gate is None:
+            print("❌ QUALITY_GATE_MODE=off: el modelo no tiene filtro de calidad")
+            sys.exit(1)
+        model.quality_gate.mode = "reject"
+
+        def scan(data: bytes) -> Tuple[float, Dict]:
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                result = model.compare_nose_print(data)
+            return (time.perf_counter() - start) / args.iterations * 1000, result
+
+        accepted_ms, accepted = scan(samples["nítida"])
+        accepted_ok = not accepted.get("quality_rejected") and accepted["quality"]["accepted"]
+        rejected_ms, rejected = scan(samples["desenfocada"])
+        rejected_ok = bool(rejected.get("quality_rejected")) and bool(rejected["quality"]["message"])
+        stats = model.get_model_stats()["quality_gate"]
+    print(f"\n/scan con foto buena: {accepted_ms:.1f} ms; rechazada por calidad: {rejected_ms:.1f} ms "
+          f"({rejected_ms / accepted_ms * 100:.0f}%)")
+    print(f"{'✅' if accepted_ok and rejected_ok else '❌'} Rechazo con motivo estructurado y contadores en stats: "
+          f"rejected={stats['rejected']} by_reason={ {k: v for k, v in stats['by_reason'].items() if v} }")
+    ok = ok and accepted_ok and rejected_ok and rejected_ms < accepted_ms and stats["rejected"] > 0
+    report.update({"scan_accepted_ms": accepted_ms, "scan_rejected_ms": rejected_ms, "model_stats": stats})
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not ok:
+        print("❌ El filtro dejó pasar/rechazó una foto equivocada o superó el costo máximo")
+        sys.exit(1)
+    print("✅ Fotos inservibles rechazadas en pocos ms antes de la inferencia")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Perfiles bajo demanda (profiling.RequestProfiler) sobre el ModelExecutor del servicio.
+
+  - costo por tarea del pool sin perfiles (wrap_call = None, como con PROFILING_ENABLED=false)
+    y con perfiles habilitados pero sin sesión en la petición
+  - disparo: cabecera de administrador con token correcto/incorrecto y fracción muestreada
+  - el perfil de una extracción de NosePrintModel contiene el pipeline de la petición y no
+    una tarea concurrente de otra petición en el mismo pool
+  - el directorio queda acotado por cantidad y por bytes
+
+Uso (desde ai-service/):
+    python -m benchmarks.request_profiling --calls 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks import report_path
+from benchmarks.enhancement_parity import synthetic_nose
+
+def unrelated_work(n: int) -> int:
+    """Tarea de otra petición que corre a la vez en el pool"""
+    total = 0
+    for i in range(n):
+        total += i % 7
+    return total
+
+async def per_call_us(executor, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await executor.run(int)
+    return (time.perf_counter() - start) / calls * 1e6
+
+def check(label: str, passed: bool, results: dict) -> bool:
+    results[label] = passed
+    print(f"{'✅' if passed else '❌'} {label}")
+    return passed
+
+async def run(args, tmp: str) -> dict:
+    from model_executor import ModelExecutor
+    from nose_print_model import NosePrintModel
+    from profiling import RequestProfiler
+
+    results: dict = {}
+    executor = ModelExecutor(workers=2, max_pending=8)
+    profiler = RequestProfiler(os.path.join(tmp, "profiles"), sample_rate=0.0, admin_token="secreto",
+                               max_profiles=5, max_bytes=50 * 1024 * 1024)
+
+    disabled = await per_call_us(executor, args.calls)
+    executor.wrap_call = profiler.wrap
+    enabled_idle = await per_call_us(executor, args.calls)
+    results.update({"task_us_disabled": disabled, "task_us_enabled_no_session": enabled_idle})
+    print(f"Tarea del pool: {disabled:.1f} µs sin perfiles, {enabled_idle:.1f} µs habilitados sin sesión")
+
+    admin = {"x-profile": "true", "x-admin-token": "secreto"}
+    check("X-Profile con el token correcto inicia un perfil", profiler.begin("scan", admin) is not None, results)
+    check("token incorrecto o ausente no perfila",
+          profiler.begin("scan", {"x-profile": "true", "x-admin-token": "otro"}) is None
+          and profiler.begin("scan", {"x-profile": "true"}) is None, results)
+    profiler.sample_rate = 0.25
+    sampled = sum(profiler.begin("scan", {}) is not None for _ in range(20000)) / 20000
+    profiler.sample_rate = 0.0
+    check(f"muestreo del 25% ({sampled * 100:.1f}% perfilado)", abs(sampled - 0.25) < 0.02, results)
+
+    # Una petición perfilada y, a la vez, una tarea de otra petición en el otro hilo del pool
+    model = NosePrintModel(os.path.join(tmp, "nose_print_embeddings.json"))
+    ok, encoded = cv2.imencode(".jpg", synthetic_nose(480, 640, np.random.default_rng(0)))
+    session = profiler.begin("scan", admin)
+
+    async def profiled_request():
+        token = profiler.activate(session)
+        try:
+            return await executor.run(model.extract_nose_features, encoded.tobytes())
+        finally:
+            profiler.deactivate(token)
+
+    await asyncio.gather(profiled_request(), executor.run(unrelated_work, 2_000_000))
+    meta = profiler.save(session, 200, 0.1, "benchmark")
+    summary_path = profiler.profile_file(session.profile_id, "summary.txt")
+    with open(summary_path) as f:
+        summary = f.read()
+    check("el perfil contiene la extracción de nose_print_model", "nose_print_model.py" in summary, results)
+    check("el perfil no contiene la tarea concurrente de otra petición", "unrelated_work" not in summary, results)
+    check("cpu.prof descargable", profiler.profile_file(session.profile_id, "cpu.prof") is not None, results)
+    results["profile_meta"] = meta
+
+    for _ in range(12):
+        extra = profiler.begin("compare", admin)
+        await executor.run(extra.run, lambda: unrelated_work(1000))
+        profiler.save(extra, 200, 0.01, None)
+    stored = len(profiler.list_profiles())
+    check(f"máximo de perfiles respetado ({stored} guardados de 13)", stored == 5, results)
+    profiler.max_bytes = 1
+    last = profiler.begin("compare", admin)
+    profiler.save(last, 200, 0.01, None)
+    listed = profiler.list_profiles()
+    check("límite de bytes: sólo queda el perfil más reciente",
+          len(listed) == 1 and listed[0]["id"] == last.profile_id, results)
+    executor.shutdown()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfiles bajo demanda: costo, disparo, aislamiento y límites")
+    parser.add_argument("--calls", type=int, default=20000, help="Tareas vacías para medir el costo por tarea")
+    parser.add_argument("--output", default=report_path("request_profiling_report.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(run(args, tmp))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if not all(value for value in results.values() if isinstance(value, bool)):
+        print("❌ Algún perfil no se disparó, no se aisló o no respetó los límites")
+        sys.exit(1)
+    print("✅ Perfiles bajo demanda aislados por petición y acotados en disco")
+
+if __name__ == "__main__":
+    main()
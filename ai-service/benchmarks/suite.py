@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Suite reproducible de las rutas calientes del servicio, con comparación contra un baseline.
+
+Todo se genera sin red ni fotos reales (semilla fija): narices sintéticas codificadas en JPEG a
+varias resoluciones y registros sintéticos de 1k a 1M mascotas. Casos medidos:
+  - decode/<res>                   cv2.imdecode de la subida (DecodedImage)
+  - quality_gate/<res>             filtro de calidad previo a la inferencia (umbrales de config.py)
+  - enhance/<res>                  enhance_nose_image + resize a 224 (NOSE_ENHANCE_MAX_SIDE)
+  - nose_specific/224              características hechas a mano de una imagen
+  - extract/<modelo>/<res>         extracción completa de cada modelo desde la imagen ya decodificada
+  - register/<modelo>              registro de una mascota (extracción + escritura al store)
+  - compare/<modelo>/<mascotas>    comparación de una foto contra el registro sintético
+  - search/nose_print/<mascotas>   EmbeddingIndex.search configurado como en producción
+                                   (precisión, re-puntuación y ANN de config.py)
+
+Cada caso reporta p50/p95/media en ms y throughput. Los modelos que no se pueden construir en
+esta máquina (p. ej. sin TensorFlow) se reportan como omitidos, no se simulan. Cada caso guarda
+su `variant` (backend o 'traditional'): sólo se comparan casos con la misma variante.
+
+Con --baseline el p50 de cada caso se compara con el guardado; un caso más lento que
+baseline * (1 + --tolerance) y por más de --min-delta-ms es una regresión y la suite falla.
+El baseline es propio de cada máquina: generarlo con --update-baseline en el mismo runner.
+
+La caché de características se desactiva (FEATURE_CACHE_ENABLED=false) para medir la extracción
+y los logs de los modelos se silencian durante las mediciones.
+
+Uso (desde ai-service/):
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --update-baseline
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.2
+    python -m benchmarks.suite --registry-sizes 1000 10000 100000 1000000 --quick
+"""
+
+import os
+
+# Antes de importar config: medir la extracción, no la caché
+os.environ["FEATURE_CACHE_ENABLED"] = "false"
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from benchmarks import report_path
+from benchmarks.ann_recall import synthetic_registry
+from benchmarks.enhancement_parity import synthetic_nose
+
+DEFAULT_RESOLUTIONS = ["640x480", "1280x960", "4032x3024"]
+DEFAULT_REGISTRY_SIZES = [1000, 10000, 100000]
+MODELS = ("nose_print", "advanced", "simple")
+
+def synthetic_uploads(resolution: str, count: int, rng: np.random.Generator) -> List[bytes]:
+    """Narices sintéticas codificadas como las sube la app (JPEG, calidad 90)"""
+    height, width = (int(v) for v in resolution.split('x'))
+    uploads = []
+    for _ in range(count):
+        bgr = cv2.cvtColor(synthetic_nose(height, width, rng), cv2.COLOR_RGB2BGR)
+        ok, encoded = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if not ok:
+            raise RuntimeError(f"No se pudo codificar la imagen sintética {resolution}")
+        uploads.append(encoded.tobytes())
+    return uploads
+
+def measure(run: Callable[[object], object], prepare: Callable[[int], object], iterations: int, warmup: int,
+            variant: str = "", items: int = 1) -> Dict:
+    """Latencia de run(prepare(i)); prepare queda fuera del tiempo medido"""
+    for i in range(warmup):
+        run(prepare(i))
+    timings = []
+    for i in range(iterations):
+        argument = prepare(warmup + i)
+        start = time.perf_counter()
+        run(argument)
+        timings.append(time.perf_counter() - start)
+    ms = np.array(timings) * 1000
+    mean = float(ms.mean())
+    return {
+        "variant": variant,
+        "iterations": iterations,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "mean_ms": mean,
+        "throughput_per_s": items * 1000 / mean if mean > 0 else 0.0
+    }
+
+def load_models(directory: str) -> Dict[str, Dict]:
+    """Cada modelo del roster sobre un directorio vacío; los que no cargan quedan con su error"""
+    from model_roster import model_factories
+    models = {}
+    for name, factory in model_factories(directory).items():
+        try:
+            models[name] = {"model": factory()}
+        except Exception as e:  # ImportError sin TensorFlow, artefactos ausentes, etc.
+            models[name] = {"error": f"{type(e).__name__}: {e}"}
+    return models
+
+def nose_print_variant(model) -> str:
+    return model.backend.name if model.feature_models else "traditional"
+
+def model_variant(name: str, model) -> str:
+    if name == "nose_print":
+        return nose_print_variant(model)
+    return "keras" if model.feature_models else "traditional"
+
+def model_operations(name: str, model) -> Dict[str, Callable]:
+    """extract / register / compare / add de cada modelo con la misma firma"""
+    if name == "nose_print":
+        return {"extract": model.extract_nose_features, "register": model.register_nose_print,
+                "compare": model.compare_nose_print, "add": model.add_nose_prints}
+    if name == "advanced":
+        return {"extract": model.extract_features_advanced, "register": model.register_pet_advanced,
+                "compare": model.compare_nose_advanced, "add": model.add_pets_advanced}
+    return {"extract": model.extract_features, "register": model.register_pet,
+            "compare": model.compare_nose, "add": model.add_pets}
+
+def perturbed(features, rng: np.random.Generator):
+    """Otra mascota 'parecida': las características de la plantilla con ruido"""
+    if isinstance(features, dict):
+        return {name: perturbed(values, rng) for name, values in features.items()}
+    values = np.asarray(features, dtype=np.float32)
+    return (values + 0.3 * np.abs(values).mean() * rng.standard_normal(values.shape[0]).astype(np.float32)).tolist()
+
+def image_cases(args, uploads: Dict[str, List[bytes]], results: Dict):
+    from config import Config
+    from image_pipeline import DecodedImage
+    from image_quality import ImageQualityGate
+    from nose_enhancement import enhance_nose_image
+    from nose_specific_features import nose_specific_features
+
+    gate = ImageQualityGate.from_config(Config, mode="reject")
+
+    for resolution, images in uploads.items():
+        def pick(i, images=images):
+            return images[i % len(images)]
+        results[f"decode/{resolution}"] = measure(lambda data: DecodedImage(data).rgb, pick, args.iterations, args.warmup)
+        # Una imagen decodificada nueva por llamada: el reporte de calidad se memoriza en ella
+        results[f"quality_gate/{resolution}"] = measure(
+            gate.assess, lambda i, images=images: DecodedImage(images[i % len(images)]), args.iterations, args.warmup,
+            variant=f"side={Config.QUALITY_ANALYSIS_SIDE}"
+        )
+        decoded = [DecodedImage(data).rgb for data in images]
+        results[f"enhance/{resolution}"] = measure(
+            lambda rgb: cv2.resize(enhance_nose_image(rgb, max_side=Config.NOSE_ENHANCE_MAX_SIDE), (224, 224)),
+            lambda i, decoded=decoded: decoded[i % len(decoded)], args.iterations, args.warmup,
+            variant=f"max_side={Config.NOSE_ENHANCE_MAX_SIDE}"
+        )
+    first = next(iter(uploads.values()))
+    enhanced = [cv2.resize(DecodedImage(data).rgb, (224, 224)) for data in first]
+    results["nose_specific/224"] = measure(nose_specific_features, lambda i: enhanced[i % len(enhanced)],
+                                           args.iterations, args.warmup)
+
+def model_cases(args, name: str, model, uploads: Dict[str, List[bytes]], rng: np.random.Generator, results: Dict):
+    from image_pipeline import DecodedImage
+
+    ops = model_operations(name, model)
+    variant = model_variant(name, model)
+    for resolution, images in uploads.items():
+        # Un DecodedImage nuevo por llamada: memoriza las características extraídas
+        results[f"extract/{name}/{resolution}"] = measure(
+            ops["extract"], lambda i, images=images: DecodedImage(images[i % len(images)]),
+            args.iterations, args.warmup, variant=variant
+        )
+
+    images = uploads[args.model_resolution]
+    results[f"register/{name}"] = measure(
+        lambda arg: ops["register"](*arg), lambda i: (f"bench-register-{i}", images[i % len(images)]),
+        args.iterations, args.warmup, variant=variant
+    )
+
+    # Registro sintético: la plantilla es lo que este modelo extrae de una foto, con ruido por mascota
+    template = ops["extract"](DecodedImage(images[0]))
+    registered = len(model.embeddings)
+    for size in sorted(args.compare_sizes):
+        entries = [(f"bench-pet-{i}", perturbed(template, rng)) for i in range(registered, size)]
+        for start in range(0, len(entries), 5000):
+            ops["add"](entries[start:start + 5000])
+        registered = max(registered, size)
+        results[f"compare/{name}/{size}"] = measure(
+            ops["compare"], lambda i: images[i % len(images)], args.iterations, args.warmup, variant=variant
+        )
+
+def search_cases(args, model, rng: np.random.Generator, results: Dict):
+    """Búsqueda en el índice de un NosePrintModel sobre registros sintéticos crecientes (sin imágenes)"""
+    from benchmarks.ann_recall import FAMILY_DIMS, MODEL_WEIGHTS, make_queries
+
+    index = model.index
+    sizes = sorted(args.registry_sizes)
+    registry = synthetic_registry(sizes[-1], clusters=64, rng=rng)
+    # Re-puntuación (float16/int8) con los float32 del registro sintético, como hace el store
+    index.exact_vectors = lambda pet_id: {f: registry[f][int(pet_id[4:])] for f in FAMILY_DIMS}
+    variant = f"{index.precision},ann={'on' if index.ann is not None else 'off'}"
+    built = 0
+    for size in sizes:
+        start = time.perf_counter()
+        for i in range(built, size):
+            index.upsert(f"pet-{i}", {family: registry[family][i] for family in FAMILY_DIMS})
+        print(f"  índice de {size} mascotas construido en {time.perf_counter() - start:.1f} s")
+        built = size
+        queries = make_queries(registry, size, min(size, args.queries), rng)
+        results[f"search/nose_print/{size}"] = measure(
+            lambda q: index.search(q, MODEL_WEIGHTS, top_k=10), lambda i: queries[i % len(queries)],
+            len(queries), min(args.warmup, len(queries)), variant=variant
+        )
+
+def environment() -> Dict:
+    from config import Config
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "inference_backend": Config.INFERENCE_BACKEND,
+        "index_precision": Config.EMBEDDING_INDEX_PRECISION,
+        "ann_enabled": Config.ANN_ENABLED,
+        "enhance_max_side": Config.NOSE_ENHANCE_MAX_SIDE,
+        "quality_gate_mode": Config.QUALITY_GATE_MODE
+    }
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float, min_delta_ms: float) -> Dict:
+    """Regresiones, mejoras y casos no comparables respecto del baseline"""
+    report = {"regressions": [], "improvements": [], "incomparable": [], "missing": []}
+    for case, old in baseline.get("cases", {}).items():
+        new = results.get(case)
+        if new is None:
+            report["missing"].append(case)
+            continue
+        if new["variant"] != old["variant"]:
+            report["incomparable"].append(case)
+            continue
+        delta = new["p50_ms"] - old["p50_ms"]
+        row = {"case": case, "baseline_p50_ms": old["p50_ms"], "p50_ms": new["p50_ms"],
+               "change": delta / old["p50_ms"] if old["p50_ms"] > 0 else 0.0}
+        if delta > tolerance * old["p50_ms"] and delta > min_delta_ms:
+            report["regressions"].append(row)
+        elif -delta > tolerance * old["p50_ms"] and -delta > min_delta_ms:
+            report["improvements"].append(row)
+    return report
+
+def print_cases(cases: Dict):
+    print(f"\n{'caso':<36} {'variante':<22} {'p50 ms':>10} {'p95 ms':>10} {'por s':>10}")
+    for case, row in cases.items():
+        print(f"{case:<36} {row['variant'] or '-':<22} {row['p50_ms']:>10.3f} {row['p95_ms']:>10.3f} "
+              f"{row['throughput_per_s']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de ai-service con baseline")
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS, help="Resoluciones ALTOxANCHO")
+    parser.add_argument("--images-per-resolution", type=int, default=8)
+    parser.add_argument("--registry-sizes", type=int, nargs="+", default=DEFAULT_REGISTRY_SIZES,
+                        help="Mascotas de los registros sintéticos para search/ (hasta 1000000)")
+    parser.add_argument("--compare-sizes", type=int, nargs="+", default=[1000],
+                        help="Mascotas registradas para compare/ de cada modelo")
+    parser.add_argument("--model-resolution", default=None, help="Resolución de register/ y compare/ (por defecto la primera)")
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=MODELS)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200, help="Consultas por tamaño de registro en search/")
+    parser.add_argument("--quick", action="store_true", help="Menos iteraciones (humo, no para baselines)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=None, help="JSON de un baseline previo")
+    parser.add_argument("--update-baseline", action="store_true", help="Escribir estos resultados como baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Aumento relativo del p50 tolerado")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Diferencias menores nunca son regresión")
+    parser.add_argument("--output", default=report_path("suite_report.json"))
+    args = parser.parse_args()
+    if args.quick:
+        args.iterations, args.warmup, args.queries = 5, 1, 20
+    args.model_resolution = args.model_resolution or args.resolutions[0]
+    if args.model_resolution not in args.resolutions:
+        args.resolutions.append(args.model_resolution)
+
+    rng = np.random.default_rng(args.seed)
+    uploads = {resolution: synthetic_uploads(resolution, args.images_per_resolution, rng) for resolution in args.resolutions}
+    results: Dict[str, Dict] = {}
+    skipped: Dict[str, str] = {}
+
+    print("Etapas de imagen...")
+    image_cases(args, uploads, results)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        models = load_models(tmp)
+        # Los modelos registran cada extracción en INFO/WARNING: no medir la consola
+        logging.disable(logging.WARNING)
+        try:
+            for name in args.models:
+                entry = models[name]
+                if "error" in entry:
+                    skipped[name] = entry["error"]
+                    print(f"⚠️  {name} omitido: {entry['error']}")
+                    continue
+                print(f"Modelo {name} ({model_variant(name, entry['model'])})...")
+                model_cases(args, name, entry["model"], uploads, rng, results)
+            if "model" in models["nose_print"]:
+                print("Búsqueda en registros sintéticos...")
+                # Un NosePrintModel aparte: el índice empieza vacío, sin las mascotas de compare/
+                from nose_print_model import NosePrintModel
+                search_cases(args, NosePrintModel(os.path.join(tmp, "search_embeddings.json")), rng, results)
+        finally:
+            logging.disable(logging.NOTSET)
+
+    print_cases(results)
+    report = {"environment": environment(), "seed": args.seed, "iterations": args.iterations,
+              "cases": results, "skipped": skipped}
+
+    ok = True
+    baseline: Optional[Dict] = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline is not None:
+        if baseline.get("environment") != report["environment"]:
+            print("\n⚠️  El baseline se generó en otro entorno; las diferencias pueden no ser regresiones")
+        comparison = compare_to_baseline(results, baseline, args.tolerance, args.min_delta_ms)
+        comparison["tolerance"] = args.tolerance
+        report["comparison"] = comparison
+        print(f"\nContra {args.baseline} (tolerancia {args.tolerance * 100:.0f}%):")
+        for row in comparison["regressions"]:
+            print(f"  ❌ {row['case']}: {row['baseline_p50_ms']:.3f} → {row['p50_ms']:.3f} ms ({row['change'] * 100:+.0f}%)")
+        for row in comparison["improvements"]:
+            print(f"  ✅ {row['case']}: {row['baseline_p50_ms']:.3f} → {row['p50_ms']:.3f} ms ({row['change'] * 100:+.0f}%)")
+        for case in comparison["incomparable"]:
+            print(f"  ⚠️  {case}: otra variante que el baseline, no se compara")
+        for case in comparison["missing"]:
+            print(f"  ⚠️  {case}: no se midió en esta corrida")
+        ok = not comparison["regressions"]
+    elif args.baseline and not args.update_baseline:
+        print(f"\n⚠️  No existe {args.baseline}; generarlo con --update-baseline")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReporte guardado en {args.output}")
+    if args.update_baseline:
+        if not args.baseline:
+            print("❌ --update-baseline necesita --baseline")
+            sys.exit(1)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline actualizado en {args.baseline}")
+        return
+    if not ok:
+        print(f"❌ {len(report['comparison']['regressions'])} casos más lentos que el baseline por encima de la tolerancia")
+        sys.exit(1)
+    print("✅ Sin regresiones respecto del baseline" if baseline is not None else "✅ Suite completada")
+
+if __name__ == "__main__":
+    main()
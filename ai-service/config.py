@@ -25,10 +25,131 @@ class Config:
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.80"))
     CONFIDENCE_BOOST = float(os.getenv("CONFIDENCE_BOOST", "0.1"))
     
+    # Roster de modelos: sólo los activos se construyen y reciben registros (nose_print es obligatorio)
+    MODEL_ROSTER = os.getenv("MODEL_ROSTER", "nose_print,advanced,simple")
+    # Activos que se cargan en su primer uso (grafos de TensorFlow y archivo de embeddings)
+    MODEL_LAZY = os.getenv("MODEL_LAZY", "advanced,simple")
+    
+    # Artefactos versionados de los extractores (generados con export_feature_models.py)
+    MODEL_ARTIFACTS_DIR = os.getenv("MODEL_ARTIFACTS_DIR", "model_artifacts")
+    MODEL_ARTIFACT_VERSION = os.getenv("MODEL_ARTIFACT_VERSION", "v1")
+    MODEL_SEED = int(os.getenv("MODEL_SEED", "1234"))
+    # Sin artefacto los backbones descargan pesos ImageNet al arrancar; con true el arranque falla en su lugar
+    MODEL_ARTIFACT_REQUIRED = os.getenv("MODEL_ARTIFACT_REQUIRED", "false").lower() == "true"
+    
+    # Pool acotado para el trabajo de CPU fuera del event loop
+    MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "4"))
+    MODEL_MAX_PENDING = int(os.getenv("MODEL_MAX_PENDING", "64"))  # en curso + en cola; el resto recibe 503
+    
+    # Ruta de inferencia: predict | direct | compiled (tf.function con firma fija)
+    INFERENCE_MODE = os.getenv("INFERENCE_MODE", "compiled")
+    # XLA en CPU fue ~13x más lento que la ruta compilada sin XLA (benchmarks/results/inference_paths.json)
+    INFERENCE_XLA = os.getenv("INFERENCE_XLA", "false").lower() == "true"
+    
+    # Backend de los extractores de huella nasal: keras | onnx | tflite (modelos de export_feature_models.py)
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras")
+    INFERENCE_BACKEND_VARIANT = os.getenv("INFERENCE_BACKEND_VARIANT", "fp32")  # fp32 | dynamic | int8
+    INFERENCE_BACKEND_THREADS = int(os.getenv("INFERENCE_BACKEND_THREADS", "0"))  # 0: lo decide el runtime
+    
+    # Micro-batching de inferencia: agrupa peticiones concurrentes por backbone. Con 1 CPU no sube el
+    # throughput (~40 img/s con y sin lote) y suma hasta INFERENCE_MAX_WAIT_MS de latencia
+    # (benchmarks/results/micro_batching.json); la ganancia depende de tener núcleos para el lote
+    INFERENCE_BATCHING_ENABLED = os.getenv("INFERENCE_BATCHING_ENABLED", "true").lower() == "true"
+    INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "32"))
+    INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+    
+    # Registro por lotes (/register-embeddings/batch)
+    REGISTER_BATCH_MAX_ITEMS = int(os.getenv("REGISTER_BATCH_MAX_ITEMS", "1000"))
+    REGISTER_BATCH_CHUNK_SIZE = int(os.getenv("REGISTER_BATCH_CHUNK_SIZE", "32"))  # imágenes en memoria a la vez
+    REGISTER_BATCH_DECODE_WORKERS = int(os.getenv("REGISTER_BATCH_DECODE_WORKERS", "4"))
+    REGISTER_BATCH_MAX_IMAGE_BYTES = int(os.getenv("REGISTER_BATCH_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+    
+    # Mascotas puntuadas que devuelven /scan, /compare y /visual-comparison (parámetro top_k)
+    RESULTS_DEFAULT_TOP_K = int(os.getenv("RESULTS_DEFAULT_TOP_K", "10"))
+    RESULTS_MAX_TOP_K = int(os.getenv("RESULTS_MAX_TOP_K", "1000"))
+    
+    # Cliente del pet-service (metadatos de mascotas para /scan y /visual-comparison)
+    PET_SERVICE_URL = os.getenv("PET_SERVICE_URL", "http://localhost:8083")
+    PET_SERVICE_TIMEOUT_SECONDS = float(os.getenv("PET_SERVICE_TIMEOUT_SECONDS", "2"))
+    PET_SERVICE_MAX_CONNECTIONS = int(os.getenv("PET_SERVICE_MAX_CONNECTIONS", "20"))  # keep-alive
+    PET_SERVICE_MAX_CONCURRENCY = int(os.getenv("PET_SERVICE_MAX_CONCURRENCY", "16"))  # fan-out por proceso
+    PET_SERVICE_FAILURE_THRESHOLD = int(os.getenv("PET_SERVICE_FAILURE_THRESHOLD", "5"))  # fallos seguidos para abrir el circuito
+    PET_SERVICE_RESET_TIMEOUT_SECONDS = float(os.getenv("PET_SERVICE_RESET_TIMEOUT_SECONDS", "30"))
+    PET_CACHE_TTL_SECONDS = float(os.getenv("PET_CACHE_TTL_SECONDS", "300"))
+    PET_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("PET_CACHE_NEGATIVE_TTL_SECONDS", "30"))  # mascotas no encontradas
+    PET_CACHE_SIZE = int(os.getenv("PET_CACHE_SIZE", "10000"))
+    
+    # Realce de imagen de nariz: lado máximo de trabajo en píxeles (0 = resolución completa, salida idéntica)
+    NOSE_ENHANCE_MAX_SIDE = int(os.getenv("NOSE_ENHANCE_MAX_SIDE", "0"))
+    
+    # Filtro de calidad antes de la inferencia (off | flag | reject); umbrales sobre la miniatura en grises.
+    # Por defecto "flag": los umbrales sólo están ajustados con imágenes sintéticas, así que primero se
+    # calibran con el tráfico real (by_reason en /model-stats, `quality` en cada respuesta) y recién
+    # entonces se pasa a "reject", que devuelve 422 sin inferencia en /scan, /compare, /visual-comparison
+    # y los registros (también por lotes y en la reconstrucción)
+    QUALITY_GATE_MODE = os.getenv("QUALITY_GATE_MODE", "flag").lower()
+    QUALITY_ANALYSIS_SIDE = int(os.getenv("QUALITY_ANALYSIS_SIDE", "256"))  # lado mayor de la miniatura
+    QUALITY_MIN_SIDE = int(os.getenv("QUALITY_MIN_SIDE", "112"))  # lado menor de la foto original, en píxeles
+    QUALITY_MIN_BLUR_VARIANCE = float(os.getenv("QUALITY_MIN_BLUR_VARIANCE", "30"))  # varianza del laplaciano
+    QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "25"))
+    QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "230"))
+    QUALITY_MAX_CLIPPED_FRACTION = float(os.getenv("QUALITY_MAX_CLIPPED_FRACTION", "0.5"))  # píxeles quemados o negros
+    QUALITY_MIN_TEXTURE_ENERGY = float(os.getenv("QUALITY_MIN_TEXTURE_ENERGY", "8"))  # gradiente medio (Sobel)
+    
+    # Caché de características de huella nasal por hash de la imagen (memoria LRU + disco opcional)
+    FEATURE_CACHE_ENABLED = os.getenv("FEATURE_CACHE_ENABLED", "true").lower() == "true"
+    FEATURE_CACHE_MAX_BYTES = int(os.getenv("FEATURE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "")  # vacío = sin nivel en disco
+    FEATURE_CACHE_DISK_MAX_ENTRIES = int(os.getenv("FEATURE_CACHE_DISK_MAX_ENTRIES", "100000"))
+    
+    # Precisión del índice en memoria: float32 | float16 | int8 (escala por vector). Con 20k mascotas
+    # (benchmarks/results/compressed_index.json): float32 2988 B/mascota y ~130 QPS; float16 la mitad de
+    # memoria pero ~2x más lento (cada bloque se ensancha a float32 antes del producto); int8 ~1/4 de la
+    # memoria y QPS similar a float32. La re-puntuación lee los float32 del snapshot mapeado (páginas de
+    # caché compartidas, no memoria privada), así que comprimir sí reduce la memoria residente del índice
+    EMBEDDING_INDEX_PRECISION = os.getenv("EMBEDDING_INDEX_PRECISION", "float32")
+    # Candidatos del escaneo comprimido que se re-puntúan en float32
+    EMBEDDING_INDEX_RESCORE_CANDIDATES = int(os.getenv("EMBEDDING_INDEX_RESCORE_CANDIDATES", "100"))
+    # Índice mapeado en memoria desde un archivo que comparten todos los workers de uvicorn
+    EMBEDDING_INDEX_SHARED = os.getenv("EMBEDDING_INDEX_SHARED", "true").lower() == "true"
+    
+    # Búsqueda aproximada (IVF) para registros muy grandes
+    ANN_ENABLED = os.getenv("ANN_ENABLED", "false").lower() == "true"
+    ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # 0 = automático (4 * sqrt(N))
+    # Más listas = mayor recall y menor QPS; con 16 el recall@10 es ≥0.97 hasta 300k mascotas a ~10x el
+    # QPS del escaneo exacto (benchmarks/results/ann_recall.json); con 8 baja a ~0.82
+    ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+    ANN_MIN_PETS = int(os.getenv("ANN_MIN_PETS", "50000"))  # Por debajo se usa escaneo exacto
+    ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "100000"))  # Filas para k-means; el resto se asigna por tramos
+    ANN_TRAIN_ITERS = int(os.getenv("ANN_TRAIN_ITERS", "10"))
+    
     # Configuración de archivos
     EMBEDDINGS_FILE = os.getenv("EMBEDDINGS_FILE", "nose_print_embeddings.json")
+    # Registros en el log append-only antes de compactar a un snapshot
+    EMBEDDING_STORE_COMPACT_EVERY = int(os.getenv("EMBEDDING_STORE_COMPACT_EVERY", "1000"))
     AUDIT_LOG_FILE = os.getenv("AUDIT_LOG_FILE", "requests.log")
+    # Auditoría en segundo plano: cola acotada, flush por tamaño/tiempo y rotación por tamaño
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))  # eventos; si se llena se descartan
+    AUDIT_FLUSH_BYTES = int(os.getenv("AUDIT_FLUSH_BYTES", str(64 * 1024)))
+    AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+    AUDIT_MAX_BYTES = int(os.getenv("AUDIT_MAX_BYTES", str(50 * 1024 * 1024)))
+    AUDIT_BACKUP_COUNT = int(os.getenv("AUDIT_BACKUP_COUNT", "5"))
+    AUDIT_SIMILARITIES_TOP_K = int(os.getenv("AUDIT_SIMILARITIES_TOP_K", "5"))  # similitudes guardadas por evento
     
+    # Métricas /metrics (Prometheus): latencia por etapa, peticiones, coincidencias y errores
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Directorio de los contadores de cada worker para sumarlos (vacío = cada worker expone sólo lo suyo)
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+
+    # Perfiles bajo demanda de /scan, /compare y /register-embedding (deshabilitado = sin costo por petición)
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))  # fracción de peticiones perfiladas
+    # Token de X-Admin-Token para pedir un perfil (X-Profile: true) y listar/descargar perfiles; vacío = sin acceso
+    PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+    PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+    PROFILING_MAX_BYTES = int(os.getenv("PROFILING_MAX_BYTES", str(200 * 1024 * 1024)))
+
     # Configuración de base de datos (si se necesita en el futuro)
     DATABASE_URL = os.getenv("DATABASE_URL")
     
@@ -0,0 +1,598 @@
+import numpy as np
+import os
+import json
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Precisión de las matrices en memoria: float32 (exacta), float16 o int8 con escala por vector
+PRECISIONS = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Filas por bloque al escanear matrices comprimidas (la copia temporal cabe en caché)
+SCAN_BLOCK_ROWS = 1024
+
+# float16 -> float32 sin el cast lento de numpy: los bits de la mitad desplazados 13 posiciones son el
+# float32 del mismo valor por 2^-112 (exacto también para cero y subnormales); el 2^112 se aplica a la consulta
+_F16_SHIFT = 13
+_F16_MASK = np.int32(-0x70000001)  # 0x8FFFFFFF: limpia los bits de exponente que deja la extensión de signo
+_F16_SCALE = np.float32(2.0 ** 112)
+
+# Archivo del índice compartido entre workers (ver save_shared / load_shared)
+SHARED_INDEX_MAGIC = b"NOSEINDX"
+SHARED_INDEX_FORMAT = 1
+SHARED_INDEX_ALIGNMENT = 4096  # cada matriz empieza en su propia página
+
+def _page_align(offset: int) -> int:
+    return (offset + SHARED_INDEX_ALIGNMENT - 1) // SHARED_INDEX_ALIGNMENT * SHARED_INDEX_ALIGNMENT
+
+class EmbeddingIndex:
+    """Índice en memoria con una matriz contigua y pre-normalizada por familia de características.
+
+    Con precision float16/int8 el escaneo corre sobre los vectores comprimidos y los mejores
+    `rescore_candidates` se vuelven a puntuar con los vectores float32 que entrega
+    `exact_vectors(pet_id)` (los embeddings del store), así que el orden y los scores del
+    principio de la lista coinciden con los de float32.
+
+    Con load_shared las matrices son un mapeo copy-on-write de un archivo escrito por
+    save_shared: los workers que cargan el mismo archivo comparten sus páginas y sólo las
+    filas que cada uno modifica después pasan a ser privadas.
+
+    El backend ANN se (re)entrena en un hilo aparte: mientras tanto las búsquedas siguen con
+    el cuantizador anterior (o con el escaneo exacto si aún no hay uno) y el nuevo se instala
+    cuando está listo, re-asignando las filas que cambiaron durante el entrenamiento.
+    """
+
+    def __init__(self, families: List[str], initial_capacity: int = 256, precision: str = "float32",
+                 exact_vectors: Optional[Callable[[str], Optional[Dict[str, List[float]]]]] = None,
+                 rescore_candidates: int = 100):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Precisión de índice desconocida: {precision}")
+        self.families = list(families)
+        self.precision = precision
+        self._dtype = PRECISIONS[precision]
+        self.exact_vectors = exact_vectors
+        self.rescore_candidates = max(0, rescore_candidates)
+        self.pet_ids: List[str] = []
+        self.row_of: Dict[str, int] = {}
+        self.dims: Dict[str, int] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        # Escala por fila de cada familia (sólo int8): vector ≈ fila_int8 * escala
+        self._scales: Dict[str, np.ndarray] = {}
+        # Filas que tienen vector de cada familia: las ausentes no aparecen en scores_por_modelo
+        self._present: Dict[str, np.ndarray] = {}
+        self._capacity = max(1, initial_capacity)
+        self._lock = threading.RLock()
+        self.ann = None
+        # Entrenamiento ANN en segundo plano: hilo en curso, filas modificadas desde que empezó y
+        # generación (cambia al reemplazar las filas: el entrenamiento en curso queda descartado)
+        self._ann_trainer: Optional[threading.Thread] = None
+        self._ann_dirty: Optional[set] = None
+        self._ann_generation = 0
+        self.rescored = 0
+        # Archivo mapeado por load_shared (None = matrices privadas del proceso)
+        self.shared_path: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.pet_ids)
+
+    def __contains__(self, pet_id: str) -> bool:
+        return pet_id in self.row_of
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        """Convertir a float32 y normalizar L2 (los vectores nulos quedan en cero)"""
+        v = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(v)
+        if norm == 0 or not np.isfinite(norm):
+            return np.zeros_like(v)
+        return v / norm
+
+    def attach_ann(self, ann):
+        """Activar un backend ANN (por ejemplo IVFIndex) para preseleccionar candidatos"""
+        with self._lock:
+            self.ann = ann
+            self._reset_ann()
+            self._maybe_train_ann()
+
+    def _fused_rows(self, rows) -> np.ndarray:
+        return self.ann.fuse_rows(lambda family: self._dequantize(family, rows),
+                                  {family: self.dims[family] for family in self._matrices})
+
+    def _dequantize(self, family: str, rows) -> np.ndarray:
+        """Filas de una familia en float32 (copia si la matriz está comprimida)"""
+        matrix = self._matrices[family][rows]
+        if self.precision == "float32":
+            return matrix
+        values = matrix.astype(np.float32)
+        if self.precision == "int8":
+            values *= self._scales[family][rows][..., np.newaxis]
+        return values
+
+    def _maybe_train_ann(self):
+        n = len(self.pet_ids)
+        if self.ann is None:
+            return
+        if n == 0 or n < self.ann.min_pets:
+            self._reset_ann()
+        elif self.ann.needs_training(n) and self._ann_trainer is None:
+            self._ann_dirty = set()
+            self._ann_trainer = threading.Thread(target=self._train_ann, args=(self._ann_generation, n),
+                                                 name="ann-train", daemon=True)
+            self._ann_trainer.start()
+
+    def _reset_ann(self):
+        """Descartar el cuantizador y cualquier entrenamiento en curso (las filas van a cambiar)"""
+        self._ann_generation += 1
+        self._ann_trainer = None
+        self._ann_dirty = None
+        if self.ann is not None:
+            self.ann.reset()
+
+    def _train_ann(self, generation: int, n: int):
+        """Hilo de entrenamiento: el candado sólo se toma para copiar cada tramo de filas"""
+        ann = self.ann
+        stale = lambda: self._ann_generation != generation
+
+        def fused_rows(rows):
+            with self._lock:
+                return self._fused_rows(rows)
+
+        try:
+            centroids = ann.fit(fused_rows, n, stop=stale)
+            if centroids is None:
+                return
+            assign = np.empty(n, dtype=np.int32)
+            for start in range(0, n, ann.assign_chunk):
+                if stale():
+                    return
+                end = min(n, start + ann.assign_chunk)
+                assign[start:end] = ann.assign_rows(fused_rows(slice(start, end)), centroids)
+            with self._lock:
+                if stale():
+                    return
+                # Filas agregadas o modificadas después de copiar su tramo: se asignan con los centroides nuevos
+                size = len(self.pet_ids)
+                changed = sorted({row for row in self._ann_dirty if row < size} | set(range(min(n, size), size)))
+                assign = np.resize(assign, size)
+                if changed:
+                    assign[changed] = ann.assign_rows(self._fused_rows(np.asarray(changed)), centroids)
+                ann.install(centroids, assign, n)
+        except Exception as e:
+            logger.error(f"Error entrenando el índice ANN: {e}")
+        finally:
+            with self._lock:
+                if not stale():
+                    self._ann_trainer = None
+                    self._ann_dirty = None
+
+    def wait_ann_training(self, timeout: Optional[float] = None) -> bool:
+        """Esperar el entrenamiento ANN en curso (benchmarks y pruebas); True si no queda ninguno"""
+        trainer = self._ann_trainer
+        if trainer is not None:
+            trainer.join(timeout)
+        return self._ann_trainer is None
+
+    def _ensure_family(self, family: str, dim: int):
+        if family not in self._matrices:
+            self.dims[family] = dim
+            self._matrices[family] = np.zeros((self._capacity, dim), dtype=self._dtype)
+            self._present[family] = np.zeros(self._capacity, dtype=bool)
+            if self.precision == "int8":
+                self._scales[family] = np.zeros(self._capacity, dtype=np.float32)
+
+    def _grow(self, needed: int):
+        if needed <= self._capacity:
+            return
+        if self.shared_path is not None:
+            logger.info(f"El índice superó las filas libres de {self.shared_path}; matrices privadas hasta la próxima compactación")
+            self.shared_path = None
+        new_capacity = self._capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        for family, matrix in self._matrices.items():
+            grown = np.zeros((new_capacity, matrix.shape[1]), dtype=self._dtype)
+            grown[:len(self.pet_ids)] = matrix[:len(self.pet_ids)]
+            self._matrices[family] = grown
+        for family, scales in self._scales.items():
+            grown = np.zeros(new_capacity, dtype=np.float32)
+            grown[:len(self.pet_ids)] = scales[:len(self.pet_ids)]
+            self._scales[family] = grown
+        for family, present in self._present.items():
+            grown = np.zeros(new_capacity, dtype=bool)
+            grown[:len(self.pet_ids)] = present[:len(self.pet_ids)]
+            self._present[family] = grown
+        self._capacity = new_capacity
+
+    def _set_row(self, family: str, row: int, v: Optional[np.ndarray]):
+        """Guardar un vector normalizado en la precisión del índice (None = fila en cero y ausente)"""
+        self._present[family][row] = v is not None
+        if family in self._scales:
+            peak = float(np.max(np.abs(v))) if v is not None and v.size else 0.0
+            scale = peak / 127.0
+            self._scales[family][row] = scale
+            if scale == 0.0:
+                self._matrices[family][row] = 0
+            else:
+                self._matrices[family][row] = np.clip(np.rint(v / scale), -127, 127).astype(np.int8)
+        else:
+            self._matrices[family][row] = 0.0 if v is None else v
+
+    def _write_row(self, row: int, features: Dict[str, List[float]]):
+        for family in self.families:
+            vector = features.get(family)
+            if vector is None:
+                if family in self._matrices:
+                    self._set_row(family, row, None)
+                continue
+            v = self._normalize(vector)
+            self._ensure_family(family, v.shape[0])
+            if v.shape[0] != self.dims[family]:
+                # Embeddings de otra versión del extractor: se tratan como ausentes
+                logger.warning(f"Dimensión inesperada para {family}: {v.shape[0]} (esperada {self.dims[family]})")
+                self._set_row(family, row, None)
+                continue
+            self._set_row(family, row, v)
+
+    def upsert(self, pet_id: str, features: Dict[str, List[float]]):
+        """Agregar o reemplazar los vectores de una mascota"""
+        with self._lock:
+            row = self.row_of.get(pet_id)
+            if row is None:
+                row = len(self.pet_ids)
+                self._grow(row + 1)
+                self.pet_ids.append(pet_id)
+                self.row_of[pet_id] = row
+            self._write_row(row, features)
+            if self.ann is not None:
+                if self._ann_dirty is not None:
+                    self._ann_dirty.add(row)
+                if self.ann.ready:
+                    self.ann.add(row, self._fused_rows(row))
+                if self.ann.needs_training(len(self.pet_ids)):
+                    self._maybe_train_ann()
+
+    def remove(self, pet_id: str) -> bool:
+        """Eliminar una mascota moviendo la última fila a su posición"""
+        with self._lock:
+            row = self.row_of.pop(pet_id, None)
+            if row is None:
+                return False
+            last = len(self.pet_ids) - 1
+            if row != last:
+                moved_id = self.pet_ids[last]
+                self.pet_ids[row] = moved_id
+                self.row_of[moved_id] = row
+                for matrix in self._matrices.values():
+                    matrix[row] = matrix[last]
+                for scales in self._scales.values():
+                    scales[row] = scales[last]
+                for present in self._present.values():
+                    present[row] = present[last]
+                if self.ann is not None:
+                    self.ann.move(last, row)
+                    if self._ann_dirty is not None:
+                        self._ann_dirty.add(row)
+            self.pet_ids.pop()
+            for matrix in self._matrices.values():
+                matrix[last] = 0
+            for scales in self._scales.values():
+                scales[last] = 0.0
+            for present in self._present.values():
+                present[last] = False
+            return True
+
+    def rebuild(self, embeddings: Dict[str, Dict[str, List[float]]]):
+        """Reconstruir el índice completo a partir del diccionario de embeddings"""
+        with self._lock:
+            self.pet_ids = []
+            self.row_of = {}
+            self.dims = {}
+            self._matrices = {}
+            self._scales = {}
+            self._present = {}
+            self.shared_path = None
+            self._capacity = max(self._capacity, len(embeddings), 1)
+            self._reset_ann()
+            ann, self.ann = self.ann, None
+            for pet_id, features in embeddings.items():
+                self.upsert(pet_id, features)
+            self.ann = ann
+            self._maybe_train_ann()
+
+    def save_shared(self, path: str, snapshot_id: str, headroom: int = 0):
+        """Escribir las matrices en un archivo mapeable por todos los workers (tmp + os.replace).
+
+        Se reservan `headroom` filas libres para que los registros posteriores a la compactación
+        no obliguen a copiar la matriz completa a memoria privada. Si hay un cuantizador ANN
+        listo se guardan también sus centroides y asignaciones: los demás workers lo mapean en
+        lugar de re-entrenarlo.
+        """
+        with self._lock:
+            count = len(self.pet_ids)
+            capacity = max(1, count + max(0, headroom))
+            itemsize = np.dtype(self._dtype).itemsize
+            families_meta = []
+            offset = 0
+            for family, dim in self.dims.items():
+                meta = {"name": family, "dim": dim, "offset": offset}
+                offset = _page_align(offset + capacity * dim * itemsize)
+                if family in self._scales:
+                    meta["scales_offset"] = offset
+                    offset = _page_align(offset + capacity * 4)
+                meta["present_offset"] = offset
+                offset = _page_align(offset + capacity)
+                families_meta.append(meta)
+            ann_meta = None
+            if self.ann is not None and self.ann.ready:
+                centroids = self.ann.centroids
+                ann_meta = {"nlist": int(centroids.shape[0]), "width": int(centroids.shape[1]),
+                            "trained_size": self.ann.trained_size, "centroids_offset": offset}
+                offset = _page_align(offset + centroids.nbytes)
+                ann_meta["assign_offset"] = offset
+                offset = _page_align(offset + count * 4)
+            header = {
+                "snapshot_id": snapshot_id,
+                "precision": self.precision,
+                "count": count,
+                "capacity": capacity,
+                "families": families_meta,
+                "ann": ann_meta,
+                "pet_ids": self.pet_ids
+            }
+            header_bytes = json.dumps(header).encode('utf-8')
+            data_start = _page_align(len(SHARED_INDEX_MAGIC) + 8 + len(header_bytes))
+
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(SHARED_INDEX_MAGIC)
+                f.write(struct.pack('<II', SHARED_INDEX_FORMAT, len(header_bytes)))
+                f.write(header_bytes)
+                for meta in families_meta:
+                    f.seek(data_start + meta["offset"])
+                    f.write(np.ascontiguousarray(self._matrices[meta["name"]][:count]).tobytes())
+                    if "scales_offset" in meta:
+                        f.seek(data_start + meta["scales_offset"])
+                        f.write(np.ascontiguousarray(self._scales[meta["name"]][:count]).tobytes())
+                    f.seek(data_start + meta["present_offset"])
+                    f.write(np.ascontiguousarray(self._present[meta["name"]][:count]).tobytes())
+                if ann_meta is not None:
+                    f.seek(data_start + ann_meta["centroids_offset"])
+                    f.write(np.ascontiguousarray(centroids, dtype=np.float32).tobytes())
+                    f.seek(data_start + ann_meta["assign_offset"])
+                    f.write(np.ascontiguousarray(self.ann.assignments(count), dtype=np.int32).tobytes())
+                # Las filas libres quedan como huecos del archivo (ceros sin ocupar disco)
+                f.truncate(data_start + offset)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        logger.info(f"Índice compartido escrito: {count} mascotas (+{capacity - count} libres) en {path}")
+
+    def load_shared(self, path: str, snapshot_id: str) -> bool:
+        """Mapear el índice escrito por save_shared si corresponde al snapshot y la precisión actuales"""
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(SHARED_INDEX_MAGIC)) != SHARED_INDEX_MAGIC:
+                    raise ValueError("cabecera inválida")
+                fmt, header_len = struct.unpack('<II', f.read(8))
+                if fmt != SHARED_INDEX_FORMAT:
+                    raise ValueError(f"formato {fmt} no soportado")
+                header = json.loads(f.read(header_len).decode('utf-8'))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Índice compartido ilegible en {path}: {e}")
+            return False
+        if header["snapshot_id"] != snapshot_id or header["precision"] != self.precision:
+            return False
+
+        data_start = _page_align(len(SHARED_INDEX_MAGIC) + 8 + header_len)
+        capacity = header["capacity"]
+        matrices: Dict[str, np.ndarray] = {}
+        scales: Dict[str, np.ndarray] = {}
+        present: Dict[str, np.ndarray] = {}
+        dims: Dict[str, int] = {}
+        for meta in header["families"]:
+            family = meta["name"]
+            dims[family] = meta["dim"]
+            # mode='c': lectura compartida; una escritura copia sólo esa página al proceso
+            matrices[family] = np.memmap(path, dtype=self._dtype, mode='c',
+                                         offset=data_start + meta["offset"], shape=(capacity, meta["dim"]))
+            if "scales_offset" in meta:
+                scales[family] = np.memmap(path, dtype=np.float32, mode='c',
+                                           offset=data_start + meta["scales_offset"], shape=(capacity,))
+            if "present_offset" in meta:
+                present[family] = np.memmap(path, dtype=bool, mode='c',
+                                            offset=data_start + meta["present_offset"], shape=(capacity,))
+            else:
+                # Archivo anterior sin máscara: una fila en cero se toma como ausente
+                present[family] = np.zeros(capacity, dtype=bool)
+                present[family][:header["count"]] = matrices[family][:header["count"]].any(axis=1)
+        with self._lock:
+            pet_ids = header["pet_ids"][:header["count"]]
+            # Mismas filas (el worker que acaba de escribir el archivo): el ANN y su entrenamiento siguen valiendo
+            same_rows = pet_ids == self.pet_ids
+            self.pet_ids = pet_ids
+            self.row_of = {pet_id: row for row, pet_id in enumerate(self.pet_ids)}
+            self.dims = dims
+            self._matrices = matrices
+            self._scales = scales
+            self._present = present
+            self._capacity = capacity
+            self.shared_path = path
+            if self.ann is not None and not same_rows:
+                self._reset_ann()
+                self._load_shared_ann(path, data_start, header)
+                self._maybe_train_ann()
+        return True
+
+    def _load_shared_ann(self, path: str, data_start: int, header: Dict):
+        """Instalar el cuantizador guardado por save_shared si corresponde a este espacio fusionado"""
+        meta = header.get("ann")
+        width = sum(dim for family, dim in self.dims.items() if family in self.ann.weights)
+        if not meta or meta["width"] != width:
+            return
+        count = header["count"]
+        centroids = np.fromfile(path, dtype=np.float32, count=meta["nlist"] * meta["width"],
+                                offset=data_start + meta["centroids_offset"]).reshape(meta["nlist"], meta["width"])
+        assign = np.fromfile(path, dtype=np.int32, count=count, offset=data_start + meta["assign_offset"])
+        self.ann.install(centroids, assign, meta["trained_size"])
+
+    def family_matrix(self, family: str) -> Optional[np.ndarray]:
+        """Vista de las filas ocupadas de una familia (sin copia, en la precisión del índice)"""
+        matrix = self._matrices.get(family)
+        if matrix is None:
+            return None
+        return matrix[:len(self.pet_ids)]
+
+    def _normalized_query(self, query: Dict[str, List[float]], weights: Dict[str, float]) -> Dict[str, np.ndarray]:
+        normalized = {}
+        for family in weights:
+            if family not in query or family not in self._matrices:
+                continue
+            q = self._normalize(query[family])
+            if q.shape[0] != self.dims[family]:
+                logger.warning(f"Dimensión de consulta incompatible para {family}: {q.shape[0]}")
+                continue
+            normalized[family] = q
+        return normalized
+
+    def score(self, query: Dict[str, List[float]], weights: Dict[str, float], rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Puntuar la consulta contra todas las mascotas (o sólo `rows`): una multiplicación matriz-vector por familia"""
+        with self._lock:
+            n = len(self.pet_ids) if rows is None else len(rows)
+            fused = np.zeros(n, dtype=np.float32)
+            family_scores: Dict[str, np.ndarray] = {}
+            for family, q in self._normalized_query(query, weights).items():
+                weight = weights[family]
+                scores = self._family_scores(family, q, rows)
+                family_scores[family] = scores
+                fused += np.float32(weight) * scores
+            return fused, family_scores
+
+    def _family_scores(self, family: str, q: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        matrix = self.family_matrix(family)
+        if rows is not None:
+            matrix = matrix[rows]
+        if self.precision == "float32":
+            return matrix @ q
+        # Comprimido: se convierte a float32 por bloques para no duplicar la matriz entera
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        half = self.precision == "float16"
+        buffer = np.empty((min(SCAN_BLOCK_ROWS, matrix.shape[0]), matrix.shape[1]), dtype=np.int32 if half else np.float32)
+        q_scan = q * _F16_SCALE if half else q
+        for start in range(0, matrix.shape[0], SCAN_BLOCK_ROWS):
+            block = matrix[start:start + SCAN_BLOCK_ROWS]
+            converted = buffer[:block.shape[0]]
+            if half:
+                np.copyto(converted, block.view(np.int16))
+                converted <<= _F16_SHIFT
+                converted &= _F16_MASK
+                scores[start:start + block.shape[0]] = converted.view(np.float32) @ q_scan
+            else:
+                np.copyto(converted, block)
+                scores[start:start + block.shape[0]] = converted @ q_scan
+        if self.precision == "int8":
+            scales = self._scales[family][:len(self.pet_ids)]
+            scores *= scales if rows is None else scales[rows]
+        return scores
+
+    @staticmethod
+    def top_k_rows(fused: np.ndarray, top_k: Optional[int] = None) -> np.ndarray:
+        """Filas ordenadas por score descendente; selección parcial cuando top_k < n"""
+        n = fused.shape[0]
+        if top_k is None or top_k >= n:
+            return np.argsort(-fused, kind='stable')
+        if top_k <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.argpartition(-fused, top_k - 1)[:top_k]
+        return candidates[np.argsort(-fused[candidates], kind='stable')]
+
+    def search(self, query: Dict[str, List[float]], weights: Dict[str, float], top_k: Optional[int] = None) -> List[Tuple[str, float, Dict[str, float]]]:
+        """Devolver [(pet_id, score_final, scores_por_modelo)] ordenado de mayor a menor"""
+        with self._lock:
+            candidates = self._ann_candidates(query, weights)
+            fused, family_scores = self.score(query, weights, rows=candidates)
+            if self.precision != "float32" and self.exact_vectors is not None and self.rescore_candidates:
+                order = self._rescore(query, weights, candidates, fused, family_scores, top_k)
+            else:
+                order = self.top_k_rows(fused, top_k)
+            results = []
+            for row in order:
+                index_row = row if candidates is None else candidates[row]
+                results.append((
+                    self.pet_ids[index_row],
+                    float(fused[row]),
+                    {family: float(scores[row]) for family, scores in family_scores.items()
+                     if self._present[family][index_row]}
+                ))
+            return results
+
+    def _rescore(self, query: Dict[str, List[float]], weights: Dict[str, float], candidates: Optional[np.ndarray],
+                 fused: np.ndarray, family_scores: Dict[str, np.ndarray], top_k: Optional[int]) -> np.ndarray:
+        """Re-puntuar en float32 los mejores candidatos del escaneo comprimido (modifica fused y family_scores).
+
+        Devuelve el orden final: los re-puntuados por score exacto y, si se piden más, el resto
+        por su score comprimido.
+        """
+        n = fused.shape[0]
+        depth = min(n, max(top_k or 0, self.rescore_candidates))
+        shortlist = self.top_k_rows(fused, depth)
+        normalized = self._normalized_query(query, weights)
+        exact = [self.exact_vectors(self.pet_ids[row if candidates is None else candidates[row]]) or {} for row in shortlist]
+        for family, q in normalized.items():
+            present = [i for i, vectors in enumerate(exact)
+                       if vectors.get(family) is not None and len(vectors[family]) == q.shape[0]]
+            if not present:
+                continue
+            stacked = np.asarray([exact[i][family] for i in present], dtype=np.float32)
+            norms = np.linalg.norm(stacked, axis=1, keepdims=True)
+            valid = (norms > 0) & np.isfinite(norms)
+            stacked = np.where(valid, stacked / np.where(valid, norms, 1), 0)
+            family_scores[family][shortlist[present]] = stacked @ q
+        fused[shortlist] = 0
+        for family in normalized:
+            fused[shortlist] += np.float32(weights[family]) * family_scores[family][shortlist]
+        self.rescored += len(shortlist)
+        order = shortlist[np.argsort(-fused[shortlist], kind='stable')]
+        if top_k is not None and top_k <= depth:
+            return order[:top_k]
+        rest = np.ones(n, dtype=bool)
+        rest[shortlist] = False
+        rest_rows = np.flatnonzero(rest)
+        rest_order = rest_rows[self.top_k_rows(fused[rest_rows], None if top_k is None else top_k - depth)]
+        return np.concatenate([order, rest_order])
+
+    def _ann_candidates(self, query: Dict[str, List[float]], weights: Dict[str, float]) -> Optional[np.ndarray]:
+        """Filas preseleccionadas por el backend ANN, o None para un escaneo exacto"""
+        if self.ann is None or not self.ann.ready or len(self.pet_ids) < self.ann.min_pets:
+            return None
+        normalized = self._normalized_query(query, weights)
+        if set(normalized) != set(self._matrices):
+            # Consulta incompleta (p. ej. características tradicionales): escaneo exacto
+            return None
+        return self.ann.candidate_rows(self.ann.fuse(normalized), len(self.pet_ids))
+
+    def memory_bytes(self) -> int:
+        return int(sum(m.nbytes for m in self._matrices.values()) + sum(s.nbytes for s in self._scales.values()))
+
+    def bytes_per_pet(self) -> float:
+        """Bytes de matriz por mascota (sin contar la capacidad libre)"""
+        row_bytes = sum(dim * np.dtype(self._dtype).itemsize for dim in self.dims.values())
+        return float(row_bytes + 4 * len(self._scales))
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self.pet_ids),
+            "dims": dict(self.dims),
+            "precision": self.precision,
+            "bytes_per_pet": self.bytes_per_pet(),
+            "rescore_candidates": self.rescore_candidates if self.precision != "float32" else 0,
+            "rescored": self.rescored,
+            "memory_bytes": self.memory_bytes(),
+            "shared_path": self.shared_path,
+            "ann": self.ann.stats() if self.ann is not None else None
+        }
@@ -0,0 +1,552 @@
+import numpy as np
+import os
+import json
+import mmap
+import struct
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+import logging
+
+try:
+    import fcntl
+except ImportError:  # sin flock (Windows) el store sólo es seguro dentro de un proceso
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Familia usada para modelos que guardan un único vector plano (SimpleNoseModel)
+FLAT_FAMILY = "_"
+
+SNAPSHOT_MAGIC = b"NOSESNAP"
+SNAPSHOT_FORMAT = 1
+ALIGNMENT = 64
+
+OP_PUT = 1
+OP_DELETE = 2
+
+# Versión de los embeddings migrados del JSON heredado: los generó el extractor anterior a los
+# artefactos versionados, así que nunca coinciden con la versión actual y cuentan como obsoletos
+LEGACY_VERSION = "legacy"
+
+_RECORD_HEADER = struct.Struct('<II')  # longitud del payload, crc32
+
+# Archivo de generación: época (cambia al compactar o reemplazar los archivos) y número de escrituras
+_GENERATION = struct.Struct('<QQ')
+
+# Cambios pendientes de otro proceso: pet_id -> vectores (None = borrado)
+Changes = Dict[str, Optional[Union[Dict[str, np.ndarray], np.ndarray]]]
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _pack_str(value: str) -> bytes:
+    raw = value.encode('utf-8')
+    return struct.pack('<H', len(raw)) + raw
+
+def _unpack_str(buf: memoryview, pos: int) -> Tuple[str, int]:
+    (length,) = struct.unpack_from('<H', buf, pos)
+    pos += 2
+    return bytes(buf[pos:pos + length]).decode('utf-8'), pos + length
+
+class GenerationCounter:
+    """Dos enteros en un archivo mapeado (MAP_SHARED) que todos los workers leen sin syscalls.
+
+    `epoch` cambia cuando el snapshot o el log se reemplazan (hay que recargar todo) y
+    `writes` con cada escritura al log (basta leer el final del log). Sólo se modifican con
+    el candado de escritura del store tomado.
+    """
+
+    def __init__(self, path: str):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < _GENERATION.size:
+                os.ftruncate(fd, _GENERATION.size)
+            self._map = mmap.mmap(fd, _GENERATION.size)
+        finally:
+            os.close(fd)
+
+    def read(self) -> Tuple[int, int]:
+        return _GENERATION.unpack_from(self._map, 0)
+
+    def bump_writes(self):
+        epoch, writes = self.read()
+        _GENERATION.pack_into(self._map, 0, epoch, writes + 1)
+
+    def bump_epoch(self):
+        epoch, writes = self.read()
+        _GENERATION.pack_into(self._map, 0, epoch + 1, writes + 1)
+
+class EmbeddingStore:
+    """Almacén de embeddings: log binario append-only + snapshot compactado y mapeable en memoria.
+
+    Cada registro del log lleva el pet_id, la versión del modelo y un vector float32 por familia.
+    El snapshot se escribe en un archivo temporal y se publica con os.replace, y un registro
+    incompleto al final del log (caída a mitad de escritura) se descarta al cargar.
+
+    Varios procesos (workers de uvicorn) pueden compartir los mismos archivos: las escrituras
+    toman un flock, el contador de generación avisa de cambios y pending_changes() lee sólo
+    lo que otros agregaron al log desde la última lectura.
+    """
+
+    def __init__(self, base_path: str, model_version: str = "", compact_every: int = 1000):
+        base, ext = os.path.splitext(base_path)
+        self.base_path = base if ext == '.json' else base_path
+        self.json_path = base_path if ext == '.json' else base_path + '.json'
+        self.snapshot_path = self.base_path + '.snapshot'
+        self.log_path = self.base_path + '.log'
+        # Índice normalizado que los workers mapean en memoria (lo escribe EmbeddingIndex.save_shared)
+        self.index_path = self.base_path + '.index'
+        self.lock_path = self.base_path + '.lock'
+        self.generation_path = self.base_path + '.gen'
+        self.model_version = model_version
+        self.compact_every = compact_every
+        self.versions: Dict[str, str] = {}
+        self.log_records = 0
+        # Identificador del snapshot cargado/escrito (el índice compartido debe corresponder a él)
+        self.snapshot_id: Optional[str] = None
+        # pet_ids del log aplicados sobre el snapshot en la última carga
+        self.log_pet_ids: List[str] = []
+        self._log_offset = 0
+        self._seen: Tuple[int, int] = (0, 0)
+        self._pending: Dict[str, Optional[Dict[str, np.ndarray]]] = {}
+        self._generation: Optional[GenerationCounter] = None
+        self._lock = threading.Lock()
+        self._log_file = None
+
+    # ---------------------------------------------------------- entre procesos
+
+    def _counter(self) -> GenerationCounter:
+        if self._generation is None:
+            directory = os.path.dirname(self.generation_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._generation = GenerationCounter(self.generation_path)
+        return self._generation
+
+    @contextmanager
+    def _exclusive(self):
+        """Candado del hilo + flock del archivo .lock (excluye a los otros workers)"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(self.lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.lock_path, 'a+b') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def changed(self) -> bool:
+        """¿Otro proceso escribió desde la última lectura? Sólo lee memoria compartida"""
+        return bool(self._pending) or self._counter().read() != self._seen
+
+    def pending_changes(self) -> Optional[Changes]:
+        """Registros que otros workers agregaron al log desde la última lectura, o None si hay que recargar todo.
+
+        None significa que cambió la época: se compactó o se reemplazaron los archivos.
+        """
+        with self._lock:
+            current = self._counter().read()
+            if current[0] != self._seen[0]:
+                self._pending = {}
+                return None
+            changes = self._collect_changes_locked()
+            self._seen = current
+            return changes
+
+    def _collect_changes_locked(self) -> Changes:
+        """Cambios leídos durante escrituras propias + los registros nuevos al final del log"""
+        changes = self._pending
+        self._pending = {}
+        changes.update(self._read_tail_locked())
+        return {pet_id: None if features is None else self._to_public(features) for pet_id, features in changes.items()}
+
+    def _read_tail_locked(self) -> Dict[str, Optional[Dict[str, np.ndarray]]]:
+        """Aplicar los registros completos del log a partir de _log_offset (sin truncar: otro proceso puede estar escribiendo)"""
+        changes: Dict[str, Optional[Dict[str, np.ndarray]]] = {}
+        if not os.path.exists(self.log_path):
+            return changes
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        records: Dict[str, Dict[str, np.ndarray]] = {}
+        pos = self._scan_records(memoryview(data), records, changes)
+        self._log_offset += pos
+        return changes
+
+    def replace_from(self, source: "EmbeddingStore", keep_missing: bool = True,
+                     known_ids: Optional[Set[str]] = None) -> int:
+        """Publicar los archivos de otro store (p. ej. el staging de regenerate_embeddings.py) con os.replace.
+
+        Se hace con el candado de escritura tomado y cambiando la época, así los workers en
+        vivo no escriben en el log viejo y recargan todo en su próxima sincronización. Con
+        keep_missing, antes de publicar se agregan al log de `source` (con su versión original)
+        las mascotas en vivo que no están en él, p. ej. las registradas por /register-embedding
+        durante una reconstrucción de horas. Con `known_ids` (las mascotas que existen hoy en el
+        pet-service) sólo se conservan las que están ahí: las eliminadas no vuelven al índice.
+        Devuelve cuántas se conservaron.
+        """
+        with self._exclusive():
+            kept = self._merge_missing_locked(source, known_ids) if keep_missing else 0
+            os.replace(source.snapshot_path, self.snapshot_path)
+            if os.path.exists(source.index_path):
+                os.replace(source.index_path, self.index_path)
+            elif os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.replace(source.log_path, self.log_path)
+            self._counter().bump_epoch()
+        return kept
+
+    def _merge_missing_locked(self, source: "EmbeddingStore", known_ids: Optional[Set[str]]) -> int:
+        live = self._read_records_locked()
+        with source._exclusive():
+            staged = source._read_records_locked()
+            missing = [pet_id for pet_id in live if pet_id not in staged]
+            kept = [pet_id for pet_id in missing if known_ids is None or pet_id in known_ids]
+            if kept:
+                source._append_locked([source._encode_put(pet_id, live[pet_id], self.versions[pet_id])
+                                       for pet_id in kept])
+        if kept:
+            logger.info(f"{len(kept)} mascotas de {self.snapshot_path} que no están en {source.snapshot_path} se conservan")
+        if len(kept) < len(missing):
+            logger.info(f"{len(missing) - len(kept)} mascotas eliminadas del pet-service se quitan de {self.snapshot_path}")
+        return len(kept)
+
+    # ------------------------------------------------------------------ lectura
+
+    def load(self) -> Dict[str, Union[Dict[str, np.ndarray], np.ndarray]]:
+        """Cargar snapshot + log; migra el JSON heredado la primera vez.
+
+        Los vectores del snapshot son vistas de un mapeo de sólo lectura: todos los workers
+        comparten esas páginas.
+        """
+        with self._exclusive():
+            self._seen = self._counter().read()
+            self._pending = {}
+            # El log pudo ser reemplazado (p. ej. por regenerate_embeddings.py): reabrirlo en la próxima escritura
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            if not os.path.exists(self.snapshot_path) and not os.path.exists(self.log_path) \
+                    and os.path.exists(self.json_path):
+                self._migrate_json_locked()
+            records = self._read_records_locked()
+            return {pet_id: self._to_public(features) for pet_id, features in records.items()}
+
+    def _read_records_locked(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """Snapshot + log por familia (y self.versions) con el candado de escritura tomado"""
+        records: Dict[str, Dict[str, np.ndarray]] = {}
+        self.versions = {}
+        self.snapshot_id = None
+        if os.path.exists(self.snapshot_path):
+            self._read_snapshot(records)
+        self.log_records = 0
+        self.log_pet_ids = []
+        self._log_offset = 0
+        if os.path.exists(self.log_path):
+            self._replay_log(records)
+        return records
+
+    @staticmethod
+    def _to_public(features: Dict[str, np.ndarray]):
+        if set(features) == {FLAT_FAMILY}:
+            return features[FLAT_FAMILY]
+        return features
+
+    def _read_snapshot(self, records: Dict[str, Dict[str, np.ndarray]]):
+        with open(self.snapshot_path, 'rb') as f:
+            magic = f.read(len(SNAPSHOT_MAGIC))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Snapshot inválido: {self.snapshot_path}")
+            fmt, header_len = struct.unpack('<II', f.read(8))
+            if fmt != SNAPSHOT_FORMAT:
+                raise ValueError(f"Formato de snapshot no soportado: {fmt}")
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        self.snapshot_id = header.get('snapshot_id')
+        count = header['count']
+        data_start = header['data_start']
+        pet_ids = header['pet_ids']
+        for pet_id, version in zip(pet_ids, header['versions']):
+            records[pet_id] = {}
+            self.versions[pet_id] = version
+        for family in header['families']:
+            lengths = np.memmap(self.snapshot_path, dtype=np.int32, mode='r',
+                                offset=data_start + family['lengths_offset'], shape=(count,))
+            matrix = np.memmap(self.snapshot_path, dtype=np.float32, mode='r',
+                               offset=data_start + family['offset'], shape=(count, family['width']))
+            for row in np.flatnonzero(lengths):
+                records[pet_ids[row]][family['name']] = matrix[row, :lengths[row]]
+        logger.info(f"Snapshot cargado: {count} embeddings desde {self.snapshot_path}")
+
+    def _replay_log(self, records: Dict[str, Dict[str, np.ndarray]]):
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        changes: Dict[str, Optional[Dict[str, np.ndarray]]] = {}
+        pos = self._scan_records(memoryview(data), records, changes)
+        self.log_pet_ids = list(changes)
+        self._log_offset = pos
+        if pos < len(data):
+            # Con el flock tomado ningún otro worker está escribiendo: es una escritura interrumpida
+            logger.warning(f"Registro incompleto al final de {self.log_path}; truncando {len(data) - pos} bytes")
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(pos)
+
+    def _scan_records(self, buf: memoryview, records: Dict[str, Dict[str, np.ndarray]],
+                      changes: Dict[str, Optional[Dict[str, np.ndarray]]]) -> int:
+        """Aplicar los registros completos de buf; devuelve dónde termina el último válido"""
+        pos = 0
+        while pos + _RECORD_HEADER.size <= len(buf):
+            length, crc = _RECORD_HEADER.unpack_from(buf, pos)
+            start = pos + _RECORD_HEADER.size
+            payload = buf[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            pet_id = self._apply(payload, records)
+            changes[pet_id] = records.get(pet_id)
+            self.log_records += 1
+            pos = start + length
+        return pos
+
+    def _apply(self, payload: memoryview, records: Dict[str, Dict[str, np.ndarray]]) -> str:
+        op = payload[0]
+        pet_id, pos = _unpack_str(payload, 1)
+        if op == OP_DELETE:
+            records.pop(pet_id, None)
+            self.versions.pop(pet_id, None)
+            return pet_id
+        version, pos = _unpack_str(payload, pos)
+        (n_families,) = struct.unpack_from('<H', payload, pos)
+        pos += 2
+        features = {}
+        for _ in range(n_families):
+            name, pos = _unpack_str(payload, pos)
+            (dim,) = struct.unpack_from('<I', payload, pos)
+            pos += 4
+            features[name] = np.frombuffer(payload, dtype=np.float32, count=dim, offset=pos).copy()
+            pos += 4 * dim
+        records[pet_id] = features
+        self.versions[pet_id] = version
+        return pet_id
+
+    # ---------------------------------------------------------------- escritura
+
+    @staticmethod
+    def _as_families(value) -> Dict[str, np.ndarray]:
+        if isinstance(value, dict):
+            return {name: np.asarray(vector, dtype=np.float32).ravel() for name, vector in value.items()}
+        return {FLAT_FAMILY: np.asarray(value, dtype=np.float32).ravel()}
+
+    def _encode_put(self, pet_id: str, value, version: str) -> bytes:
+        families = self._as_families(value)
+        parts = [struct.pack('<B', OP_PUT), _pack_str(pet_id), _pack_str(version),
+                 struct.pack('<H', len(families))]
+        for name, vector in families.items():
+            parts.append(_pack_str(name))
+            parts.append(struct.pack('<I', vector.shape[0]))
+            parts.append(vector.astype('<f4', copy=False).tobytes())
+        return b''.join(parts)
+
+    def _append_locked(self, payloads: List[bytes]):
+        # Al día con la época: leer antes lo que agregaron otros workers para que el offset
+        # quede al final del log y los registros propios no se vuelvan a leer
+        caught_up = self._counter().read()[0] == self._seen[0]
+        if caught_up:
+            self._pending.update(self._read_tail_locked())
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > self._log_offset:
+                # Con el flock tomado nadie está escribiendo: es una escritura interrumpida
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(self._log_offset)
+        # Otro worker pudo compactar y reemplazar el log: escribir en el archivo nuevo, no en el desvinculado
+        if self._log_file is not None and not self._same_file(self._log_file, self.log_path):
+            self._log_file.close()
+            self._log_file = None
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'ab')
+        chunk = b''.join(_RECORD_HEADER.pack(len(p), zlib.crc32(p)) + p for p in payloads)
+        self._log_file.write(chunk)
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+        self.log_records += len(payloads)
+        self._counter().bump_writes()
+        if caught_up:
+            self._log_offset += len(chunk)
+            self._seen = self._counter().read()
+
+    @staticmethod
+    def _same_file(handle, path: str) -> bool:
+        try:
+            return os.fstat(handle.fileno()).st_ino == os.stat(path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def put(self, pet_id: str, value, version: Optional[str] = None):
+        """Agregar (o reemplazar) el embedding de una mascota con una sola escritura al log"""
+        self.put_many([(pet_id, value)], version=version)
+
+    def put_many(self, items: List[Tuple[str, object]], version: Optional[str] = None):
+        """Agregar varios embeddings en una única escritura + fsync"""
+        version = self.model_version if version is None else version
+        with self._exclusive():
+            self._append_locked([self._encode_put(pet_id, value, version) for pet_id, value in items])
+            for pet_id, _ in items:
+                self.versions[pet_id] = version
+
+    def delete(self, pet_id: str):
+        with self._exclusive():
+            self._append_locked([struct.pack('<B', OP_DELETE) + _pack_str(pet_id)])
+            self.versions.pop(pet_id, None)
+
+    def should_compact(self) -> bool:
+        return self.compact_every > 0 and self.log_records >= self.compact_every
+
+    def compact(self, embeddings: Dict[str, object], apply_changes: Optional[Callable[[Changes], None]] = None,
+                publish: Optional[Callable[[], None]] = None) -> bool:
+        """Escribir un snapshot completo de forma atómica y vaciar el log.
+
+        Antes se incorpora lo que otros workers agregaron al log (con apply_changes o directamente
+        en `embeddings`), así la compactación no pierde sus registros. `publish` corre con el
+        snapshot nuevo ya escrito y antes de vaciar el log (p. ej. para escribir el índice compartido).
+        Si otro worker compactó desde la última carga no se hace nada (devuelve False): estos
+        embeddings no incluyen lo que ya está en su snapshot. Tras escribirlo, los vectores de
+        `embeddings` pasan a ser vistas del snapshot mapeado en lugar de copias privadas.
+        """
+        with self._exclusive():
+            if self._counter().read()[0] != self._seen[0]:
+                logger.info(f"Otro worker ya compactó {self.snapshot_path}; se recargará en la próxima sincronización")
+                return False
+            changes = self._collect_changes_locked()
+            if apply_changes is not None:
+                apply_changes(changes)
+            else:
+                for pet_id, value in changes.items():
+                    if value is None:
+                        embeddings.pop(pet_id, None)
+                    else:
+                        embeddings[pet_id] = value
+            self._write_snapshot_locked(embeddings)
+            self._map_snapshot_locked(embeddings)
+            if publish is not None:
+                publish()
+            self._reset_log_locked()
+            # Los demás workers recargan el snapshot nuevo en su próxima sincronización
+            self._counter().bump_epoch()
+            self._seen = self._counter().read()
+        logger.info(f"Snapshot compactado: {len(embeddings)} embeddings en {self.snapshot_path}")
+        return True
+
+    def _write_snapshot_locked(self, embeddings: Dict[str, object]):
+        pet_ids = list(embeddings.keys())
+        count = len(pet_ids)
+        per_pet = [self._as_families(embeddings[pet_id]) for pet_id in pet_ids]
+        widths: Dict[str, int] = {}
+        for families in per_pet:
+            for name, vector in families.items():
+                widths[name] = max(widths.get(name, 0), vector.shape[0])
+
+        families_meta = []
+        offset = 0
+        for name, width in widths.items():
+            lengths_offset = offset
+            offset = _align(offset + 4 * count)
+            families_meta.append({"name": name, "width": width, "lengths_offset": lengths_offset, "offset": offset})
+            offset = _align(offset + 4 * count * width)
+
+        snapshot_id = uuid.uuid4().hex
+        header = {
+            "snapshot_id": snapshot_id,
+            "count": count,
+            "pet_ids": pet_ids,
+            "versions": [self.versions.get(pet_id, self.model_version) for pet_id in pet_ids],
+            "families": families_meta
+        }
+        # data_start depende del tamaño del header; se itera hasta que sea estable
+        data_start = 0
+        while True:
+            header["data_start"] = data_start
+            header_bytes = json.dumps(header).encode('utf-8')
+            needed = _align(len(SNAPSHOT_MAGIC) + 8 + len(header_bytes))
+            if needed == data_start:
+                break
+            data_start = needed
+
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack('<II', SNAPSHOT_FORMAT, len(header_bytes)))
+            f.write(header_bytes)
+            for meta in families_meta:
+                lengths = np.zeros(count, dtype='<i4')
+                matrix = np.zeros((count, meta['width']), dtype='<f4')
+                for row, families in enumerate(per_pet):
+                    vector = families.get(meta['name'])
+                    if vector is not None:
+                        lengths[row] = vector.shape[0]
+                        matrix[row, :vector.shape[0]] = vector
+                f.seek(data_start + meta['lengths_offset'])
+                f.write(lengths.tobytes())
+                f.seek(data_start + meta['offset'])
+                f.write(matrix.tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.snapshot_id = snapshot_id
+
+    def _map_snapshot_locked(self, embeddings: Dict[str, object]):
+        """Cambiar los vectores de `embeddings` por vistas del snapshot recién escrito"""
+        records: Dict[str, Dict[str, np.ndarray]] = {}
+        self._read_snapshot(records)
+        for pet_id, features in records.items():
+            embeddings[pet_id] = self._to_public(features)
+
+    def _reset_log_locked(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        tmp_path = self.log_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_path)
+        self.log_records = 0
+        self.log_pet_ids = []
+        self._log_offset = 0
+
+    # ---------------------------------------------------------------- migración
+
+    def _migrate_json_locked(self):
+        with open(self.json_path, 'r') as f:
+            embeddings = json.load(f)
+        self.versions = {pet_id: LEGACY_VERSION for pet_id in embeddings}
+        self._write_snapshot_locked(embeddings)
+        os.replace(self.json_path, self.json_path + '.migrated')
+        logger.info(f"Migrados {len(embeddings)} embeddings de {self.json_path} a {self.snapshot_path}")
+
+    def migrate_from_json(self) -> bool:
+        """Migración única desde el archivo JSON heredado (no hace nada si ya existe el store)"""
+        with self._exclusive():
+            if not os.path.exists(self.json_path):
+                return False
+            if os.path.exists(self.snapshot_path) or os.path.exists(self.log_path):
+                logger.warning(f"{self.snapshot_path} ya existe; se omite la migración de {self.json_path}")
+                return False
+            self._migrate_json_locked()
+            return True
+
+    def stats(self) -> Dict:
+        return {
+            "snapshot_path": self.snapshot_path,
+            "snapshot_bytes": os.path.getsize(self.snapshot_path) if os.path.exists(self.snapshot_path) else 0,
+            "log_bytes": os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0,
+            "log_records": self.log_records,
+            "compact_every": self.compact_every,
+            "snapshot_id": self.snapshot_id,
+            "generation": list(self._counter().read())
+        }
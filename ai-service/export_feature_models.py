@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Exportar una vez los extractores completos (backbones + cabezas) a un artefacto versionado con checksum.
+
+Con --onnx / --tflite también se exportan los extractores de huella nasal (backbone + pooling +
+cabeza de cada familia) para los backends INFERENCE_BACKEND=onnx|tflite, en las variantes pedidas:
+fp32, dynamic (pesos int8, activaciones float) e int8 (cuantización completa calibrada con
+imágenes de nariz). ONNX requiere tf2onnx y onnxruntime sólo en la máquina que exporta.
+
+Uso:
+    python export_feature_models.py            # versión de Config.MODEL_ARTIFACT_VERSION
+    python export_feature_models.py v2 --force
+    python export_feature_models.py --runtime-only --onnx --tflite --variants fp32 dynamic int8 --calibration-dir fotos_nariz/
+"""
+
+import argparse
+import tempfile
+import os
+import logging
+from typing import Iterator, List
+
+import cv2
+import numpy as np
+
+from config import Config
+from feature_artifacts import FeatureArtifacts
+from image_pipeline import DecodedImage
+from inference_backends import BACKEND_VARIANTS, RUNTIME_EXTENSIONS, record_runtime_files, runtime_rel_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def calibration_images(directory: str, samples: int) -> List[DecodedImage]:
+    """Imágenes de nariz para calibrar int8 (sintéticas si no se indica un directorio)"""
+    images = []
+    if directory:
+        for name in sorted(os.listdir(directory))[:samples]:
+            with open(os.path.join(directory, name), 'rb') as f:
+                try:
+                    images.append(DecodedImage(f.read()))
+                except ValueError:
+                    logger.warning(f"Imagen de calibración ilegible: {name}")
+    if not images:
+        from benchmarks.enhancement_parity import synthetic_nose
+        rng = np.random.default_rng(0)
+        for _ in range(samples):
+            _, encoded = cv2.imencode('.jpg', synthetic_nose(480, 640, rng))
+            images.append(DecodedImage(encoded.tobytes()))
+    return images
+
+def fused_extractor(registry, head, family: str):
+    """Modelo Keras único: imagen preprocesada (N, 224, 224, 3) -> salida de la cabeza (N, D)"""
+    import tensorflow as tf
+    inputs = tf.keras.Input(shape=(224, 224, 3), name="input")
+    return tf.keras.Model(inputs, head(registry.get(family)(inputs)), name=f"nose_print_{family}")
+
+def export_onnx(model, path: str, variant: str, calibration: List[np.ndarray]):
+    import tensorflow as tf
+    try:
+        import tf2onnx
+        from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_dynamic, quantize_static
+    except ImportError as e:
+        raise SystemExit(f"Exportar a ONNX requiere tf2onnx y onnxruntime ({e})")
+
+    signature = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+    if variant == "fp32":
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=17, output_path=path)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "model.onnx")
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=17, output_path=fp32_path)
+        if variant == "dynamic":
+            quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+            return
+
+        class NoseCalibration(CalibrationDataReader):
+            def __init__(self):
+                self._batches = iter(calibration)
+
+            def get_next(self):
+                batch = next(self._batches, None)
+                return None if batch is None else {"input": batch}
+
+        quantize_static(fp32_path, path, NoseCalibration(), per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+def export_tflite(model, path: str, variant: str, calibration: List[np.ndarray]):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "int8":
+        def representative_dataset() -> Iterator[List[np.ndarray]]:
+            for batch in calibration:
+                yield [batch]
+        converter.representative_dataset = representative_dataset
+        # Operaciones int8; entrada y salida siguen en float32 para no cambiar el preprocesamiento
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+def export_runtime(artifacts: FeatureArtifacts, nose_print, backends: List[str], variants: List[str], calibration_dir: str, samples: int):
+    """Exportar los extractores de huella nasal a runtime/ dentro del artefacto y registrar sus checksums"""
+    from backbone_registry import get_backbone_registry
+    registry = get_backbone_registry()
+    calibration = []
+    if "int8" in variants:
+        for img in calibration_images(calibration_dir, samples):
+            calibration.append(nose_print.preprocess_nose_image(img))
+    exported = []
+    for family, head in nose_print.feature_models.items():
+        model = fused_extractor(registry, head, family)
+        family_calibration = [inputs[family] for inputs in calibration]
+        for backend in backends:
+            exporter = export_onnx if backend == "onnx" else export_tflite
+            for variant in variants:
+                rel_path = runtime_rel_path(backend, f"{nose_print.ARTIFACT_PREFIX}/{family}", variant)
+                path = os.path.join(artifacts.path, rel_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                exporter(model, path, variant, family_calibration)
+                exported.append(rel_path)
+                print(f"  {rel_path}: {os.path.getsize(path) / 1e6:.1f} MB")
+    record_runtime_files(artifacts.path, exported, artifacts.tag)
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Exportar artefactos de los extractores de características")
+    parser.add_argument("version", nargs="?", default=Config.MODEL_ARTIFACT_VERSION)
+    parser.add_argument("--force", action="store_true", help="Sobrescribir un artefacto existente")
+    parser.add_argument("--runtime-only", action="store_true", help="Usar el artefacto existente y sólo exportar ONNX/TFLite")
+    parser.add_argument("--onnx", action="store_true", help="Exportar los extractores de huella nasal a ONNX")
+    parser.add_argument("--tflite", action="store_true", help="Exportar los extractores de huella nasal a TFLite")
+    parser.add_argument("--variants", nargs="+", choices=BACKEND_VARIANTS, default=["fp32"])
+    parser.add_argument("--calibration-dir", default="", help="Imágenes de nariz para calibrar int8 (sintéticas si se omite)")
+    parser.add_argument("--calibration-samples", type=int, default=64)
+    args = parser.parse_args()
+    backends = [backend for backend in RUNTIME_EXTENSIONS if getattr(args, backend)]
+    if args.runtime_only and not backends:
+        parser.error("--runtime-only requiere --onnx y/o --tflite")
+
+    # Importar después de parsear: los modelos cargan TensorFlow
+    from backbone_registry import get_backbone_registry
+    from feature_artifacts import get_feature_artifacts
+    from nose_print_model import NosePrintModel
+    from advanced_nose_model import AdvancedNoseModel
+    from simple_nose_model import SimpleNoseModel
+
+    if args.runtime_only:
+        # Las cabezas y backbones se cargan del artefacto verificado que se va a extender
+        artifacts = get_feature_artifacts()
+        if not artifacts.available or artifacts.version != args.version:
+            raise SystemExit(f"No hay un artefacto {args.version} cargable en {Config.MODEL_ARTIFACTS_DIR} (MODEL_ARTIFACT_VERSION)")
+        with tempfile.TemporaryDirectory() as tmp:
+            nose_print = NosePrintModel(os.path.join(tmp, "nose_print_embeddings.json"), backend="keras")
+        export_runtime(artifacts, nose_print, backends, args.variants, args.calibration_dir, args.calibration_samples)
+        print(f"✅ Modelos de runtime exportados en {artifacts.path} ({artifacts.tag})")
+        return
+
+    # Registros vacíos en un directorio temporal para no tocar los embeddings reales
+    with tempfile.TemporaryDirectory() as tmp:
+        nose_print = NosePrintModel(os.path.join(tmp, "nose_print_embeddings.json"), backend="keras")
+        advanced = AdvancedNoseModel(os.path.join(tmp, "advanced_embeddings.json"))
+        simple = SimpleNoseModel(os.path.join(tmp, "embeddings.json"))
+
+    heads = {}
+    for model in (nose_print, advanced):
+        for name, head in model.feature_models.items():
+            heads[f"{model.ARTIFACT_PREFIX}/{name}"] = head
+    if simple.feature_extractor is not None:
+        heads[f"{simple.ARTIFACT_PREFIX}/mobilenet"] = simple.feature_extractor
+
+    registry = get_backbone_registry()
+    backbones = {name: registry.get(name) for name in ('mobilenet', 'efficientnet')}
+
+    artifacts = FeatureArtifacts(Config.MODEL_ARTIFACTS_DIR, args.version, load=False)
+    path = artifacts.export(backbones, heads, force=args.force)
+    print(f"✅ Artefacto {artifacts.tag} exportado en {path}")
+    if backends:
+        export_runtime(artifacts, nose_print, backends, args.variants, args.calibration_dir, args.calibration_samples)
+        print(f"✅ Modelos de runtime exportados en {path}")
+
+if __name__ == "__main__":
+    main()
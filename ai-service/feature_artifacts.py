@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, Optional
+import logging
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def layer_seed(key: str, index: int) -> int:
+    """Semilla determinista por capa para que las cabezas sin artefacto coincidan entre procesos"""
+    return (Config.MODEL_SEED + zlib.crc32(key.encode('utf-8')) + index) % (2 ** 31)
+
+class FeatureArtifacts:
+    """Pesos versionados de backbones y cabezas exportados una vez a disco, con checksum.
+
+    Estructura: <MODEL_ARTIFACTS_DIR>/<MODEL_ARTIFACT_VERSION>/
+        manifest.json, backbones/<nombre>.weights.h5, heads/<modelo>/<nombre>.weights.h5
+    """
+
+    def __init__(self, root: str, version: str, load: bool = True):
+        self.root = root
+        self.version = version
+        self.path = os.path.join(root, version)
+        self.manifest: Optional[Dict] = None
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        if not load:
+            return
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+            self._verify()
+        elif Config.MODEL_ARTIFACT_REQUIRED:
+            raise RuntimeError(f"No hay artefactos de modelo en {self.path} (MODEL_ARTIFACT_REQUIRED=true); "
+                               f"genérelos con export_feature_models.py {self.version}")
+        else:
+            logger.warning(f"No hay artefactos de modelo en {self.path}; se usarán pesos ImageNet y cabezas con semilla fija")
+
+    @property
+    def available(self) -> bool:
+        return self.manifest is not None
+
+    @property
+    def tag(self) -> str:
+        """Versión con la que se etiqueta cada embedding producido"""
+        if self.manifest is None:
+            return f"runtime-seed{Config.MODEL_SEED}"
+        return f"{self.version}+{self.manifest['checksum'][:12]}"
+
+    def _verify(self):
+        for rel_path, expected in self.manifest['files'].items():
+            actual = _sha256(os.path.join(self.path, rel_path))
+            if actual != expected:
+                raise ValueError(f"Checksum inválido para {rel_path} en el artefacto {self.version}")
+        logger.info(f"Artefactos de modelo verificados: {self.tag}")
+
+    def backbone_path(self, name: str) -> Optional[str]:
+        rel_path = f"backbones/{name}.weights.h5"
+        if self.manifest is None or rel_path not in self.manifest['files']:
+            return None
+        return os.path.join(self.path, rel_path)
+
+    def head_path(self, key: str) -> Optional[str]:
+        rel_path = f"heads/{key}.weights.h5"
+        if self.manifest is None or rel_path not in self.manifest['files']:
+            return None
+        return os.path.join(self.path, rel_path)
+
+    def export(self, backbones: Dict, heads: Dict, force: bool = False) -> str:
+        """Guardar pesos y manifest en un directorio temporal y publicarlo con rename"""
+        import tensorflow as tf
+
+        if os.path.exists(self.path):
+            if not force:
+                raise FileExistsError(f"El artefacto {self.path} ya existe")
+            shutil.rmtree(self.path)
+        tmp_path = self.path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        files = {}
+        for name, model in backbones.items():
+            rel_path = f"backbones/{name}.weights.h5"
+            os.makedirs(os.path.dirname(os.path.join(tmp_path, rel_path)), exist_ok=True)
+            model.save_weights(os.path.join(tmp_path, rel_path))
+            files[rel_path] = _sha256(os.path.join(tmp_path, rel_path))
+        for key, model in heads.items():
+            rel_path = f"heads/{key}.weights.h5"
+            os.makedirs(os.path.dirname(os.path.join(tmp_path, rel_path)), exist_ok=True)
+            model.save_weights(os.path.join(tmp_path, rel_path))
+            files[rel_path] = _sha256(os.path.join(tmp_path, rel_path))
+        manifest = {
+            "version": self.version,
+            "created_at": datetime.now().isoformat(),
+            "tensorflow": tf.__version__,
+            "seed": Config.MODEL_SEED,
+            "files": files,
+            "checksum": hashlib.sha256("".join(f"{k}:{files[k]}" for k in sorted(files)).encode('utf-8')).hexdigest()
+        }
+        with open(os.path.join(tmp_path, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.manifest = manifest
+        logger.info(f"Artefactos exportados en {self.path} ({self.tag})")
+        return self.path
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "available": self.available,
+            "version": self.tag,
+            "created_at": self.manifest.get("created_at") if self.manifest else None
+        }
+
+_artifacts: Optional[FeatureArtifacts] = None
+_artifacts_lock = threading.Lock()
+
+def get_feature_artifacts() -> FeatureArtifacts:
+    """Artefactos de la versión configurada, cargados una vez por proceso"""
+    global _artifacts
+    with _artifacts_lock:
+        if _artifacts is None:
+            _artifacts = FeatureArtifacts(Config.MODEL_ARTIFACTS_DIR, Config.MODEL_ARTIFACT_VERSION)
+        return _artifacts
@@ -0,0 +1,181 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes aproximados por entrada además de los vectores (claves, dict, arreglos)
+_ENTRY_OVERHEAD = 512
+
+Features = Dict[str, List[float]]
+
+def _pack(features: Features) -> Dict[str, np.ndarray]:
+    """Vectores compactos: float32 si es exacto (salidas de las cabezas y nose_specific), si no float64"""
+    packed = {}
+    for name, values in features.items():
+        vector = np.asarray(values, dtype=np.float64)
+        compact = vector.astype(np.float32)
+        packed[name] = compact if np.array_equal(compact, vector) else vector
+    return packed
+
+def _unpack(packed: Dict[str, np.ndarray]) -> Features:
+    return {name: vector.tolist() for name, vector in packed.items()}
+
+class FeatureCache:
+    """Caché de características por hash del contenido de la imagen + versión del extractor.
+
+    Nivel en memoria LRU acotado por bytes y, opcionalmente, un nivel en disco (un .npz por
+    entrada). Las peticiones concurrentes con la misma imagen se agrupan: sólo una calcula y
+    las demás esperan su resultado.
+    """
+
+    def __init__(self, version: str, max_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, disk_max_entries: int = 100000):
+        self.version = version
+        self.max_bytes = max(0, max_bytes)
+        self.disk_dir = os.path.join(disk_dir, version.replace('/', '_')) if disk_dir else None
+        self.disk_max_entries = disk_max_entries
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, np.ndarray], int]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self._disk_writes = 0
+        # Métricas
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def get_or_compute(self, digest: str, compute: Callable[[], Features],
+                       cacheable: Callable[[Features], bool] = lambda features: True) -> Features:
+        """Características de la imagen con hash `digest`; compute() sólo corre en un fallo de caché"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return _unpack(entry[0])
+            waiting = self._in_flight.get(digest)
+            if waiting is None:
+                future: Future = Future()
+                self._in_flight[digest] = future
+            else:
+                self.coalesced += 1
+        if waiting is not None:
+            return _unpack(waiting.result())
+
+        try:
+            packed = self._read_disk(digest)
+            if packed is not None:
+                self.disk_hits += 1
+                features = _unpack(packed)
+            else:
+                self.misses += 1
+                features = compute()
+                packed = _pack(features) if cacheable(features) else None
+                if packed is not None:
+                    self._write_disk(digest, packed)
+            if packed is not None:
+                self._insert(digest, packed)
+            future.set_result(packed if packed is not None else _pack(features))
+            return features
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(digest, None)
+
+    def put(self, digest: str, features: Features):
+        """Guardar características ya calculadas (p. ej. por el registro por lotes)"""
+        packed = _pack(features)
+        self._insert(digest, packed)
+        self._write_disk(digest, packed)
+
+    def _insert(self, digest: str, packed: Dict[str, np.ndarray]):
+        size = _ENTRY_OVERHEAD + sum(vector.nbytes for vector in packed.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(digest, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[digest] = (packed, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    # ------------------------------------------------------------ nivel en disco
+
+    def _disk_path(self, digest: str) -> str:
+        return os.path.join(self.disk_dir, f"{digest}.npz")
+
+    def _read_disk(self, digest: str) -> Optional[Dict[str, np.ndarray]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with np.load(self._disk_path(digest)) as data:
+                return {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de caché en disco ilegible ({digest}): {e}")
+            return None
+
+    def _write_disk(self, digest: str, packed: Dict[str, np.ndarray]):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **packed)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir la caché en disco: {e}")
+            return
+        self._disk_writes += 1
+        if self.disk_max_entries > 0 and self._disk_writes % 1000 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Borrar las entradas más antiguas si el nivel en disco supera disk_max_entries"""
+        try:
+            files = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith('.npz')]
+            excess = len(files) - self.disk_max_entries
+            if excess <= 0:
+                return
+            files.sort(key=lambda path: os.stat(path).st_mtime)
+            for path in files[:excess]:
+                os.remove(path)
+            self.disk_evictions += excess
+        except OSError as e:
+            logger.warning(f"No se pudo podar la caché en disco: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": ((self.hits + self.disk_hits + self.coalesced) / (lookups + self.coalesced)) if lookups + self.coalesced else 0.0,
+            "evictions": self.evictions,
+            "disk_dir": self.disk_dir,
+            "disk_evictions": self.disk_evictions
+        }
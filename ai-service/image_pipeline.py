@@ -0,0 +1,160 @@
+import numpy as np
+import cv2
+import hashlib
+import struct
+from typing import Callable, Dict, Tuple, Union
+from metrics import stage
+
+def _exif_orientation(img_bytes: bytes) -> int:
+    """Leer la etiqueta de orientación EXIF de un JPEG (1 si no existe o no es JPEG)"""
+    if len(img_bytes) < 4 or img_bytes[:2] != b'\xff\xd8':
+        return 1
+    pos = 2
+    while pos + 4 <= len(img_bytes):
+        if img_bytes[pos] != 0xFF:
+            return 1
+        marker = img_bytes[pos + 1]
+        if marker in (0xD9, 0xDA):  # fin de imagen / inicio de datos comprimidos
+            return 1
+        (length,) = struct.unpack('>H', img_bytes[pos + 2:pos + 4])
+        if marker == 0xE1 and img_bytes[pos + 4:pos + 10] == b'Exif\x00\x00':
+            tiff = pos + 10
+            endian = '<' if img_bytes[tiff:tiff + 2] == b'II' else '>'
+            try:
+                (ifd_offset,) = struct.unpack(endian + 'I', img_bytes[tiff + 4:tiff + 8])
+                ifd = tiff + ifd_offset
+                (entries,) = struct.unpack(endian + 'H', img_bytes[ifd:ifd + 2])
+                for i in range(entries):
+                    entry = ifd + 2 + 12 * i
+                    tag, _, _ = struct.unpack(endian + 'HHI', img_bytes[entry:entry + 8])
+                    if tag == 0x0112:
+                        (value,) = struct.unpack(endian + 'H', img_bytes[entry + 8:entry + 10])
+                        return value if 1 <= value <= 8 else 1
+            except struct.error:
+                return 1
+            return 1
+        pos += 2 + length
+    return 1
+
+def _apply_orientation(img: np.ndarray, orientation: int) -> np.ndarray:
+    """Aplicar la orientación EXIF igual que cv2.IMREAD_COLOR"""
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+def content_digest(img_bytes: bytes) -> str:
+    return hashlib.sha256(img_bytes).hexdigest()
+
+class DecodedImage:
+    """Imagen decodificada una sola vez por petición y compartida por todos los extractores.
+
+    - `rgb`: RGB uint8 con el canal alfa compuesto sobre fondo blanco (semántica de NosePrintModel)
+    - `rgb_color`: RGB uint8 equivalente a cv2.IMREAD_COLOR (alfa descartado y orientación EXIF
+      aplicada), usada por AdvancedNoseModel y SimpleNoseModel
+    Las vistas derivadas (redimensionados, imagen realzada, etc.) se calculan una vez con `memo`.
+    """
+
+    def __init__(self, img_bytes: bytes):
+        self.img_bytes = img_bytes
+        nparr = np.frombuffer(img_bytes, np.uint8)
+        with stage("decode"):
+            raw = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
+        if raw is None:
+            raise ValueError("No se pudo decodificar la imagen")
+        if raw.dtype != np.uint8:
+            # PNG/TIFF de 16 bits: reducir a 8 bits como hace IMREAD_COLOR
+            raw = (raw >> 8).astype(np.uint8) if raw.dtype == np.uint16 else cv2.convertScaleAbs(raw)
+        self._raw = raw
+        self._views: Dict[str, object] = {}
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._raw.shape
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 de los bytes subidos (clave de la caché de características)"""
+        return self.memo('sha256', lambda: content_digest(self.img_bytes))
+
+    def memo(self, key: str, compute: Callable[[], object]):
+        """Calcular una vista derivada una sola vez"""
+        if key not in self._views:
+            self._views[key] = compute()
+        return self._views[key]
+
+    @property
+    def rgb(self) -> np.ndarray:
+        return self.memo('rgb', self._to_rgb)
+
+    @property
+    def rgb_color(self) -> np.ndarray:
+        return self.memo('rgb_color', self._to_rgb_color)
+
+    def _to_rgb(self) -> np.ndarray:
+        img = self._raw
+        if img.ndim == 3 and img.shape[-1] == 4:  # RGBA
+            # Convertir RGBA a RGB usando fondo blanco
+            alpha = img[:, :, 3] / 255.0
+            rgb = img[:, :, :3].astype(np.float32)
+            white_background = np.ones_like(rgb) * 255
+            return (rgb * alpha[:, :, np.newaxis] + white_background * (1 - alpha[:, :, np.newaxis])).astype(np.uint8)
+        if img.ndim == 3 and img.shape[-1] == 3:  # BGR
+            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        # Escala de grises
+        gray = img if img.ndim == 2 else img[:, :, 0]
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+
+    def _to_rgb_color(self) -> np.ndarray:
+        img = self._raw
+        if img.ndim == 3 and img.shape[-1] == 4:
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
+        else:
+            rgb = self.rgb
+        return _apply_orientation(rgb, _exif_orientation(self.img_bytes))
+
+    def resized(self, view: str = 'rgb', size: Tuple[int, int] = (224, 224)) -> np.ndarray:
+        """Vista `rgb` o `rgb_color` redimensionada (cacheada por tamaño)"""
+        return self.memo(f'{view}@{size[0]}x{size[1]}', lambda: cv2.resize(getattr(self, view), size))
+
+    def gray_thumbnail(self, max_side: int = 256) -> np.ndarray:
+        """Escala de grises con el lado mayor ≤ max_side, sin convertir la imagen completa.
+
+        Muestrea con paso entero hasta ~2x el tamaño pedido y promedia por área el resto: en una
+        foto de 12 MP cuesta unos pocos ms (un INTER_AREA directo recorre los 36 MB).
+        """
+        return self.memo(f'gray_thumbnail@{max_side}', lambda: self._gray_thumbnail(max_side))
+
+    def _gray_thumbnail(self, max_side: int) -> np.ndarray:
+        img = self.rgb if self._raw.ndim == 3 and self._raw.shape[-1] == 4 else self._raw
+        step = max(1, max(img.shape[:2]) // (2 * max_side))
+        if step > 1:
+            img = np.ascontiguousarray(img[::step, ::step])
+        height, width = img.shape[:2]
+        factor = max(1, -(-max(height, width) // max_side))
+        if factor > 1:
+            img = cv2.resize(img, (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA)
+        if img.ndim == 2:
+            return img
+        # RGBA ya compuesto sobre blanco (RGB); el resto es BGR de imdecode
+        code = cv2.COLOR_RGB2GRAY if self._raw.shape[-1] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(img, code)
+
+ImageInput = Union[bytes, DecodedImage]
+
+def as_decoded(image: ImageInput) -> DecodedImage:
+    """Aceptar bytes o una imagen ya decodificada"""
+    if isinstance(image, DecodedImage):
+        return image
+    return DecodedImage(image)
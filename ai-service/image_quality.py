@@ -0,0 +1,159 @@
+import threading
+import time
+from typing import Dict, List
+import logging
+
+import cv2
+import numpy as np
+
+from image_pipeline import DecodedImage
+from metrics import stage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUALITY_MODES = ("off", "flag", "reject")
+
+# Motivos con el mensaje que la app puede mostrar tal cual
+QUALITY_MESSAGES = {
+    "too_small": "La foto es demasiado pequeña: acerque la cámara a la nariz",
+    "blurry": "La foto está borrosa: mantenga el teléfono quieto y enfoque la nariz",
+    "underexposed": "La foto está demasiado oscura: busque más luz",
+    "overexposed": "La foto está sobreexpuesta: evite el flash y la luz directa",
+    "low_texture": "No se distinguen los surcos de la nariz: acerque la cámara y enfoque"
+}
+
+class ImageQualityGate:
+    """Filtro de calidad previo a la inferencia: resolución, nitidez, exposición y textura.
+
+    Mide sobre la miniatura en grises de la imagen ya decodificada (DecodedImage.gray_thumbnail,
+    lado mayor ≤ analysis_side), así que cuesta unos pocos ms aun con fotos de 12 MP. Los
+    umbrales están pensados para esa miniatura:
+      - nitidez: varianza del laplaciano
+      - exposición: brillo medio y fracción de píxeles quemados (≥250) o negros (≤5)
+      - textura: magnitud media del gradiente (Sobel); una nariz enfocada tiene surcos marcados
+    En modo "reject" las fotos con algún motivo no llegan a la extracción; en "flag" siguen
+    el pipeline y el reporte acompaña al resultado.
+    """
+
+    def __init__(self, mode: str = "flag", min_side: int = 112, min_blur_variance: float = 30.0,
+                 min_brightness: float = 25.0, max_brightness: float = 230.0, max_clipped_fraction: float = 0.5,
+                 min_texture_energy: float = 8.0, analysis_side: int = 256):
+        if mode not in QUALITY_MODES:
+            raise ValueError(f"Modo de filtro de calidad desconocido: {mode}")
+        self.mode = mode
+        self.min_side = min_side
+        self.min_blur_variance = min_blur_variance
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped_fraction = max_clipped_fraction
+        self.min_texture_energy = min_texture_energy
+        self.analysis_side = analysis_side
+        self._lock = threading.Lock()
+        # Métricas
+        self.checked = 0
+        self.flagged = 0
+        self.rejected = 0
+        self.by_reason: Dict[str, int] = {code: 0 for code in QUALITY_MESSAGES}
+        self.total_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config, mode: str = "") -> "ImageQualityGate":
+        """Filtro con los umbrales QUALITY_* de config.py (mode sobrescribe QUALITY_GATE_MODE)"""
+        return cls(
+            mode=mode or config.QUALITY_GATE_MODE,
+            min_side=config.QUALITY_MIN_SIDE,
+            min_blur_variance=config.QUALITY_MIN_BLUR_VARIANCE,
+            min_brightness=config.QUALITY_MIN_BRIGHTNESS,
+            max_brightness=config.QUALITY_MAX_BRIGHTNESS,
+            max_clipped_fraction=config.QUALITY_MAX_CLIPPED_FRACTION,
+            min_texture_energy=config.QUALITY_MIN_TEXTURE_ENERGY,
+            analysis_side=config.QUALITY_ANALYSIS_SIDE
+        )
+
+    def measure(self, decoded: DecodedImage) -> Dict[str, float]:
+        """Métricas de calidad de la imagen (sin decidir)"""
+        gray = decoded.gray_thumbnail(self.analysis_side)
+        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0)
+        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1)
+        return {
+            "min_side": int(min(decoded.shape[:2])),
+            "blur_variance": float(cv2.Laplacian(gray, cv2.CV_32F).var()),
+            "brightness": float(gray.mean()),
+            "highlight_fraction": float(np.count_nonzero(gray >= 250)) / gray.size,
+            "shadow_fraction": float(np.count_nonzero(gray <= 5)) / gray.size,
+            "texture_energy": float(np.abs(gx).mean() + np.abs(gy).mean())
+        }
+
+    def _reasons(self, metrics: Dict[str, float]) -> List[Dict]:
+        reasons = []
+
+        def add(code: str, metric: str, threshold: float):
+            reasons.append({"code": code, "message": QUALITY_MESSAGES[code], "metric": metric,
+                            "value": metrics[metric], "threshold": threshold})
+
+        if metrics["min_side"] < self.min_side:
+            add("too_small", "min_side", self.min_side)
+        if metrics["brightness"] < self.min_brightness:
+            add("underexposed", "brightness", self.min_brightness)
+        elif metrics["shadow_fraction"] > self.max_clipped_fraction:
+            add("underexposed", "shadow_fraction", self.max_clipped_fraction)
+        if metrics["brightness"] > self.max_brightness:
+            add("overexposed", "brightness", self.max_brightness)
+        elif metrics["highlight_fraction"] > self.max_clipped_fraction:
+            add("overexposed", "highlight_fraction", self.max_clipped_fraction)
+        if metrics["blur_variance"] < self.min_blur_variance:
+            add("blurry", "blur_variance", self.min_blur_variance)
+        if metrics["texture_energy"] < self.min_texture_energy:
+            add("low_texture", "texture_energy", self.min_texture_energy)
+        return reasons
+
+    def assess(self, decoded: DecodedImage) -> Dict:
+        """Reporte de calidad (una sola vez por imagen): accepted, action, message, reasons, metrics"""
+        return decoded.memo('quality_report', lambda: self._assess(decoded))
+
+    def _assess(self, decoded: DecodedImage) -> Dict:
+        start = time.perf_counter()
+        with stage("quality_gate"):
+            metrics = self.measure(decoded)
+            reasons = self._reasons(metrics)
+        elapsed = time.perf_counter() - start
+        action = "ok" if not reasons else ("rejected" if self.mode == "reject" else "flagged")
+        with self._lock:
+            self.checked += 1
+            self.total_seconds += elapsed
+            if action == "rejected":
+                self.rejected += 1
+            elif action == "flagged":
+                self.flagged += 1
+            for reason in reasons:
+                self.by_reason[reason["code"]] += 1
+        if reasons:
+            logger.info(f"Imagen {action} por calidad: {', '.join(r['code'] for r in reasons)}")
+        return {
+            "accepted": action != "rejected",
+            "action": action,
+            "message": reasons[0]["message"] if reasons else None,
+            "reasons": reasons,
+            "metrics": metrics,
+            "elapsed_ms": elapsed * 1000
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "thresholds": {
+                "min_side": self.min_side,
+                "min_blur_variance": self.min_blur_variance,
+                "min_brightness": self.min_brightness,
+                "max_brightness": self.max_brightness,
+                "max_clipped_fraction": self.max_clipped_fraction,
+                "min_texture_energy": self.min_texture_energy,
+                "analysis_side": self.analysis_side
+            },
+            "checked": self.checked,
+            "flagged": self.flagged,
+            "rejected": self.rejected,  # no pasaron a la extracción ni a la búsqueda
+            "by_reason": dict(self.by_reason),
+            "avg_ms": (self.total_seconds / self.checked * 1000) if self.checked else 0.0
+        }
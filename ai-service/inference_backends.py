@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Sequence
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Backends de inferencia para los extractores de huella nasal
+INFERENCE_BACKENDS = ("keras", "onnx", "tflite")
+# Variantes de los modelos exportados: pesos float32, cuantización dinámica (pesos int8) o int8 completo calibrado
+BACKEND_VARIANTS = ("fp32", "dynamic", "int8")
+
+RUNTIME_DIR = "runtime"
+RUNTIME_MANIFEST = "runtime.json"
+RUNTIME_EXTENSIONS = {"onnx": ".onnx", "tflite": ".tflite"}
+
+def mobilenet_preprocess(x: np.ndarray) -> np.ndarray:
+    """Equivalente numpy de mobilenet_v2.preprocess_input (modo 'tf', en sitio): [0, 255] -> [-1, 1]"""
+    x /= 127.5
+    x -= 1.0
+    return x
+
+def efficientnet_preprocess(x: np.ndarray) -> np.ndarray:
+    """Equivalente de efficientnet.preprocess_input: EfficientNetB0 normaliza dentro del modelo"""
+    return x
+
+def runtime_rel_path(backend: str, key: str, variant: str) -> str:
+    """Ruta dentro del artefacto: runtime/<modelo>/<familia>.<variante>.<ext>"""
+    return f"{RUNTIME_DIR}/{key}.{variant}{RUNTIME_EXTENSIONS[backend]}"
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_runtime_manifest(artifact_path: str) -> Dict:
+    manifest_path = os.path.join(artifact_path, RUNTIME_DIR, RUNTIME_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return {"files": {}}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def record_runtime_files(artifact_path: str, rel_paths: Sequence[str], source_tag: str):
+    """Agregar al manifest de runtime los checksums de modelos recién exportados"""
+    manifest = load_runtime_manifest(artifact_path)
+    manifest["source"] = source_tag
+    for rel_path in rel_paths:
+        manifest["files"][rel_path] = _sha256(os.path.join(artifact_path, rel_path))
+    manifest_path = os.path.join(artifact_path, RUNTIME_DIR, RUNTIME_MANIFEST)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def resolve_runtime_paths(artifacts, backend: str, prefix: str, families: Sequence[str], variant: str) -> Dict[str, str]:
+    """Rutas verificadas de los modelos exportados de cada familia (FileNotFoundError si faltan)"""
+    if not artifacts.available:
+        raise FileNotFoundError(f"El backend {backend} requiere un artefacto exportado en {artifacts.path}")
+    manifest = load_runtime_manifest(artifacts.path)
+    if manifest.get("source") != artifacts.tag:
+        raise ValueError(f"Los modelos de {RUNTIME_DIR}/ no corresponden al artefacto {artifacts.tag}")
+    paths = {}
+    for family in families:
+        rel_path = runtime_rel_path(backend, f"{prefix}/{family}", variant)
+        expected = manifest["files"].get(rel_path)
+        if expected is None:
+            raise FileNotFoundError(
+                f"Falta {rel_path} en {artifacts.path}; ejecute export_feature_models.py --runtime-only --{backend} --quantize {variant}"
+            )
+        path = os.path.join(artifacts.path, rel_path)
+        if _sha256(path) != expected:
+            raise ValueError(f"Checksum inválido para {rel_path} en el artefacto {artifacts.tag}")
+        paths[family] = path
+    return paths
+
+class KerasBackend:
+    """Ruta de referencia: backbones Keras compartidos (micro-batching) + cabeza densa por familia"""
+
+    name = "keras"
+    variant = "fp32"
+    # Los backbones se comparten con los otros modelos a través del fan-out de BackboneRegistry
+    shared_backbones = True
+
+    def __init__(self, prefix: str, families: Sequence[str], units: List[int], dropouts: List[float]):
+        from backbone_registry import get_backbone_registry, build_head
+        from inference_runner import make_runner
+
+        self.backbones = get_backbone_registry()
+        self.models = {}
+        self.head_runners = {}
+        for family in families:
+            self.backbones.get(family)
+            self.models[family] = build_head(self.backbones.output_dim(family), units, dropouts, f"{prefix}/{family}")
+            self.head_runners[family] = make_runner(self.models[family])
+
+    def head(self, family: str, pooled: np.ndarray) -> np.ndarray:
+        return self.head_runners[family](pooled)
+
+    def run(self, family: str, batch: np.ndarray) -> np.ndarray:
+        """Imágenes preprocesadas (N, 224, 224, 3) -> embeddings sin normalizar (N, D)"""
+        return self.head(family, self.backbones.pooled(family, batch))
+
+class OnnxBackend:
+    """Extractor completo por familia (backbone + pooling + cabeza) en ONNX Runtime CPU"""
+
+    name = "onnx"
+    shared_backbones = False
+
+    def __init__(self, paths: Dict[str, str], variant: str, threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("INFERENCE_BACKEND=onnx requiere onnxruntime "
+                              "(pip install -r requirements-onnx.txt o imagen con --build-arg WITH_ONNX=true)") from e
+
+        self.variant = variant
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        # InferenceSession.run es seguro entre hilos: una sesión por familia para todo el pool
+        self.models = {
+            family: ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            for family, path in paths.items()
+        }
+        self._input_names = {family: session.get_inputs()[0].name for family, session in self.models.items()}
+
+    def run(self, family: str, batch: np.ndarray) -> np.ndarray:
+        feed = {self._input_names[family]: np.ascontiguousarray(batch, dtype=np.float32)}
+        return self.models[family].run(None, feed)[0]
+
+def _tflite_interpreter_class():
+    """Intérprete de tflite_runtime (liviano) o, si no está instalado, el de TensorFlow"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+class TFLiteBackend:
+    """Extractor completo por familia en el intérprete TFLite (un candado por intérprete)"""
+
+    name = "tflite"
+    shared_backbones = False
+
+    def __init__(self, paths: Dict[str, str], variant: str, threads: int = 0):
+        Interpreter = _tflite_interpreter_class()
+        self.variant = variant
+        self.models = {}
+        self._locks = {}
+        for family, path in paths.items():
+            interpreter = Interpreter(model_path=path, num_threads=threads if threads > 0 else None)
+            interpreter.allocate_tensors()
+            self.models[family] = interpreter
+            self._locks[family] = threading.Lock()
+
+    def run(self, family: str, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        # El intérprete no admite llamadas concurrentes y redimensiona su entrada según el lote
+        with self._locks[family]:
+            interpreter = self.models[family]
+            input_detail = interpreter.get_input_details()[0]
+            if tuple(input_detail['shape']) != batch.shape:
+                interpreter.resize_tensor_input(input_detail['index'], batch.shape)
+                interpreter.allocate_tensors()
+            interpreter.set_tensor(input_detail['index'], batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(interpreter.get_output_details()[0]['index']).copy()
+
+def create_backend(name: str, variant: str, prefix: str, families: Sequence[str],
+                   units: List[int], dropouts: List[float], artifacts, threads: int = 0):
+    """Backend configurado; si el runtime o los modelos exportados no están se vuelve a Keras"""
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(f"Backend de inferencia desconocido: {name}")
+    if name != "keras":
+        if variant not in BACKEND_VARIANTS:
+            raise ValueError(f"Variante de backend desconocida: {variant}")
+        start = time.perf_counter()
+        try:
+            paths = resolve_runtime_paths(artifacts, name, prefix, families, variant)
+            backend_class = OnnxBackend if name == "onnx" else TFLiteBackend
+            backend = backend_class(paths, variant, threads)
+            logger.info(f"Backend {name}/{variant} de {prefix} cargado en {time.perf_counter() - start:.2f}s")
+            return backend
+        except (ImportError, FileNotFoundError, ValueError) as e:
+            logger.error(f"No se pudo cargar el backend {name}/{variant} de {prefix}, usando keras: {e}")
+    return KerasBackend(prefix, families, units, dropouts)
+
+def backend_version_suffix(backend) -> str:
+    """Sufijo de embedding_version: embeddings de runtimes distintos no son bit a bit comparables"""
+    return "" if backend.name == "keras" else f"+{backend.name}-{backend.variant}"
@@ -0,0 +1,40 @@
+import numpy as np
+from typing import Callable, Optional
+import logging
+import tensorflow as tf
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ("predict", "direct", "compiled")
+
+def make_runner(model: tf.keras.Model, mode: Optional[str] = None, xla: Optional[bool] = None) -> Callable[[np.ndarray], np.ndarray]:
+    """Función numpy -> numpy que ejecuta el modelo según el modo de inferencia configurado.
+
+    - predict: model.predict (arma adaptador de datos y callbacks en cada llamada)
+    - direct: llamada directa model(x, training=False)
+    - compiled: tf.function trazada con firma de entrada fija (opcionalmente compilada con XLA)
+    """
+    mode = mode or Config.INFERENCE_MODE
+    xla = Config.INFERENCE_XLA if xla is None else xla
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Modo de inferencia desconocido: {mode}")
+
+    if mode == "predict":
+        return lambda x: model.predict(x, verbose=0)
+
+    if mode == "direct":
+        return lambda x: model(x, training=False).numpy()
+
+    signature = [tf.TensorSpec(shape=(None,) + tuple(model.input_shape[1:]), dtype=tf.float32)]
+
+    @tf.function(input_signature=signature, jit_compile=xla)
+    def compiled(x):
+        return model(x, training=False)
+
+    def run(x: np.ndarray) -> np.ndarray:
+        return compiled(tf.convert_to_tensor(x, dtype=tf.float32)).numpy()
+
+    return run
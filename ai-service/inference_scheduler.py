@@ -0,0 +1,102 @@
+import numpy as np
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _Pending:
+    __slots__ = ('tensor', 'enqueued_at', 'future')
+
+    def __init__(self, tensor: np.ndarray):
+        self.tensor = tensor
+        self.enqueued_at = time.perf_counter()
+        self.future: Future = Future()
+
+class MicroBatchScheduler:
+    """Agrupa tensores de peticiones concurrentes en un único forward pass por backbone.
+
+    Un hilo trabajador toma el primer tensor en cola y espera hasta `max_wait_ms` (o hasta
+    reunir `max_batch` imágenes) antes de ejecutar `run_batch` sobre el lote concatenado;
+    luego reparte las filas del resultado a cada petición en espera.
+    """
+
+    def __init__(self, name: str, run_batch: Callable[[np.ndarray], np.ndarray],
+                 max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"microbatch-{name}", daemon=True)
+        self._thread.start()
+        # Métricas
+        self.batches = 0
+        self.items = 0
+        self.images = 0
+        self.batch_size_histogram: Dict[int, int] = {}
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    def submit(self, tensor: np.ndarray) -> np.ndarray:
+        """Encolar un tensor (N, H, W, C) y bloquear hasta obtener sus N filas de salida"""
+        pending = _Pending(tensor)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def _collect(self) -> list:
+        first = self._queue.get()
+        batch = [first]
+        rows = first.tensor.shape[0]
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += item.tensor.shape[0]
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                inputs = batch[0].tensor if len(batch) == 1 else np.concatenate([p.tensor for p in batch], axis=0)
+                outputs = self.run_batch(inputs)
+            except Exception as e:
+                logger.error(f"Error en lote de inferencia {self.name}: {e}")
+                for pending in batch:
+                    pending.future.set_exception(e)
+                continue
+            offset = 0
+            for pending in batch:
+                n = pending.tensor.shape[0]
+                pending.future.set_result(outputs[offset:offset + n])
+                offset += n
+                wait = started - pending.enqueued_at
+                self.total_queue_wait += wait
+                self.max_queue_wait = max(self.max_queue_wait, wait)
+            self.batches += 1
+            self.items += len(batch)
+            self.images += offset
+            self.batch_size_histogram[offset] = self.batch_size_histogram.get(offset, 0) + 1
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "requests": self.items,
+            "avg_batch_size": (self.images / self.batches) if self.batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_size_histogram.items())},
+            "avg_queue_wait_ms": (self.total_queue_wait / self.items * 1000) if self.items else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait * 1000
+        }
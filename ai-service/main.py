@@ -1,5 +1,6 @@
 # Servicio de IA para reconocimiento de huellas nasales de mascotas
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import random
@@ -7,15 +8,21 @@ import uuid
 from typing import Optional, List
 import numpy as np
 import cv2
-import tensorflow as tf
 import os
 import json
-import requests
-from simple_nose_model import SimpleNoseModel
-from advanced_nose_model import AdvancedNoseModel
-from nose_print_model import NosePrintModel
+from model_roster import ModelRoster, model_factories, parse_model_list, loaded_backbone_registry, process_rss_bytes
+from model_executor import ModelExecutor, ModelBusyError
+from image_pipeline import DecodedImage, ImageInput
+from pet_service_client import create_pet_service_client
+from audit_log import AuditLogWriter
+from batch_registration import BatchRegistrar, archive_sources, pet_id_from_name, read_limited
+from metrics import REGISTRY as metrics_registry, record_match, record_request, stage
+from profiling import RequestProfiler
+from config import Config
+import asyncio
 import logging
 import datetime
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,6 +33,35 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Métricas por etapa y por endpoint; con METRICS_DIR /metrics suma los contadores de todos los workers
+metrics_registry.enabled = Config.METRICS_ENABLED
+if Config.METRICS_ENABLED and Config.METRICS_DIR:
+    metrics_registry.share(Config.METRICS_DIR)
+
+# Endpoints del pipeline de reconocimiento con latencia, peticiones y errores en /metrics
+METRIC_ENDPOINTS = {
+    "/scan": "scan",
+    "/compare": "compare",
+    "/visual-comparison": "visual-comparison",
+    "/register-embedding": "register-embedding",
+    "/register-embeddings/batch": "register-batch"
+}
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    endpoint = METRIC_ENDPOINTS.get(request.url.path)
+    if endpoint is None or not metrics_registry.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        record_request(endpoint, time.perf_counter() - start, failed=True)
+        raise
+    # Con respuestas en streaming la latencia llega hasta el envío de las cabeceras
+    record_request(endpoint, time.perf_counter() - start, failed=response.status_code >= 400)
+    return response
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -41,6 +77,7 @@ class ScanResponse(BaseModel):
     confidence: float
     message: Optional[str] = None
     all_similarities: Optional[dict] = None
+    quality: Optional[dict] = None
 
 class VisualComparisonResponse(BaseModel):
     uploaded_image_features: dict
@@ -58,32 +95,159 @@ class TrainingResponse(BaseModel):
     training_data_count: int
     epochs: int
 
-# Inicializar modelos
-simple_model = SimpleNoseModel()
-simple_model.load_embeddings()
-
-# Inicializar modelo avanzado
-advanced_model = AdvancedNoseModel()
-advanced_model.load_embeddings()
-
-# Inicializar modelo específico de huella nasal
-nose_print_model = NosePrintModel()
-nose_print_model.load_embeddings()
+# Inicializar modelos según el roster: los inactivos no se construyen y los lazy cargan en su primer uso
+# (los backbones de los modelos Keras se comparten a través del registro)
+rss_before_models = process_rss_bytes()
+startup_started = time.perf_counter()
+model_roster = ModelRoster(model_factories(), parse_model_list(Config.MODEL_ROSTER), parse_model_list(Config.MODEL_LAZY))
 
 # Usar modelo de huella nasal por defecto (más preciso para narices)
+nose_print_model = model_roster.get("nose_print")
 nose_model = nose_print_model
 
-AUDIT_LOG = "requests.log"
+startup_seconds = time.perf_counter() - startup_started
+rss_after_models = process_rss_bytes()
+registration_stats = {"count": 0, "total_seconds": 0.0}
+
+metrics_registry.gauge(
+    "nose_registry_size", "Mascotas registradas por modelo cargado (vista de este worker)", "model",
+    lambda: {name: len(model.embeddings) for name, model in model_roster.loaded_models().items()}
+)
+
+# Todo el trabajo de CPU (preprocesado, inferencia, búsqueda) corre fuera del event loop
+model_executor = ModelExecutor(workers=Config.MODEL_WORKERS, max_pending=Config.MODEL_MAX_PENDING)
+
+# Perfiles bajo demanda: deshabilitado no se registra el middleware ni se envuelven las tareas del pool
+PROFILED_ENDPOINTS = {
+    "/scan": "scan",
+    "/compare": "compare",
+    "/register-embedding": "register-embedding"
+}
+request_profiler = None
+if Config.PROFILING_ENABLED:
+    request_profiler = RequestProfiler(
+        Config.PROFILING_DIR,
+        sample_rate=Config.PROFILING_SAMPLE_RATE,
+        admin_token=Config.PROFILING_ADMIN_TOKEN,
+        max_profiles=Config.PROFILING_MAX_PROFILES,
+        max_bytes=Config.PROFILING_MAX_BYTES
+    )
+    model_executor.wrap_call = request_profiler.wrap
+
+    @app.middleware("http")
+    async def profile_requests(request, call_next):
+        endpoint = PROFILED_ENDPOINTS.get(request.url.path)
+        session = request_profiler.begin(endpoint, request.headers) if endpoint else None
+        if session is None:
+            return await call_next(request)
+        # call_next copia el contexto: las tareas que el endpoint envía al pool ven la sesión
+        token = request_profiler.activate(session)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            request_profiler.deactivate(token)
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, request_profiler.save, session, response.status_code,
+                time.perf_counter() - start, request.headers.get("user-agent")
+            )
+            response.headers["X-Profile-Id"] = session.profile_id
+        except OSError as e:
+            logger.error(f"No se pudo guardar el perfil {session.profile_id}: {e}")
+        return response
+
+# Registro por lotes: decodificación en paralelo y un forward pass por backbone por tramo
+batch_registrar = BatchRegistrar(model_roster, decode_workers=Config.REGISTER_BATCH_DECODE_WORKERS)
+
+# Metadatos de mascotas: pool keep-alive, caché y circuit breaker frente al pet-service
+pet_client = create_pet_service_client()
+
+@app.on_event("shutdown")
+async def shutdown_model_executor():
+    model_executor.shutdown()
+    batch_registrar.shutdown()
+    await pet_client.aclose()
+    audit_writer.close()
+
+# Auditoría: la petición sólo encola; un hilo escribe por lotes, rota y recorta all_similarities al top-k
+audit_writer = AuditLogWriter(
+    Config.AUDIT_LOG_FILE,
+    max_queue=Config.AUDIT_QUEUE_SIZE,
+    flush_bytes=Config.AUDIT_FLUSH_BYTES,
+    flush_interval=Config.AUDIT_FLUSH_INTERVAL_SECONDS,
+    max_bytes=Config.AUDIT_MAX_BYTES,
+    backup_count=Config.AUDIT_BACKUP_COUNT,
+    top_k=Config.AUDIT_SIMILARITIES_TOP_K
+)
 
 def log_audit(event: str, data: dict):
-    """Registrar evento de auditoría en archivo"""
-    entry = {
-        "timestamp": datetime.datetime.now().isoformat(),
-        "event": event,
-        **data
-    }
-    with open(AUDIT_LOG, "a") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    """Registrar evento de auditoría (no bloqueante)"""
+    with stage("audit_write"):
+        audit_writer.log(event, data)
+
+def TopKQuery():
+    """Parámetro top_k: cuántas mascotas puntuadas se serializan en la respuesta"""
+    return Query(Config.RESULTS_DEFAULT_TOP_K, ge=1, le=Config.RESULTS_MAX_TOP_K,
+                 description="Número de mascotas mejor puntuadas a devolver")
+
+def decode_upload(img_bytes: bytes) -> ImageInput:
+    """Decodificar la subida una sola vez para todos los modelos (se ejecuta en el pool).
+
+    Si no se puede decodificar se devuelven los bytes tal cual, para que cada modelo
+    responda con su propio error como hasta ahora.
+    """
+    try:
+        return DecodedImage(img_bytes)
+    except ValueError as e:
+        logger.warning(f"No se pudo decodificar la imagen subida: {e}")
+        return img_bytes
+
+def quality_rejection(result: dict) -> HTTPException:
+    """422 con el motivo estructurado del filtro de calidad (la app muestra `message`)"""
+    quality = result["quality"]
+    return HTTPException(status_code=422, detail={
+        "error": "image_quality",
+        "message": quality["message"],
+        "reasons": quality["reasons"]
+    })
+
+def register_in_all_models(petId: str, img_bytes: bytes):
+    """Registrar en los modelos activos con un solo forward pass por backbone (se ejecuta en el pool)"""
+    img_bytes = decode_upload(img_bytes)
+    if isinstance(img_bytes, DecodedImage):
+        quality = nose_print_model.assess_quality(img_bytes)
+        if quality is not None and not quality["accepted"]:
+            # Foto inservible: ni forward pass ni registro en los demás modelos
+            return nose_print_model.register_nose_print(petId, img_bytes), None, None
+    # Los modelos lazy se construyen en el primer registro; los inactivos devuelven None
+    advanced_model = model_roster.get("advanced")
+    simple_model = model_roster.get("simple")
+    pooled = {}
+    try:
+        jobs = {}
+        if nose_print_model.uses_shared_backbones:
+            jobs["nose_print"] = nose_print_model.preprocess_nose_image(img_bytes)
+        if advanced_model is not None and advanced_model.feature_models:
+            jobs["advanced"] = advanced_model.preprocess_image_advanced(img_bytes)
+        if simple_model is not None and simple_model.feature_extractor is not None:
+            jobs["simple"] = {"mobilenet": simple_model.preprocess_image(img_bytes)}
+        if jobs:
+            pooled = loaded_backbone_registry().fan_out(jobs)
+    except Exception as e:
+        logger.warning(f"Fan-out de backbones falló, cada modelo extraerá por separado: {e}")
+    
+    # Usar modelo específico de huella nasal
+    result = nose_print_model.register_nose_print(petId, img_bytes, pooled=pooled.get("nose_print"))
+    
+    # También registrar en otros modelos activos para compatibilidad
+    advanced_result = None
+    if advanced_model is not None:
+        advanced_result = advanced_model.register_pet_advanced(petId, img_bytes, pooled=pooled.get("advanced"))
+    simple_result = None
+    if simple_model is not None:
+        simple_result = simple_model.register_pet(petId, img_bytes, pooled=pooled.get("simple"))
+    return result, advanced_result, simple_result
 
 @app.post("/register-embedding")
 async def register_embedding(petId: str, image: UploadFile = File(...)):
@@ -98,14 +262,13 @@ async def register_embedding(petId: str, image: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="File must be an image")
     
     try:
-        img_bytes = await image.read()
+        with stage("upload_read"):
+            img_bytes = await image.read()
+        start = time.perf_counter()
         
-        # Usar modelo específico de huella nasal
-        result = nose_print_model.register_nose_print(petId, img_bytes)
-        
-        # También registrar en otros modelos para compatibilidad
-        advanced_result = advanced_model.register_pet_advanced(petId, img_bytes)
-        simple_result = simple_model.register_pet(petId, img_bytes)
+        result, advanced_result, simple_result = await model_executor.run(register_in_all_models, petId, img_bytes)
+        registration_stats["count"] += 1
+        registration_stats["total_seconds"] += time.perf_counter() - start
         
         log_audit("register-embedding-result", {
             "petId": petId,
@@ -115,6 +278,8 @@ async def register_embedding(petId: str, image: UploadFile = File(...)):
             "img_size": len(img_bytes)
         })
         
+        if result.get("quality_rejected"):
+            raise quality_rejection(result)
         if result["status"] == "success":
             return {
                 "status": "registered", 
@@ -128,13 +293,110 @@ async def register_embedding(petId: str, image: UploadFile = File(...)):
             log_audit("register-embedding-error", {"petId": petId, "error": result["message"]})
             raise HTTPException(status_code=500, detail=result["message"])
             
+    except HTTPException:
+        raise
+    except ModelBusyError as e:
+        log_audit("register-embedding-busy", {"petId": petId, "error": str(e)})
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         log_audit("register-embedding-exception", {"petId": petId, "error": str(e)})
         logger.error(f"Error registering pet {petId}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/register-embeddings/batch")
+async def register_embeddings_batch(images: Optional[List[UploadFile]] = File(None),
+                                    petIds: Optional[List[str]] = Form(None),
+                                    archive: Optional[UploadFile] = File(None)):
+    """Registrar muchas mascotas de una vez (multipart images + petIds, o un archivo .zip/.tar).
+
+    Sin petIds (o en el archivo) el petId es el nombre del archivo sin extensión. Cada elemento
+    recibe su propio estado: los que fallan no impiden registrar al resto.
+    """
+    sources = []
+    results = []
+    if archive is not None:
+        try:
+            sources = await model_executor.run(archive_sources, archive.file, Config.REGISTER_BATCH_MAX_IMAGE_BYTES)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ModelBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    if images:
+        if petIds and len(petIds) != len(images):
+            raise HTTPException(status_code=400, detail="petIds debe tener un valor por imagen")
+        for i, upload in enumerate(images):
+            pet_id = petIds[i] if petIds else pet_id_from_name(upload.filename or "")
+            if not upload.content_type or not upload.content_type.startswith("image/"):
+                results.append({"petId": pet_id, "status": "error", "message": "File must be an image"})
+                continue
+            sources.append((pet_id, lambda f=upload.file: read_limited(f, Config.REGISTER_BATCH_MAX_IMAGE_BYTES)))
+    if not sources and not results:
+        raise HTTPException(status_code=400, detail="Enviar images (con petIds opcionales) o un archivo archive")
+    if len(sources) + len(results) > Config.REGISTER_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"El lote supera el máximo de {Config.REGISTER_BATCH_MAX_ITEMS} imágenes")
+    
+    # petId vacío o repetido dentro del lote: sólo se registra la primera aparición
+    unique_sources = []
+    seen = set()
+    for pet_id, read in sources:
+        if not pet_id or pet_id in seen:
+            results.append({"petId": pet_id, "status": "error", "message": "petId vacío o duplicado en el lote"})
+            continue
+        seen.add(pet_id)
+        unique_sources.append((pet_id, read))
+    
+    log_audit("register-batch-request", {"items": len(sources) + len(results), "archive": archive.filename if archive else None})
+    start = time.perf_counter()
+    
+    # Tramos acotados: sólo un tramo de imágenes decodificadas y tensores vive en memoria a la vez
+    chunk_size = max(1, Config.REGISTER_BATCH_CHUNK_SIZE)
+    extracted = []
+    for offset in range(0, len(unique_sources), chunk_size):
+        chunk = unique_sources[offset:offset + chunk_size]
+        try:
+            extracted.extend(await model_executor.run(batch_registrar.extract, chunk))
+        except ModelBusyError as e:
+            # Lo ya extraído se registra igual; el resto se reporta para reintentar
+            extracted.extend({"petId": pet_id, "status": "error", "message": str(e)} for pet_id, _ in unique_sources[offset:])
+            break
+        except Exception as e:
+            logger.error(f"Error en tramo del lote: {e}")
+            extracted.extend({"petId": pet_id, "status": "error", "message": str(e)} for pet_id, _ in chunk)
+    
+    try:
+        registered = await model_executor.run(batch_registrar.commit, extracted)
+    except ModelBusyError as e:
+        log_audit("register-batch-busy", {"error": str(e)})
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        log_audit("register-batch-exception", {"error": str(e)})
+        logger.error(f"Error registering batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    results = extracted + results
+    
+    elapsed = time.perf_counter() - start
+    if registered:
+        registration_stats["count"] += registered
+        registration_stats["total_seconds"] += elapsed
+    failed = len(results) - registered
+    log_audit("register-batch-result", {
+        "registered": registered,
+        "failed": failed,
+        "errors": [r for r in results if r["status"] == "error"][:Config.AUDIT_SIMILARITIES_TOP_K],
+        "seconds": elapsed
+    })
+    
+    return {
+        "status": "registered" if not failed else ("partial" if registered else "failed"),
+        "registered": registered,
+        "failed": failed,
+        "total_pets": len(nose_print_model.embeddings),
+        "seconds": elapsed,
+        "items": results
+    }
+
 @app.post("/compare", response_model=ScanResponse)
-async def compare_nose_print(image: UploadFile = File(...)):
+async def compare_nose_print(image: UploadFile = File(...), top_k: int = TopKQuery()):
     """Comparar huella nasal con todas las mascotas registradas usando modelo específico"""
     log_audit("compare-request", {
         "filename": image.filename,
@@ -145,24 +407,35 @@ async def compare_nose_print(image: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="File must be an image")
     
     try:
-        img_bytes = await image.read()
+        with stage("upload_read"):
+            img_bytes = await image.read()
         
-        # Usar modelo específico de huella nasal
-        result = nose_print_model.compare_nose_print(img_bytes)
+        # Usar modelo específico de huella nasal (sólo las top_k mejores se puntúan en detalle y se serializan)
+        result = await model_executor.run(nose_print_model.compare_nose_print, img_bytes, top_k=top_k)
         
         log_audit("compare-result", {
             "result": result,
             "img_size": len(img_bytes)
         })
         
+        if result.get("quality_rejected"):
+            raise quality_rejection(result)
+        if result["match"]:
+            record_match("compare")
         return ScanResponse(
             match=result["match"],
             petId=result.get("pet_id"),
             confidence=result["confidence"],
             message=result.get("message"),
-            all_similarities=result.get("all_similarities")
+            all_similarities=result.get("all_similarities"),
+            quality=result.get("quality")
         )
         
+    except HTTPException:
+        raise
+    except ModelBusyError as e:
+        log_audit("compare-busy", {"error": str(e)})
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         log_audit("compare-exception", {"error": str(e)})
         logger.error(f"Error comparing nose: {str(e)}")
@@ -178,23 +451,130 @@ async def train_model(request: TrainingRequest, background_tasks: BackgroundTask
         epochs=request.epochs or 10
     )
 
+def reload_all_embeddings() -> dict:
+    """Volver a leer los embeddings de disco en los modelos cargados (se ejecuta en el pool).
+
+    Los modelos lazy aún sin construir leerán el archivo nuevo en su primer uso.
+    """
+    counts = {}
+    for name, model in model_roster.loaded_models().items():
+        model.load_embeddings()
+        counts[name] = len(model.embeddings)
+    return counts
+
+@app.post("/reload-embeddings")
+async def reload_embeddings():
+    """Recargar los embeddings tras publicar una reconstrucción (regenerate_embeddings.py)"""
+    try:
+        counts = await model_executor.run(reload_all_embeddings)
+    except ModelBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    log_audit("reload-embeddings", counts)
+    return {"status": "reloaded", "embeddings": counts}
+
+def sync_all_embeddings() -> dict:
+    """Incorporar los registros de otros workers en los modelos cargados (se ejecuta en el pool)"""
+    return {name: model.sync_embeddings() for name, model in model_roster.loaded_models().items()}
+
 @app.get("/model-stats")
 async def get_model_stats():
     """Obtener estadísticas del modelo avanzado"""
+    # Con varios workers cada uno responde con su vista: primero se pone al día fuera del event loop
+    try:
+        await model_executor.run(sync_all_embeddings)
+    except ModelBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    backbones = loaded_backbone_registry()
+    backbone_stats = backbones.stats() if backbones is not None else None
+    advanced_model = model_roster.peek("advanced")
+    simple_model = model_roster.peek("simple")
     return {
-        "advanced_model": advanced_model.get_model_stats(),
-        "simple_model": simple_model.get_model_stats(),
-        "active_model": "advanced"
+        "advanced_model": advanced_model.get_model_stats() if advanced_model is not None else None,
+        "simple_model": simple_model.get_model_stats() if simple_model is not None else None,
+        "nose_print_model": nose_print_model.get_model_stats(),
+        "active_model": "advanced",
+        "worker_pid": os.getpid(),
+        "model_roster": model_roster.stats(),
+        "shared_backbones": backbone_stats,
+        "model_executor": model_executor.stats(),
+        "pet_service": pet_client.stats(),
+        "audit_log": audit_writer.stats(),
+        "batch_registration": batch_registrar.stats(),
+        "feature_cache": nose_print_model.feature_cache.stats() if nose_print_model.feature_cache is not None else None,
+        "profiling": request_profiler.stats() if request_profiler is not None else None,
+        "memory": {
+            "rss_before_models_bytes": rss_before_models,
+            "rss_after_models_bytes": rss_after_models,
+            "rss_now_bytes": process_rss_bytes(),
+            "startup_seconds": startup_seconds,
+            "backbone_weights_bytes_shared": backbone_stats["shared_weight_bytes"] if backbone_stats else 0,
+            "backbone_weights_bytes_unshared_estimate": backbone_stats["unshared_weight_bytes_estimate"] if backbone_stats else 0
+        },
+        "registration_latency": {
+            "count": registration_stats["count"],
+            "avg_ms": (registration_stats["total_seconds"] / registration_stats["count"] * 1000) if registration_stats["count"] else 0.0,
+            "backbone_forward_avg_ms": backbone_stats["avg_forward_ms"] if backbone_stats else 0.0
+        }
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus: latencia por etapa y endpoint, peticiones, coincidencias, errores"""
+    try:
+        # Para que nose_registry_size incluya lo registrado en otros workers
+        await model_executor.run(sync_all_embeddings)
+    except ModelBusyError:
+        pass  # bajo carga se expone el tamaño que ya conoce este worker
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+def require_profile_admin(request: Request) -> RequestProfiler:
+    if request_profiler is None:
+        raise HTTPException(status_code=404, detail="Perfiles deshabilitados (PROFILING_ENABLED)")
+    if not request_profiler.is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="X-Admin-Token inválido")
+    return request_profiler
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """Perfiles guardados por todos los workers, del más reciente al más antiguo"""
+    profiler = require_profile_admin(request)
+    return {"profiling": profiler.stats(), "profiles": profiler.list_profiles()}
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, request: Request):
+    """Perfil de CPU (pstats): `python -m pstats` o snakeviz"""
+    path = require_profile_admin(request).profile_file(profile_id, "cpu.prof")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.get("/admin/profiles/{profile_id}/summary")
+async def profile_summary(profile_id: str, request: Request):
+    """Funciones con más tiempo acumulado del perfil, en texto"""
+    path = require_profile_admin(request).profile_file(profile_id, "summary.txt")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    with open(path) as f:
+        return PlainTextResponse(f.read())
+
+@app.get("/admin/profiles/{profile_id}/trace")
+async def download_profile_trace(profile_id: str, request: Request):
+    """Traza de TensorFlow del perfil en zip (abrir con TensorBoard)"""
+    archive = require_profile_admin(request).trace_archive(profile_id)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="El perfil no tiene traza de TensorFlow")
+    return Response(archive, media_type="application/zip",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}-tf_trace.zip"'})
+
 @app.post("/update-threshold")
 async def update_threshold(threshold: float):
     """Actualizar umbral de similitud"""
     if 0.0 <= threshold <= 1.0:
         # Actualizar todos los modelos
         nose_print_model.update_threshold(threshold)
-        advanced_model.update_threshold(threshold)
-        simple_model.threshold = threshold
+        # Los modelos lazy aún sin cargar reciben el ajuste al construirse
+        model_roster.apply(lambda model: model.update_threshold(threshold), ["advanced"])
+        model_roster.apply(lambda model: setattr(model, "threshold", threshold), ["simple"])
         return {"status": "updated", "new_threshold": threshold}
     else:
         raise HTTPException(status_code=400, detail="Threshold must be between 0.0 and 1.0")
@@ -205,13 +585,13 @@ async def update_confidence_boost(boost: float):
     if boost > 0:
         # Actualizar todos los modelos
         nose_print_model.update_confidence_boost(boost)
-        advanced_model.update_confidence_boost(boost)
+        model_roster.apply(lambda model: model.update_confidence_boost(boost), ["advanced"])
         return {"status": "updated", "new_confidence_boost": boost}
     else:
         raise HTTPException(status_code=400, detail="Confidence boost must be positive")
 
 @app.post("/scan")
-async def scan_nose_print(image: UploadFile = File(...)):
+async def scan_nose_print(image: UploadFile = File(...), top_k: int = TopKQuery()):
     """Endpoint unificado para escanear huella nasal usando modelo específico"""
     log_audit("scan-request", {
         "filename": image.filename,
@@ -223,32 +603,29 @@ async def scan_nose_print(image: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="File must be an image")
     
     try:
-        img_bytes = await image.read()
+        with stage("upload_read"):
+            img_bytes = await image.read()
         
-        # Usar modelo específico de huella nasal
-        result = nose_print_model.compare_nose_print(img_bytes)
+        # Usar modelo específico de huella nasal (sólo las top_k mejores se serializan)
+        result = await model_executor.run(nose_print_model.compare_nose_print, img_bytes, top_k=top_k)
         
         log_audit("scan-result", {
             "result": result,
             "img_size": len(img_bytes)
         })
         
+        if result.get("quality_rejected"):
+            raise quality_rejection(result)
+        
         # Obtener información de la mascota si hay coincidencia
         petName = None
         petId = result.get("petId") or result.get("pet_id")
+        if result["match"]:
+            record_match("scan")
         if result["match"] and petId:
-            try:
-                # Obtener información de la mascota desde el pet-service
-                pet_response = requests.get(f"http://localhost:8083/pets/{petId}", timeout=5)
-                if pet_response.status_code == 200:
-                    pet_data = pet_response.json()
-                    petName = pet_data.get("name", "Mascota Encontrada")
-                else:
-                    logger.warning(f"Pet service returned {pet_response.status_code}")
-                    petName = "Mascota Encontrada"
-            except Exception as e:
-                logger.warning(f"Could not fetch pet info: {str(e)}")
-                petName = "Mascota Encontrada"
+            # Obtener información de la mascota desde el pet-service (caché / circuit breaker)
+            pet_data = await pet_client.get_pet(petId)
+            petName = (pet_data or {}).get("name") or "Mascota Encontrada"
         
         # Formato de respuesta compatible con el frontend
         return {
@@ -258,16 +635,80 @@ async def scan_nose_print(image: UploadFile = File(...)):
             "confidence": result["confidence"],
             "raw_score": result.get("raw_score", result["confidence"]),
             "message": result.get("message"),
-            "all_similarities": result.get("all_similarities")
+            "all_similarities": result.get("all_similarities"),
+            "quality": result.get("quality")
         }
         
+    except HTTPException:
+        raise
+    except ModelBusyError as e:
+        log_audit("scan-busy", {"error": str(e)})
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         log_audit("scan-exception", {"error": str(e)})
         logger.error(f"Error scanning nose: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_pet_info(pet_id: str, similarity_data: dict, pet_data: Optional[dict]) -> dict:
+    """Entrada de registered_pets_comparison con los metadatos del pet-service (o valores por defecto)"""
+    pet_info = {
+        "petId": pet_id,
+        "final_score": similarity_data.get("final_score", 0),
+        "model_scores": similarity_data.get("model_scores", {}),
+        "match": similarity_data.get("final_score", 0) >= nose_print_model.threshold
+    }
+    if pet_data is not None:
+        pet_info["petName"] = pet_data.get("name") or "Mascota Desconocida"
+        pet_info["breed"] = pet_data.get("breed") or "Desconocida"
+        pet_info["noseImageUrl"] = pet_data.get("noseImageUrl")
+    else:
+        pet_info["petName"] = "Mascota Desconocida"
+        pet_info["breed"] = "Desconocida"
+    return pet_info
+
+def build_analysis_summary(registered_pets_comparison: List[dict], uploaded_features: dict, total_compared: int) -> dict:
+    return {
+        "total_pets_compared": total_compared,
+        "pets_returned": len(registered_pets_comparison),
+        "matching_pets": sum(1 for pet in registered_pets_comparison if pet["match"]),
+        "best_match_score": registered_pets_comparison[0]["final_score"] if registered_pets_comparison else 0,
+        "threshold_used": nose_print_model.threshold,
+        "confidence_boost": nose_print_model.confidence_boost,
+        "feature_models_used": list(uploaded_features.keys())
+    }
+
+async def stream_visual_comparison(uploaded_features: dict, similarities: dict, total_compared: int):
+    """NDJSON: cabecera, una línea por mascota en orden de ranking en cuanto tiene metadatos, y resumen"""
+    yield json.dumps({
+        "type": "header",
+        "uploaded_image_features": {
+            "feature_models": list(uploaded_features.keys()),
+            "feature_dimensions": {model: len(features) for model, features in uploaded_features.items()}
+        },
+        "total_pets_compared": total_compared
+    }, ensure_ascii=False) + "\n"
+    
+    # Las consultas al pet-service corren en paralelo; cada línea sale en cuanto ella y las anteriores están listas
+    lookups = [(pet_id, data, asyncio.ensure_future(pet_client.get_pet(pet_id))) for pet_id, data in similarities.items()]
+    registered_pets_comparison = []
+    try:
+        for rank, (pet_id, similarity_data, lookup) in enumerate(lookups, start=1):
+            pet_info = build_pet_info(pet_id, similarity_data, await lookup)
+            registered_pets_comparison.append(pet_info)
+            yield json.dumps({"type": "pet", "rank": rank, **pet_info}, ensure_ascii=False) + "\n"
+    finally:
+        # Si el cliente corta la conexión no se dejan consultas huérfanas
+        for _, _, lookup in lookups:
+            lookup.cancel()
+    
+    yield json.dumps({
+        "type": "summary",
+        "analysis_summary": build_analysis_summary(registered_pets_comparison, uploaded_features, total_compared)
+    }, ensure_ascii=False) + "\n"
+
 @app.post("/visual-comparison")
-async def visual_comparison(image: UploadFile = File(...)):
+async def visual_comparison(image: UploadFile = File(...), top_k: int = TopKQuery(),
+                            stream: bool = Query(False, description="Responder en NDJSON a medida que se enriquece cada mascota")):
     """Endpoint para comparación visual detallada de huella nasal"""
     log_audit("visual-comparison-request", {
         "filename": image.filename,
@@ -279,62 +720,45 @@ async def visual_comparison(image: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="File must be an image")
     
     try:
-        img_bytes = await image.read()
+        with stage("upload_read"):
+            img_bytes = await image.read()
         
-        # Extraer características de la imagen subida
-        uploaded_features = nose_print_model.extract_nose_features(img_bytes)
+        # Decodificar una sola vez; compare_nose_print reutiliza las características ya extraídas
+        decoded = await model_executor.run(decode_upload, img_bytes)
+        
+        # Filtro de calidad antes de pagar el realce y los forward passes
+        quality = None
+        if isinstance(decoded, DecodedImage):
+            quality = await model_executor.run(nose_print_model.assess_quality, decoded)
+            if quality is not None and not quality["accepted"]:
+                log_audit("visual-comparison-rejected", {"quality": quality, "img_size": len(img_bytes)})
+                raise quality_rejection({"quality": quality})
         
-        # Obtener comparaciones con todas las mascotas registradas
-        all_similarities = nose_print_model.compare_nose_print(img_bytes)
+        # Extraer características de la imagen subida
+        uploaded_features = await model_executor.run(nose_print_model.extract_nose_features, decoded)
         
-        # Preparar respuesta detallada
-        registered_pets_comparison = []
-        top_matches = []
+        # Comparar con todas las mascotas registradas; sólo las top_k mejores se enriquecen y serializan
+        comparison = await model_executor.run(nose_print_model.compare_nose_print, decoded, top_k=top_k)
+        similarities = comparison.get("all_similarities") or {}
+        if comparison.get("match"):
+            record_match("visual-comparison")
+        total_compared = len(nose_print_model.index)
         
-        if "all_similarities" in all_similarities:
-            for pet_id, similarity_data in all_similarities["all_similarities"].items():
-                pet_info = {
-                    "petId": pet_id,
-                    "final_score": similarity_data.get("final_score", 0),
-                    "model_scores": similarity_data.get("model_scores", {}),
-                    "match": similarity_data.get("final_score", 0) >= nose_print_model.threshold
-                }
-                
-                # Obtener información de la mascota
-                try:
-                    pet_response = requests.get(f"http://localhost:8083/pets/{pet_id}", timeout=5)
-                    if pet_response.status_code == 200:
-                        pet_data = pet_response.json()
-                        pet_info["petName"] = pet_data.get("name", "Mascota Desconocida")
-                        pet_info["breed"] = pet_data.get("breed", "Desconocida")
-                        pet_info["noseImageUrl"] = pet_data.get("noseImageUrl")
-                    else:
-                        pet_info["petName"] = "Mascota Desconocida"
-                        pet_info["breed"] = "Desconocida"
-                except Exception as e:
-                    logger.warning(f"Could not fetch pet info for {pet_id}: {str(e)}")
-                    pet_info["petName"] = "Mascota Desconocida"
-                    pet_info["breed"] = "Desconocida"
-                
-                registered_pets_comparison.append(pet_info)
-                
-                # Agregar a top matches si supera el umbral
-                if pet_info["match"]:
-                    top_matches.append(pet_info)
+        if stream:
+            return StreamingResponse(
+                stream_visual_comparison(uploaded_features, similarities, total_compared),
+                media_type="application/x-ndjson"
+            )
         
-        # Ordenar por score
-        registered_pets_comparison.sort(key=lambda x: x["final_score"], reverse=True)
-        top_matches.sort(key=lambda x: x["final_score"], reverse=True)
+        # Metadatos de las mascotas en paralelo (fan-out acotado, caché y circuit breaker)
+        pets_data = await pet_client.get_pets(similarities.keys())
         
-        # Análisis resumido
-        analysis_summary = {
-            "total_pets_compared": len(registered_pets_comparison),
-            "matching_pets": len(top_matches),
-            "best_match_score": registered_pets_comparison[0]["final_score"] if registered_pets_comparison else 0,
-            "threshold_used": nose_print_model.threshold,
-            "confidence_boost": nose_print_model.confidence_boost,
-            "feature_models_used": list(uploaded_features.keys())
-        }
+        # all_similarities ya viene ordenado por score
+        registered_pets_comparison = [
+            build_pet_info(pet_id, similarity_data, pets_data.get(pet_id))
+            for pet_id, similarity_data in similarities.items()
+        ]
+        top_matches = [pet for pet in registered_pets_comparison if pet["match"]]
         
         return {
             "uploaded_image_features": {
@@ -343,9 +767,15 @@ async def visual_comparison(image: UploadFile = File(...)):
             },
             "registered_pets_comparison": registered_pets_comparison,
             "top_matches": top_matches,
-            "analysis_summary": analysis_summary
+            "analysis_summary": build_analysis_summary(registered_pets_comparison, uploaded_features, total_compared),
+            "quality": comparison.get("quality", quality)
         }
         
+    except HTTPException:
+        raise
+    except ModelBusyError as e:
+        log_audit("visual-comparison-busy", {"error": str(e)})
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         log_audit("visual-comparison-exception", {"error": str(e)})
         logger.error(f"Error in visual comparison: {str(e)}")
@@ -354,14 +784,18 @@ async def visual_comparison(image: UploadFile = File(...)):
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    # Sin provocar la carga de los modelos lazy
+    advanced_model = model_roster.peek("advanced")
+    simple_model = model_roster.peek("simple")
     return {
         "status": "healthy",
         "nose_print_model_loaded": len(nose_print_model.feature_models) > 0,
-        "advanced_model_loaded": len(advanced_model.feature_models) > 0,
-        "simple_model_loaded": True,
+        "advanced_model_loaded": advanced_model is not None and len(advanced_model.feature_models) > 0,
+        "simple_model_loaded": simple_model is not None,
         "total_pets_nose_print": len(nose_print_model.embeddings),
-        "total_pets_advanced": len(advanced_model.embeddings),
-        "total_pets_simple": len(simple_model.embeddings),
+        "total_pets_advanced": len(advanced_model.embeddings) if advanced_model is not None else None,
+        "total_pets_simple": len(simple_model.embeddings) if simple_model is not None else None,
+        "model_roster": model_roster.stats(),
         "threshold": nose_print_model.threshold,
         "confidence_boost": nose_print_model.confidence_boost,
         "active_model": "nose_print",
@@ -377,10 +811,14 @@ async def root():
         "endpoints": {
             "health": "/health",
             "register": "/register-embedding",
+            "register_batch": "/register-embeddings/batch",
+            "reload": "/reload-embeddings",
             "compare": "/compare",
             "scan": "/scan",
             "train": "/train-model",
             "stats": "/model-stats",
+            "metrics": "/metrics",
+            "profiles": "/admin/profiles",
             "threshold": "/update-threshold",
             "confidence_boost": "/update-confidence-boost"
         },
@@ -0,0 +1,237 @@
+import bisect
+import glob
+import hashlib
+import mmap
+import os
+from array import array
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) de los histogramas de latencia: de 0.5 ms (búsqueda, caché) a 10 s (lote, primer uso)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Etapas del pipeline de reconocimiento (/scan, /compare, /register-embedding)
+STAGES = (
+    "upload_read",             # await UploadFile.read()
+    "decode",                  # cv2.imdecode de la subida (DecodedImage)
+    "quality_gate",            # filtro de calidad sobre la miniatura (antes de la inferencia)
+    "enhance",                 # enhance_nose_image + resize a 224
+    "backbone_mobilenet",      # forward pass (backbone + cabeza, o sólo backbone en el fan-out)
+    "backbone_efficientnet",
+    "nose_specific",           # características hechas a mano
+    "similarity_search",       # sincronización con otros workers + EmbeddingIndex.search
+    "pet_service",             # metadatos de la mascota (caché o HTTP)
+    "audit_write"              # encolar el evento de auditoría
+)
+
+ENDPOINTS = ("scan", "compare", "visual-comparison", "register-embedding", "register-batch")
+
+class MetricsRegistry:
+    """Contadores e histogramas en un único arreglo de doubles, con exposición en formato Prometheus.
+
+    Las series se declaran al importar el módulo, así todos los workers tienen la misma
+    disposición. Con share(directorio) el arreglo pasa a ser un archivo mapeado por proceso y
+    render() suma los archivos de todos los workers; sin él cada worker expone sólo lo suyo.
+    Registrar una observación es una búsqueda binaria y dos sumas con un candado (sin numpy:
+    indexar un escalar de numpy cuesta más que la medición).
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._values = array('d')
+        self._layout: List[str] = []
+        self._metrics: List = []
+        self._gauges: List[Tuple[str, str, str, Callable[[], Dict[str, float]]]] = []
+        self._lock = threading.Lock()
+        self.shared_dir: Optional[str] = None
+
+    def _allocate(self, keys: Sequence[str]) -> int:
+        if self.shared_dir is not None:
+            raise RuntimeError("Las métricas se declaran antes de share()")
+        offset = len(self._layout)
+        self._layout.extend(keys)
+        self._values.extend([0.0] * len(keys))
+        return offset
+
+    def add(self, slot: int, amount: float = 1.0):
+        with self._lock:
+            self._values[slot] += amount
+
+    def layout_hash(self) -> str:
+        return hashlib.sha1("\n".join(self._layout).encode('utf-8')).hexdigest()[:12]
+
+    def gauge(self, name: str, help_text: str, label: str, collect: Callable[[], Dict[str, float]]):
+        """Valor calculado al exponer (p. ej. tamaño del registro); no se suma entre workers"""
+        self._gauges.append((name, help_text, label, collect))
+
+    def share(self, directory: str):
+        """Mover los valores a `directorio/<layout>-<pid>.metrics` para agregarlos entre workers"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.layout_hash()}-{os.getpid()}.metrics")
+        size = len(self._layout) * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Un archivo previo del mismo pid (worker reiniciado) se continúa: los contadores no retroceden
+            reuse = os.fstat(fd).st_size == size
+            if not reuse:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            mapped = memoryview(mmap.mmap(fd, size)).cast('d')
+        finally:
+            os.close(fd)
+        with self._lock:
+            for i, value in enumerate(self._values):
+                mapped[i] += value
+            self._values = mapped
+            self.shared_dir = directory
+
+    def snapshot(self) -> Tuple[np.ndarray, int]:
+        """Valores sumados de todos los workers (o sólo de este proceso) y cuántos se sumaron"""
+        if self.shared_dir is None:
+            return np.array(self._values, dtype=np.float64), 1
+        total = np.zeros(len(self._layout), dtype=np.float64)
+        workers = 0
+        for path in glob.glob(os.path.join(self.shared_dir, f"{self.layout_hash()}-*.metrics")):
+            try:
+                values = np.fromfile(path, dtype=np.float64)
+            except OSError:
+                continue
+            if values.shape[0] == total.shape[0]:
+                total += values
+                workers += 1
+        return total, workers
+
+    def render(self) -> str:
+        """Texto de exposición de Prometheus (version 0.0.4)"""
+        values, workers = self.snapshot()
+        lines: List[str] = []
+        for metric in self._metrics:
+            metric.render(values, lines)
+        for name, help_text, label, collect in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            try:
+                samples = collect()
+            except Exception as e:
+                logger.warning(f"No se pudo calcular {name}: {e}")
+                samples = {}
+            for label_value, value in samples.items():
+                lines.append(f'{name}{{{label}="{label_value}"}} {_format(value)}')
+        lines.append("# HELP nose_metrics_workers Procesos cuyos valores se sumaron en esta respuesta")
+        lines.append("# TYPE nose_metrics_workers gauge")
+        lines.append(f"nose_metrics_workers {workers}")
+        return "\n".join(lines) + "\n"
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Contador por valor de etiqueta (los valores se fijan al declararlo)"""
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, label: str, label_values: Iterable[str]):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.label_values = tuple(label_values)
+        offset = registry._allocate([f"{name}|{v}" for v in self.label_values])
+        self._slots = {v: offset + i for i, v in enumerate(self.label_values)}
+        registry._metrics.append(self)
+
+    def inc(self, label_value: str, amount: float = 1.0):
+        slot = self._slots.get(label_value)
+        if slot is not None and self.registry.enabled:
+            self.registry.add(slot, amount)
+
+    def render(self, values: np.ndarray, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} counter")
+        for label_value, slot in self._slots.items():
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {_format(values[slot])}')
+
+class _Timer:
+    __slots__ = ("histogram", "label_value", "start")
+
+    def __init__(self, histogram: "Histogram", label_value: str):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.label_value, time.perf_counter() - self.start)
+        return False
+
+class Histogram:
+    """Histograma por valor de etiqueta: un contador por bucket (no acumulado), desbordes y suma"""
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, label: str,
+                 label_values: Iterable[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.label_values = tuple(label_values)
+        width = len(self.buckets) + 2  # buckets finitos, +Inf, suma
+        offset = registry._allocate([f"{name}|{v}|{i}" for v in self.label_values for i in range(width)])
+        self._bases = {v: offset + i * width for i, v in enumerate(self.label_values)}
+        registry._metrics.append(self)
+
+    def observe(self, label_value: str, seconds: float):
+        base = self._bases.get(label_value)
+        if base is None or not self.registry.enabled:
+            return
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        registry = self.registry
+        with registry._lock:
+            registry._values[base + bucket] += 1
+            registry._values[base + len(self.buckets) + 1] += seconds
+
+    def time(self, label_value: str) -> _Timer:
+        """with histogram.time("decode"): ..."""
+        return _Timer(self, label_value)
+
+    def render(self, values: np.ndarray, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} histogram")
+        width = len(self.buckets) + 2
+        for label_value, base in self._bases.items():
+            counts = values[base:base + width - 1]
+            cumulative = np.cumsum(counts)
+            for bound, count in zip(self.buckets, cumulative):
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {_format(count)}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {_format(cumulative[-1])}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {_format(values[base + width - 1])}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {_format(cumulative[-1])}')
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = Histogram(REGISTRY, "nose_stage_seconds", "Latencia de cada etapa del pipeline de reconocimiento", "stage", STAGES)
+REQUEST_SECONDS = Histogram(REGISTRY, "nose_request_seconds", "Latencia total por endpoint", "endpoint", ENDPOINTS)
+REQUESTS = Counter(REGISTRY, "nose_requests_total", "Peticiones recibidas por endpoint", "endpoint", ENDPOINTS)
+ERRORS = Counter(REGISTRY, "nose_request_errors_total", "Peticiones terminadas con error (4xx/5xx) por endpoint", "endpoint", ENDPOINTS)
+MATCHES = Counter(REGISTRY, "nose_matches_total", "Comparaciones con coincidencia por endpoint", "endpoint", ENDPOINTS)
+
+def stage(name: str) -> _Timer:
+    """with stage("decode"): ... mide una etapa del pipeline"""
+    return STAGE_SECONDS.time(name)
+
+def record_request(endpoint: str, seconds: float, failed: bool):
+    """Una petición terminada: latencia total y, si respondió 4xx/5xx o lanzó excepción, un error"""
+    REQUESTS.inc(endpoint)
+    REQUEST_SECONDS.observe(endpoint, seconds)
+    if failed:
+        ERRORS.inc(endpoint)
+
+def record_match(endpoint: str):
+    MATCHES.inc(endpoint)
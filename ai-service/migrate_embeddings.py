@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Migración única de los embeddings JSON heredados al almacén binario (snapshot + log)
+"""
+
+import sys
+import logging
+
+from embedding_store import EmbeddingStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Archivos por defecto de NosePrintModel, AdvancedNoseModel y SimpleNoseModel
+DEFAULT_FILES = [
+    "nose_print_embeddings.json",
+    "advanced_embeddings.json",
+    "embeddings.json"
+]
+
+def main():
+    """Función principal"""
+    paths = sys.argv[1:] or DEFAULT_FILES
+    for path in paths:
+        store = EmbeddingStore(path)
+        if store.migrate_from_json():
+            print(f"✅ {path} -> {store.snapshot_path}")
+        else:
+            print(f"⏭️  {path}: nada que migrar")
+
+if __name__ == "__main__":
+    main()
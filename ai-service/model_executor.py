@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ModelBusyError(Exception):
+    """Demasiadas tareas de modelo en espera; la petición debe reintentarse"""
+
+class ModelExecutor:
+    """Pool acotado de hilos para el trabajo de CPU (OpenCV, TensorFlow, búsqueda de similitud).
+
+    El event loop sólo espera el resultado, así que /health y el resto de endpoints de I/O siguen
+    respondiendo durante una ráfaga de escaneos. Las tareas por encima de `max_pending`
+    (en ejecución + en cola) se rechazan con ModelBusyError en lugar de acumularse sin límite.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="model")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        # Envoltorio opcional de cada tarea (perfiles bajo demanda); None = la tarea se ejecuta tal cual
+        self.wrap_call: Optional[Callable[[Callable], Callable]] = None
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Ejecutar func(*args, **kwargs) en el pool sin bloquear el event loop"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ModelBusyError(f"Servicio ocupado: {self.pending} tareas de modelo en curso")
+            self.pending += 1
+        try:
+            call = functools.partial(func, *args, **kwargs)
+            if self.wrap_call is not None:
+                call = self.wrap_call(call)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, call)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,167 @@
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Modelos conocidos y su archivo de embeddings por defecto
+MODEL_FILES = {
+    "nose_print": "nose_print_embeddings.json",
+    "advanced": "advanced_embeddings.json",
+    "simple": "embeddings.json"
+}
+
+# /scan, /compare y /visual-comparison dependen de este modelo: siempre activo y cargado al arrancar
+PRIMARY_MODEL = "nose_print"
+
+def process_rss_bytes() -> int:
+    """Memoria residente actual del proceso (0 si no se puede leer)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def parse_model_list(value: str) -> List[str]:
+    """'nose_print, advanced' -> ['nose_print', 'advanced'] (valida los nombres)"""
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in MODEL_FILES]
+    if unknown:
+        raise ValueError(f"Modelos desconocidos: {unknown} (disponibles: {list(MODEL_FILES)})")
+    return names
+
+def loaded_backbone_registry():
+    """Registro de backbones compartidos sólo si algún modelo ya cargó TensorFlow (no lo importa)"""
+    module = sys.modules.get("backbone_registry")
+    return module.get_backbone_registry() if module is not None else None
+
+def model_factories(directory: Optional[str] = None) -> Dict[str, Callable[[], object]]:
+    """Constructores de cada modelo con sus embeddings ya cargados (una sola lectura del registro).
+
+    Las clases se importan dentro de cada constructor: un modelo que no se construye no importa
+    TensorFlow ni sus dependencias.
+    """
+    def path(name: str) -> str:
+        return os.path.join(directory, MODEL_FILES[name]) if directory else MODEL_FILES[name]
+
+    def nose_print():
+        from nose_print_model import NosePrintModel
+        return NosePrintModel(path("nose_print"))  # carga sus embeddings en __init__
+
+    def advanced():
+        from advanced_nose_model import AdvancedNoseModel
+        model = AdvancedNoseModel(path("advanced"))
+        model.load_embeddings()
+        return model
+
+    def simple():
+        from simple_nose_model import SimpleNoseModel
+        model = SimpleNoseModel(path("simple"))
+        model.load_embeddings()
+        return model
+
+    return {"nose_print": nose_print, "advanced": advanced, "simple": simple}
+
+class LazyModel:
+    """Un modelo del roster: se construye una sola vez, al arrancar o en su primer uso"""
+
+    def __init__(self, name: str, factory: Callable[[], object]):
+        self.name = name
+        self._factory = factory
+        self._model = None
+        self._pending: List[Callable[[object], None]] = []
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.rss_delta_bytes: Optional[int] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def peek(self):
+        """El modelo si ya está construido, sin provocar la carga"""
+        return self._model
+
+    def get(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                rss_before = process_rss_bytes()
+                start = time.perf_counter()
+                model = self._factory()
+                for apply in self._pending:
+                    apply(model)
+                self._pending = []
+                self.load_seconds = time.perf_counter() - start
+                self.rss_delta_bytes = process_rss_bytes() - rss_before
+                self._model = model
+                logger.info(f"Modelo {self.name} cargado en {self.load_seconds:.2f}s")
+        return self._model
+
+    def apply(self, change: Callable[[object], None]):
+        """Aplicar un ajuste ahora o, si aún no se cargó, en cuanto se construya"""
+        with self._lock:
+            if self._model is None:
+                self._pending.append(change)
+                return
+        change(self._model)
+
+    def stats(self) -> Dict:
+        return {
+            "active": True,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "rss_delta_bytes": self.rss_delta_bytes
+        }
+
+class ModelRoster:
+    """Modelos activos del servicio según configuración.
+
+    Los modelos fuera de `active` nunca se construyen. Los activos en `lazy` se construyen en su
+    primer uso (p. ej. el primer registro), con sus grafos de TensorFlow y su archivo de
+    embeddings; el resto se construye al crear el roster.
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[], object]], active: Sequence[str], lazy: Sequence[str] = ()):
+        if PRIMARY_MODEL not in active:
+            raise ValueError(f"El roster debe incluir {PRIMARY_MODEL}")
+        if PRIMARY_MODEL in lazy:
+            logger.warning(f"{PRIMARY_MODEL} atiende /scan: se carga al arrancar aunque figure como lazy")
+        self._slots = {name: LazyModel(name, factories[name]) for name in MODEL_FILES if name in active}
+        self.lazy = [name for name in self._slots if name in lazy and name != PRIMARY_MODEL]
+        for name, slot in self._slots.items():
+            if name not in self.lazy:
+                slot.get()
+
+    @property
+    def active(self) -> List[str]:
+        return list(self._slots)
+
+    def get(self, name: str):
+        """Modelo activo (construyéndolo si es su primer uso) o None si está inactivo"""
+        slot = self._slots.get(name)
+        return slot.get() if slot is not None else None
+
+    def peek(self, name: str):
+        """Modelo sólo si ya está construido"""
+        slot = self._slots.get(name)
+        return slot.peek() if slot is not None else None
+
+    def loaded_models(self) -> Dict[str, object]:
+        return {name: slot.peek() for name, slot in self._slots.items() if slot.loaded}
+
+    def apply(self, change: Callable[[object], None], names: Optional[Sequence[str]] = None):
+        for name, slot in self._slots.items():
+            if names is None or name in names:
+                slot.apply(change)
+
+    def stats(self) -> Dict:
+        return {
+            name: (self._slots[name].stats() if name in self._slots else {"active": False, "loaded": False})
+            for name in MODEL_FILES
+        }
@@ -0,0 +1,175 @@
+import numpy as np
+import cv2
+import time
+from typing import Dict, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_MORPH_KERNEL = np.ones((2, 2), np.uint8)
+
+class _StageTimer:
+    """Acumula la duración de cada etapa en `timings` (ms); no hace nada si timings es None"""
+
+    def __init__(self, timings: Optional[Dict[str, float]]):
+        self.timings = timings
+        self.last = time.perf_counter() if timings is not None else 0.0
+
+    def lap(self, stage: str):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+def enhance_nose_image_reference(img: np.ndarray, timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Implementación original de NosePrintModel._enhance_nose_image (float64, resolución completa).
+
+    Se conserva sólo como referencia para benchmarks/enhancement_parity.py; el servicio usa
+    enhance_nose_image.
+    """
+    timer = _StageTimer(timings)
+    img_float = img.astype(np.float32) / 255.0
+
+    # Convertir a escala de grises para procesamiento
+    gray = cv2.cvtColor(img_float, cv2.COLOR_RGB2GRAY)
+    gray_uint8 = np.uint8(gray * 255)
+    timer.lap('gray')
+
+    # 1. CLAHE AGRESIVO para resaltar contrastes locales
+    clahe = cv2.createCLAHE(clipLimit=6.0, tileGridSize=(8,8))
+    gray_enhanced = clahe.apply(gray_uint8)
+    timer.lap('clahe')
+
+    # 2. DETECCIÓN DE BORDES MÚLTIPLE para capturar diferentes tipos de relieves
+    # Bordes de Canny para grietas finas
+    edges_canny = cv2.Canny(gray_enhanced, 20, 80)
+    timer.lap('canny')
+
+    # Bordes de Sobel para relieves más suaves
+    sobel_x = cv2.Sobel(gray_enhanced, cv2.CV_64F, 1, 0, ksize=3)
+    sobel_y = cv2.Sobel(gray_enhanced, cv2.CV_64F, 0, 1, ksize=3)
+    sobel_magnitude = np.sqrt(sobel_x**2 + sobel_y**2)
+    sobel_normalized = np.uint8(sobel_magnitude * 255 / sobel_magnitude.max())
+    timer.lap('sobel')
+
+    # Bordes de Laplacian para detalles finos
+    laplacian = cv2.Laplacian(gray_enhanced, cv2.CV_64F)
+    laplacian_abs = np.uint8(np.absolute(laplacian))
+    timer.lap('laplacian')
+
+    # 3. COMBINAR TODOS LOS BORDES para crear una imagen de relieves completa
+    edges_combined = cv2.addWeighted(edges_canny, 0.4, sobel_normalized, 0.4, 0)
+    edges_combined = cv2.addWeighted(edges_combined, 0.8, laplacian_abs, 0.2, 0)
+    timer.lap('edge_blend')
+
+    # 4. UMBRALIZACIÓN ADAPTATIVA para resaltar patrones únicos
+    thresh_adaptive = cv2.adaptiveThreshold(gray_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    timer.lap('adaptive_threshold')
+
+    # 5. MORFOLOGÍA para limpiar y conectar patrones
+    kernel = np.ones((2,2), np.uint8)
+    edges_morph = cv2.morphologyEx(edges_combined, cv2.MORPH_CLOSE, kernel)
+    timer.lap('morphology')
+
+    # 6. COMBINAR IMAGEN ORIGINAL CON RELIEVES RESALTADOS
+    # Convertir bordes a escala de grises
+    edges_gray = cv2.cvtColor(edges_morph, cv2.COLOR_GRAY2RGB)
+    thresh_gray = cv2.cvtColor(thresh_adaptive, cv2.COLOR_GRAY2RGB)
+
+    # Mezcla inteligente: 60% imagen original + 40% relieves resaltados
+    enhanced = cv2.addWeighted(img_float, 0.6, edges_gray.astype(np.float32) / 255.0, 0.4, 0)
+
+    # 7. NORMALIZACIÓN FINAL
+    enhanced = np.clip(enhanced, 0, 1)
+
+    # 8. CONVERTIR A BLANCO Y NEGRO CON ALTO CONTRASTE
+    enhanced_gray = cv2.cvtColor(enhanced, cv2.COLOR_RGB2GRAY)
+    timer.lap('overlay')
+    enhanced_gray = cv2.equalizeHist(np.uint8(enhanced_gray * 255))
+    timer.lap('equalize')
+
+    # 9. APLICAR UMBRAL FINAL para crear imagen binaria de alta calidad
+    _, final_binary = cv2.threshold(enhanced_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    # 10. CONVERTIR DE VUELTA A RGB (blanco y negro)
+    final_rgb = cv2.cvtColor(final_binary, cv2.COLOR_GRAY2RGB)
+
+    result = final_rgb.astype(np.float32) / 255.0
+    timer.lap('otsu')
+    return result
+
+def enhance_nose_image(img: np.ndarray, max_side: int = 0, timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Convertir a blanco y negro y resaltar relieves, grietas y bordes de la nariz (float32/uint8).
+
+    Misma secuencia que enhance_nose_image_reference, con estos cambios:
+    - Sobel y magnitud en float32 (cv2.magnitude) en lugar de float64 con np.sqrt
+    - Laplaciano en int16 exacto; se reproduce el desbordamiento módulo 256 del cast a uint8 original
+    - se eliminan el umbral adaptativo y su conversión a RGB, que no se usaban
+    - la mezcla 60/40 y la conversión a gris se fusionan en un solo canal: como los bordes son
+      iguales en R, G y B y los pesos de RGB2GRAY suman 1, gris(0.6·img + 0.4·bordes) es
+      0.6·gris(img) + 0.4·bordes
+    - max_side > 0 reduce la imagen (INTER_AREA) a ese lado máximo antes de procesarla; la salida
+      queda a la resolución de trabajo, que de todos modos se redimensiona a 224x224 después
+    Con max_side=0 la salida es binaria (0/1) e idéntica a la referencia salvo píxeles aislados
+    donde el redondeo float32 cruza un umbral; benchmarks/enhancement_parity.py acota esa diferencia.
+    """
+    timer = _StageTimer(timings)
+    if max_side and max(img.shape[:2]) > max_side:
+        scale = max_side / float(max(img.shape[:2]))
+        size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        timer.lap('resize')
+
+    img_float = img.astype(np.float32) / 255.0
+    gray = cv2.cvtColor(img_float, cv2.COLOR_RGB2GRAY)
+    gray_uint8 = (gray * 255).astype(np.uint8)
+    timer.lap('gray')
+
+    # 1. CLAHE agresivo para resaltar contrastes locales
+    clahe = cv2.createCLAHE(clipLimit=6.0, tileGridSize=(8, 8))
+    gray_enhanced = clahe.apply(gray_uint8)
+    timer.lap('clahe')
+
+    # 2. Bordes de Canny para grietas finas
+    edges_canny = cv2.Canny(gray_enhanced, 20, 80)
+    timer.lap('canny')
+
+    # Bordes de Sobel para relieves más suaves (float32)
+    sobel_x = cv2.Sobel(gray_enhanced, cv2.CV_32F, 1, 0, ksize=3)
+    sobel_y = cv2.Sobel(gray_enhanced, cv2.CV_32F, 0, 1, ksize=3)
+    sobel_magnitude = cv2.magnitude(sobel_x, sobel_y)
+    max_magnitude = float(sobel_magnitude.max())
+    if max_magnitude > 0:
+        sobel_normalized = (sobel_magnitude * np.float32(255.0 / max_magnitude)).astype(np.uint8)
+    else:
+        sobel_normalized = np.zeros_like(gray_enhanced)
+    timer.lap('sobel')
+
+    # Laplaciano para detalles finos: |lap| <= 1020 cabe en int16 y el cast original se quedaba con el byte bajo
+    laplacian = cv2.Laplacian(gray_enhanced, cv2.CV_16S)
+    laplacian_abs = (np.abs(laplacian) & 0xFF).astype(np.uint8)
+    timer.lap('laplacian')
+
+    # 3. Combinar bordes (uint8 con saturación, igual que la referencia)
+    edges_combined = cv2.addWeighted(edges_canny, 0.4, sobel_normalized, 0.4, 0)
+    edges_combined = cv2.addWeighted(edges_combined, 0.8, laplacian_abs, 0.2, 0)
+    timer.lap('edge_blend')
+
+    # 4. Morfología para limpiar y conectar patrones
+    edges_morph = cv2.morphologyEx(edges_combined, cv2.MORPH_CLOSE, _MORPH_KERNEL)
+    timer.lap('morphology')
+
+    # 5. Mezcla 60% imagen + 40% relieves, directamente en escala de grises
+    enhanced_gray = cv2.addWeighted(gray, 0.6, edges_morph.astype(np.float32), 0.4 / 255.0, 0)
+    np.clip(enhanced_gray, 0, 1, out=enhanced_gray)
+    timer.lap('overlay')
+    enhanced_gray = cv2.equalizeHist((enhanced_gray * 255).astype(np.uint8))
+    timer.lap('equalize')
+
+    # 6. Umbral de Otsu directamente a 0/1 y réplica en tres canales
+    _, final_binary = cv2.threshold(enhanced_gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    result = cv2.cvtColor(final_binary, cv2.COLOR_GRAY2RGB).astype(np.float32)
+    timer.lap('otsu')
+    return result
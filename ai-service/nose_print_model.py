@@ -2,190 +2,182 @@ import numpy as np
 import cv2
 import os
 import json
-from typing import List, Dict, Tuple
+import threading
+from typing import List, Dict, Tuple, Optional, Sequence
 import logging
-import tensorflow as tf
-from tensorflow.keras.applications import MobileNetV2, EfficientNetB0
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input as mobilenet_preprocess
-from tensorflow.keras.applications.efficientnet import preprocess_input as efficientnet_preprocess
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import Model
-from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout, Concatenate
-from sklearn.metrics.pairwise import cosine_similarity
-import pickle
-from datetime import datetime
+from embedding_index import EmbeddingIndex
+from ann_index import IVFIndex
+from config import Config
+from embedding_store import Changes, EmbeddingStore
+from inference_backends import create_backend, backend_version_suffix, mobilenet_preprocess, efficientnet_preprocess
+from image_pipeline import DecodedImage, ImageInput, as_decoded, content_digest
+from nose_enhancement import enhance_nose_image
+from nose_specific_features import nose_specific_features
+from feature_artifacts import get_feature_artifacts
+from feature_cache import FeatureCache
+from image_quality import ImageQualityGate
+from metrics import stage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _enhanced_224(decoded: DecodedImage) -> np.ndarray:
+    with stage("enhance"):
+        return cv2.resize(enhance_nose_image(decoded.rgb, max_side=Config.NOSE_ENHANCE_MAX_SIDE), (224, 224))
+
+def preprocess_nose_input(img_bytes: ImageInput) -> Dict[str, np.ndarray]:
+    """Entradas (1, 224, 224, 3) de cada familia a partir de la nariz realzada; sólo numpy/OpenCV"""
+    decoded = as_decoded(img_bytes)
+    
+    # Aplicar mejoras específicas para nariz y redimensionar una sola vez para ambos backbones
+    enhanced_224 = decoded.memo('nose_enhanced@224x224', lambda: _enhanced_224(decoded))
+    base_array = np.expand_dims(np.asarray(enhanced_224, dtype=np.float32), axis=0)
+    
+    processed_images = {}
+    
+    # Procesar para MobileNetV2 (preprocess_input modifica el arreglo en sitio)
+    processed_images['mobilenet'] = mobilenet_preprocess(base_array.copy())
+    
+    # Procesar para EfficientNetB0
+    processed_images['efficientnet'] = efficientnet_preprocess(base_array)
+    
+    return processed_images
+
 class NosePrintModel:
-    def __init__(self, embeddings_path="nose_print_embeddings.json"):
+    # Prefijo de las cabezas en el artefacto y de la versión de cada embedding
+    ARTIFACT_PREFIX = "nose_print"
+
+    # Pesos de fusión por familia de características
+    MODEL_WEIGHTS = {
+        'mobilenet': 0.35,      # Características generales
+        'efficientnet': 0.35,   # Características específicas
+        'nose_specific': 0.30   # MAYOR PESO para manchas y patrones únicos
+    }
+
+    # Familias extraídas con redes y arquitectura de sus cabezas
+    FAMILIES = ('mobilenet', 'efficientnet')
+    HEAD_UNITS = [1024, 512, 256]
+    HEAD_DROPOUTS = [0.4, 0.3]
+
+    def __init__(self, embeddings_path="nose_print_embeddings.json", backend: Optional[str] = None):
         self.embeddings_path = embeddings_path
         self.embeddings = {}
         self.feature_models = {}
+        self.backend = None
         # Umbral más estricto para huellas nasales
         self.threshold = 0.85  # Reducido de 0.90 para ser más flexible
         self.confidence_boost = 1.2  # Aumentado para compensar la flexibilidad
-        self._initialize_models()
+        # Serializa escrituras y sincronizaciones con los demás workers (embeddings + índice)
+        self._sync_lock = threading.RLock()
+        self._initialize_models(backend or Config.INFERENCE_BACKEND)
+        # Cada runtime/variante produce embeddings ligeramente distintos: se versionan por separado
+        self.embedding_version = f"{self.ARTIFACT_PREFIX}-{get_feature_artifacts().tag}"
+        if self.backend is not None:
+            self.embedding_version += backend_version_suffix(self.backend)
+        self.store = EmbeddingStore(embeddings_path, self.embedding_version, Config.EMBEDDING_STORE_COMPACT_EVERY)
+        # Con precisión float16/int8 el top del escaneo se re-puntúa con los vectores float32 del store:
+        # desde la última compactación son vistas del snapshot mapeado (sólo el log queda en copias privadas)
+        self.index = EmbeddingIndex(
+            list(self.MODEL_WEIGHTS.keys()),
+            precision=Config.EMBEDDING_INDEX_PRECISION,
+            exact_vectors=lambda pet_id: self.embeddings.get(pet_id),
+            rescore_candidates=Config.EMBEDDING_INDEX_RESCORE_CANDIDATES
+        )
+        if Config.ANN_ENABLED:
+            self.index.attach_ann(IVFIndex(
+                self.MODEL_WEIGHTS,
+                nlist=Config.ANN_NLIST,
+                nprobe=Config.ANN_NPROBE,
+                min_pets=Config.ANN_MIN_PETS,
+                train_sample=Config.ANN_TRAIN_SAMPLE,
+                train_iters=Config.ANN_TRAIN_ITERS
+            ))
+        # Caché por contenido: reintentos con la misma foto y re-registros no vuelven a extraer
+        self.feature_cache = None
+        if Config.FEATURE_CACHE_ENABLED:
+            self.feature_cache = FeatureCache(
+                f"{self.embedding_version}-enh{Config.NOSE_ENHANCE_MAX_SIDE}",
+                max_bytes=Config.FEATURE_CACHE_MAX_BYTES,
+                disk_dir=Config.FEATURE_CACHE_DIR or None,
+                disk_max_entries=Config.FEATURE_CACHE_DISK_MAX_ENTRIES
+            )
+        # Filtro de calidad: fotos borrosas, mal expuestas o diminutas no llegan a la inferencia
+        self.quality_gate = None
+        if Config.QUALITY_GATE_MODE != "off":
+            self.quality_gate = ImageQualityGate.from_config(Config)
         self.load_embeddings()
         
-    def _initialize_models(self):
-        """Inicializar modelos específicos para huellas nasales"""
+    def _initialize_models(self, backend_name: str):
+        """Inicializar los extractores de huella nasal con el backend configurado (keras | onnx | tflite)"""
         try:
             # Modelo 1: MobileNetV2 optimizado para texturas
-            mobilenet_base = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
-            mobilenet_x = mobilenet_base.output
-            mobilenet_x = GlobalAveragePooling2D()(mobilenet_x)
-            mobilenet_x = Dense(1024, activation='relu')(mobilenet_x)
-            mobilenet_x = Dropout(0.4)(mobilenet_x)
-            mobilenet_x = Dense(512, activation='relu')(mobilenet_x)
-            mobilenet_x = Dropout(0.3)(mobilenet_x)
-            mobilenet_x = Dense(256, activation='relu')(mobilenet_x)
-            
-            self.feature_models['mobilenet'] = Model(inputs=mobilenet_base.input, outputs=mobilenet_x)
-            
             # Modelo 2: EfficientNetB0 para detalles finos
-            efficientnet_base = EfficientNetB0(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
-            efficientnet_x = efficientnet_base.output
-            efficientnet_x = GlobalAveragePooling2D()(efficientnet_x)
-            efficientnet_x = Dense(1024, activation='relu')(efficientnet_x)
-            efficientnet_x = Dropout(0.4)(efficientnet_x)
-            efficientnet_x = Dense(512, activation='relu')(efficientnet_x)
-            efficientnet_x = Dropout(0.3)(efficientnet_x)
-            efficientnet_x = Dense(256, activation='relu')(efficientnet_x)
-            
-            self.feature_models['efficientnet'] = Model(inputs=efficientnet_base.input, outputs=efficientnet_x)
-            
-            # Congelar capas base
-            for model in self.feature_models.values():
-                for layer in model.layers[:-9]:  # No congelar las últimas capas
-                    layer.trainable = False
+            self.backend = create_backend(
+                backend_name, Config.INFERENCE_BACKEND_VARIANT, self.ARTIFACT_PREFIX, self.FAMILIES,
+                self.HEAD_UNITS, self.HEAD_DROPOUTS, get_feature_artifacts(), Config.INFERENCE_BACKEND_THREADS
+            )
+            self.feature_models = self.backend.models
                     
-            logger.info(f"Modelos de huella nasal inicializados: {list(self.feature_models.keys())}")
+            logger.info(f"Modelos de huella nasal inicializados ({self.backend.name}): {list(self.feature_models.keys())}")
             
         except Exception as e:
             logger.error(f"Error inicializando modelos: {e}")
+            self.backend = None
             self.feature_models = {}
     
-    def preprocess_nose_image(self, img_bytes: bytes) -> Dict[str, np.ndarray]:
-        """Preprocesamiento específico para imágenes de nariz"""
-        # Convertir bytes a imagen
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
-        
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen")
-        
-        # Manejar imágenes con canal alfa (RGBA)
-        if img.shape[-1] == 4:  # RGBA
-            # Convertir RGBA a RGB usando fondo blanco
-            alpha = img[:, :, 3] / 255.0
-            rgb = img[:, :, :3].astype(np.float32)
-            white_background = np.ones_like(rgb) * 255
-            img = (rgb * alpha[:, :, np.newaxis] + white_background * (1 - alpha[:, :, np.newaxis])).astype(np.uint8)
-        elif img.shape[-1] == 3:  # BGR
-            # Convertir BGR a RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        else:
-            # Convertir escala de grises a RGB
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-        
-        # Aplicar mejoras específicas para nariz
-        img_enhanced = self._enhance_nose_image(img)
-        
-        processed_images = {}
-        
-        # Procesar para MobileNetV2
-        mobilenet_img = cv2.resize(img_enhanced, (224, 224))
-        mobilenet_array = image.img_to_array(mobilenet_img)
-        mobilenet_array = np.expand_dims(mobilenet_array, axis=0)
-        mobilenet_array = mobilenet_preprocess(mobilenet_array)
-        processed_images['mobilenet'] = mobilenet_array
-        
-        # Procesar para EfficientNetB0
-        efficientnet_img = cv2.resize(img_enhanced, (224, 224))
-        efficientnet_array = image.img_to_array(efficientnet_img)
-        efficientnet_array = np.expand_dims(efficientnet_array, axis=0)
-        efficientnet_array = efficientnet_preprocess(efficientnet_array)
-        processed_images['efficientnet'] = efficientnet_array
-        
-        return processed_images
+    @property
+    def uses_shared_backbones(self) -> bool:
+        """Si las entradas de este modelo pueden ir al fan-out de BackboneRegistry (sólo keras)"""
+        return bool(self.feature_models) and self.backend.shared_backbones
+    
+    def preprocess_nose_image(self, img_bytes: ImageInput) -> Dict[str, np.ndarray]:
+        """Preprocesamiento específico para imágenes de nariz (acepta bytes o DecodedImage)"""
+        return preprocess_nose_input(img_bytes)
     
     def _enhance_nose_image(self, img: np.ndarray) -> np.ndarray:
         """MEJORADO: Convertir a blanco y negro y resaltar relieves, grietas y bordes de la nariz"""
-        img_float = img.astype(np.float32) / 255.0
-        
-        # Convertir a escala de grises para procesamiento
-        gray = cv2.cvtColor(img_float, cv2.COLOR_RGB2GRAY)
-        gray_uint8 = np.uint8(gray * 255)
-        
-        # 1. CLAHE AGRESIVO para resaltar contrastes locales
-        clahe = cv2.createCLAHE(clipLimit=6.0, tileGridSize=(8,8))
-        gray_enhanced = clahe.apply(gray_uint8)
-        
-        # 2. DETECCIÓN DE BORDES MÚLTIPLE para capturar diferentes tipos de relieves
-        # Bordes de Canny para grietas finas
-        edges_canny = cv2.Canny(gray_enhanced, 20, 80)
-        
-        # Bordes de Sobel para relieves más suaves
-        sobel_x = cv2.Sobel(gray_enhanced, cv2.CV_64F, 1, 0, ksize=3)
-        sobel_y = cv2.Sobel(gray_enhanced, cv2.CV_64F, 0, 1, ksize=3)
-        sobel_magnitude = np.sqrt(sobel_x**2 + sobel_y**2)
-        sobel_normalized = np.uint8(sobel_magnitude * 255 / sobel_magnitude.max())
-        
-        # Bordes de Laplacian para detalles finos
-        laplacian = cv2.Laplacian(gray_enhanced, cv2.CV_64F)
-        laplacian_abs = np.uint8(np.absolute(laplacian))
-        
-        # 3. COMBINAR TODOS LOS BORDES para crear una imagen de relieves completa
-        edges_combined = cv2.addWeighted(edges_canny, 0.4, sobel_normalized, 0.4, 0)
-        edges_combined = cv2.addWeighted(edges_combined, 0.8, laplacian_abs, 0.2, 0)
-        
-        # 4. UMBRALIZACIÓN ADAPTATIVA para resaltar patrones únicos
-        thresh_adaptive = cv2.adaptiveThreshold(gray_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-        
-        # 5. MORFOLOGÍA para limpiar y conectar patrones
-        kernel = np.ones((2,2), np.uint8)
-        edges_morph = cv2.morphologyEx(edges_combined, cv2.MORPH_CLOSE, kernel)
-        
-        # 6. COMBINAR IMAGEN ORIGINAL CON RELIEVES RESALTADOS
-        # Convertir bordes a escala de grises
-        edges_gray = cv2.cvtColor(edges_morph, cv2.COLOR_GRAY2RGB)
-        thresh_gray = cv2.cvtColor(thresh_adaptive, cv2.COLOR_GRAY2RGB)
-        
-        # Mezcla inteligente: 60% imagen original + 40% relieves resaltados
-        enhanced = cv2.addWeighted(img_float, 0.6, edges_gray.astype(np.float32) / 255.0, 0.4, 0)
-        
-        # 7. NORMALIZACIÓN FINAL
-        enhanced = np.clip(enhanced, 0, 1)
-        
-        # 8. CONVERTIR A BLANCO Y NEGRO CON ALTO CONTRASTE
-        enhanced_gray = cv2.cvtColor(enhanced, cv2.COLOR_RGB2GRAY)
-        enhanced_gray = cv2.equalizeHist(np.uint8(enhanced_gray * 255))
-        
-        # 9. APLICAR UMBRAL FINAL para crear imagen binaria de alta calidad
-        _, final_binary = cv2.threshold(enhanced_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # 10. CONVERTIR DE VUELTA A RGB (blanco y negro)
-        final_rgb = cv2.cvtColor(final_binary, cv2.COLOR_GRAY2RGB)
-        
-        return final_rgb.astype(np.float32) / 255.0
+        return enhance_nose_image(img, max_side=Config.NOSE_ENHANCE_MAX_SIDE)
     
-    def extract_nose_features(self, img_bytes: bytes) -> Dict[str, List[float]]:
-        """Extraer características específicas de huella nasal"""
+    def extract_nose_features(self, img_bytes: ImageInput, pooled: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, List[float]]:
+        """Extraer características específicas de huella nasal (pooled: salidas ya calculadas de los backbones).
+
+        Con un DecodedImage el resultado queda cacheado en la imagen, así que varias llamadas
+        en la misma petición (p. ej. /visual-comparison) sólo extraen una vez.
+        """
+        if not isinstance(img_bytes, DecodedImage):
+            # Con bytes se consulta la caché antes de decodificar
+            return self._cached_features(content_digest(img_bytes), lambda: self._compute_nose_features(as_decoded(img_bytes), pooled))
+        decoded = img_bytes
+        return decoded.memo('nose_print_features', lambda: self._cached_features(decoded.digest, lambda: self._compute_nose_features(decoded, pooled)))
+    
+    def _cached_features(self, digest: str, compute) -> Dict[str, List[float]]:
+        if self.feature_cache is None:
+            return compute()
+        # El respaldo 'traditional' por un error transitorio no se guarda
+        return self.feature_cache.get_or_compute(
+            digest, compute, cacheable=lambda features: 'traditional' not in features or not self.feature_models
+        )
+    
+    def _compute_nose_features(self, img_bytes: DecodedImage, pooled: Optional[Dict[str, np.ndarray]]) -> Dict[str, List[float]]:
         try:
             if not self.feature_models:
                 logger.warning("Modelos no disponibles, usando características tradicionales")
                 return {'traditional': self._extract_nose_traditional_features(img_bytes)}
             
-            processed_images = self.preprocess_nose_image(img_bytes)
+            if pooled is None:
+                outputs = {
+                    model_name: self._timed_run(model_name, img_array)
+                    for model_name, img_array in self.preprocess_nose_image(img_bytes).items()
+                }
+            else:
+                # Salidas de los backbones compartidos: sólo faltan las cabezas
+                outputs = {model_name: self.backend.head(model_name, pooled[model_name]) for model_name in self.feature_models if model_name in pooled}
             features = {}
             
             # Extraer características de cada modelo
-            for model_name, model in self.feature_models.items():
-                if model_name in processed_images:
-                    img_array = processed_images[model_name]
-                    model_features = model.predict(img_array, verbose=0)
+            for model_name in self.feature_models:
+                if model_name in outputs:
+                    model_features = outputs[model_name]
                     
                     # Normalizar características
                     features_norm = model_features[0] / np.linalg.norm(model_features[0])
@@ -201,134 +193,56 @@ class NosePrintModel:
             logger.error(f"Error en extracción de características de nariz: {e}")
             return {'traditional': self._extract_nose_traditional_features(img_bytes)}
     
-    def _extract_nose_specific_features(self, img_bytes: bytes) -> List[float]:
-        """Extraer características específicas de la nariz incluyendo manchas y patrones únicos"""
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
-        
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen")
-        
-        # Manejar imágenes con canal alfa (RGBA)
-        if img.shape[-1] == 4:  # RGBA
-            # Convertir RGBA a RGB usando fondo blanco
-            alpha = img[:, :, 3] / 255.0
-            rgb = img[:, :, :3].astype(np.float32)
-            white_background = np.ones_like(rgb) * 255
-            img = (rgb * alpha[:, :, np.newaxis] + white_background * (1 - alpha[:, :, np.newaxis])).astype(np.uint8)
-        elif img.shape[-1] == 3:  # BGR
-            # Convertir BGR a RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        else:
-            # Convertir escala de grises a RGB
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-        img = cv2.resize(img, (224, 224))
-        
-        features = []
-        
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        gray_uint8 = np.clip(gray.astype(np.float32) * 255, 0, 255).astype(np.uint8)
-        
-        # MEJORA: Detección de manchas y características únicas
-        # Detectar manchas usando umbral adaptativo
-        thresh = cv2.adaptiveThreshold(gray_uint8, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Características de manchas
-        spot_features = []
-        if contours:
-            # Encontrar las manchas más grandes
-            areas = [cv2.contourArea(c) for c in contours]
-            if areas:
-                max_area = max(areas)
-                spot_features.extend([
-                    len(contours),  # Número de manchas
-                    max_area / (224 * 224),  # Área de la mancha más grande
-                    sum(areas) / (224 * 224),  # Área total de manchas
-                    np.mean(areas) if areas else 0  # Área promedio
-                ])
+    def _timed_run(self, family: str, batch: np.ndarray) -> np.ndarray:
+        """Forward pass de una familia (backbone + cabeza) medido como etapa backbone_<familia>"""
+        with stage(f"backbone_{family}"):
+            return self.backend.run(family, batch)
+    
+    def extract_nose_features_batch(self, images: Sequence[DecodedImage], pooled: Optional[Dict[str, np.ndarray]] = None) -> List[Dict[str, List[float]]]:
+        """Características de un lote de imágenes (pooled: {backbone: (N, D)} ya calculado, sólo keras).
+
+        Cada extractor corre una sola vez sobre todo el lote y nose_specific usa el extractor
+        vectorizado; si algo falla se extrae imagen por imagen como en el registro individual.
+        """
+        if not self.feature_models:
+            return [self.extract_nose_features(img) for img in images]
+        try:
+            if pooled is None:
+                inputs = [self.preprocess_nose_image(img) for img in images]
+                outputs = {
+                    model_name: self._timed_run(model_name, np.concatenate([x[model_name] for x in inputs], axis=0))
+                    for model_name in self.feature_models
+                }
             else:
-                spot_features = [0, 0, 0, 0]
-        else:
-            spot_features = [0, 0, 0, 0]
-        
-        features.extend(spot_features)
-        
-        # Características específicas de textura de nariz
-        # Histograma de gradientes
-        grad_x = cv2.Sobel(gray_uint8, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray_uint8, cv2.CV_64F, 0, 1, ksize=3)
-        magnitude = np.sqrt(grad_x**2 + grad_y**2)
-        angle = np.arctan2(grad_y, grad_x)
-        
-        # Histograma de gradientes (HOG simplificado)
-        hist_mag = np.histogram(magnitude, bins=16, range=(0, np.max(magnitude)))[0]
-        hist_angle = np.histogram(angle, bins=16, range=(-np.pi, np.pi))[0]
-        
-        features.extend(hist_mag / np.sum(hist_mag))
-        features.extend(hist_angle / np.sum(hist_angle))
-        
-        # Características de textura local
-        # Matriz de co-ocurrencia simplificada
-        for i in range(0, 224, 32):
-            for j in range(0, 224, 32):
-                patch = gray_uint8[i:i+32, j:j+32]
-                if patch.size > 0:
-                    features.extend([
-                        float(np.mean(patch)),
-                        float(np.std(patch)),
-                        float(np.max(patch)),
-                        float(np.min(patch))
-                    ])
-        
-        # Características de forma de la nariz
-        # Detectar contornos
-        edges = cv2.Canny(gray_uint8, 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if contours:
-            # Encontrar el contorno más grande (probablemente la nariz)
-            largest_contour = max(contours, key=cv2.contourArea)
-            area = cv2.contourArea(largest_contour)
-            perimeter = cv2.arcLength(largest_contour, True)
-            
-            features.extend([
-                float(area / (224 * 224)),  # Área normalizada
-                float(perimeter / (2 * (224 + 224))),  # Perímetro normalizado
-                float(area / (perimeter * perimeter)) if perimeter > 0 else 0  # Circularidad
-            ])
-        else:
-            features.extend([0.0, 0.0, 0.0])
-        
-        # Normalización L2
-        features_norm = np.array(features)
-        features_norm = features_norm / np.linalg.norm(features_norm)
-        
-        return features_norm.tolist()
+                outputs = {model_name: self.backend.head(model_name, pooled[model_name]) for model_name in self.feature_models if model_name in pooled}
+            families = {}
+            for model_name in self.feature_models:
+                if model_name in outputs:
+                    model_features = outputs[model_name]
+                    families[model_name] = model_features / np.linalg.norm(model_features, axis=1, keepdims=True)
+            families['nose_specific'] = self.extract_nose_specific_batch(images)
+            logger.info(f"Características de nariz extraídas para un lote de {len(images)} imágenes")
+            batch_features = [{name: rows[i].tolist() for name, rows in families.items()} for i in range(len(images))]
+            if self.feature_cache is not None:
+                for img, features in zip(images, batch_features):
+                    self.feature_cache.put(img.digest, features)
+            return batch_features
+        except Exception as e:
+            logger.error(f"Error en extracción por lote, extrayendo imagen por imagen: {e}")
+            return [self.extract_nose_features(img) for img in images]
+    
+    def _extract_nose_specific_features(self, img_bytes: ImageInput) -> List[float]:
+        """Extraer características específicas de la nariz incluyendo manchas y patrones únicos"""
+        return self.extract_nose_specific_batch([img_bytes])[0].tolist()
+    
+    def extract_nose_specific_batch(self, images: Sequence[ImageInput]) -> np.ndarray:
+        """Características nose_specific de un lote de imágenes como arreglo (N, D) float32"""
+        with stage("nose_specific"):
+            return nose_specific_features([as_decoded(img).resized('rgb', (224, 224)) for img in images])
     
-    def _extract_nose_traditional_features(self, img_bytes: bytes) -> List[float]:
+    def _extract_nose_traditional_features(self, img_bytes: ImageInput) -> List[float]:
         """Extraer características tradicionales específicas para nariz"""
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
-        
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen")
-        
-        # Manejar imágenes con canal alfa (RGBA)
-        if img.shape[-1] == 4:  # RGBA
-            # Convertir RGBA a RGB usando fondo blanco
-            alpha = img[:, :, 3] / 255.0
-            rgb = img[:, :, :3].astype(np.float32)
-            white_background = np.ones_like(rgb) * 255
-            img = (rgb * alpha[:, :, np.newaxis] + white_background * (1 - alpha[:, :, np.newaxis])).astype(np.uint8)
-        elif img.shape[-1] == 3:  # BGR
-            # Convertir BGR a RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        else:
-            # Convertir escala de grises a RGB
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-        img = cv2.resize(img, (224, 224))
+        img = as_decoded(img_bytes).resized('rgb', (224, 224))
         
         features = []
         
@@ -385,33 +299,100 @@ class NosePrintModel:
         return features_norm.tolist()
     
     def load_embeddings(self):
-        """Cargar embeddings guardados"""
-        if os.path.exists(self.embeddings_path):
-            with open(self.embeddings_path, 'r') as f:
-                self.embeddings = json.load(f)
+        """Cargar embeddings guardados (snapshot binario + log append-only)"""
+        with self._sync_lock:
+            self.embeddings = self.store.load()
+            stale = self.stale_embedding_count()
+            if stale:
+                logger.warning(f"{stale} embeddings fueron generados con otra versión del extractor (actual: {self.embedding_version})")
+            if self.embeddings:
                 logger.info(f"Cargados {len(self.embeddings)} embeddings de huella nasal")
-        else:
-            self.embeddings = {}
-            logger.info("No se encontraron embeddings de huella nasal previos")
+            else:
+                logger.info("No se encontraron embeddings de huella nasal previos")
+            if self._load_shared_index():
+                return
+            self.index.rebuild(self.embeddings)
+            if Config.EMBEDDING_INDEX_SHARED and self.embeddings:
+                # Sin índice compartido para este snapshot: el primer worker compacta y lo publica
+                self.save_embeddings()
+
+    def _load_shared_index(self) -> bool:
+        """Mapear el índice del snapshot actual y aplicar encima los registros del log"""
+        if not Config.EMBEDDING_INDEX_SHARED or self.store.snapshot_id is None:
+            return False
+        if not self.index.load_shared(self.store.index_path, self.store.snapshot_id):
+            return False
+        for pet_id in self.store.log_pet_ids:
+            if pet_id in self.embeddings:
+                self.index.upsert(pet_id, self.embeddings[pet_id])
+            else:
+                self.index.remove(pet_id)
+        logger.info(f"Índice compartido mapeado desde {self.store.index_path} ({len(self.store.log_pet_ids)} cambios del log)")
+        return True
+
+    def sync_embeddings(self) -> bool:
+        """Incorporar lo que registraron otros workers; sin cambios sólo lee el contador compartido"""
+        if not self.store.changed():
+            return False
+        with self._sync_lock:
+            changes = self.store.pending_changes()
+            if changes is None:
+                # Otro worker compactó: recargar el snapshot y mapear su índice
+                self.load_embeddings()
+            else:
+                self._apply_changes(changes)
+        return True
+
+    def _apply_changes(self, changes: Changes):
+        for pet_id, features in changes.items():
+            if features is None:
+                self.embeddings.pop(pet_id, None)
+                self.index.remove(pet_id)
+            else:
+                self.embeddings[pet_id] = features
+                self.index.upsert(pet_id, features)
+    
+    def stale_embedding_count(self) -> int:
+        """Embeddings producidos con un artefacto distinto del cargado (no comparables)"""
+        return sum(1 for pet_id in self.embeddings if self.store.versions.get(pet_id) != self.embedding_version)
     
     def save_embeddings(self):
-        """Guardar embeddings"""
-        with open(self.embeddings_path, 'w') as f:
-            json.dump(self.embeddings, f)
+        """Compactar todos los embeddings en un snapshot atómico (y publicar el índice compartido)"""
+        with self._sync_lock:
+            publish = None
+            if Config.EMBEDDING_INDEX_SHARED:
+                # Filas libres para los registros que caben en el log hasta la próxima compactación
+                publish = lambda: self.index.save_shared(self.store.index_path, self.store.snapshot_id,
+                                                         headroom=Config.EMBEDDING_STORE_COMPACT_EVERY)
+            if not self.store.compact(self.embeddings, apply_changes=self._apply_changes, publish=publish):
+                return
+            if publish is not None:
+                # Cambiar las matrices privadas por el mapeo que acaban de recibir los demás workers
+                self.index.load_shared(self.store.index_path, self.store.snapshot_id)
         logger.info(f"Guardados {len(self.embeddings)} embeddings de huella nasal")
     
-    def register_nose_print(self, pet_id: str, img_bytes: bytes) -> Dict:
-        """Registrar una nueva huella nasal"""
+    def assess_quality(self, img_bytes: ImageInput) -> Optional[Dict]:
+        """Reporte del filtro de calidad (None si está desactivado); lanza ValueError si no se puede decodificar"""
+        if self.quality_gate is None:
+            return None
+        return self.quality_gate.assess(as_decoded(img_bytes))
+    
+    def register_nose_print(self, pet_id: str, img_bytes: ImageInput, pooled: Optional[Dict[str, np.ndarray]] = None) -> Dict:
+        """Registrar una nueva huella nasal (rechazada si no pasa el filtro de calidad)"""
         try:
-            features = self.extract_nose_features(img_bytes)
+            if self.quality_gate is not None:
+                img_bytes = as_decoded(img_bytes)
+                quality = self.assess_quality(img_bytes)
+                if not quality["accepted"]:
+                    return {"status": "error", "message": quality["message"], "quality_rejected": True, "quality": quality}
+            features = self.extract_nose_features(img_bytes, pooled=pooled)
             
             # Convertir numpy arrays a listas para serialización JSON
             features_serializable = {}
             for model_name, model_features in features.items():
                 features_serializable[model_name] = [float(f) for f in model_features]
             
-            self.embeddings[pet_id] = features_serializable
-            self.save_embeddings()
+            self.add_nose_prints([(pet_id, features_serializable)])
             
             total_features = sum(len(f) for f in features_serializable.values())
             logger.info(f"Huella nasal de mascota {pet_id} registrada exitosamente")
@@ -428,71 +409,73 @@ class NosePrintModel:
             logger.error(f"Error registrando huella nasal de mascota {pet_id}: {str(e)}")
             return {"status": "error", "message": str(e)}
     
-    def compare_nose_print(self, img_bytes: bytes) -> Dict:
-        """Comparar huella nasal con mejor manejo de variaciones"""
+    def add_nose_prints(self, entries: List[Tuple[str, Dict[str, List[float]]]]):
+        """Agregar huellas ya extraídas (memoria, índice y una sola escritura al store)"""
+        with self._sync_lock:
+            for pet_id, features in entries:
+                # float32 como al cargar del snapshot (una lista de floats de Python ocupa ~8 veces más)
+                self.embeddings[pet_id] = {name: np.asarray(values, dtype=np.float32) for name, values in features.items()}
+                self.index.upsert(pet_id, features)
+            self.store.put_many(entries)
+            if self.store.should_compact():
+                self.save_embeddings()
+    
+    def compare_nose_print(self, img_bytes: ImageInput, top_k: Optional[int] = None) -> Dict:
+        """Comparar huella nasal con mejor manejo de variaciones (top_k limita all_similarities).
+
+        Con el filtro de calidad activo la foto se evalúa antes de extraer: si se rechaza no hay
+        inferencia ni búsqueda y el resultado lleva `quality_rejected` y el reporte en `quality`.
+        """
+        if self.quality_gate is None:
+            return self._compare_nose_print(img_bytes, top_k)
         try:
-            # Convertir bytes a imagen
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
-            
-            if img is None:
-                raise ValueError("No se pudo decodificar la imagen")
-            
-            # Manejar imágenes con canal alfa (RGBA)
-            if img.shape[-1] == 4:  # RGBA
-                # Convertir RGBA a RGB usando fondo blanco
-                alpha = img[:, :, 3] / 255.0
-                rgb = img[:, :, :3].astype(np.float32)
-                white_background = np.ones_like(rgb) * 255
-                img = (rgb * alpha[:, :, np.newaxis] + white_background * (1 - alpha[:, :, np.newaxis])).astype(np.uint8)
-            elif img.shape[-1] == 3:  # BGR
-                # Convertir BGR a RGB
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            else:
-                # Convertir escala de grises a RGB
-                img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-            
-            # Extraer características directamente de los bytes
-            features = self.extract_nose_features(img_bytes)
-            
-            if not self.embeddings:
-                return {
-                    "match": False,
-                    "confidence": 0.0,
-                    "message": "No hay mascotas registradas",
-                    "all_similarities": {}
-                }
-            
-            # Calcular similitudes con pesos ajustados para detectar características únicas
-            similarities = {}
-            model_weights = {
-                'mobilenet': 0.35,      # Características generales
-                'efficientnet': 0.35,   # Características específicas
-                'nose_specific': 0.30   # MAYOR PESO para manchas y patrones únicos
+            img_bytes = as_decoded(img_bytes)
+        except ValueError as e:
+            return {"match": False, "confidence": 0.0, "message": f"Error en comparación: {str(e)}", "all_similarities": {}}
+        quality = self.assess_quality(img_bytes)
+        if not quality["accepted"]:
+            return {
+                "match": False,
+                "confidence": 0.0,
+                "message": quality["message"],
+                "all_similarities": {},
+                "quality_rejected": True,
+                "quality": quality
             }
+        result = self._compare_nose_print(img_bytes, top_k)
+        result["quality"] = quality
+        return result
+    
+    def _compare_nose_print(self, img_bytes: ImageInput, top_k: Optional[int]) -> Dict:
+        try:
+            # Extraer características (se decodifica una sola vez)
+            features = self.extract_nose_features(img_bytes)
             
-            for pet_id, stored_features in self.embeddings.items():
-                model_scores = {}
-                weighted_score = 0.0
+            with stage("similarity_search"):
+                # Registros hechos en otros workers desde la última consulta
+                self.sync_embeddings()
                 
-                for model_name in model_weights.keys():
-                    if model_name in features and model_name in stored_features:
-                        similarity = self.cosine_similarity_nose(
-                            features[model_name], stored_features[model_name]
-                        )
-                        model_scores[model_name] = similarity
-                        weighted_score += similarity * model_weights[model_name]
+                if len(self.index) == 0:
+                    return {
+                        "match": False,
+                        "confidence": 0.0,
+                        "message": "No hay mascotas registradas",
+                        "all_similarities": {}
+                    }
                 
-                similarities[pet_id] = {
-                    'final_score': weighted_score,
-                    'model_scores': model_scores
+                # Calcular similitudes contra todo el índice (una multiplicación por familia)
+                ranked = self.index.search(features, self.MODEL_WEIGHTS, top_k=top_k)
+            all_similarities = {
+                str(pet_id): {
+                    "final_score": final_score,
+                    "model_scores": {str(mk): mv for mk, mv in model_scores.items()}
                 }
+                for pet_id, final_score, model_scores in ranked
+            }
             
             # Encontrar la mejor coincidencia
-            if similarities:
-                best_match = max(similarities.items(), key=lambda x: x[1]['final_score'])
-                best_pet_id, best_score_data = best_match
-                final_score = best_score_data['final_score']
+            if ranked:
+                best_pet_id, final_score, _ = ranked[0]
                 
                 # Aplicar boost de confianza
                 confidence = min(1.0, final_score * self.confidence_boost)
@@ -506,14 +489,14 @@ class NosePrintModel:
                     "raw_score": float(final_score),
                     "petId": str(best_pet_id) if is_match else None,
                     "message": f"Huella nasal {'coincidente' if is_match else 'no coincidente'} encontrada con confianza {confidence*100:.1f}%",
-                    "all_similarities": {str(k): {"final_score": float(v["final_score"]), "model_scores": {str(mk): float(mv) for mk, mv in v["model_scores"].items()}} for k, v in similarities.items()}
+                    "all_similarities": all_similarities
                 }
             
             return {
                 "match": False,
                 "confidence": 0.0,
                 "message": "No se encontraron coincidencias",
-                "all_similarities": {str(k): {"final_score": float(v["final_score"]), "model_scores": {str(mk): float(mv) for mk, mv in v["model_scores"].items()}} for k, v in similarities.items()}
+                "all_similarities": all_similarities
             }
             
         except Exception as e:
@@ -537,13 +520,21 @@ class NosePrintModel:
     
     def get_model_stats(self) -> Dict:
         """Obtener estadísticas del modelo de huella nasal"""
+        self.sync_embeddings()
         return {
             "total_pets": len(self.embeddings),
             "embeddings_path": self.embeddings_path,
+            "store": self.store.stats(),
+            "embedding_version": self.embedding_version,
+            "stale_embeddings": self.stale_embedding_count(),
+            "index": self.index.stats(),
+            "feature_cache": self.feature_cache.stats() if self.feature_cache is not None else None,
+            "quality_gate": self.quality_gate.stats() if self.quality_gate is not None else None,
             "threshold": self.threshold,
             "confidence_boost": self.confidence_boost,
             "model_type": "NosePrintRecognitionModel",
             "available_models": list(self.feature_models.keys()),
+            "inference_backend": f"{self.backend.name}/{self.backend.variant}" if self.backend is not None else None,
             "model_weights": {
                 'mobilenet': 0.35,
                 'efficientnet': 0.40,
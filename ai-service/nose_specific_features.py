@@ -0,0 +1,225 @@
+import numpy as np
+import cv2
+from typing import List, Sequence, Union
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZE = 224
+PATCH_SIZE = 32
+HIST_BINS = 16
+# 4 manchas + 16 magnitud + 16 ángulo + 7x7 parches x 4 estadísticas + 3 forma
+FEATURE_DIM = 4 + 2 * HIST_BINS + (IMAGE_SIZE // PATCH_SIZE) ** 2 * 4 + 3
+
+def nose_specific_features_reference(img: np.ndarray) -> List[float]:
+    """Implementación original de NosePrintModel._extract_nose_specific_features (una imagen a la vez).
+
+    Se conserva sólo como referencia para benchmarks/nose_specific_parity.py; el servicio usa
+    nose_specific_features.
+    """
+    features = []
+
+    # Convertir a escala de grises
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    gray_uint8 = np.clip(gray.astype(np.float32) * 255, 0, 255).astype(np.uint8)
+
+    # MEJORA: Detección de manchas y características únicas
+    # Detectar manchas usando umbral adaptativo
+    thresh = cv2.adaptiveThreshold(gray_uint8, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # Características de manchas
+    spot_features = []
+    if contours:
+        # Encontrar las manchas más grandes
+        areas = [cv2.contourArea(c) for c in contours]
+        if areas:
+            max_area = max(areas)
+            spot_features.extend([
+                len(contours),  # Número de manchas
+                max_area / (224 * 224),  # Área de la mancha más grande
+                sum(areas) / (224 * 224),  # Área total de manchas
+                np.mean(areas) if areas else 0  # Área promedio
+            ])
+        else:
+            spot_features = [0, 0, 0, 0]
+    else:
+        spot_features = [0, 0, 0, 0]
+
+    features.extend(spot_features)
+
+    # Características específicas de textura de nariz
+    # Histograma de gradientes
+    grad_x = cv2.Sobel(gray_uint8, cv2.CV_64F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(gray_uint8, cv2.CV_64F, 0, 1, ksize=3)
+    magnitude = np.sqrt(grad_x**2 + grad_y**2)
+    angle = np.arctan2(grad_y, grad_x)
+
+    # Histograma de gradientes (HOG simplificado)
+    hist_mag = np.histogram(magnitude, bins=16, range=(0, np.max(magnitude)))[0]
+    hist_angle = np.histogram(angle, bins=16, range=(-np.pi, np.pi))[0]
+
+    features.extend(hist_mag / np.sum(hist_mag))
+    features.extend(hist_angle / np.sum(hist_angle))
+
+    # Características de textura local
+    # Matriz de co-ocurrencia simplificada
+    for i in range(0, 224, 32):
+        for j in range(0, 224, 32):
+            patch = gray_uint8[i:i+32, j:j+32]
+            if patch.size > 0:
+                features.extend([
+                    float(np.mean(patch)),
+                    float(np.std(patch)),
+                    float(np.max(patch)),
+                    float(np.min(patch))
+                ])
+
+    # Características de forma de la nariz
+    # Detectar contornos
+    edges = cv2.Canny(gray_uint8, 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    if contours:
+        # Encontrar el contorno más grande (probablemente la nariz)
+        largest_contour = max(contours, key=cv2.contourArea)
+        area = cv2.contourArea(largest_contour)
+        perimeter = cv2.arcLength(largest_contour, True)
+
+        features.extend([
+            float(area / (224 * 224)),  # Área normalizada
+            float(perimeter / (2 * (224 + 224))),  # Perímetro normalizado
+            float(area / (perimeter * perimeter)) if perimeter > 0 else 0  # Circularidad
+        ])
+    else:
+        features.extend([0.0, 0.0, 0.0])
+
+    # Normalización L2
+    features_norm = np.array(features)
+    features_norm = features_norm / np.linalg.norm(features_norm)
+
+    return features_norm.tolist()
+
+def _uniform_edges(first: np.ndarray, last: np.ndarray, bins: int) -> np.ndarray:
+    """Bordes (N, bins + 1) como los calcula np.histogram para bins uniformes en [first, last]"""
+    first = first.astype(np.float64)
+    last = last.astype(np.float64)
+    # np.histogram amplía un rango degenerado a +-0.5
+    degenerate = first == last
+    return np.linspace(np.where(degenerate, first - 0.5, first), np.where(degenerate, last + 0.5, last), bins + 1, axis=1)
+
+def _sorted_histogram(sorted_values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Histogramas normalizados (N, bins) a partir de filas ordenadas y los umbrales internos (N, bins - 1).
+
+    Igual que np.histogram con todos los valores dentro del rango: el bin i cuenta
+    umbral[i-1] <= v < umbral[i] y el último bin es cerrado.
+    """
+    n, total = sorted_values.shape
+    at_least = np.empty((n, thresholds.shape[1] + 2), dtype=np.int64)
+    at_least[:, 0] = total
+    at_least[:, -1] = 0
+    for k in range(n):
+        at_least[k, 1:-1] = total - np.searchsorted(sorted_values[k], thresholds[k], side='left')
+    counts = (at_least[:, :-1] - at_least[:, 1:]).astype(np.float64)
+    return counts / counts.sum(axis=1, keepdims=True)
+
+def _magnitude_histogram(squared: np.ndarray, bins: int) -> np.ndarray:
+    """Histograma de sqrt(squared) en [0, max] sin calcular la raíz por píxel.
+
+    squared es gx² + gy² entero; como la raíz es monótona, v = sqrt(s) >= borde equivale a
+    s >= t, con t el menor entero cuya raíz float64 alcanza el borde (ajustado contra np.sqrt
+    para reproducir exactamente el redondeo de la referencia).
+    """
+    squared_max = squared.max(axis=1)
+    edges = _uniform_edges(np.zeros(len(squared)), np.sqrt(squared_max.astype(np.float64)), bins)[:, 1:-1]
+    candidate = np.ceil(np.maximum(edges, 0) ** 2)
+    for _ in range(2):
+        candidate = np.where((candidate > 0) & (np.sqrt(np.maximum(candidate - 1, 0)) >= edges), candidate - 1, candidate)
+        candidate = np.where(np.sqrt(candidate) < edges, candidate + 1, candidate)
+    thresholds = np.where(edges <= 0, 0, candidate).astype(squared.dtype)
+    return _sorted_histogram(np.sort(squared, axis=1), thresholds)
+
+def _angle_histogram(angle: np.ndarray, bins: int) -> np.ndarray:
+    n = len(angle)
+    edges = _uniform_edges(np.full(n, -np.pi), np.full(n, np.pi), bins)[:, 1:-1]
+    return _sorted_histogram(np.sort(angle, axis=1), edges)
+
+def _spot_features(gray_uint8: np.ndarray) -> List[float]:
+    thresh = cv2.adaptiveThreshold(gray_uint8, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return [0.0, 0.0, 0.0, 0.0]
+    areas = np.fromiter((cv2.contourArea(c) for c in contours), dtype=np.float64, count=len(contours))
+    total = IMAGE_SIZE * IMAGE_SIZE
+    return [len(contours), areas.max() / total, areas.sum() / total, areas.mean()]
+
+def _shape_features(gray_uint8: np.ndarray) -> List[float]:
+    edges = cv2.Canny(gray_uint8, 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return [0.0, 0.0, 0.0]
+    largest_contour = max(contours, key=cv2.contourArea)
+    area = cv2.contourArea(largest_contour)
+    perimeter = cv2.arcLength(largest_contour, True)
+    return [
+        area / (IMAGE_SIZE * IMAGE_SIZE),
+        perimeter / (2 * (IMAGE_SIZE + IMAGE_SIZE)),
+        area / (perimeter * perimeter) if perimeter > 0 else 0.0
+    ]
+
+def nose_specific_features(images: Union[np.ndarray, Sequence[np.ndarray]]) -> np.ndarray:
+    """Características específicas de nariz (manchas, gradientes, parches, forma) de un lote.
+
+    images: imágenes RGB uint8 de 224x224, como arreglo (N, 224, 224, 3) o secuencia.
+    Devuelve un arreglo (N, FEATURE_DIM) float32 normalizado L2 por fila, equivalente a
+    nose_specific_features_reference salvo el redondeo final a float32:
+    - estadísticas de los 49 parches 32x32 con un reshape en bloques y sumas enteras (exactas)
+    - histogramas de magnitud y ángulo de todo el lote ordenando cada fila una vez y contando
+      por umbral, con la misma asignación de bins que np.histogram
+    - Sobel en int16 (exacto para uint8); la magnitud se compara al cuadrado en enteros y sólo
+      el ángulo se calcula en float64
+    Los contornos (manchas y forma) siguen siendo por imagen porque OpenCV no los vectoriza.
+    """
+    batch = np.asarray(images, dtype=np.uint8) if not isinstance(images, np.ndarray) else images
+    if batch.ndim == 3:
+        batch = batch[np.newaxis]
+    n = batch.shape[0]
+    if n == 0:
+        return np.zeros((0, FEATURE_DIM), dtype=np.float32)
+    if batch.shape[1:] != (IMAGE_SIZE, IMAGE_SIZE, 3):
+        raise ValueError(f"Se esperaban imágenes RGB de {IMAGE_SIZE}x{IMAGE_SIZE}, no {batch.shape[1:]}")
+
+    # Misma conversión que la referencia: gris uint8 escalado x255 con saturación
+    gray = np.empty((n, IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
+    grad_x = np.empty((n, IMAGE_SIZE, IMAGE_SIZE), dtype=np.int16)
+    grad_y = np.empty((n, IMAGE_SIZE, IMAGE_SIZE), dtype=np.int16)
+    spots = np.empty((n, 4), dtype=np.float64)
+    shapes = np.empty((n, 3), dtype=np.float64)
+    for k in range(n):
+        g = cv2.cvtColor(batch[k], cv2.COLOR_RGB2GRAY)
+        gray[k] = np.clip(g.astype(np.float32) * 255, 0, 255).astype(np.uint8)
+        cv2.Sobel(gray[k], cv2.CV_16S, 1, 0, dst=grad_x[k], ksize=3)
+        cv2.Sobel(gray[k], cv2.CV_16S, 0, 1, dst=grad_y[k], ksize=3)
+        spots[k] = _spot_features(gray[k])
+        shapes[k] = _shape_features(gray[k])
+
+    # Histogramas de gradientes (HOG simplificado) de todo el lote
+    gx = grad_x.reshape(n, -1).astype(np.int32)
+    gy = grad_y.reshape(n, -1).astype(np.int32)
+    hist_mag = _magnitude_histogram(gx * gx + gy * gy, HIST_BINS)
+    hist_angle = _angle_histogram(np.arctan2(gy, gx, dtype=np.float64), HIST_BINS)
+
+    # Estadísticas por parche 32x32: (N, 7, 32, 7, 32) -> (N, 49, 1024) en orden fila-columna
+    grid = IMAGE_SIZE // PATCH_SIZE
+    patches = gray.reshape(n, grid, PATCH_SIZE, grid, PATCH_SIZE).transpose(0, 1, 3, 2, 4).reshape(n, grid * grid, -1)
+    count = PATCH_SIZE * PATCH_SIZE
+    sums = patches.sum(axis=2, dtype=np.int64)
+    squares = np.einsum('npi,npi->np', patches, patches, dtype=np.int64)
+    means = sums / count
+    stds = np.sqrt((squares - sums.astype(np.float64) ** 2 / count) / count)
+    patch_stats = np.stack([means, stds, patches.max(axis=2), patches.min(axis=2)], axis=2).reshape(n, -1)
+
+    features = np.concatenate([spots, hist_mag, hist_angle, patch_stats, shapes], axis=1)
+    features /= np.linalg.norm(features, axis=1, keepdims=True)
+    return features.astype(np.float32)
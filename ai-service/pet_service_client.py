@@ -0,0 +1,212 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+import httpx
+
+from config import Config
+from metrics import stage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+# httpx registra cada petición en INFO; con el fan-out de /visual-comparison eso inunda el log
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Campos del pet-service que usan /scan y /visual-comparison
+PET_FIELDS = ("name", "breed", "noseImageUrl")
+
+class CircuitBreaker:
+    """Abre el circuito tras `failure_threshold` fallos seguidos y deja pasar una prueba cada `reset_timeout` s.
+
+    closed: todas las llamadas pasan; open: ninguna (se responde con datos por defecto);
+    half_open: una sola llamada de prueba decide si se vuelve a cerrar.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release_probe(self):
+        """La llamada terminó sin respuesta (p. ej. cancelada): no cuenta como fallo ni como éxito,
+        pero si era la prueba de half_open la siguiente llamada vuelve a probar"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(f"Circuito del pet-service abierto tras {self.failures} fallos")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class PetServiceClient:
+    """Cliente async del pet-service con pool keep-alive, fan-out acotado, caché TTL+LRU y circuit breaker.
+
+    get_pet devuelve {"name", "breed", "noseImageUrl"} o None si la mascota no existe o el
+    servicio no está disponible; en ese caso quien llama usa sus nombres por defecto. Si el
+    servicio falla se sirve la última entrada conocida aunque haya caducado.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 2.0, max_connections: int = 20,
+                 max_concurrency: int = 16, cache_ttl: float = 300.0, negative_ttl: float = 30.0,
+                 cache_size: int = 10000, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.cache_size = max(1, cache_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # pet_id -> (expira_en, datos o None si la mascota no existe)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[Dict]]]" = OrderedDict()
+        # Métricas
+        self.requests = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self.stale_hits = 0
+        self.short_circuited = 0
+
+    def _cached(self, pet_id: str, allow_stale: bool = False) -> Tuple[bool, Optional[Dict]]:
+        entry = self._cache.get(pet_id)
+        if entry is None:
+            return False, None
+        expires_at, data = entry
+        if expires_at < time.monotonic() and not allow_stale:
+            return False, None
+        self._cache.move_to_end(pet_id)
+        return True, data
+
+    def _store(self, pet_id: str, data: Optional[Dict]):
+        ttl = self.cache_ttl if data is not None else self.negative_ttl
+        self._cache[pet_id] = (time.monotonic() + ttl, data)
+        self._cache.move_to_end(pet_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _fallback(self, pet_id: str) -> Optional[Dict]:
+        found, data = self._cached(pet_id, allow_stale=True)
+        if found:
+            self.stale_hits += 1
+        return data
+
+    async def get_pet(self, pet_id: str) -> Optional[Dict]:
+        """Metadatos de una mascota (caché primero; nunca lanza excepción)"""
+        with stage("pet_service"):
+            return await self._get_pet(pet_id)
+
+    async def _get_pet(self, pet_id: str) -> Optional[Dict]:
+        found, data = self._cached(pet_id)
+        if found:
+            self.cache_hits += 1
+            return data
+        async with self._semaphore:
+            # Se comprueba ya dentro del semáforo: las llamadas en cola no esperan a un servicio caído
+            if not self.breaker.allow():
+                self.short_circuited += 1
+                return self._fallback(pet_id)
+            is_probe = self.breaker.state == "half_open"
+            self.requests += 1
+            try:
+                response = await self._client.get(f"/pets/{pet_id}")
+            except httpx.HTTPError as e:
+                self.failures += 1
+                self.breaker.record_failure()
+                logger.warning(f"Could not fetch pet info for {pet_id}: {e!r}")
+                return self._fallback(pet_id)
+            except BaseException:
+                # Cancelación (cliente desconectado en /visual-comparison): si era la prueba de
+                # half_open hay que liberarla o el circuito queda atascado para siempre
+                if is_probe:
+                    self.breaker.release_probe()
+                raise
+        if response.status_code >= 500:
+            self.failures += 1
+            self.breaker.record_failure()
+            logger.warning(f"Pet service returned {response.status_code} for {pet_id}")
+            return self._fallback(pet_id)
+        self.breaker.record_success()
+        if response.status_code != 200:
+            logger.warning(f"Pet service returned {response.status_code} for {pet_id}")
+            self._store(pet_id, None)
+            return None
+        try:
+            payload = response.json()
+        except ValueError:
+            logger.warning(f"Respuesta inválida del pet-service para {pet_id}")
+            return self._fallback(pet_id)
+        data = {field: payload.get(field) for field in PET_FIELDS}
+        self._store(pet_id, data)
+        return data
+
+    async def get_pets(self, pet_ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Fan-out concurrente (acotado por max_concurrency) para varias mascotas"""
+        unique_ids = list(dict.fromkeys(pet_ids))
+        results = await asyncio.gather(*(self.get_pet(pet_id) for pet_id in unique_ids))
+        return dict(zip(unique_ids, results))
+
+    def invalidate(self, pet_id: Optional[str] = None):
+        if pet_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(pet_id, None)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "base_url": self.base_url,
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "requests": self.requests,
+            "failures": self.failures,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "stale_hits": self.stale_hits,
+            "short_circuited": self.short_circuited
+        }
+
+def create_pet_service_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> PetServiceClient:
+    """Cliente configurado desde Config (transport permite apuntar a un stub en pruebas)"""
+    return PetServiceClient(
+        Config.PET_SERVICE_URL,
+        timeout=Config.PET_SERVICE_TIMEOUT_SECONDS,
+        max_connections=Config.PET_SERVICE_MAX_CONNECTIONS,
+        max_concurrency=Config.PET_SERVICE_MAX_CONCURRENCY,
+        cache_ttl=Config.PET_CACHE_TTL_SECONDS,
+        negative_ttl=Config.PET_CACHE_NEGATIVE_TTL_SECONDS,
+        cache_size=Config.PET_CACHE_SIZE,
+        failure_threshold=Config.PET_SERVICE_FAILURE_THRESHOLD,
+        reset_timeout=Config.PET_SERVICE_RESET_TIMEOUT_SECONDS,
+        transport=transport
+    )
@@ -0,0 +1,274 @@
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from typing import Callable, Dict, List, Mapping, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sesión de la petición en curso: la fija el middleware y la leen las tareas enviadas al ModelExecutor
+_current_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("profile_session", default=None)
+
+# El profiler de TensorFlow es global al proceso: una sola traza a la vez
+_tf_trace_lock = threading.Lock()
+
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+def _flag(value: Optional[str]) -> bool:
+    return (value or "").lower() in ("1", "true", "yes")
+
+class ProfileSession:
+    """Perfil de una petición: cProfile de cada tarea de modelo y, opcionalmente, una traza de TensorFlow.
+
+    cProfile sólo mide el hilo donde se activa, así que se activa dentro del hilo del pool que
+    ejecuta cada tarea (las tareas de una petición son secuenciales y comparten el mismo Profile).
+    La traza de TensorFlow, en cambio, es global: incluye lo que otras peticiones ejecuten a la vez.
+    """
+
+    def __init__(self, profile_id: str, endpoint: str, reason: str, directory: str, tf_trace: bool):
+        self.profile_id = profile_id
+        self.endpoint = endpoint
+        self.reason = reason
+        self.directory = directory
+        self.tf_trace_dir = os.path.join(directory, "tf_trace") if tf_trace else None
+        self.profiler = cProfile.Profile()
+        self.calls = 0
+        self.cpu_seconds = 0.0
+        self.notes: List[str] = []
+
+    def run(self, call: Callable):
+        tracing = self._start_tf_trace()
+        cpu_start = time.thread_time()
+        self.profiler.enable()
+        try:
+            return call()
+        finally:
+            self.profiler.disable()
+            self.cpu_seconds += time.thread_time() - cpu_start
+            self.calls += 1
+            if tracing:
+                self._stop_tf_trace()
+
+    def _note(self, message: str):
+        if message not in self.notes:
+            self.notes.append(message)
+
+    def _start_tf_trace(self) -> bool:
+        if self.tf_trace_dir is None:
+            return False
+        # Sólo si algún modelo ya cargó TensorFlow: perfilar no debe importarlo
+        tf = sys.modules.get("tensorflow")
+        if tf is None:
+            self._note("TensorFlow no está cargado en este worker: sin traza")
+            return False
+        if not _tf_trace_lock.acquire(blocking=False):
+            self._note("Otra traza de TensorFlow estaba en curso: parte de la petición quedó sin traza")
+            return False
+        try:
+            tf.profiler.experimental.start(self.tf_trace_dir)
+            return True
+        except Exception as e:
+            _tf_trace_lock.release()
+            self._note(f"No se pudo iniciar la traza de TensorFlow: {e}")
+            return False
+
+    def _stop_tf_trace(self):
+        try:
+            sys.modules["tensorflow"].profiler.experimental.stop()
+        except Exception as e:
+            self._note(f"No se pudo cerrar la traza de TensorFlow: {e}")
+        finally:
+            _tf_trace_lock.release()
+
+class RequestProfiler:
+    """Perfiles bajo demanda de peticiones del pipeline, guardados en un directorio acotado.
+
+    Una petición se perfila si trae `X-Profile: true` con el `X-Admin-Token` correcto (y
+    `X-Profile-TF: true` para además trazar TensorFlow) o si cae en la muestra `sample_rate`.
+    Cada perfil es un subdirectorio `<id>/` con cpu.prof (pstats), summary.txt, meta.json y,
+    si hubo traza, tf_trace/. Al guardar se borran los más antiguos por encima de
+    `max_profiles` o `max_bytes`. Varios workers pueden compartir el directorio (el id lleva el pid).
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, admin_token: str = "",
+                 max_profiles: int = 50, max_bytes: int = 200 * 1024 * 1024, top_functions: int = 25):
+        self.directory = directory
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.admin_token = admin_token
+        self.max_profiles = max(1, max_profiles)
+        self.max_bytes = max_bytes
+        self.top_functions = top_functions
+        self.profiled = 0
+        self.pruned = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def is_admin(self, headers: Mapping[str, str]) -> bool:
+        """Sin token configurado no hay acceso de administrador"""
+        token = headers.get("x-admin-token") or ""
+        return bool(self.admin_token) and hmac.compare_digest(token.encode("utf-8"), self.admin_token.encode("utf-8"))
+
+    def begin(self, endpoint: str, headers: Mapping[str, str]) -> Optional[ProfileSession]:
+        """Decidir si esta petición se perfila (cabecera de administrador o muestreo)"""
+        if _flag(headers.get("x-profile")) and self.is_admin(headers):
+            reason, tf_trace = "header", _flag(headers.get("x-profile-tf"))
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            reason, tf_trace = "sample", False
+        else:
+            return None
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        return ProfileSession(profile_id, endpoint, reason, os.path.join(self.directory, profile_id), tf_trace)
+
+    @staticmethod
+    def activate(session: ProfileSession) -> contextvars.Token:
+        return _current_session.set(session)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token):
+        _current_session.reset(token)
+
+    @staticmethod
+    def wrap(call: Callable) -> Callable:
+        """Hook de ModelExecutor: las tareas de una petición perfilada corren bajo su sesión"""
+        session = _current_session.get()
+        if session is None:
+            return call
+        return functools.partial(session.run, call)
+
+    def save(self, session: ProfileSession, status_code: int, wall_seconds: float, user_agent: Optional[str]) -> Dict:
+        """Escribir el perfil de una petición terminada y recortar el directorio"""
+        os.makedirs(session.directory, exist_ok=True)
+        summary = io.StringIO()
+        top_functions: List[Dict] = []
+        if session.calls:
+            session.profiler.dump_stats(os.path.join(session.directory, "cpu.prof"))
+            stats = pstats.Stats(session.profiler, stream=summary)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_functions)
+            top_functions = self._top_functions(stats, 10)
+        else:
+            # Rechazada antes del pool (400, 503): sólo quedan la latencia y los metadatos
+            summary.write("La petición no ejecutó tareas de modelo\n")
+        with open(os.path.join(session.directory, "summary.txt"), "w") as f:
+            f.write(summary.getvalue())
+
+        meta = {
+            "id": session.profile_id,
+            "endpoint": session.endpoint,
+            "reason": session.reason,
+            "created": time.time(),
+            "worker_pid": os.getpid(),
+            "status_code": status_code,
+            "wall_seconds": wall_seconds,
+            "profiled_cpu_seconds": session.cpu_seconds,
+            "profiled_calls": session.calls,
+            "user_agent": user_agent,
+            "tf_trace": session.tf_trace_dir is not None and os.path.isdir(session.tf_trace_dir),
+            "notes": session.notes,
+            "top_functions": top_functions
+        }
+        with open(os.path.join(session.directory, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        self.profiled += 1
+        self._prune()
+        logger.info(f"Perfil {session.profile_id} guardado ({session.reason}, {wall_seconds * 1000:.0f} ms)")
+        return meta
+
+    @staticmethod
+    def _top_functions(stats: pstats.Stats, count: int) -> List[Dict]:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:count]
+        return [
+            {"function": f"{os.path.basename(filename)}:{line}({name})", "calls": calls,
+             "tottime": tottime, "cumtime": cumtime}
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+        ]
+
+    def _profile_dirs(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names
+                if os.path.isfile(os.path.join(self.directory, name, "meta.json"))]
+
+    @staticmethod
+    def _dir_bytes(path: str) -> int:
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _prune(self):
+        """Borrar los perfiles más antiguos hasta cumplir los límites (el más reciente se conserva)"""
+        entries = []
+        for path in self._profile_dirs():
+            try:
+                entries.append((os.path.getmtime(os.path.join(path, "meta.json")), path, self._dir_bytes(path)))
+            except OSError:
+                continue  # otro worker lo está borrando
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        while len(entries) > 1 and (len(entries) > self.max_profiles or total > self.max_bytes):
+            _, path, size = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.pruned += 1
+
+    def list_profiles(self) -> List[Dict]:
+        """Metadatos de los perfiles guardados por todos los workers, del más reciente al más antiguo"""
+        profiles = []
+        for path in self._profile_dirs():
+            try:
+                with open(os.path.join(path, "meta.json")) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda meta: meta.get("created", 0), reverse=True)
+
+    def profile_file(self, profile_id: str, name: str) -> Optional[str]:
+        """Ruta de un archivo de un perfil (None si el id no es válido o no existe)"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id, name)
+        return path if os.path.exists(path) else None
+
+    def trace_archive(self, profile_id: str) -> Optional[bytes]:
+        """Traza de TensorFlow del perfil comprimida en zip (para TensorBoard)"""
+        trace_dir = self.profile_file(profile_id, "tf_trace")
+        if trace_dir is None:
+            return None
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for root, _, files in os.walk(trace_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    archive.write(path, os.path.relpath(path, os.path.dirname(trace_dir)))
+        return buffer.getvalue()
+
+    def stats(self) -> Dict:
+        return {
+            "directory": self.directory,
+            "sample_rate": self.sample_rate,
+            "header_trigger": bool(self.admin_token),
+            "max_profiles": self.max_profiles,
+            "max_bytes": self.max_bytes,
+            "profiled": self.profiled,
+            "pruned": self.pruned,
+            "stored": len(self._profile_dirs())
+        }
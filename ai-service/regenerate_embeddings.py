@@ -1,111 +1,225 @@
 #!/usr/bin/env python3
 """
 Script para regenerar embeddings usando las imágenes reales de cada mascota
+
+La reconstrucción corre dentro de este proceso (sin pasar por /register-embedding):
+  - descarga las imágenes de nariz en paralelo con concurrencia acotada
+  - registra por tramos con inferencia por lotes (BatchRegistrar) en un directorio de staging
+  - el store de staging es el checkpoint: si se interrumpe, al volver a ejecutar se retoma
+    desde la última mascota registrada (las fallidas se reintentan)
+  - al terminar publica los archivos nuevos con os.replace; el servicio en vivo sigue
+    respondiendo con los embeddings anteriores hasta ese momento, y las mascotas que se
+    registraron en vivo mientras tanto se conservan en el índice publicado (las eliminadas
+    del pet-service no)
+
+Uso (desde ai-service/):
+    python regenerate_embeddings.py
+    python regenerate_embeddings.py --reload-url http://localhost:8000/reload-embeddings
 """
 
-import requests
+import argparse
+import asyncio
 import json
 import os
-from typing import Dict, List
+import sys
+import time
+from typing import Dict, List, Optional, Set
 import logging
+import httpx
+
+from config import Config
+from batch_registration import BatchRegistrar
+from model_roster import MODEL_FILES, ModelRoster, model_factories, parse_model_list
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_all_pets() -> List[Dict]:
+class Progress:
+    """Avance de la reconstrucción: mascotas hechas, fallidas, imágenes/s y tiempo estimado"""
+
+    def __init__(self, total: int, already_done: int, report_every: float = 5.0):
+        self.total = total
+        self.done = already_done
+        self.resumed = already_done
+        self.failures: Dict[str, str] = {}
+        self.report_every = report_every
+        self.started = time.perf_counter()
+        self._last_report = 0.0
+
+    def update(self, results: List[Dict]):
+        for result in results:
+            if result.get("status") == "registered":
+                self.done += 1
+            else:
+                self.failures[result["petId"]] = result.get("message", "error")
+        now = time.perf_counter()
+        if now - self._last_report >= self.report_every:
+            self._last_report = now
+            self.report()
+
+    def images_per_sec(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return (self.done - self.resumed) / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        rate = self.images_per_sec()
+        remaining = self.total - self.done - len(self.failures)
+        eta = remaining / rate if rate > 0 else float("inf")
+        print(f"📊 {self.done}/{self.total} registradas, {len(self.failures)} fallidas, "
+              f"{rate:.1f} imágenes/s, ETA {eta:.0f}s", flush=True)
+
+async def get_all_pets(client: httpx.AsyncClient, pet_service_url: str) -> List[Dict]:
     """Obtener todas las mascotas del pet-service"""
     try:
-        response = requests.get("http://localhost:8083/pets", timeout=10)
+        response = await client.get(f"{pet_service_url.rstrip('/')}/pets", timeout=30)
         if response.status_code == 200:
             return response.json()
-        else:
-            print(f"Error obteniendo mascotas: {response.status_code}")
-            return []
-    except Exception as e:
-        print(f"Error conectando al pet-service: {e}")
-        return []
-
-def download_pet_image(image_url: str, pet_id: str) -> bytes:
-    """Descargar imagen de la mascota desde GCS"""
-    try:
-        response = requests.get(image_url, timeout=30)
-        if response.status_code == 200:
-            return response.content
-        else:
-            print(f"Error descargando imagen para {pet_id}: {response.status_code}")
+        print(f"Error obteniendo mascotas: {response.status_code}")
+    except httpx.HTTPError as e:
+        print(f"Error conectando al pet-service: {e!r}")
+    return []
+
+async def download_pet_image(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, pet: Dict) -> Optional[bytes]:
+    """Descargar imagen de la mascota desde GCS (None si falla)"""
+    async with semaphore:
+        try:
+            response = await client.get(pet["noseImageUrl"])
+        except httpx.HTTPError as e:
+            logger.warning(f"Error descargando imagen para {pet['id']}: {e!r}")
             return None
-    except Exception as e:
-        print(f"Error descargando imagen para {pet_id}: {e}")
+    if response.status_code != 200:
+        logger.warning(f"Error descargando imagen para {pet['id']}: {response.status_code}")
         return None
+    return response.content
 
-def register_embedding(pet_id: str, image_bytes: bytes) -> bool:
-    """Registrar embedding en el AI Service"""
-    try:
-        files = {'image': ('nose.jpg', image_bytes, 'image/jpeg')}
-        
-        response = requests.post(
-            f"http://localhost:8000/register-embedding?petId={pet_id}",
-            files=files,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            print(f"✅ Embedding registrado para {pet_id}")
-            return True
-        else:
-            print(f"❌ Error registrando embedding para {pet_id}: {response.status_code}")
+def load_models(directory: str) -> ModelRoster:
+    """Modelos activos del roster apuntando a los archivos de `directory` (cargan lo ya registrado)"""
+    roster = ModelRoster(model_factories(directory), parse_model_list(Config.MODEL_ROSTER))
+    for model in roster.loaded_models().values():
+        # Se compacta una sola vez al final, no cada EMBEDDING_STORE_COMPACT_EVERY registros
+        model.store.compact_every = 0
+    return roster
+
+def register_chunk(registrar: BatchRegistrar, sources) -> List[Dict]:
+    """Extraer y escribir un tramo; el put_many con fsync deja el checkpoint al día"""
+    results = registrar.extract(sources)
+    registrar.commit(results)
+    return results
+
+def swap_in(models: Dict, target_dir: str, pet_ids: Set[str]):
+    """Compactar el staging y publicar snapshot + índice + log de cada modelo con os.replace.
+
+    `pet_ids` son las mascotas que existen en el pet-service al publicar: las que no están se
+    quitan del staging y tampoco se conservan del índice en vivo.
+    """
+    from embedding_store import EmbeddingStore
+    for name, model in models.items():
+        # Mascotas de una ejecución anterior que ya no están en el pet-service
+        for pet_id in [pet_id for pet_id in model.embeddings if pet_id not in pet_ids]:
+            del model.embeddings[pet_id]
+            if getattr(model, "index", None) is not None:
+                model.index.remove(pet_id)
+        model.save_embeddings()
+        # Snapshot, índice compartido y log con las mascotas registradas en vivo durante la
+        # reconstrucción (no estaban en la lista inicial); los workers recargan al ver la época nueva
+        live = EmbeddingStore(os.path.join(target_dir, MODEL_FILES[name]))
+        kept = live.replace_from(model.store, known_ids=pet_ids)
+        print(f"✅ {live.snapshot_path}: {len(model.embeddings)} embeddings reconstruidos, {kept} conservados del índice en vivo")
+
+async def rebuild(args) -> bool:
+    limits = httpx.Limits(max_connections=args.download_concurrency, max_keepalive_connections=args.download_concurrency)
+    async with httpx.AsyncClient(timeout=args.download_timeout, limits=limits, follow_redirects=True) as client:
+        pets = await get_all_pets(client, args.pet_service_url)
+        if not pets:
+            print("❌ No se pudieron obtener las mascotas")
+            return False
+        print(f"📊 Encontradas {len(pets)} mascotas")
+
+        # Filtrar mascotas con imágenes de nariz
+        targets = [{**pet, "id": str(pet["id"])} for pet in pets if pet.get("noseImageUrl")]
+        print(f"📸 {len(targets)} mascotas tienen imágenes de nariz")
+
+        os.makedirs(args.staging_dir, exist_ok=True)
+        roster = load_models(args.staging_dir)
+        models = roster.loaded_models()
+        nose_print_model = models["nose_print"]
+        # Checkpoint: lo que ya está en el staging con la versión actual del extractor no se repite
+        done = {
+            pet_id for pet_id in nose_print_model.embeddings
+            if nose_print_model.store.versions.get(pet_id) == nose_print_model.embedding_version
+        }
+        pending = [pet for pet in targets if pet["id"] not in done]
+        if done:
+            print(f"⏩ Retomando: {len(done)} mascotas ya registradas en {args.staging_dir}")
+
+        registrar = BatchRegistrar(roster, decode_workers=args.decode_workers)
+        progress = Progress(len(targets), len(done & {pet["id"] for pet in targets}), args.report_every)
+        semaphore = asyncio.Semaphore(args.download_concurrency)
+        loop = asyncio.get_running_loop()
+
+        # Las descargas del tramo siguiente se solapan con la inferencia del actual
+        inference = None
+        for offset in range(0, len(pending), args.chunk_size):
+            chunk = pending[offset:offset + args.chunk_size]
+            downloads = await asyncio.gather(*(download_pet_image(client, semaphore, pet) for pet in chunk))
+            if inference is not None:
+                progress.update(await inference)
+            sources = []
+            for pet, data in zip(chunk, downloads):
+                if data is None:
+                    progress.failures[pet["id"]] = "No se pudo descargar la imagen"
+                else:
+                    sources.append((pet["id"], lambda data=data: data))
+            inference = loop.run_in_executor(None, register_chunk, registrar, sources) if sources else None
+        if inference is not None:
+            progress.update(await inference)
+        registrar.shutdown()
+        progress.report()
+
+    if progress.failures:
+        failures_path = os.path.join(args.staging_dir, "failures.json")
+        with open(failures_path, "w") as f:
+            json.dump(progress.failures, f, indent=2, ensure_ascii=False)
+        print(f"❌ {len(progress.failures)} mascotas fallaron (detalle en {failures_path})")
+        if not args.allow_partial:
+            print("⏸️  No se publica el índice; vuelva a ejecutar para reintentar las fallidas o use --allow-partial")
             return False
-    except Exception as e:
-        print(f"❌ Error registrando embedding para {pet_id}: {e}")
+
+    # Lista actual del pet-service: incluye las mascotas registradas durante la reconstrucción y
+    # no las eliminadas mientras tanto (o antes, si estaban en el índice en vivo)
+    async with httpx.AsyncClient(timeout=args.download_timeout) as client:
+        current = await get_all_pets(client, args.pet_service_url)
+    if not current:
+        print("❌ No se pudo obtener la lista actual de mascotas; no se publica el índice")
         return False
+    swap_in(models, args.target_dir, {str(pet["id"]) for pet in current})
+    if args.reload_url:
+        try:
+            response = httpx.post(args.reload_url, timeout=120)
+            print(f"🔄 Servicio recargado: {response.status_code}")
+        except httpx.HTTPError as e:
+            print(f"⚠️  No se pudo recargar el servicio ({e!r}); reinícielo para usar los embeddings nuevos")
+    print(f"\n🎉 Proceso completado: {progress.done} embeddings, {progress.images_per_sec():.1f} imágenes/s")
+    return True
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Regenerar embeddings desde las imágenes del pet-service")
+    parser.add_argument("--pet-service-url", default=Config.PET_SERVICE_URL)
+    parser.add_argument("--target-dir", default=".", help="Directorio de los embeddings en vivo")
+    parser.add_argument("--staging-dir", default="rebuild_staging", help="Índice nuevo y checkpoint")
+    parser.add_argument("--chunk-size", type=int, default=Config.REGISTER_BATCH_CHUNK_SIZE)
+    parser.add_argument("--download-concurrency", type=int, default=16)
+    parser.add_argument("--download-timeout", type=float, default=30.0)
+    parser.add_argument("--decode-workers", type=int, default=Config.REGISTER_BATCH_DECODE_WORKERS)
+    parser.add_argument("--report-every", type=float, default=5.0, help="Segundos entre reportes de avance")
+    parser.add_argument("--allow-partial", action="store_true", help="Publicar aunque haya mascotas fallidas")
+    parser.add_argument("--reload-url", help="POST tras publicar, p. ej. http://localhost:8000/reload-embeddings")
+    args = parser.parse_args()
+
     print("🔄 Regenerando embeddings con imágenes reales...")
-    
-    # Obtener todas las mascotas
-    pets = get_all_pets()
-    if not pets:
-        print("❌ No se pudieron obtener las mascotas")
-        return
-    
-    print(f"📊 Encontradas {len(pets)} mascotas")
-    
-    # Filtrar mascotas con imágenes de nariz
-    pets_with_nose_images = [pet for pet in pets if pet.get('noseImageUrl')]
-    print(f"📸 {len(pets_with_nose_images)} mascotas tienen imágenes de nariz")
-    
-    # Limpiar embeddings existentes
-    print("🧹 Limpiando embeddings existentes...")
-    if os.path.exists("nose_print_embeddings.json"):
-        os.remove("nose_print_embeddings.json")
-        print("✅ Embeddings anteriores eliminados")
-    
-    # Registrar embeddings con imágenes reales
-    success_count = 0
-    for pet in pets_with_nose_images:
-        pet_id = pet['id']
-        pet_name = pet['name']
-        nose_image_url = pet['noseImageUrl']
-        
-        print(f"\n🔄 Procesando {pet_name} (ID: {pet_id})")
-        print(f"📸 URL: {nose_image_url}")
-        
-        # Descargar imagen
-        image_bytes = download_pet_image(nose_image_url, pet_id)
-        if image_bytes is None:
-            print(f"❌ No se pudo descargar imagen para {pet_name}")
-            continue
-        
-        # Registrar embedding
-        if register_embedding(pet_id, image_bytes):
-            success_count += 1
-        else:
-            print(f"❌ No se pudo registrar embedding para {pet_name}")
-    
-    print(f"\n🎉 Proceso completado!")
-    print(f"✅ {success_count} embeddings registrados exitosamente")
-    print(f"❌ {len(pets_with_nose_images) - success_count} errores")
+    if not asyncio.run(rebuild(args)):
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -2,48 +2,48 @@ import numpy as np
 import cv2
 import os
 import json
-from typing import List, Dict
+from typing import List, Dict, Tuple, Optional, Sequence
 import logging
 import tensorflow as tf
-from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import Model
-from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout
+from embedding_store import EmbeddingStore
+from backbone_registry import get_backbone_registry, build_head
+from inference_runner import make_runner
+from image_pipeline import DecodedImage, ImageInput, as_decoded
+from feature_artifacts import get_feature_artifacts
+from config import Config
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SimpleNoseModel:
+    # Prefijo de las cabezas en el artefacto y de la versión de cada embedding
+    ARTIFACT_PREFIX = "simple"
+
     def __init__(self, embeddings_path: str = "embeddings.json"):
         self.embeddings_path = embeddings_path
         self.embeddings = {}
+        self.embedding_version = f"{self.ARTIFACT_PREFIX}-{get_feature_artifacts().tag}"
+        self.store = EmbeddingStore(embeddings_path, self.embedding_version, Config.EMBEDDING_STORE_COMPACT_EVERY)
         # Umbral más estricto para evitar falsos positivos
         self.threshold = 0.85
         self.feature_extractor = None
+        self.feature_runner = None
         self._initialize_model()
         
     def _initialize_model(self):
         """Inicializar el modelo de extracción de características"""
         try:
-            # Cargar MobileNetV2 pre-entrenado sin la capa de clasificación
-            base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
-            
-            # Agregar capa de pooling global para obtener características
-            x = base_model.output
-            x = GlobalAveragePooling2D()(x)
-            x = Dense(512, activation='relu')(x)
-            x = Dropout(0.5)(x)
-            x = Dense(256, activation='relu')(x)
-            x = Dropout(0.3)(x)
-            x = Dense(128, activation='relu')(x)
-            
-            # Crear modelo de extracción de características
-            self.feature_extractor = Model(inputs=base_model.input, outputs=x)
+            # MobileNetV2 pre-entrenado compartido (sin la capa de clasificación, con pooling global)
+            self.backbones = get_backbone_registry()
+            self.backbones.get('mobilenet')
             
-            # Congelar las capas del modelo base
-            for layer in base_model.layers:
-                layer.trainable = False
+            # Cabeza densa propia para obtener características
+            self.feature_extractor = build_head(
+                self.backbones.output_dim('mobilenet'), [512, 256, 128], [0.5, 0.3], f"{self.ARTIFACT_PREFIX}/mobilenet"
+            )
+            self.feature_runner = make_runner(self.feature_extractor)
                 
             logger.info("Modelo de extracción de características inicializado correctamente")
             
@@ -52,20 +52,10 @@ class SimpleNoseModel:
             # Fallback a características tradicionales si falla el modelo de deep learning
             self.feature_extractor = None
         
-    def preprocess_image(self, img_bytes: bytes) -> np.ndarray:
-        """Preprocesamiento mejorado de imagen para deep learning"""
-        # Convertir bytes a imagen
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen")
-            
-        # Convertir BGR a RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Redimensionar a 224x224 (tamaño requerido por MobileNetV2)
-        img = cv2.resize(img, (224, 224))
+    def preprocess_image(self, img_bytes: ImageInput) -> np.ndarray:
+        """Preprocesamiento mejorado de imagen para deep learning (acepta bytes o DecodedImage)"""
+        # Imagen RGB redimensionada a 224x224 (tamaño requerido por MobileNetV2), compartida con el fallback
+        img = as_decoded(img_bytes).resized('rgb_color', (224, 224))
         
         # Convertir a formato de imagen de Keras
         img_array = image.img_to_array(img)
@@ -78,18 +68,19 @@ class SimpleNoseModel:
         
         return img_array
     
-    def extract_features(self, img_bytes: bytes) -> List[float]:
-        """Extraer características usando deep learning"""
+    def extract_features(self, img_bytes: ImageInput, pooled: Optional[Dict[str, np.ndarray]] = None) -> List[float]:
+        """Extraer características usando deep learning (pooled: salida ya calculada del backbone)"""
         try:
             if self.feature_extractor is None:
                 logger.warning("Modelo de deep learning no disponible, usando características tradicionales")
                 return self._extract_traditional_features(img_bytes)
             
-            # Preprocesar imagen
-            img_array = self.preprocess_image(img_bytes)
+            if pooled is None:
+                # Preprocesar imagen y pasarla por el backbone compartido
+                pooled = {'mobilenet': self.backbones.pooled('mobilenet', self.preprocess_image(img_bytes))}
             
-            # Extraer características usando el modelo
-            features = self.feature_extractor.predict(img_array, verbose=0)
+            # Extraer características usando la cabeza del modelo
+            features = self.feature_runner(pooled['mobilenet'])
             
             # Convertir a lista y normalizar
             features_list = features[0].tolist()
@@ -106,20 +97,24 @@ class SimpleNoseModel:
             logger.info("Fallback a características tradicionales")
             return self._extract_traditional_features(img_bytes)
     
-    def _extract_traditional_features(self, img_bytes: bytes) -> List[float]:
+    def extract_features_batch(self, images: Sequence[DecodedImage], pooled: Optional[Dict[str, np.ndarray]] = None) -> List[List[float]]:
+        """Características de un lote de imágenes (pooled: {'mobilenet': (N, D)} ya calculado)"""
+        if self.feature_extractor is None:
+            return [self.extract_features(img) for img in images]
+        try:
+            if pooled is None:
+                pooled = {'mobilenet': self.backbones.pooled('mobilenet', np.concatenate([self.preprocess_image(img) for img in images], axis=0))}
+            features = self.feature_runner(pooled['mobilenet']).astype(np.float64)
+            features_norm = features / np.linalg.norm(features, axis=1, keepdims=True)
+            logger.info(f"Características extraídas para un lote de {len(images)} imágenes")
+            return features_norm.tolist()
+        except Exception as e:
+            logger.error(f"Error en extracción por lote, extrayendo imagen por imagen: {e}")
+            return [self.extract_features(img) for img in images]
+    
+    def _extract_traditional_features(self, img_bytes: ImageInput) -> List[float]:
         """Extraer características tradicionales como fallback"""
-        # Convertir bytes a imagen
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen")
-            
-        # Convertir a RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Redimensionar
-        img = cv2.resize(img, (224, 224))
+        img = as_decoded(img_bytes).resized('rgb_color', (224, 224))
         
         # Normalización
         img = img.astype(np.float32) / 255.0
@@ -175,29 +170,47 @@ class SimpleNoseModel:
         return features_norm.tolist()
     
     def load_embeddings(self):
-        """Cargar embeddings guardados"""
-        if os.path.exists(self.embeddings_path):
-            with open(self.embeddings_path, 'r') as f:
-                self.embeddings = json.load(f)
-                logger.info(f"Cargados {len(self.embeddings)} embeddings")
+        """Cargar embeddings guardados (snapshot binario + log append-only)"""
+        self.embeddings = self.store.load()
+        stale = self.stale_embedding_count()
+        if stale:
+            logger.warning(f"{stale} embeddings fueron generados con otra versión del extractor (actual: {self.embedding_version})")
+        if self.embeddings:
+            logger.info(f"Cargados {len(self.embeddings)} embeddings")
         else:
-            self.embeddings = {}
             logger.info("No se encontraron embeddings previos")
     
+    def sync_embeddings(self) -> bool:
+        """Incorporar lo que registraron otros workers; sin cambios sólo lee el contador compartido"""
+        if not self.store.changed():
+            return False
+        changes = self.store.pending_changes()
+        if changes is None:
+            self.load_embeddings()
+            return True
+        for pet_id, features in changes.items():
+            if features is None:
+                self.embeddings.pop(pet_id, None)
+            else:
+                self.embeddings[pet_id] = features
+        return True
+    
+    def stale_embedding_count(self) -> int:
+        """Embeddings producidos con un artefacto distinto del cargado (no comparables)"""
+        return sum(1 for pet_id in self.embeddings if self.store.versions.get(pet_id) != self.embedding_version)
+    
     def save_embeddings(self):
-        """Guardar embeddings"""
-        with open(self.embeddings_path, 'w') as f:
-            json.dump(self.embeddings, f)
+        """Compactar todos los embeddings en un snapshot atómico"""
+        self.store.compact(self.embeddings)
         logger.info(f"Guardados {len(self.embeddings)} embeddings")
     
-    def register_pet(self, pet_id: str, img_bytes: bytes) -> Dict:
+    def register_pet(self, pet_id: str, img_bytes: ImageInput, pooled: Optional[Dict[str, np.ndarray]] = None) -> Dict:
         """Registrar una nueva mascota con sus características"""
         try:
-            features = self.extract_features(img_bytes)
+            features = self.extract_features(img_bytes, pooled=pooled)
             # Convertir numpy arrays a listas para serialización JSON
             features_list = [float(f) for f in features]
-            self.embeddings[pet_id] = features_list
-            self.save_embeddings()
+            self.add_pets([(pet_id, features_list)])
             logger.info(f"Mascota {pet_id} registrada exitosamente")
             logger.info(f"Tamaño de características: {len(features_list)}")
             return {"status": "success", "pet_id": pet_id, "features_size": len(features_list)}
@@ -205,11 +218,22 @@ class SimpleNoseModel:
             logger.error(f"Error registrando mascota {pet_id}: {str(e)}")
             return {"status": "error", "message": str(e)}
     
-    def compare_nose(self, img_bytes: bytes) -> Dict:
+    def add_pets(self, entries: List[Tuple[str, List[float]]]):
+        """Agregar características ya extraídas con una sola escritura al store"""
+        for pet_id, features in entries:
+            self.embeddings[pet_id] = features
+        self.store.put_many(entries)
+        if self.store.should_compact():
+            self.save_embeddings()
+    
+    def compare_nose(self, img_bytes: ImageInput) -> Dict:
         """Comparar nariz con embeddings registrados"""
         try:
             query_features = self.extract_features(img_bytes)
             
+            # Registros hechos en otros workers desde la última consulta
+            self.sync_embeddings()
+            
             if not self.embeddings:
                 return {"match": False, "confidence": 0.0, "message": "No hay mascotas registradas"}
             
@@ -256,9 +280,13 @@ class SimpleNoseModel:
     
     def get_model_stats(self) -> Dict:
         """Obtener estadísticas del modelo"""
+        self.sync_embeddings()
         return {
             "total_pets": len(self.embeddings),
             "embeddings_path": self.embeddings_path,
+            "store": self.store.stats(),
+            "embedding_version": self.embedding_version,
+            "stale_embeddings": self.stale_embedding_count(),
             "threshold": self.threshold,
             "model_type": "DeepLearningNoseModel",
             "feature_extractor_available": self.feature_extractor is not None
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del servicio son planos en ai-service/ (se importan como en main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RANDOM_ARTIFACT_VERSION = "random-init"
+
+@pytest.fixture(scope="session")
+def random_artifact(tmp_path_factory):
+    """Artefacto con backbones de pesos aleatorios (semilla fija), sin descargar ImageNet.
+
+    Misma arquitectura y costo que los backbones reales; los embeddings no tienen significado.
+    Devuelve (MODEL_ARTIFACTS_DIR, MODEL_ARTIFACT_VERSION) para apuntar Config o un proceso hijo.
+    """
+    tf = pytest.importorskip("tensorflow")
+    from tensorflow.keras.layers import GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+    from backbone_registry import ARCHITECTURES
+    from config import Config
+    from feature_artifacts import FeatureArtifacts
+
+    root = str(tmp_path_factory.mktemp("model_artifacts"))
+    tf.keras.utils.set_random_seed(Config.MODEL_SEED)
+    backbones = {}
+    for name, (constructor, _) in ARCHITECTURES.items():
+        base = constructor(weights=None, include_top=False, input_shape=(224, 224, 3))
+        backbones[name] = Model(inputs=base.input, outputs=GlobalAveragePooling2D()(base.output))
+    FeatureArtifacts(root, RANDOM_ARTIFACT_VERSION, load=False).export(backbones, {})
+    return root, RANDOM_ARTIFACT_VERSION
+
+@pytest.fixture
+def random_backbones(random_artifact, monkeypatch):
+    """Config apuntando al artefacto aleatorio mientras dura la prueba"""
+    from config import Config
+    root, version = random_artifact
+    monkeypatch.setattr(Config, "MODEL_ARTIFACTS_DIR", root)
+    monkeypatch.setattr(Config, "MODEL_ARTIFACT_VERSION", version)
+    return random_artifact
+
+@pytest.fixture(scope="session")
+def service(tmp_path_factory, random_artifact):
+    """main.app con sólo nose_print, backbones aleatorios y embeddings/auditoría/perfiles en un directorio temporal.
+
+    main se importa una sola vez por proceso, así que todas las pruebas de endpoints comparten esta instancia.
+    """
+    pytest.importorskip("fastapi")
+    from config import Config
+    directory = tmp_path_factory.mktemp("service")
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.chdir(directory)
+    root, version = random_artifact
+    for name, value in {"MODEL_ROSTER": "nose_print", "MODEL_LAZY": "", "MODEL_WORKERS": 2,
+                        "FEATURE_CACHE_ENABLED": False, "AUDIT_LOG_FILE": str(directory / "requests.log"),
+                        "MODEL_ARTIFACTS_DIR": root, "MODEL_ARTIFACT_VERSION": version,
+                        "PROFILING_ENABLED": True, "PROFILING_ADMIN_TOKEN": "test-admin-token",
+                        "PROFILING_DIR": str(directory / "profiles")}.items():
+        monkeypatch.setattr(Config, name, value)
+    import main
+    yield main
+    monkeypatch.undo()
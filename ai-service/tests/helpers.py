@@ -0,0 +1,52 @@
+"""Datos sintéticos compartidos por las pruebas (imágenes de nariz y registros de embeddings)"""
+
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+
+FAMILY_DIMS = {'mobilenet': 256, 'efficientnet': 256, 'nose_specific': 235}
+# Mismos pesos que NosePrintModel.MODEL_WEIGHTS (sin importar TensorFlow)
+MODEL_WEIGHTS = {'mobilenet': 0.35, 'efficientnet': 0.35, 'nose_specific': 0.30}
+
+def synthetic_nose(height: int, width: int, rng: np.random.Generator) -> np.ndarray:
+    """Textura de surcos y lóbulos parecida a una trufa, con ruido de sensor (RGB uint8)"""
+    coarse = rng.normal(110, 45, size=(height // 12 + 2, width // 12 + 2, 1)).clip(0, 255).astype(np.uint8)
+    img = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    tint = np.array([1.0, 0.85, 0.8], np.float32)
+    img = (img.astype(np.float32) * tint).clip(0, 255).astype(np.uint8)
+    noise = rng.integers(0, 25, size=img.shape, dtype=np.uint8)
+    return cv2.add(img, noise)
+
+def jpeg(rgb: np.ndarray, quality: int = 90) -> bytes:
+    return cv2.imencode(".jpg", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+def synthetic_registry(n: int, clusters: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Embeddings agrupados (razas/tipos de nariz) con ruido individual por mascota"""
+    labels = rng.integers(0, clusters, size=n)
+    registry = {}
+    for family, dim in FAMILY_DIMS.items():
+        centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+        registry[family] = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return registry
+
+def pet_vectors(registry: Dict[str, np.ndarray], i: int) -> Dict[str, np.ndarray]:
+    return {family: registry[family][i] for family in FAMILY_DIMS}
+
+def build_index(registry: Dict[str, np.ndarray], n: int) -> EmbeddingIndex:
+    index = EmbeddingIndex(list(FAMILY_DIMS.keys()), initial_capacity=n)
+    for i in range(n):
+        index.upsert(f"pet-{i}", pet_vectors(registry, i))
+    return index
+
+def make_queries(registry: Dict[str, np.ndarray], n: int, count: int, rng: np.random.Generator) -> List[Dict[str, np.ndarray]]:
+    """Re-escaneos ruidosos de mascotas registradas"""
+    targets = rng.choice(n, size=count, replace=False)
+    return [
+        {family: registry[family][t] + 0.3 * rng.standard_normal(dim).astype(np.float32)
+         for family, dim in FAMILY_DIMS.items()}
+        for t in targets
+    ]
@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from embedding_index import EmbeddingIndex
+from helpers import FAMILY_DIMS, MODEL_WEIGHTS, build_index, make_queries, pet_vectors, synthetic_registry
+
+def test_training_materializes_only_the_sample_and_one_chunk():
+    n = 3000
+    index = build_index(synthetic_registry(n, 16, np.random.default_rng(0)), n)
+    ivf = IVFIndex(MODEL_WEIGHTS, nlist=32, min_pets=0, train_sample=500, assign_chunk=256)
+    index.ann = ivf
+    requested = []
+
+    def fused_rows(rows):
+        fused = index._fused_rows(rows)
+        requested.append(fused.shape[0])
+        return fused
+
+    ivf.train(fused_rows, n)
+    assert max(requested) == 500
+    assert sorted(requested)[:-1] == [184] + [256] * 11  # 3000 filas en tramos de 256
+    assert ivf.trained_size == n
+
+def test_ivf_recall_against_exact_search():
+    n = 5000
+    rng = np.random.default_rng(0)
+    registry = synthetic_registry(n, 32, rng)
+    index = build_index(registry, n)
+    queries = make_queries(registry, n, 50, rng)
+    exact = [index.search(q, MODEL_WEIGHTS, top_k=10) for q in queries]
+    index.attach_ann(IVFIndex(MODEL_WEIGHTS, min_pets=0, train_sample=2000))
+    assert index.wait_ann_training(timeout=60) and index.ann.ready
+    approx = [index.search(q, MODEL_WEIGHTS, top_k=10) for q in queries]
+    recall = np.mean([len({p for p, _, _ in a} & {p for p, _, _ in e}) / len(e) for a, e in zip(approx, exact)])
+    assert recall >= 0.95
+
+def test_searches_keep_working_while_the_ivf_retrains():
+    rng = np.random.default_rng(0)
+    registry = synthetic_registry(4400, 16, rng)
+    index = build_index(registry, 2000)
+    ivf = IVFIndex(MODEL_WEIGHTS, nlist=16, min_pets=0, train_sample=1000)
+    index.attach_ann(ivf)
+    assert index.wait_ann_training(timeout=60) and ivf.trained_size == 2000
+
+    started, release = threading.Event(), threading.Event()
+    fit = ivf.fit
+
+    def blocked_fit(*args, **kwargs):
+        started.set()
+        release.wait(60)
+        return fit(*args, **kwargs)
+
+    ivf.fit = blocked_fit
+    # El registro que duplica el índice dispara el re-entrenamiento sin esperarlo
+    for i in range(2000, 4000):
+        index.upsert(f"pet-{i}", pet_vectors(registry, i))
+    assert started.wait(10) and not release.is_set()
+
+    # Mientras entrena: búsquedas con el cuantizador anterior, registros y bajas
+    for i in range(4000, 4400):
+        index.upsert(f"pet-{i}", pet_vectors(registry, i))
+    for i in range(0, 200):
+        index.remove(f"pet-{i}")
+    for i in (250, 3999, 4399):
+        assert index.search(pet_vectors(registry, i), MODEL_WEIGHTS, top_k=1)[0][0] == f"pet-{i}"
+    assert ivf.trained_size == 2000
+
+    release.set()
+    assert index.wait_ann_training(timeout=60)
+    assert ivf.trained_size == 4000
+    # Las filas que cambiaron durante el entrenamiento quedan en la lista correcta de los centroides nuevos
+    n = len(index)
+    np.testing.assert_array_equal(ivf.assignments(n), ivf.assign_rows(index._fused_rows(slice(0, n)), ivf.centroids))
+    for i in (250, 3999, 4399):
+        assert index.search(pet_vectors(registry, i), MODEL_WEIGHTS, top_k=1)[0][0] == f"pet-{i}"
+
+def test_shared_index_file_carries_the_ivf_quantizer(tmp_path):
+    n = 3000
+    registry = synthetic_registry(n, 16, np.random.default_rng(0))
+    writer = build_index(registry, n)
+    writer.attach_ann(IVFIndex(MODEL_WEIGHTS, nlist=32, min_pets=0, train_sample=1000))
+    assert writer.wait_ann_training(timeout=60)
+    path = str(tmp_path / "nose_print.index")
+    writer.save_shared(path, "snapshot-1")
+
+    # Otro worker mapea el archivo: usa los centroides guardados sin re-entrenar
+    reader = EmbeddingIndex(list(FAMILY_DIMS))
+    reader.attach_ann(IVFIndex(MODEL_WEIGHTS, nlist=32, min_pets=0, train_sample=1000))
+    reader.ann.fit = lambda *args, **kwargs: pytest.fail("el worker re-entrenó el IVF")
+    assert reader.load_shared(path, "snapshot-1")
+    assert reader.ann.ready and reader._ann_trainer is None
+    np.testing.assert_array_equal(reader.ann.centroids, writer.ann.centroids)
+    np.testing.assert_array_equal(reader.ann.assignments(n), writer.ann.assignments(n))
+    query = pet_vectors(registry, 7)
+    assert reader.search(query, MODEL_WEIGHTS, top_k=5) == writer.search(query, MODEL_WEIGHTS, top_k=5)
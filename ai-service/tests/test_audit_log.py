@@ -0,0 +1,66 @@
+import json
+import os
+import time
+
+from audit_log import AuditLogWriter
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_events_are_written_in_order_and_flushed_on_close(tmp_path):
+    path = str(tmp_path / "audit" / "requests.log")
+    writer = AuditLogWriter(path, flush_bytes=4096, flush_interval=60)
+    for seq in range(2000):
+        assert writer.log("compare-request", {"seq": seq, "petId": f"pet-{seq % 7}"})
+    writer.close()
+
+    lines = read_lines(path)
+    assert [line["seq"] for line in lines] == list(range(2000))
+    assert all(line["event"] == "compare-request" and "timestamp" in line for line in lines)
+    stats = writer.stats()
+    assert stats["enqueued"] == stats["written"] == 2000
+    assert stats["dropped"] == stats["errors"] == 0
+    assert stats["flushes"] >= 2000 * 40 // 4096  # también por tamaño, no sólo al cerrar
+
+def test_a_quiet_writer_flushes_after_the_interval(tmp_path):
+    path = str(tmp_path / "requests.log")
+    writer = AuditLogWriter(path, flush_bytes=1024 * 1024, flush_interval=0.1)
+    try:
+        writer.log("register-embedding-request", {"petId": "p1"})
+        # Un solo evento no llena el buffer: lo escribe el flush por tiempo, sin cerrar el writer
+        assert wait_for(lambda: os.path.exists(path) and os.path.getsize(path) > 0)
+        assert [line["petId"] for line in read_lines(path)] == ["p1"]
+    finally:
+        writer.close()
+
+def test_similarities_are_capped_to_top_k(tmp_path):
+    path = str(tmp_path / "requests.log")
+    writer = AuditLogWriter(path, top_k=2)
+    similarities = {f"pet-{i}": {"final_score": 1.0 - i / 10} for i in range(10)}
+    writer.log("compare-result", {"result": {"match": True, "all_similarities": similarities}})
+    writer.close()
+
+    summary = read_lines(path)[0]["result"]["all_similarities"]
+    assert list(summary["top"]) == ["pet-0", "pet-1"]
+    assert summary["count"] == 10
+    assert summary["max"] == 1.0 and abs(summary["min"] - 0.1) < 1e-9
+
+def test_rotation_keeps_every_event(tmp_path):
+    path = str(tmp_path / "requests.log")
+    writer = AuditLogWriter(path, flush_bytes=1, max_bytes=2000, backup_count=20)
+    for seq in range(300):
+        writer.log("compare-request", {"seq": seq})
+    writer.close()
+
+    files = [f"{path}.{i}" for i in range(20, 0, -1) if os.path.exists(f"{path}.{i}")] + [path]
+    assert len(files) > 1 and writer.stats()["rotations"] == len(files) - 1
+    assert [line["seq"] for f in files for line in read_lines(f)] == list(range(300))
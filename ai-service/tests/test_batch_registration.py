@@ -0,0 +1,64 @@
+import io
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from batch_registration import BatchRegistrar, archive_sources
+from helpers import jpeg, synthetic_nose
+from model_roster import ModelRoster
+from nose_print_model import NosePrintModel
+
+def test_batch_registration_applies_the_quality_gate(tmp_path, random_backbones):
+    model = NosePrintModel(str(tmp_path / "nose_print_embeddings.json"))
+    model.quality_gate.mode = "reject"
+    roster = ModelRoster({"nose_print": lambda: model}, active=["nose_print"])
+    registrar = BatchRegistrar(roster, decode_workers=2)
+
+    nose = synthetic_nose(480, 640, np.random.default_rng(0))
+    sharp, blurry = jpeg(nose), jpeg(cv2.GaussianBlur(nose, (43, 43), 0))
+    try:
+        results = registrar.extract([("sharp", lambda: sharp), ("blurry", lambda: blurry)])
+        registered = registrar.commit(results)
+    finally:
+        registrar.shutdown()
+
+    by_pet = {r["petId"]: r for r in results}
+    assert registered == 1
+    assert by_pet["sharp"]["status"] == "registered"
+    assert by_pet["blurry"]["status"] == "error"
+    assert by_pet["blurry"]["quality_rejected"]
+    assert "blurry" in [reason["code"] for reason in by_pet["blurry"]["quality"]["reasons"]]
+    assert "blurry" not in model.embeddings
+    assert registrar.stats()["quality_rejected"] == 1
+
+def test_batch_registration_from_a_tar_gz(tmp_path, random_backbones):
+    model = NosePrintModel(str(tmp_path / "nose_print_embeddings.json"))
+    roster = ModelRoster({"nose_print": lambda: model}, active=["nose_print"])
+    registrar = BatchRegistrar(roster, decode_workers=4)
+
+    rng = np.random.default_rng(1)
+    images = {f"pet-{i}": jpeg(synthetic_nose(480, 640, rng)) for i in range(16)}
+    archive_path = tmp_path / "lote.tar.gz"
+    with tarfile.open(archive_path, "w:gz") as archive:
+        for pet_id, data in images.items():
+            info = tarfile.TarInfo(f"fotos/{pet_id}.jpg")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    with open(archive_path, "rb") as f:
+        sources = archive_sources(f, max_image_bytes=10 * 1024 * 1024)
+        # Los bytes leídos en paralelo desde el tar son los del archivo original
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            read = list(pool.map(lambda source: source[1](), sources))
+        assert dict(zip((pet_id for pet_id, _ in sources), read)) == images
+        try:
+            results = registrar.extract(sources)
+            registered = registrar.commit(results)
+        finally:
+            registrar.shutdown()
+
+    assert registered == 16
+    assert all(r["status"] == "registered" for r in results)
+    assert set(model.embeddings) == set(images)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("tensorflow")
+import httpx
+
+from helpers import jpeg, synthetic_nose
+from image_pipeline import DecodedImage
+from pet_service_client import PetServiceClient
+
+PETS = 6
+
+@pytest.fixture(scope="module")
+def registered(service):
+    """Mascotas cuya similitud con la foto de consulta decrece con el índice (ruido creciente)"""
+    image = jpeg(synthetic_nose(480, 640, np.random.default_rng(7)))
+    features = service.nose_print_model.extract_nose_features(DecodedImage(image))
+    rng = np.random.default_rng(0)
+    entries = []
+    for i in range(PETS):
+        noisy = {}
+        for name, values in features.items():
+            values = np.asarray(values, dtype=np.float32)
+            noisy[name] = [float(v) for v in values + (0.2 * i) * np.abs(values).mean() * rng.standard_normal(values.shape)]
+        entries.append((f"ranked-{i}", noisy))
+    service.nose_print_model.add_nose_prints(entries)
+    return image, [pet_id for pet_id, _ in entries]
+
+@pytest.fixture
+def pet_service(service, monkeypatch):
+    """pet-service de prueba con nombre y raza para cada mascota"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        pet_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={"name": f"Pet {pet_id}", "breed": "Mestizo", "noseImageUrl": None})
+    client = PetServiceClient("http://pet-service", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(service, "pet_client", client)
+    return client
+
+def post(service, path: str, image: bytes) -> httpx.Response:
+    async def request():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ai-service", timeout=300) as client:
+            return await client.post(path, files={"image": ("nose.jpg", image, "image/jpeg")})
+    return asyncio.run(request())
+
+def test_scan_serializes_only_the_top_k_pets(service, registered, pet_service):
+    image, ranked = registered
+    response = post(service, "/scan?top_k=2", image)
+    assert response.status_code == 200
+    similarities = response.json()["all_similarities"]
+    assert list(similarities) == ranked[:2]
+    scores = [entry["final_score"] for entry in similarities.values()]
+    assert scores == sorted(scores, reverse=True)
+
+def test_top_k_outside_the_configured_range_is_rejected(service, registered, pet_service):
+    image, _ = registered
+    assert post(service, "/scan?top_k=0", image).status_code == 422
+    too_many = service.Config.RESULTS_MAX_TOP_K + 1
+    assert post(service, f"/visual-comparison?top_k={too_many}", image).status_code == 422
+
+def test_visual_comparison_stream_matches_the_buffered_response(service, registered, pet_service):
+    image, ranked = registered
+    buffered = post(service, "/visual-comparison?top_k=3", image)
+    streamed = post(service, "/visual-comparison?top_k=3&stream=true", image)
+    assert buffered.status_code == streamed.status_code == 200
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    header, pets, summary = lines[0], lines[1:-1], lines[-1]
+    assert header["type"] == "header"
+    assert header["total_pets_compared"] == len(service.nose_print_model.index)
+    assert [pet["type"] for pet in pets] == ["pet"] * 3
+    assert [pet["rank"] for pet in pets] == [1, 2, 3]
+    assert [pet["petId"] for pet in pets] == ranked[:3]
+    assert [pet["petName"] for pet in pets] == [f"Pet {pet_id}" for pet_id in ranked[:3]]
+    assert summary["type"] == "summary"
+    assert summary["analysis_summary"]["pets_returned"] == 3
+
+    body = buffered.json()
+    assert [pet["petId"] for pet in body["registered_pets_comparison"]] == ranked[:3]
+    for pet, expected in zip(pets, body["registered_pets_comparison"]):
+        assert pet["final_score"] == pytest.approx(expected["final_score"], abs=1e-6)
+    assert summary["analysis_summary"] == body["analysis_summary"]
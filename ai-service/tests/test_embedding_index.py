@@ -0,0 +1,124 @@
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from embedding_index import EmbeddingIndex
+from helpers import FAMILY_DIMS, make_queries, pet_vectors, synthetic_registry
+
+MODEL_WEIGHTS = {'mobilenet': 0.35, 'efficientnet': 0.35, 'nose_specific': 0.30}
+DIMS = {'mobilenet': 64, 'efficientnet': 48, 'nose_specific': 19}
+
+def cosine_similarity_nose(a, b) -> float:
+    """Similitud del bucle original de NosePrintModel"""
+    a = np.array(a, dtype=np.float64)
+    b = np.array(b, dtype=np.float64)
+    if np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
+        return 0.0
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+def reference_search(embeddings: Dict[str, Dict[str, np.ndarray]], features: Dict[str, np.ndarray]) -> List:
+    """Bucle por mascota anterior al índice: sólo las familias presentes en ambos lados puntúan"""
+    ranked = []
+    for pet_id, stored_features in embeddings.items():
+        model_scores = {}
+        weighted_score = 0.0
+        for model_name, weight in MODEL_WEIGHTS.items():
+            if model_name in features and model_name in stored_features:
+                similarity = cosine_similarity_nose(features[model_name], stored_features[model_name])
+                model_scores[model_name] = similarity
+                weighted_score += similarity * weight
+        ranked.append((pet_id, weighted_score, model_scores))
+    return sorted(ranked, key=lambda item: -item[1])
+
+@pytest.fixture(scope="module")
+def registry():
+    rng = np.random.default_rng(0)
+    embeddings = {}
+    for i in range(600):
+        features = {family: rng.standard_normal(dim).astype(np.float32) for family, dim in DIMS.items()}
+        if i % 7 == 0:
+            del features['nose_specific']  # registradas sin características tradicionales
+        embeddings[f"pet-{i}"] = features
+    embeddings["pet-zero"] = {family: np.zeros(dim, dtype=np.float32) for family, dim in DIMS.items()}
+    return embeddings
+
+def queries(registry) -> List[Dict[str, np.ndarray]]:
+    rng = np.random.default_rng(1)
+    result = []
+    for pet_id in ("pet-3", "pet-7", "pet-350", "pet-599"):
+        # Con todas las familias, también para pet-7 que no tiene nose_specific
+        stored = registry[pet_id]
+        result.append({family: stored.get(family, np.zeros(dim, dtype=np.float32)) + 0.3 * rng.standard_normal(dim).astype(np.float32)
+                       for family, dim in DIMS.items()})
+    # Consulta sin nose_specific: esa familia no puntúa para nadie
+    result.append({family: rng.standard_normal(dim).astype(np.float32) for family, dim in DIMS.items() if family != 'nose_specific'})
+    return result
+
+@pytest.mark.parametrize("precision", ["float32", "float16", "int8"])
+def test_index_search_matches_the_per_pet_loop(registry, precision):
+    index = EmbeddingIndex(list(MODEL_WEIGHTS), precision=precision, exact_vectors=registry.get, rescore_candidates=100)
+    for pet_id, features in registry.items():
+        index.upsert(pet_id, features)
+
+    for query in queries(registry):
+        expected = reference_search(registry, query)[:10]
+        actual = index.search(query, MODEL_WEIGHTS, top_k=10)
+        assert [pet_id for pet_id, _, _ in actual] == [pet_id for pet_id, _, _ in expected]
+        for (_, score, model_scores), (_, expected_score, expected_model_scores) in zip(actual, expected):
+            assert score == pytest.approx(expected_score, abs=1e-5)
+            # Las familias ausentes se omiten (no aparecen como 0.0)
+            assert set(model_scores) == set(expected_model_scores)
+            for family, value in expected_model_scores.items():
+                assert model_scores[family] == pytest.approx(value, abs=1e-5)
+
+def test_absent_families_are_omitted_after_removal_and_shared_reload(registry, tmp_path):
+    index = EmbeddingIndex(list(MODEL_WEIGHTS))
+    for pet_id, features in registry.items():
+        index.upsert(pet_id, features)
+    index.remove("pet-1")  # la última fila (pet-zero, con todas las familias) pasa a su lugar
+    path = str(tmp_path / "nose_print.index")
+    index.save_shared(path, "snapshot-1")
+    reloaded = EmbeddingIndex(list(MODEL_WEIGHTS))
+    assert reloaded.load_shared(path, "snapshot-1")
+
+    query = registry["pet-2"]
+    for searched in (index, reloaded):
+        by_pet = {pet_id: model_scores for pet_id, _, model_scores in searched.search(query, MODEL_WEIGHTS)}
+        assert set(by_pet["pet-14"]) == {'mobilenet', 'efficientnet'}
+        assert set(by_pet["pet-zero"]) == set(MODEL_WEIGHTS)
+        assert by_pet["pet-zero"]['nose_specific'] == 0.0
+        assert set(by_pet["pet-2"]) == set(MODEL_WEIGHTS)
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_rescored_results_and_match_decisions_agree_with_float32(precision, tmp_path):
+    # Razas muy parecidas entre sí: los scores del principio de la lista están a milésimas
+    rng = np.random.default_rng(3)
+    clustered = synthetic_registry(2000, 4, rng)
+    embeddings = {f"pet-{i}": pet_vectors(clustered, i) for i in range(2000)}
+    reference = EmbeddingIndex(list(FAMILY_DIMS))
+    compressed = EmbeddingIndex(list(FAMILY_DIMS), precision=precision, exact_vectors=embeddings.get, rescore_candidates=50)
+    for pet_id, features in embeddings.items():
+        reference.upsert(pet_id, features)
+        compressed.upsert(pet_id, features)
+    path = str(tmp_path / "nose_print.index")
+    compressed.save_shared(path, "snapshot-1")
+    reloaded = EmbeddingIndex(list(FAMILY_DIMS), precision=precision, exact_vectors=embeddings.get, rescore_candidates=50)
+    assert reloaded.load_shared(path, "snapshot-1")
+
+    threshold, boost = 0.85, 1.2  # los de NosePrintModel
+    for query in make_queries(clustered, 2000, 20, rng):
+        expected = reference.search(query, MODEL_WEIGHTS, top_k=10)
+        for searched in (compressed, reloaded):
+            actual = searched.search(query, MODEL_WEIGHTS, top_k=10)
+            assert [pet_id for pet_id, _, _ in actual] == [pet_id for pet_id, _, _ in expected]
+            for (_, score, _), (_, expected_score, _) in zip(actual, expected):
+                assert score == pytest.approx(expected_score, abs=1e-6)
+            assert (min(1.0, actual[0][1] * boost) >= threshold) == (min(1.0, expected[0][1] * boost) >= threshold)
+
+        # Con top_k mayor que rescore_candidates se re-puntúan las top_k; sólo la cola, cerca del
+        # corte de la preselección comprimida, puede diferir (y empates a 1e-7 pueden cruzarse)
+        long_expected = reference.search(query, MODEL_WEIGHTS, top_k=200)[:50]
+        long_actual = compressed.search(query, MODEL_WEIGHTS, top_k=200)[:50]
+        assert [score for _, score, _ in long_actual] == pytest.approx([score for _, score, _ in long_expected], abs=1e-6)
+    assert compressed.stats()["rescored"] > 0 and reloaded.stats()["rescored"] > 0
@@ -0,0 +1,89 @@
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+def vector(value: float, dim: int = 8) -> np.ndarray:
+    return np.full(dim, value, dtype=np.float32)
+
+def test_replace_from_keeps_pets_registered_during_a_rebuild(tmp_path):
+    live = EmbeddingStore(str(tmp_path / "live" / "nose_print_embeddings.json"), model_version="v1")
+    live.load()
+    live.put("p1", {"mobilenet": vector(1.0)})
+
+    # La reconstrucción arranca con la lista del pet-service: sólo p1
+    staging = EmbeddingStore(str(tmp_path / "staging" / "nose_print_embeddings.json"), model_version="v2")
+    staging.load()
+    staging.put("p1", {"mobilenet": vector(2.0)})
+
+    # Mientras tanto /register-embedding agrega p2 al store en vivo
+    live.put("p2", {"mobilenet": vector(3.0)})
+
+    staging.compact({"p1": {"mobilenet": vector(2.0)}})
+    publisher = EmbeddingStore(str(tmp_path / "live" / "nose_print_embeddings.json"))
+    assert publisher.replace_from(staging, known_ids={"p1", "p2"}) == 1
+
+    reloaded = EmbeddingStore(str(tmp_path / "live" / "nose_print_embeddings.json"))
+    records = reloaded.load()
+    assert set(records) == {"p1", "p2"}
+    np.testing.assert_array_equal(records["p1"]["mobilenet"], vector(2.0))  # gana la reconstrucción
+    np.testing.assert_array_equal(records["p2"]["mobilenet"], vector(3.0))
+    assert reloaded.versions == {"p1": "v2", "p2": "v1"}
+    assert live.changed()  # los workers en vivo ven la época nueva y recargan
+
+def test_replace_from_drops_pets_deleted_from_the_pet_service(tmp_path):
+    live = EmbeddingStore(str(tmp_path / "live" / "nose_print_embeddings.json"), model_version="v1")
+    live.load()
+    live.put("p1", {"mobilenet": vector(1.0)})
+    live.put("gone", {"mobilenet": vector(4.0)})  # eliminada del pet-service antes de reconstruir
+
+    staging = EmbeddingStore(str(tmp_path / "staging" / "nose_print_embeddings.json"), model_version="v2")
+    staging.load()
+    staging.put("p1", {"mobilenet": vector(2.0)})
+    live.put("new", {"mobilenet": vector(3.0)})  # registrada durante la reconstrucción
+    staging.compact({"p1": {"mobilenet": vector(2.0)}})
+
+    publisher = EmbeddingStore(str(tmp_path / "live" / "nose_print_embeddings.json"))
+    assert publisher.replace_from(staging, known_ids={"p1", "new"}) == 1
+
+    reloaded = EmbeddingStore(str(tmp_path / "live" / "nose_print_embeddings.json"))
+    assert set(reloaded.load()) == {"p1", "new"}
+    assert reloaded.versions == {"p1": "v2", "new": "v1"}
+
+def test_migrated_json_embeddings_are_tagged_legacy(tmp_path):
+    json_path = tmp_path / "nose_print_embeddings.json"
+    json_path.write_text('{"p1": {"mobilenet": [0.1, 0.2]}, "p2": {"mobilenet": [0.3, 0.4]}}')
+
+    store = EmbeddingStore(str(json_path), model_version="nose_print-v2")
+    records = store.load()
+    assert set(records) == {"p1", "p2"}
+    assert store.versions == {"p1": "legacy", "p2": "legacy"}
+
+    # Siguen siendo obsoletos tras registrar otra mascota y compactar
+    store.put("p3", {"mobilenet": vector(1.0, 2)})
+    store.compact({**records, "p3": {"mobilenet": vector(1.0, 2)}})
+    reloaded = EmbeddingStore(str(json_path), model_version="nose_print-v2")
+    reloaded.load()
+    assert reloaded.versions == {"p1": "legacy", "p2": "legacy", "p3": "nose_print-v2"}
+
+def test_compaction_swaps_private_copies_for_snapshot_views(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "nose_print_embeddings.json"), model_version="v1")
+    embeddings = store.load()
+    for pet_id, value in (("p1", 1.0), ("p2", 2.0)):
+        embeddings[pet_id] = {"mobilenet": vector(value), "efficientnet": vector(-value, 4)}
+        store.put(pet_id, embeddings[pet_id])
+
+    assert store.compact(embeddings)
+    # Los float32 de la re-puntuación quedan en el snapshot mapeado, no como copias privadas
+    for pet_id, value in (("p1", 1.0), ("p2", 2.0)):
+        for family, expected in (("mobilenet", vector(value)), ("efficientnet", vector(-value, 4))):
+            assert isinstance(embeddings[pet_id][family], np.memmap)
+            np.testing.assert_array_equal(embeddings[pet_id][family], expected)
+    assert store.versions == {"p1": "v1", "p2": "v1"}
+
+    # Una segunda compactación lee las vistas del snapshot anterior antes de reemplazarlo
+    embeddings["p3"] = {"mobilenet": vector(3.0)}
+    store.put("p3", embeddings["p3"])
+    assert store.compact(embeddings)
+    assert all(isinstance(embeddings[pet_id]["mobilenet"], np.memmap) for pet_id in ("p1", "p2", "p3"))
+    np.testing.assert_array_equal(embeddings["p1"]["efficientnet"], vector(-1.0, 4))
+    np.testing.assert_array_equal(embeddings["p3"]["mobilenet"], vector(3.0))
@@ -0,0 +1,15 @@
+import pytest
+
+from config import Config
+from feature_artifacts import FeatureArtifacts
+
+def test_missing_artifact_fails_when_required(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "MODEL_ARTIFACT_REQUIRED", True)
+    with pytest.raises(RuntimeError, match="export_feature_models.py v1"):
+        FeatureArtifacts(str(tmp_path), "v1")
+
+def test_missing_artifact_falls_back_to_imagenet_by_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "MODEL_ARTIFACT_REQUIRED", False)
+    artifacts = FeatureArtifacts(str(tmp_path), "v1")
+    assert not artifacts.available
+    assert artifacts.backbone_path("mobilenet") is None
@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from feature_cache import FeatureCache
+
+FEATURES = {"mobilenet": [0.25, -1.5, 3.0], "nose_specific": [0.1, 0.2]}
+
+def wait_until(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "tiempo de espera agotado"
+        time.sleep(0.01)
+
+def test_concurrent_requests_for_the_same_image_compute_once():
+    cache = FeatureCache("v1")
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(10)
+        return FEATURES
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        leader = pool.submit(cache.get_or_compute, "same", compute)
+        assert started.wait(10)
+        followers = [pool.submit(cache.get_or_compute, "same", compute) for _ in range(5)]
+        # Los seguidores esperan el resultado del primero en vez de calcular
+        wait_until(lambda: cache.coalesced == 5)
+        release.set()
+        results = [leader.result(10)] + [future.result(10) for future in followers]
+
+    assert len(calls) == 1
+    assert all(result["nose_specific"] == pytest.approx(FEATURES["nose_specific"]) for result in results)
+    assert all(result["mobilenet"] == FEATURES["mobilenet"] for result in results)
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 5, 0)
+    assert cache.get_or_compute("same", compute) == results[0]
+    assert cache.stats()["hits"] == 1
+
+def test_a_failed_compute_reaches_waiters_and_is_not_cached():
+    cache = FeatureCache("v1")
+    release = threading.Event()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(10)
+        raise RuntimeError("forward pass falló")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(cache.get_or_compute, "broken", failing)
+        assert started.wait(10)
+        follower = pool.submit(cache.get_or_compute, "broken", failing)
+        wait_until(lambda: cache.coalesced == 1)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="forward pass"):
+                future.result(10)
+
+    # El siguiente intento vuelve a calcular
+    assert cache.get_or_compute("broken", lambda: FEATURES)["mobilenet"] == FEATURES["mobilenet"]
+    assert cache.stats()["misses"] == 2
+
+def test_uncacheable_results_are_recomputed():
+    cache = FeatureCache("v1")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {}
+
+    for _ in range(2):
+        assert cache.get_or_compute("empty", compute, cacheable=lambda features: bool(features)) == {}
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+def test_memory_tier_evicts_least_recently_used_by_bytes():
+    probe = FeatureCache("v1")
+    probe.put("probe", FEATURES)
+    entry_bytes = probe.bytes
+    cache = FeatureCache("v1", max_bytes=2 * entry_bytes)
+    cache.put("a", FEATURES)
+    cache.put("b", FEATURES)
+    cache.get_or_compute("a", lambda: pytest.fail("a debía estar en caché"))
+    cache.put("c", FEATURES)  # expulsa b, el menos usado
+    assert cache.stats()["evictions"] == 1
+    calls = []
+    cache.get_or_compute("b", lambda: calls.append(1) or FEATURES)
+    assert calls == [1]
+    assert cache.bytes <= cache.max_bytes
+
+def test_disk_tier_is_shared_across_instances_of_the_same_version(tmp_path):
+    FeatureCache("v1", disk_dir=str(tmp_path)).put("img", FEATURES)
+    warm = FeatureCache("v1", disk_dir=str(tmp_path))
+    features = warm.get_or_compute("img", lambda: pytest.fail("debía leerse del disco"))
+    assert features["mobilenet"] == FEATURES["mobilenet"]
+    assert warm.stats()["disk_hits"] == 1
+    # Otra versión del extractor no reutiliza las entradas
+    other = FeatureCache("v2", disk_dir=str(tmp_path))
+    assert other.get_or_compute("img", lambda: {"mobilenet": [9.0]}) == {"mobilenet": [9.0]}
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("tensorflow")
+import httpx
+
+from helpers import synthetic_nose
+
+def test_health_stays_responsive_during_a_burst_of_scans(service):
+    nose = synthetic_nose(960, 1280, np.random.default_rng(0))
+    image = cv2.imencode(".jpg", cv2.cvtColor(nose, cv2.COLOR_RGB2BGR))[1].tobytes()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ai-service", timeout=300) as client:
+            # Calentamiento: el primer forward pass traza las funciones compiladas
+            await client.post("/scan", files={"image": ("nose.jpg", image, "image/jpeg")})
+
+            async def scan():
+                return await client.post("/scan", files={"image": ("nose.jpg", image, "image/jpeg")})
+
+            started = time.perf_counter()
+            scans = [asyncio.create_task(scan()) for _ in range(12)]
+            health = []
+            while not all(task.done() for task in scans):
+                start = time.perf_counter()
+                response = await client.get("/health")
+                health.append((time.perf_counter() - start, response.status_code))
+                await asyncio.sleep(0.02)
+            responses = await asyncio.gather(*scans)
+            return responses, health, time.perf_counter() - started
+
+    responses, health, burst_seconds = asyncio.run(scenario())
+    assert all(response.status_code == 200 for response in responses)
+    assert len(health) >= 5  # el loop atendió /health muchas veces durante la ráfaga
+    assert all(status == 200 for _, status in health)
+    worst = max(seconds for seconds, _ in health)
+    # Sin el pool un solo /scan bloquearía el loop durante toda su inferencia
+    assert worst < 0.25, f"/health tardó {worst * 1000:.0f} ms durante una ráfaga de {burst_seconds:.1f} s"
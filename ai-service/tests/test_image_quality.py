@@ -0,0 +1,78 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from config import Config
+from helpers import jpeg, synthetic_nose
+from image_pipeline import DecodedImage
+from image_quality import QUALITY_MESSAGES, ImageQualityGate
+
+def nose(rng_seed: int = 0, height: int = 480, width: int = 640) -> np.ndarray:
+    return synthetic_nose(height, width, np.random.default_rng(rng_seed))
+
+def decoded(rgb: np.ndarray) -> DecodedImage:
+    return DecodedImage(jpeg(rgb))
+
+DEFECTS = {
+    "blurry": lambda img: cv2.GaussianBlur(img, (0, 0), 12),
+    "underexposed": lambda img: (img * 0.08).astype(np.uint8),
+    "overexposed": lambda img: cv2.add(img, np.full_like(img, 200)),
+    "too_small": lambda img: cv2.resize(img, (96, 72), interpolation=cv2.INTER_AREA)
+}
+
+def test_a_sharp_well_exposed_nose_is_accepted():
+    gate = ImageQualityGate.from_config(Config, mode="reject")
+    report = gate.assess(decoded(nose()))
+    assert report["accepted"] and report["action"] == "ok"
+    assert report["reasons"] == [] and report["message"] is None
+    assert gate.stats()["checked"] == 1 and gate.stats()["rejected"] == 0
+
+@pytest.mark.parametrize("defect", sorted(DEFECTS))
+def test_defective_photos_are_rejected_with_their_reason(defect):
+    gate = ImageQualityGate.from_config(Config, mode="reject")
+    report = gate.assess(decoded(DEFECTS[defect](nose())))
+    assert not report["accepted"] and report["action"] == "rejected"
+    codes = [reason["code"] for reason in report["reasons"]]
+    assert defect in codes
+    assert report["message"] == QUALITY_MESSAGES[codes[0]]
+    assert gate.stats()["rejected"] == 1 and gate.stats()["by_reason"][defect] == 1
+
+def test_flag_mode_reports_without_rejecting():
+    gate = ImageQualityGate.from_config(Config, mode="flag")
+    image = decoded(DEFECTS["blurry"](nose()))
+    report = gate.assess(image)
+    assert report["accepted"] and report["action"] == "flagged"
+    assert "blurry" in [reason["code"] for reason in report["reasons"]]
+    # El reporte se calcula una sola vez por imagen decodificada
+    assert gate.assess(image) is report
+    assert gate.stats()["checked"] == 1 and gate.stats()["flagged"] == 1
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ImageQualityGate(mode="strict")
+
+def test_rejected_scans_return_422_before_inference(service, monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    from backbone_registry import get_backbone_registry
+    monkeypatch.setattr(service.nose_print_model, "quality_gate", ImageQualityGate.from_config(Config, mode="reject"))
+    registry = get_backbone_registry()
+
+    async def scan(image: bytes):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ai-service", timeout=300) as client:
+            return await client.post("/scan", files={"image": ("nose.jpg", image, "image/jpeg")})
+
+    images_before = registry.images
+    rejected = asyncio.run(scan(jpeg(DEFECTS["blurry"](nose(5)))))
+    assert rejected.status_code == 422
+    detail = rejected.json()["detail"]
+    assert detail["error"] == "image_quality"
+    assert "blurry" in [reason["code"] for reason in detail["reasons"]]
+    assert registry.images == images_before  # ningún forward pass
+
+    accepted = asyncio.run(scan(jpeg(nose(5))))
+    assert accepted.status_code == 200
+    assert accepted.json()["quality"]["action"] == "ok"
+    assert registry.images > images_before
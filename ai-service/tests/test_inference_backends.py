@@ -0,0 +1,10 @@
+import sys
+
+import pytest
+
+from inference_backends import OnnxBackend
+
+def test_onnx_backend_without_onnxruntime_names_the_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)  # como si no estuviera instalado
+    with pytest.raises(ImportError, match="requirements-onnx.txt"):
+        OnnxBackend({"mobilenet": "nose_print/mobilenet.onnx"}, "fp32")
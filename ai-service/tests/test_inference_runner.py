@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from inference_runner import INFERENCE_MODES, make_runner
+
+def small_extractor() -> "tf.keras.Model":
+    """Conv + BatchNorm + depthwise + pooling + densa: las mismas capas que los backbones, en chico"""
+    tf.keras.utils.set_random_seed(0)
+    inputs = tf.keras.Input(shape=(32, 32, 3))
+    x = tf.keras.layers.Conv2D(8, 3, strides=2, activation="relu")(inputs)
+    x = tf.keras.layers.BatchNormalization()(x)
+    x = tf.keras.layers.DepthwiseConv2D(3, activation="relu")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(16)(x)
+    return tf.keras.Model(inputs, outputs)
+
+@pytest.mark.parametrize("mode", [mode for mode in INFERENCE_MODES if mode != "predict"])
+@pytest.mark.parametrize("batch", [1, 5])
+def test_runner_modes_match_predict(mode, batch):
+    model = small_extractor()
+    x = np.random.default_rng(batch).uniform(-1, 1, size=(batch, 32, 32, 3)).astype(np.float32)
+    expected = model.predict(x, verbose=0)
+    runner = make_runner(model, mode, xla=False)
+    runner(x[:1])  # el modo compiled no se vuelve a trazar con otro tamaño de lote
+    np.testing.assert_allclose(runner(x), expected, atol=1e-5)
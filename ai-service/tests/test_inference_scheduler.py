@@ -0,0 +1,33 @@
+import threading
+
+import numpy as np
+
+from inference_scheduler import MicroBatchScheduler
+
+def test_each_request_gets_its_own_rows_back():
+    calls = []
+
+    def run_batch(batch: np.ndarray) -> np.ndarray:
+        calls.append(batch.shape[0])
+        return batch.reshape(batch.shape[0], -1).sum(axis=1, keepdims=True) * 2
+
+    scheduler = MicroBatchScheduler("test", run_batch, max_batch=16, max_wait_ms=50)
+    tensors = [np.full((1 + i % 3, 2, 2, 1), float(i), dtype=np.float32) for i in range(12)]
+    outputs = [None] * len(tensors)
+    start = threading.Barrier(len(tensors))
+
+    def client(i):
+        start.wait()
+        outputs[i] = scheduler.submit(tensors[i])
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(len(tensors))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for tensor, output in zip(tensors, outputs):
+        np.testing.assert_array_equal(output, np.full((tensor.shape[0], 1), tensor[0].sum() * 2))
+    assert sum(calls) == sum(t.shape[0] for t in tensors)
+    assert len(calls) < len(tensors)  # hubo agrupación
+    assert max(calls) <= 16 + 2  # max_batch (el último tensor puede completar el lote)
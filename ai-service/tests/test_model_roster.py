@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from model_roster import ModelRoster, parse_model_list
+
+class FakeModel:
+    def __init__(self, name: str):
+        self.name = name
+        self.threshold = 0.5
+
+def counting_factories(delay: float = 0.0):
+    """Constructores falsos que cuentan cuántas veces se construye cada modelo"""
+    built = {"nose_print": 0, "advanced": 0, "simple": 0}
+
+    def factory(name):
+        def build():
+            built[name] += 1
+            time.sleep(delay)
+            return FakeModel(name)
+        return build
+
+    return {name: factory(name) for name in built}, built
+
+def test_lazy_models_load_once_on_first_use():
+    factories, built = counting_factories(delay=0.05)
+    roster = ModelRoster(factories, ["nose_print", "advanced", "simple"], ["advanced", "simple"])
+    assert built == {"nose_print": 1, "advanced": 0, "simple": 0}
+    assert roster.peek("advanced") is None
+    assert set(roster.loaded_models()) == {"nose_print"}
+
+    # Primer uso concurrente: una sola construcción y el mismo objeto para todos
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        models = list(pool.map(lambda _: roster.get("advanced"), range(8)))
+    assert built["advanced"] == 1
+    assert all(model is models[0] for model in models)
+    stats = roster.stats()
+    assert stats["advanced"]["loaded"] and stats["advanced"]["load_seconds"] >= 0.05
+    assert not stats["simple"]["loaded"]
+
+def test_settings_applied_before_loading_reach_the_model():
+    factories, built = counting_factories()
+    roster = ModelRoster(factories, ["nose_print", "simple"], ["simple"])
+    roster.apply(lambda model: setattr(model, "threshold", 0.9), ["simple"])
+    assert built["simple"] == 0  # ajustar el umbral no fuerza la carga
+    assert roster.get("simple").threshold == 0.9
+    roster.apply(lambda model: setattr(model, "threshold", 0.7), ["simple"])
+    assert roster.peek("simple").threshold == 0.7
+
+def test_inactive_models_are_never_built():
+    factories, built = counting_factories()
+    roster = ModelRoster(factories, parse_model_list("nose_print"), parse_model_list("advanced,simple"))
+    assert roster.get("advanced") is None and roster.peek("simple") is None
+    roster.apply(lambda model: setattr(model, "threshold", 0.9))
+    assert built == {"nose_print": 1, "advanced": 0, "simple": 0}
+    assert roster.stats()["advanced"] == {"active": False, "loaded": False}
+    assert roster.active == ["nose_print"]
+
+def test_primary_model_is_required_and_always_eager():
+    factories, built = counting_factories()
+    with pytest.raises(ValueError):
+        ModelRoster(factories, ["advanced"])
+    ModelRoster(factories, ["nose_print"], ["nose_print"])
+    assert built["nose_print"] == 1
+    with pytest.raises(ValueError, match="desconocidos"):
+        parse_model_list("nose_print, resnet")
+
+def test_a_failed_load_is_retried_on_next_use():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("archivo de embeddings ilegible")
+        return FakeModel("advanced")
+
+    factories, _ = counting_factories()
+    factories["advanced"] = flaky
+    roster = ModelRoster(factories, ["nose_print", "advanced"], ["advanced"])
+    with pytest.raises(RuntimeError):
+        roster.get("advanced")
+    assert not roster.stats()["advanced"]["loaded"]
+    assert roster.get("advanced").name == "advanced"
+    assert len(attempts) == 2
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+from worker_process import Worker, seed_registry
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+@pytest.fixture
+def workers(tmp_path, random_backbones):
+    """Dos procesos worker con su propio NosePrintModel sobre el mismo registro (como uvicorn --workers 2)"""
+    root, version = random_backbones
+    seed_registry(str(tmp_path), 200)
+    env = dict(os.environ, EMBEDDING_INDEX_SHARED="true", MODEL_ARTIFACTS_DIR=root, MODEL_ARTIFACT_VERSION=version,
+               PYTHONPATH=os.pathsep.join([os.path.dirname(TESTS), TESTS, os.environ.get("PYTHONPATH", "")]))
+    started = []
+    try:
+        for i in range(2):
+            started.append(Worker(str(tmp_path), env, str(tmp_path / f"worker-{i}.log")))
+        yield started
+    finally:
+        for worker in started:
+            worker.stop()
+
+@pytest.mark.skipif(sys.platform == "win32", reason="el registro compartido usa flock")
+def test_registration_in_one_worker_is_visible_in_the_other(workers):
+    first, second = workers
+    assert first.ready["size"] == second.ready["size"] == 200
+    first.call("register", pet_ids=["solo-0"])
+    reply = second.call("find", pet_ids=["solo-0"])
+    assert reply["found"] == [True]
+    assert reply["size"] == 201
+
+@pytest.mark.skipif(sys.platform == "win32", reason="el registro compartido usa flock")
+def test_simultaneous_registrations_are_visible_in_every_worker(workers):
+    batches = [[f"concurrent-{i}-{j}" for j in range(10)] for i in range(len(workers))]
+    # Se envían los comandos antes de leer las respuestas: los registros se solapan
+    for worker, pet_ids in zip(workers, batches):
+        worker.send("register", pet_ids=pet_ids)
+    for worker in workers:
+        worker.read()
+    everyone = [pet_id for batch in batches for pet_id in batch]
+    replies = [worker.call("find", pet_ids=everyone) for worker in workers]
+    assert all(all(reply["found"]) for reply in replies)
+    assert {reply["size"] for reply in replies} == {220}
+
+@pytest.mark.skipif(sys.platform == "win32", reason="el registro compartido usa flock")
+def test_workers_stay_in_sync_after_another_worker_compacts(workers):
+    first, second = workers
+    first.call("register", pet_ids=["before-compact"])
+    compacted = first.call("compact")
+    second.call("register", pet_ids=["after-compact"])
+    replies = [worker.call("find", pet_ids=["pet-0", "before-compact", "after-compact"]) for worker in workers]
+    assert compacted["shared"]
+    assert all(all(reply["found"]) and reply["shared"] for reply in replies)
+    assert {reply["size"] for reply in replies} == {202}
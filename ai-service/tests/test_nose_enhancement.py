@@ -0,0 +1,32 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from helpers import synthetic_nose
+from nose_enhancement import enhance_nose_image, enhance_nose_image_reference
+
+def reference(img: np.ndarray) -> np.ndarray:
+    with warnings.catch_warnings():
+        # La referencia divide por cero en imágenes planas (sin bordes)
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return enhance_nose_image_reference(img)
+
+@pytest.mark.parametrize("height,width", [(224, 224), (480, 640), (1080, 1440)])
+def test_matches_the_reference_at_full_resolution(height, width):
+    img = synthetic_nose(height, width, np.random.default_rng(height))
+    expected = reference(img)
+    actual = enhance_nose_image(img)
+    assert actual.dtype == expected.dtype and actual.shape == expected.shape
+    # Salida binaria: a lo sumo píxeles aislados donde el redondeo float32 cruza un umbral
+    assert np.mean(np.any(actual != expected, axis=-1)) <= 0.001
+
+def test_flat_image_matches_the_reference():
+    img = np.full((120, 160, 3), 128, dtype=np.uint8)
+    np.testing.assert_array_equal(enhance_nose_image(img), reference(img))
+
+def test_working_resolution_caps_the_longest_side():
+    img = synthetic_nose(1080, 1440, np.random.default_rng(0))
+    reduced = enhance_nose_image(img, max_side=640)
+    assert reduced.shape == (480, 640, 3)
+    assert set(np.unique(reduced)) <= {0.0, 1.0}
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from helpers import synthetic_nose
+from nose_specific_features import FEATURE_DIM, nose_specific_features, nose_specific_features_reference
+
+@pytest.fixture(scope="module")
+def images():
+    """Narices sintéticas, ruido, casi negras y vacías (los casos límite de la referencia)"""
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(4):
+        images.append(synthetic_nose(224, 224, rng))
+        images.append(rng.integers(0, 256, size=(224, 224, 3), dtype=np.uint8))
+        images.append(((rng.random((224, 224, 3)) < 0.02) * 2).astype(np.uint8))
+        images.append(np.zeros((224, 224, 3), dtype=np.uint8))
+    return images
+
+def test_batch_matches_the_reference(images):
+    expected = np.array([nose_specific_features_reference(img) for img in images])
+    actual = nose_specific_features(np.stack(images))
+    assert actual.shape == (len(images), FEATURE_DIM) and actual.dtype == np.float32
+    assert np.isfinite(actual).all()
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+def test_result_does_not_depend_on_batch_composition(images):
+    batch = nose_specific_features(np.stack(images))
+    for i in (0, 5, len(images) - 1):
+        np.testing.assert_array_equal(nose_specific_features(images[i]), batch[i:i + 1])
+    np.testing.assert_array_equal(nose_specific_features(images[3:7]), batch[3:7])
+
+def test_empty_batch_and_wrong_size():
+    assert nose_specific_features(np.zeros((0, 224, 224, 3), dtype=np.uint8)).shape == (0, FEATURE_DIM)
+    with pytest.raises(ValueError):
+        nose_specific_features(np.zeros((1, 100, 100, 3), dtype=np.uint8))
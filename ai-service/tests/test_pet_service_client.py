@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+
+from pet_service_client import PetServiceClient
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """pet-service de prueba: falla con 503 o se cuelga hasta que se libere `release`"""
+
+    def __init__(self):
+        self.calls = 0
+        self.status = 503
+        self.hang = False
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        self.started.set()
+        if self.hang:
+            await self.release.wait()
+        pet_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(self.status, json={"name": f"Pet {pet_id}", "breed": "Mestizo", "noseImageUrl": None})
+
+def test_cancelled_half_open_probe_releases_the_breaker():
+    async def scenario():
+        transport = StubTransport()
+        client = PetServiceClient("http://pet-service", failure_threshold=1, reset_timeout=0.0,
+                                  cache_ttl=0.0, transport=transport)
+        await client.get_pet("p1")  # 503: el circuito se abre
+        assert client.breaker.state == "open"
+
+        # La prueba de half_open queda colgada y se cancela (cliente desconectado)
+        transport.hang = True
+        transport.started.clear()
+        probe = asyncio.create_task(client.get_pet("p2"))
+        await transport.started.wait()
+        assert client.breaker.state == "half_open"
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+
+        # La siguiente llamada vuelve a probar y cierra el circuito
+        transport.hang = False
+        transport.status = 200
+        calls = transport.calls
+        pet = await client.get_pet("p3")
+        await client.aclose()
+        return client, transport, calls, pet
+
+    client, transport, calls, pet = asyncio.run(scenario())
+    assert transport.calls == calls + 1
+    assert pet == {"name": "Pet p3", "breed": "Mestizo", "noseImageUrl": None}
+    assert client.breaker.state == "closed"
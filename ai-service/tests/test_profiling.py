@@ -0,0 +1,106 @@
+import asyncio
+import os
+import pstats
+
+import httpx
+import numpy as np
+import pytest
+
+import profiling
+from helpers import jpeg, synthetic_nose
+from profiling import RequestProfiler
+
+ADMIN = {"x-admin-token": "secreto"}
+
+def busy():
+    return sum(i * i for i in range(20000))
+
+def test_header_trigger_requires_the_admin_token(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), admin_token="secreto")
+    session = profiler.begin("scan", {"x-profile": "true", "x-profile-tf": "1", **ADMIN})
+    assert session.reason == "header" and session.tf_trace_dir is not None
+    assert profiler.begin("scan", {"x-profile": "true", "x-admin-token": "otro"}) is None
+    assert profiler.begin("scan", {"x-profile": "true"}) is None
+    assert profiler.begin("scan", ADMIN) is None
+    # Sin token configurado nadie es administrador, tampoco con un token vacío
+    open_profiler = RequestProfiler(str(tmp_path / "open"))
+    assert open_profiler.begin("scan", {"x-profile": "true", "x-admin-token": ""}) is None
+    assert not open_profiler.is_admin({"x-admin-token": ""})
+
+def test_sampling_trigger(tmp_path, monkeypatch):
+    profiler = RequestProfiler(str(tmp_path), sample_rate=0.25)
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.2)
+    session = profiler.begin("compare", {})
+    assert session.reason == "sample" and session.tf_trace_dir is None
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.3)
+    assert profiler.begin("compare", {}) is None
+    assert RequestProfiler(str(tmp_path), sample_rate=0.0).begin("compare", {}) is None
+
+def test_saved_profiles_are_listed_and_pruned_oldest_first(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), admin_token="secreto", max_profiles=2)
+    saved = []
+    for i in range(3):
+        session = profiler.begin("scan", {"x-profile": "true", **ADMIN})
+        profiler.wrap(busy)()  # fuera de una petición perfilada la tarea no se envuelve
+        token = profiler.activate(session)
+        try:
+            profiler.wrap(busy)()
+        finally:
+            profiler.deactivate(token)
+        meta = profiler.save(session, 200, 0.01, "pytest")
+        os.utime(os.path.join(session.directory, "meta.json"), (1000 + i, 1000 + i))
+        saved.append(meta)
+    profiler._prune()
+
+    assert saved[0]["profiled_calls"] == 1 and saved[0]["top_functions"]
+    assert [meta["id"] for meta in profiler.list_profiles()] == [saved[2]["id"], saved[1]["id"]]
+    assert profiler.profile_file(saved[0]["id"], "cpu.prof") is None
+    path = profiler.profile_file(saved[2]["id"], "cpu.prof")
+    assert "busy" in str(pstats.Stats(path).stats)
+    assert profiler.profile_file("../" + saved[2]["id"], "cpu.prof") is None
+    assert profiler.stats()["pruned"] >= 1
+
+@pytest.fixture
+def api(service):
+    """Cliente del servicio que sube una foto de nariz sintética si se pide"""
+    image = jpeg(synthetic_nose(480, 640, np.random.default_rng(11)))
+
+    def call(method: str, path: str, headers=None, upload: bool = False):
+        async def request():
+            transport = httpx.ASGITransport(app=service.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://ai-service", timeout=300) as client:
+                files = {"image": ("nose.jpg", image, "image/jpeg")} if upload else None
+                return await client.request(method, path, headers=headers, files=files)
+        return asyncio.run(request())
+    return call
+
+def test_admin_profiles_require_the_token(service, api):
+    assert api("GET", "/admin/profiles").status_code == 403
+    assert api("GET", "/admin/profiles", {"X-Admin-Token": "otro"}).status_code == 403
+    assert api("GET", "/admin/profiles/cualquiera/summary").status_code == 403
+    admin = {"X-Admin-Token": service.Config.PROFILING_ADMIN_TOKEN}
+    assert api("GET", "/admin/profiles", admin).status_code == 200
+    assert api("GET", "/admin/profiles/no-existe", admin).status_code == 404
+
+def test_scan_is_profiled_on_header_or_sample(service, api, monkeypatch):
+    admin = {"X-Admin-Token": service.Config.PROFILING_ADMIN_TOKEN}
+    response = api("POST", "/scan", {"X-Profile": "true", **admin}, upload=True)
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    # Sin token la cabecera se ignora
+    assert "X-Profile-Id" not in api("POST", "/scan", {"X-Profile": "true"}, upload=True).headers
+
+    listed = {meta["id"]: meta for meta in api("GET", "/admin/profiles", admin).json()["profiles"]}
+    assert listed[profile_id]["reason"] == "header"
+    assert listed[profile_id]["endpoint"] == "scan"
+    assert listed[profile_id]["profiled_calls"] > 0
+    assert api("GET", f"/admin/profiles/{profile_id}", admin).content
+    assert "cumulative" in api("GET", f"/admin/profiles/{profile_id}/summary", admin).text
+
+    monkeypatch.setattr(service.request_profiler, "sample_rate", 1.0)
+    sampled = api("POST", "/scan", upload=True)
+    listed = {meta["id"]: meta for meta in api("GET", "/admin/profiles", admin).json()["profiles"]}
+    assert listed[sampled.headers["X-Profile-Id"]]["reason"] == "sample"
+    # /health no está entre los endpoints perfilados
+    assert "X-Profile-Id" not in api("GET", "/health").headers
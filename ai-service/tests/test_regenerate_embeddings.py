@@ -0,0 +1,39 @@
+import numpy as np
+
+from embedding_store import EmbeddingStore
+from model_roster import MODEL_FILES
+from regenerate_embeddings import swap_in
+
+class StagedModel:
+    """Lo que swap_in usa de un modelo del staging: embeddings, store y save_embeddings"""
+
+    def __init__(self, path: str):
+        self.store = EmbeddingStore(path, model_version="v2")
+        self.embeddings = self.store.load()
+        self.index = None
+
+    def register(self, pet_id: str, value: float):
+        self.embeddings[pet_id] = {"mobilenet": np.full(8, value, dtype=np.float32)}
+        self.store.put(pet_id, self.embeddings[pet_id])
+
+    def save_embeddings(self):
+        self.store.compact(self.embeddings)
+
+def test_swap_in_keeps_new_registrations_and_drops_deleted_pets(tmp_path):
+    live_path = tmp_path / MODEL_FILES["nose_print"]
+    live = EmbeddingStore(str(live_path), model_version="v1")
+    live.load()
+    for pet_id in ("p1", "deleted-before", "deleted-during"):
+        live.put(pet_id, {"mobilenet": np.ones(8, dtype=np.float32)})
+
+    staging = StagedModel(str(tmp_path / "staging" / MODEL_FILES["nose_print"]))
+    staging.register("p1", 2.0)
+    staging.register("deleted-during", 2.0)  # estaba en la lista inicial del pet-service
+    live.put("registered-during", {"mobilenet": np.ones(8, dtype=np.float32)})
+
+    # Lista del pet-service al publicar
+    swap_in({"nose_print": staging}, str(tmp_path), {"p1", "registered-during"})
+
+    published = EmbeddingStore(str(live_path))
+    assert set(published.load()) == {"p1", "registered-during"}
+    assert published.versions == {"p1": "v2", "registered-during": "v1"}
@@ -0,0 +1,104 @@
+"""Proceso worker para las pruebas multi-worker: su propio NosePrintModel sobre archivos compartidos.
+
+Atiende comandos JSON por stdin (register / find / compact / quit) y responde una línea JSON por
+stdout, igual que un worker de `uvicorn --workers N` que registra y busca sobre el mismo store.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import zlib
+from typing import Dict
+
+import numpy as np
+
+from helpers import FAMILY_DIMS, MODEL_WEIGHTS
+
+EMBEDDINGS_FILE = "nose_print_embeddings.json"
+
+def pet_vectors(pet_id: str) -> Dict[str, np.ndarray]:
+    """Vectores deterministas por pet_id: cualquier proceso puede generar la consulta de una mascota"""
+    rng = np.random.default_rng(zlib.crc32(pet_id.encode('utf-8')))
+    return {family: rng.standard_normal(dim).astype(np.float32) for family, dim in FAMILY_DIMS.items()}
+
+def register(model, pet_ids):
+    model.add_nose_prints([(pet_id, {f: v.tolist() for f, v in pet_vectors(pet_id).items()}) for pet_id in pet_ids])
+
+def seed_registry(directory: str, pets: int):
+    """Registro inicial compactado (snapshot + índice compartido) escrito por un único proceso"""
+    from nose_print_model import NosePrintModel
+    model = NosePrintModel(os.path.join(directory, EMBEDDINGS_FILE))
+    model.store.compact_every = 0
+    register(model, [f"pet-{i}" for i in range(pets)])
+    model.save_embeddings()
+
+def child(directory: str):
+    # El protocolo usa una copia de stdout; lo que Keras/TensorFlow impriman va al log (stderr)
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    from nose_print_model import NosePrintModel
+    model = NosePrintModel(os.path.join(directory, EMBEDDINGS_FILE))
+
+    def respond(payload: Dict):
+        protocol.write(json.dumps(payload) + "\n")
+        protocol.flush()
+
+    respond({"size": len(model.index), "shared": model.index.shared_path is not None})
+    for line in sys.stdin:
+        command = json.loads(line)
+        op = command["op"]
+        if op == "register":
+            register(model, command["pet_ids"])
+            respond({"size": len(model.index)})
+        elif op == "find":
+            # Igual que compare_nose_print: sincronizar y buscar
+            model.sync_embeddings()
+            rng = np.random.default_rng(0)
+            found = []
+            for pet_id in command["pet_ids"]:
+                query = {f: v + 0.05 * rng.standard_normal(v.shape[0]).astype(np.float32) for f, v in pet_vectors(pet_id).items()}
+                ranked = model.index.search(query, MODEL_WEIGHTS, top_k=1)
+                found.append(bool(ranked) and ranked[0][0] == pet_id)
+            respond({"found": found, "size": len(model.index), "shared": model.index.shared_path is not None})
+        elif op == "compact":
+            model.save_embeddings()
+            respond({"size": len(model.index), "shared": model.index.shared_path is not None})
+        elif op == "quit":
+            return
+
+class Worker:
+    def __init__(self, directory: str, env: Dict[str, str], log_path: str):
+        self._log = open(log_path, "w")
+        self.log_path = log_path
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), directory],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._log,
+                                        text=True, env=env)
+        self.ready = self.read()
+
+    def send(self, op: str, **kwargs):
+        self.process.stdin.write(json.dumps({"op": op, **kwargs}) + "\n")
+        self.process.stdin.flush()
+
+    def read(self) -> Dict:
+        line = self.process.stdout.readline()
+        if not line:
+            with open(self.log_path) as f:
+                tail = f.read().strip().splitlines()
+            raise RuntimeError(f"El worker terminó: {tail[-1] if tail else 'sin salida'}")
+        return json.loads(line)
+
+    def call(self, op: str, **kwargs) -> Dict:
+        self.send(op, **kwargs)
+        return self.read()
+
+    def stop(self):
+        try:
+            self.send("quit")
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self._log.close()
+
+if __name__ == "__main__":
+    child(sys.argv[1])